@@ -0,0 +1,11 @@
+"""
+Benchmarks offline de los caminos calientes del backend (sin Supabase ni red).
+
+    python benchmarks/run_benchmarks.py --json bench.json
+    python benchmarks/run_benchmarks.py --quick --baseline bench.json
+
+Ver benchmarks/cases.py para los casos y benchmarks/harness.py para la
+medición y la comparación contra una corrida anterior. La prueba de carga
+(benchmarks/load_test.py) usa el Supabase en memoria de
+benchmarks/fake_supabase.py.
+"""
@@ -0,0 +1,382 @@
+# backend/benchmarks/cases.py
+"""
+Casos de benchmark con datos sintéticos y deterministas (misma semilla =
+mismos datos), sin Supabase ni descargas:
+
+- embedding: `_generate_embeddings_batch` (decodificación + forward pass) y el
+  forward pass solo, con lotes de 1/4/8/16 imágenes. Por defecto el modelo es
+  la arquitectura de MegaDescriptor-L-384 con pesos aleatorios: misma latencia
+  que el modelo real sin descargarlo (--embedding-model megadescriptor usa los
+  pesos de Hugging Face).
+- decode: decodificación y preprocesamiento de JPEG de 12 MP, con la
+  decodificación completa como referencia.
+- topk: top-k del índice en memoria (services/match_index.py) sobre 10k/100k/1M
+  vectores unitarios de 1536 dimensiones agrupados por mascota. Los tamaños
+  cuya matriz no entra en la memoria permitida se informan como salteados.
+- nearby: el handler de /reports/nearby completo (búsqueda por radio con el
+  índice espacial en memoria + filtrado de filas) sobre reportes distribuidos
+  en una ciudad.
+- ai_scoring: la puntuación en bloque de /ai-search/ (score_candidates +
+  select_top) sobre candidatos con etiquetas, colores y fechas variados.
+"""
+import asyncio
+import contextlib
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from unittest.mock import patch
+
+import numpy as np
+
+from benchmarks.harness import measure, result, skipped
+
+# Arquitectura de MegaDescriptor-L-384 (swin large, ventana 12, entrada 384)
+OFFLINE_ARCH = "swin_large_patch4_window12_384"
+EMBEDDING_DIM = 1536
+
+# Huella aproximada de Buenos Aires: (lat mín, lat máx, lon mín, lon máx)
+CITY_BBOX = (-34.705, -34.527, -58.531, -58.335)
+
+LABEL_POOL = (
+    "dog", "cat", "puppy", "kitten", "golden retriever", "labrador retriever", "poodle",
+    "german shepherd", "bulldog", "beagle", "tabby cat", "siamese", "whiskers", "snout",
+    "fur", "collar", "companion dog", "carnivore", "mammal", "small to medium-sized cats",
+)
+COLOR_POOL = (
+    "#000000", "#FFFFFF", "#8B4513", "#D2B48C", "#808080", "#F5DEB3",
+    "#A0522D", "#FFD700", "#C0C0C0", "#2F4F4F", "#DEB887", "#696969",
+)
+
+
+# =========================
+# Datos sintéticos
+# =========================
+def synthetic_jpeg(width: int, height: int, seed: int = 0, quality: int = 90) -> bytes:
+    """JPEG con ruido suave ampliado (comprime y decodifica como una foto, no como ruido puro)."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(max(1, height // 32), max(1, width // 32), 3), dtype=np.uint8)
+    img = Image.fromarray(pixels).resize((width, height), Image.BICUBIC)
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def clustered_unit_vectors(n: int, dim: int, rng: np.random.Generator, per_pet: int = 4, spread: float = 0.6) -> np.ndarray:
+    """`n` vectores unitarios float32: grupos de `per_pet` fotos alrededor del vector de cada mascota."""
+    centers = rng.standard_normal((-(-n // per_pet), dim), dtype=np.float32)
+    vecs = np.repeat(centers, per_pet, axis=0)[:n]
+    vecs += spread * rng.standard_normal((n, dim), dtype=np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs
+
+
+def synthetic_match_index(n: int, dim: int = EMBEDDING_DIM, seed: int = 0, chunk: int = 50_000):
+    """
+    MatchIndex con `n` vectores repartidos en (lost|found) x (dog|cat).
+    Las matrices se llenan por bloques en lugar de `upsert` uno por uno.
+    """
+    from services.match_index import MatchIndex, _Partition
+
+    rng = np.random.default_rng(seed)
+    keys = [("lost", "dog"), ("found", "dog"), ("lost", "cat"), ("found", "cat")]
+    sizes = [n // len(keys) + (1 if i < n % len(keys) else 0) for i in range(len(keys))]
+    index = MatchIndex(dim)
+    for key, size in zip(keys, sizes):
+        partition = _Partition(dim, capacity=max(1, size))
+        for start in range(0, size, chunk):
+            stop = min(size, start + chunk)
+            partition.matrix[start:stop] = clustered_unit_vectors(stop - start, dim, rng)
+        partition.ids = [f"{key[0]}-{key[1]}-{i}" for i in range(size)]
+        partition.rows = {report_id: row for row, report_id in enumerate(partition.ids)}
+        index._partitions[key] = partition
+        index._keys.update((report_id, key) for report_id in partition.ids)
+    return index
+
+
+def city_points(n: int, rng: np.random.Generator, bbox: Tuple[float, float, float, float] = CITY_BBOX) -> np.ndarray:
+    """(n, 2) lat/lon: la mitad concentrada en barrios, la otra mitad uniforme en la ciudad."""
+    lat_min, lat_max, lon_min, lon_max = bbox
+    uniform = np.column_stack([rng.uniform(lat_min, lat_max, n), rng.uniform(lon_min, lon_max, n)])
+    hubs = np.column_stack([rng.uniform(lat_min, lat_max, 12), rng.uniform(lon_min, lon_max, 12)])
+    clustered = hubs[rng.integers(0, len(hubs), n)] + rng.normal(0.0, 0.01, (n, 2))
+    points = np.where((rng.random(n) < 0.5)[:, None], clustered, uniform)
+    points[:, 0] = np.clip(points[:, 0], lat_min, lat_max)
+    points[:, 1] = np.clip(points[:, 1], lon_min, lon_max)
+    return points
+
+
+def synthetic_candidates(n: int, rng: np.random.Generator, vocabulary: Dict[str, int]) -> List[Dict[str, Any]]:
+    """
+    Filas de `reports` para /ai-search/: la mitad con label_ids/color_ids
+    (migración 016) y la mitad solo con el JSON, como en una base migrada a medias.
+    """
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(n):
+        labels = [LABEL_POOL[j] for j in rng.choice(len(LABEL_POOL), size=int(rng.integers(3, 9)), replace=False)]
+        colors = [COLOR_POOL[j] for j in rng.choice(len(COLOR_POOL), size=int(rng.integers(1, 4)), replace=False)]
+        created_at = (now - timedelta(hours=float(rng.uniform(0, 24 * 90)))).isoformat()
+        row: Dict[str, Any] = {
+            "id": f"cand-{i}",
+            "status": "active",
+            "labels": {"labels": [{"label": label, "score": 90.0} for label in labels]},
+            "colors": colors,
+            "created_at": created_at,
+        }
+        if i % 2 == 0:
+            row["label_ids"] = sorted(vocabulary[label] for label in labels)
+            row["color_ids"] = sorted(vocabulary[color.lower()] for color in colors)
+        rows.append(row)
+    return rows
+
+
+# =========================
+# Casos
+# =========================
+@contextlib.contextmanager
+def _quiet():
+    """Silencia los print() de los servicios durante la medición."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def install_embedding_model(model: str = "random") -> Dict[str, Any]:
+    """
+    Deja cargado el modelo que usan las funciones de services/embeddings.py.
+
+    Args:
+        model: "megadescriptor" (pesos reales de Hugging Face), "random"
+            (arquitectura de MegaDescriptor sin descargar pesos) o el nombre
+            de otra arquitectura de timm
+    """
+    import torch
+    import timm
+    from services import embeddings
+    from services.image_preprocess import MODEL_INPUT_SIZE
+    from services.inference_backends import build_backend
+
+    if model == "megadescriptor":
+        backend, dim = embeddings._load_model()
+        return {"model": embeddings.MODEL_NAME, "backend": backend.name, "dim": int(dim), "device": embeddings.DEVICE}
+
+    arch = OFFLINE_ARCH if model == "random" else model
+    net = timm.create_model(arch, pretrained=False, num_classes=0).to(embeddings.DEVICE).eval()
+    with torch.no_grad():
+        dim = int(net(torch.zeros(1, 3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, device=embeddings.DEVICE)).shape[-1])
+    embeddings._model = net
+    embeddings._actual_dim = dim
+    embeddings._backend = build_backend(embeddings.EMBEDDING_BACKEND, net, MODEL_INPUT_SIZE, embeddings.DEVICE)
+    return {"model": f"{arch} (pesos aleatorios)", "backend": embeddings._backend.name, "dim": dim, "device": embeddings.DEVICE}
+
+
+def bench_embedding(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from services import embeddings
+    from services.image_preprocess import preprocess_array
+
+    batch_sizes = config.get("batch_sizes", (1, 4, 8, 16))
+    repeats = config.get("embedding_repeats", 3)
+    with _quiet():
+        model_info = install_embedding_model(config.get("embedding_model", "random"))
+    images = [synthetic_jpeg(1024, 768, seed=i) for i in range(max(batch_sizes))]
+    tensors = [preprocess_array(image_bytes) for image_bytes in images]
+
+    results = []
+    for batch_size in batch_sizes:
+        params = {"batch": batch_size}
+        with _quiet():
+            timings = measure(lambda: embeddings._generate_embeddings_batch(images[:batch_size]), repeats, warmup=1)
+        results.append(result("embedding", params, timings, items=batch_size, **model_info))
+        with _quiet():
+            timings = measure(lambda: embeddings.embed_preprocessed(tensors[:batch_size]), repeats, warmup=1)
+        results.append(result("embedding_forward", params, timings, items=batch_size, **model_info))
+    return results
+
+
+def bench_decode(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from PIL import Image
+    from services.image_preprocess import decode_image, preprocess_array
+
+    megapixels = config.get("decode_megapixels", 12)
+    count = config.get("decode_images", 4)
+    repeats = config.get("decode_repeats", 5)
+    width = int(round((megapixels * 1e6 * 4 / 3) ** 0.5))
+    height = int(round(width * 3 / 4))
+    images = [synthetic_jpeg(width, height, seed=100 + i) for i in range(count)]
+    params = {"megapixels": megapixels}
+    extra = {"width": width, "height": height, "avg_jpeg_bytes": int(np.mean([len(b) for b in images]))}
+
+    def full_decode():
+        # Referencia: decodificación completa + resize, como antes de services/image_preprocess.py
+        for image_bytes in images:
+            Image.open(io.BytesIO(image_bytes)).convert("RGB").resize((384, 384), Image.BILINEAR)
+
+    return [
+        result("decode_draft", params, measure(lambda: [decode_image(b) for b in images], repeats), items=count, **extra),
+        result("decode_preprocess", params, measure(lambda: [preprocess_array(b) for b in images], repeats), items=count, **extra),
+        result("decode_full_reference", params, measure(full_decode, repeats), items=count, **extra),
+    ]
+
+
+def _available_memory_bytes() -> Optional[int]:
+    # MemAvailable cuenta la caché de páginas recuperable; SC_AVPHYS_PAGES solo la memoria libre
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def bench_topk(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    sizes = config.get("topk_sizes", (10_000, 100_000, 1_000_000))
+    dim = config.get("dim", EMBEDDING_DIM)
+    k = config.get("k", 10)
+    repeats = config.get("topk_repeats", 10)
+    max_bytes = config.get("max_memory_bytes")
+    if max_bytes is None:
+        available = _available_memory_bytes()
+        max_bytes = available // 2 if available else None
+
+    results = []
+    for n in sizes:
+        params = {"n": n, "dim": dim, "k": k}
+        needed = n * dim * 4
+        if max_bytes is not None and needed > max_bytes:
+            results.append(skipped("topk", params, f"la matriz necesita {needed / 1e9:.1f} GB y el límite es {max_bytes / 1e9:.1f} GB (--max-memory-gb)"))
+            continue
+        index = synthetic_match_index(n, dim, seed=config.get("seed", 0))
+        rng = np.random.default_rng(config.get("seed", 0) + 1)
+        # Consulta cercana a una mascota existente del lado "found"
+        base = index.get_vector("found-dog-0")
+        query = base + 0.3 * rng.standard_normal(dim, dtype=np.float32) / np.sqrt(dim)
+        found: List[Any] = []
+
+        def search():
+            found[:] = [index.search_with_total(query, report_type="found", k=k, threshold=0.1)]
+
+        timings = measure(search, repeats, warmup=1)
+        hits, total = found[0]
+        results.append(result("topk", params, timings, scanned=n // 2, above_threshold=total, top_similarity=round(hits[0][1], 4) if hits else None))
+        del index
+    return results
+
+
+def bench_nearby(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    import routers.reports as reports_router
+    from services.geo_index import GeoIndex
+
+    n = config.get("nearby_reports", 100_000)
+    repeats = config.get("nearby_repeats", 20)
+    rng = np.random.default_rng(config.get("seed", 0) + 2)
+    points = city_points(n, rng)
+    index = GeoIndex()
+    rows: Dict[str, Dict[str, Any]] = {}
+    for i, (lat, lon) in enumerate(points):
+        report_id = f"report-{i}"
+        report_type = "lost" if i % 2 else "found"
+        species = "dog" if i % 3 else "cat"
+        index.upsert(report_id, float(lat), float(lon), report_type, species)
+        rows[report_id] = {
+            "id": report_id, "type": report_type, "species": species,
+            # Un 10 % ya resuelto que el handler descarta
+            "status": "resolved" if i % 10 == 0 else "active",
+            "location": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+        }
+
+    def search(sb, lat, lon, radius_km, limit=None, **filters):
+        return index.query(lat, lon, radius_km, limit=limit)
+
+    def fetch(sb, ids, columns="*"):
+        # Como PostgREST, cada respuesta trae dicts nuevos
+        return {report_id: dict(rows[report_id]) for report_id in ids}
+
+    center_lat = (CITY_BBOX[0] + CITY_BBOX[1]) / 2
+    center_lon = (CITY_BBOX[2] + CITY_BBOX[3]) / 2
+    results = []
+    loop = asyncio.new_event_loop()
+    try:
+        with patch.object(reports_router, "_sb", lambda: None), \
+             patch.object(reports_router, "search_nearby", search), \
+             patch.object(reports_router, "fetch_reports_by_ids", fetch):
+            for radius_km in config.get("nearby_radii", (2.0, 10.0)):
+                for limit in config.get("nearby_limits", (None, 50)):
+                    params = {"n": n, "radius_km": radius_km, "limit": limit or "all"}
+                    response: Dict[str, Any] = {}
+
+                    def call():
+                        response.update(loop.run_until_complete(reports_router.get_nearby_reports(
+                            lat=center_lat, lng=center_lon, radius_km=radius_km, limit=limit
+                        )))
+
+                    timings = measure(call, repeats, warmup=1)
+                    results.append(result("nearby", params, timings, returned=response["count"]))
+    finally:
+        loop.close()
+    return results
+
+
+def bench_ai_scoring(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from services.ai_scoring import MAX_RESULTS, score_candidates, select_top
+    from services.label_vocab import get_label_vocabulary
+
+    rng = np.random.default_rng(config.get("seed", 0) + 3)
+    terms = [label.lower() for label in LABEL_POOL] + [color.lower() for color in COLOR_POOL]
+    vocabulary = {term: i + 1 for i, term in enumerate(terms)}
+    # Vocabulario en la caché del proceso, como tras la primera consulta a label_vocabulary
+    shared = get_label_vocabulary()
+    with shared._lock:
+        shared._ids.update(vocabulary)
+
+    query_labels = {"dog", "golden retriever", "fur", "collar", "unseen breed"}
+    query_colors = {"#d2b48c", "#ffffff"}
+    radius_km = 10.0
+    results = []
+    for n in config.get("ai_sizes", (1_000, 10_000, 100_000)):
+        rows = synthetic_candidates(n, rng, vocabulary)
+        distances = rng.uniform(0.0, radius_km, n)
+
+        def score():
+            scores = score_candidates(rows, distances, query_labels, query_colors, radius_km)
+            return select_top(scores["total"], MAX_RESULTS)
+
+        timings = measure(score, config.get("ai_repeats", 10), warmup=1)
+        results.append(result("ai_scoring", {"n": n}, timings, passing=score()[1]))
+    return results
+
+
+SUITES: Dict[str, Callable[[Dict[str, Any]], List[Dict[str, Any]]]] = {
+    "embedding": bench_embedding,
+    "decode": bench_decode,
+    "topk": bench_topk,
+    "nearby": bench_nearby,
+    "ai_scoring": bench_ai_scoring,
+}
+
+
+def run_suites(names: Sequence[str], config: Dict[str, Any], log: Callable[[str], None] = print) -> List[Dict[str, Any]]:
+    """Ejecuta las suites pedidas en orden; un error en una suite queda registrado y no corta las demás."""
+    results: List[Dict[str, Any]] = []
+    for name in names:
+        if name not in SUITES:
+            raise ValueError(f"Suite desconocida: {name} (disponibles: {', '.join(SUITES)})")
+        log(f"⏱️ [bench] {name}...")
+        try:
+            entries = SUITES[name](config)
+        except Exception as e:
+            log(f"❌ [bench] {name} falló: {e}")
+            entries = [{"id": name, "suite": name, "params": {}, "error": str(e)}]
+        for entry in entries:
+            if "median_ms" in entry:
+                log(f"   {entry['id']:<50} {entry['median_ms']:>11.3f} ms (p95 {entry['p95_ms']:.3f})")
+            elif "skipped" in entry:
+                log(f"   {entry['id']:<50} salteado: {entry['skipped']}")
+        results.extend(entries)
+    return results
@@ -0,0 +1,671 @@
+# backend/benchmarks/fake_supabase.py
+"""
+Sustituto en memoria del cliente de Supabase para pruebas de carga offline.
+
+Implementa el subconjunto de PostgREST que usan los routers:
+
+- table(...).select(columnas, count="exact", head=...) con alias
+  ("embedding:embedding_b64"), eq/neq/gt/gte/lt/lte/in_/is_/not_/or_,
+  order/limit/range/single, insert/update/upsert/delete y execute().
+- rpc(...) con las funciones de las migraciones que usan los caminos
+  calientes (match_reports_by_embedding, match_reports_for_report,
+  upsert_matches, prune_match_lists, search_reports_within_radius),
+  reimplementadas en Python con la misma semántica. Se pueden registrar
+  otras con `register_rpc`.
+
+Cada execute() es un round trip: espera `latency_ms` (+ jitter uniforme y un
+extra por RPC) con time.sleep, igual que el cliente síncrono real bloquea el
+thread que lo llama, y se cuenta en las métricas del proceso. Los errores se
+lanzan como postgrest.exceptions.APIError para que los routers los traten
+igual que los de la base.
+
+    fake = FakeSupabase(latency_ms=5, jitter_ms=2)
+    fake.seed("reports", rows)
+    with installed(fake):
+        ...  # get_supabase_client() devuelve `fake`
+"""
+import base64
+import contextlib
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from postgrest.exceptions import APIError
+
+from services.geo_index import EARTH_RADIUS_KM, extract_coords
+from utils.metrics import count_supabase_roundtrip
+from utils.vector_codec import decode_vector, encode_vector_binary, to_pgvector_text
+
+# Valores por defecto de las columnas que completa la base al insertar
+TABLE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "reports": {"status": "active"},
+    "matches": {"status": "pending", "matched_by": "ai_visual"},
+}
+# Columnas de tipo vector: se guardan como float32 y se devuelven como texto de pgvector
+VECTOR_COLUMNS = {"embedding"}
+# Columnas calculadas (funciones de PostgREST sobre la fila)
+COMPUTED_COLUMNS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "embedding_b64": lambda row: None if row.get("embedding") is None
+    else base64.b64encode(encode_vector_binary(row["embedding"])).decode("ascii"),
+}
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+class FakeResponse:
+    """Misma forma que la respuesta de postgrest: data y count."""
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _api_error(message: str, code: str = "P0001") -> APIError:
+    return APIError({"message": message, "code": code, "hint": None, "details": None})
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _same(a: Any, b: Any) -> bool:
+    # PostgREST compara contra el texto de la URL: "1" == 1, "true" == True
+    if a is None or b is None:
+        return a is b
+    if a == b:
+        return True
+    if isinstance(a, bool) or isinstance(b, bool):
+        return str(a).lower() == str(b).lower()
+    return str(a) == str(b)
+
+
+def _compare(a: Any, b: Any, op: Callable[[Any, Any], bool]) -> bool:
+    if a is None or b is None:
+        return False
+    try:
+        return op(float(a), float(b))
+    except (TypeError, ValueError):
+        return op(str(a), str(b))
+
+
+def _is(value: Any, target: Any) -> bool:
+    target = str(target).lower() if target is not None else "null"
+    if target == "null":
+        return value is None
+    if target in ("true", "false"):
+        return value is (target == "true")
+    raise _api_error(f"is_ no soporta el valor {target!r}", "PGRST100")
+
+
+def _parse_or(filters: str) -> Predicate:
+    """or_ con condiciones simples: "col.eq.valor,col2.is.null,col3.in.(a,b)"."""
+    conditions: List[Predicate] = []
+    depth = 0
+    current = ""
+    parts = []
+    for char in filters:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    parts.append(current)
+    for part in parts:
+        column, op, value = part.strip().split(".", 2)
+        if op == "eq":
+            conditions.append(lambda row, c=column, v=value: _same(row.get(c), v))
+        elif op == "neq":
+            conditions.append(lambda row, c=column, v=value: not _same(row.get(c), v))
+        elif op == "is":
+            conditions.append(lambda row, c=column, v=value: _is(row.get(c), v))
+        elif op == "in":
+            values = [v.strip().strip('"') for v in value.strip("()").split(",")]
+            conditions.append(lambda row, c=column, vs=values: any(_same(row.get(c), v) for v in vs))
+        else:
+            raise _api_error(f"Operador no soportado en or_: {op}", "PGRST100")
+    return lambda row: any(condition(row) for condition in conditions)
+
+
+class _Query:
+    """Builder encadenable de una consulta sobre una tabla (subconjunto de postgrest-py)."""
+
+    def __init__(self, fake: "FakeSupabase", table: str):
+        self._fake = fake
+        self._table = table
+        self._action = "select"
+        self._columns = "*"
+        self._count: Optional[str] = None
+        self._head = False
+        self._filters: List[Predicate] = []
+        self._id_eq: Optional[str] = None
+        self._negate = False
+        self._order: List[Tuple[str, bool]] = []
+        self._offset = 0
+        self._limit: Optional[int] = None
+        self._single = False
+        self._maybe_single = False
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+
+    # ---- acciones ----
+    def select(self, *columns: str, count: Optional[str] = None, head: bool = False) -> "_Query":
+        self._columns = ",".join(columns) if columns else "*"
+        self._count = count
+        self._head = head
+        return self
+
+    def insert(self, rows: Any, **_) -> "_Query":
+        self._action, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows: Any, on_conflict: str = "id", **_) -> "_Query":
+        self._action, self._payload, self._on_conflict = "upsert", rows, on_conflict
+        return self
+
+    def update(self, values: Dict[str, Any], **_) -> "_Query":
+        self._action, self._payload = "update", values
+        return self
+
+    def delete(self, **_) -> "_Query":
+        self._action = "delete"
+        return self
+
+    # ---- filtros ----
+    @property
+    def not_(self) -> "_Query":
+        self._negate = True
+        return self
+
+    def _filter(self, predicate: Predicate) -> "_Query":
+        if self._negate:
+            self._negate = False
+            self._filters.append(lambda row: not predicate(row))
+        else:
+            self._filters.append(predicate)
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        if column == "id" and not self._negate and self._id_eq is None:
+            self._id_eq = str(value)
+        return self._filter(lambda row: _same(row.get(column), value))
+
+    def neq(self, column: str, value: Any) -> "_Query":
+        return self._filter(lambda row: not _same(row.get(column), value))
+
+    def gt(self, column: str, value: Any) -> "_Query":
+        return self._filter(lambda row: _compare(row.get(column), value, lambda a, b: a > b))
+
+    def gte(self, column: str, value: Any) -> "_Query":
+        return self._filter(lambda row: _compare(row.get(column), value, lambda a, b: a >= b))
+
+    def lt(self, column: str, value: Any) -> "_Query":
+        return self._filter(lambda row: _compare(row.get(column), value, lambda a, b: a < b))
+
+    def lte(self, column: str, value: Any) -> "_Query":
+        return self._filter(lambda row: _compare(row.get(column), value, lambda a, b: a <= b))
+
+    def in_(self, column: str, values: Iterable[Any]) -> "_Query":
+        wanted = {str(v) for v in values}
+        return self._filter(lambda row: row.get(column) is not None and str(row.get(column)) in wanted)
+
+    def is_(self, column: str, value: Any) -> "_Query":
+        return self._filter(lambda row: _is(row.get(column), value))
+
+    def or_(self, filters: str) -> "_Query":
+        return self._filter(_parse_or(filters))
+
+    # ---- modificadores ----
+    def order(self, column: str, desc: bool = False, **_) -> "_Query":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **_) -> "_Query":
+        self._limit = int(size)
+        return self
+
+    def range(self, start: int, end: int, **_) -> "_Query":
+        self._offset, self._limit = int(start), int(end) - int(start) + 1
+        return self
+
+    def single(self) -> "_Query":
+        self._single = True
+        return self
+
+    def maybe_single(self) -> "_Query":
+        self._maybe_single = True
+        return self
+
+    # ---- ejecución ----
+    def execute(self) -> FakeResponse:
+        self._fake._roundtrip(f"{self._action}:{self._table}")
+        with self._fake._lock:
+            return getattr(self, f"_execute_{self._action}")()
+
+    def _matching(self) -> List[Dict[str, Any]]:
+        if self._id_eq is not None:
+            row = self._fake._ids.get(self._table, {}).get(self._id_eq)
+            candidates = [row] if row is not None else []
+        else:
+            candidates = self._fake._tables.get(self._table, [])
+        return [row for row in candidates if all(f(row) for f in self._filters)]
+
+    def _sorted(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for column, desc in reversed(self._order):
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: r[column], reverse=desc)
+            # Postgres: NULLS LAST en ASC y NULLS FIRST en DESC
+            rows = missing + present if desc else present + missing
+        return rows
+
+    def _shape(self, rows: List[Dict[str, Any]]) -> Any:
+        data = [self._fake._project(self._table, row, self._columns) for row in rows]
+        if self._single or self._maybe_single:
+            if len(data) == 1:
+                return data[0]
+            if self._maybe_single and not data:
+                return None
+            raise _api_error(
+                f"JSON object requested, multiple (or no) rows returned ({len(data)} rows)", "PGRST116"
+            )
+        return data
+
+    def _execute_select(self) -> FakeResponse:
+        rows = self._sorted(self._matching())
+        total = len(rows) if self._count else None
+        end = None if self._limit is None else self._offset + self._limit
+        rows = rows[self._offset:end]
+        if self._head:
+            return FakeResponse([], total)
+        return FakeResponse(self._shape(rows), total)
+
+    def _execute_insert(self) -> FakeResponse:
+        rows = self._payload if isinstance(self._payload, list) else [self._payload]
+        created = [self._fake._insert_row(self._table, row) for row in rows]
+        return FakeResponse(self._shape(created), len(created) if self._count else None)
+
+    def _execute_upsert(self) -> FakeResponse:
+        rows = self._payload if isinstance(self._payload, list) else [self._payload]
+        keys = [k.strip() for k in (self._on_conflict or "id").split(",")]
+        result = []
+        for row in rows:
+            existing = next(
+                (r for r in self._fake._tables.get(self._table, []) if all(_same(r.get(k), row.get(k)) for k in keys)),
+                None
+            ) if all(k in row for k in keys) else None
+            if existing is None:
+                result.append(self._fake._insert_row(self._table, row))
+            else:
+                self._fake._update_row(self._table, existing, row)
+                result.append(existing)
+        return FakeResponse(self._shape(result))
+
+    def _execute_update(self) -> FakeResponse:
+        rows = self._matching()
+        for row in rows:
+            self._fake._update_row(self._table, row, self._payload)
+        return FakeResponse(self._shape(rows), len(rows) if self._count else None)
+
+    def _execute_delete(self) -> FakeResponse:
+        rows = self._matching()
+        for row in rows:
+            self._fake._delete_row(self._table, row)
+        return FakeResponse(self._shape(rows), len(rows) if self._count else None)
+
+
+class _RpcCall:
+    def __init__(self, fake: "FakeSupabase", name: str, params: Dict[str, Any]):
+        self._fake = fake
+        self._name = name
+        self._params = params or {}
+
+    def execute(self) -> FakeResponse:
+        self._fake._roundtrip(f"rpc:{self._name}")
+        fn = self._fake._rpcs.get(self._name)
+        if fn is None:
+            raise _api_error(f"Could not find the function public.{self._name} in the schema cache", "PGRST202")
+        with self._fake._lock:
+            return FakeResponse(fn(self._fake, self._params))
+
+
+class FakeSupabase:
+    """
+    Cliente de Supabase en memoria con latencia configurable por round trip.
+
+    Args:
+        latency_ms: Latencia fija de cada execute()
+        jitter_ms: Latencia extra uniforme entre 0 y jitter_ms
+        rpc_latency_ms: Latencia adicional por nombre de RPC (p.ej. la búsqueda vectorial)
+        seed: Semilla del jitter y de los ids generados
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        rpc_latency_ms: Optional[Dict[str, float]] = None,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rpc_latency_ms = dict(rpc_latency_ms or {})
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self._tables: Dict[str, List[Dict[str, Any]]] = {}
+        self._ids: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._vector_text: Dict[int, Tuple[np.ndarray, str]] = {}
+        self._vectors_version = 0
+        self._matrix_cache: Optional[Tuple[int, List[Dict[str, Any]], np.ndarray]] = None
+        self._rpcs: Dict[str, Callable[["FakeSupabase", Dict[str, Any]], Any]] = dict(DEFAULT_RPCS)
+        self.roundtrips: Dict[str, int] = {}
+
+    # ---- API del cliente ----
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def from_(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None, **_) -> _RpcCall:
+        return _RpcCall(self, name, params or {})
+
+    # ---- configuración ----
+    def register_rpc(self, name: str, fn: Callable[["FakeSupabase", Dict[str, Any]], Any]) -> None:
+        """Agrega o reemplaza una RPC: `fn(fake, params)` devuelve el `data` de la respuesta."""
+        self._rpcs[name] = fn
+
+    def seed(self, table: str, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Carga filas sin latencia ni round trips (completa id/created_at/defaults si faltan) y las devuelve."""
+        with self._lock:
+            return [self._insert_row(table, row) for row in rows]
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        """Filas crudas de una tabla (sin copiar; para inspección en pruebas)."""
+        return self._tables.get(table, [])
+
+    def total_roundtrips(self) -> int:
+        return sum(self.roundtrips.values())
+
+    # ---- internos ----
+    def _roundtrip(self, kind: str) -> None:
+        with self._stats_lock:
+            self.roundtrips[kind] = self.roundtrips.get(kind, 0) + 1
+            jitter = self._random.uniform(0.0, self.jitter_ms) if self.jitter_ms else 0.0
+        count_supabase_roundtrip()
+        extra = self.rpc_latency_ms.get(kind[4:], 0.0) if kind.startswith("rpc:") else 0.0
+        delay = self.latency_ms + jitter + extra
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    def _new_id(self) -> str:
+        with self._stats_lock:
+            return str(uuid.UUID(int=self._random.getrandbits(128), version=4))
+
+    def _store_value(self, column: str, value: Any) -> Any:
+        if column in VECTOR_COLUMNS and value is not None:
+            vec = decode_vector(value)
+            if vec is None:
+                raise _api_error(f"invalid input syntax for type vector: {str(value)[:40]}", "22P02")
+            return vec
+        return value
+
+    def _insert_row(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        stored = {**TABLE_DEFAULTS.get(table, {}), **{k: self._store_value(k, v) for k, v in row.items()}}
+        stored.setdefault("created_at", _now_iso())
+        if table != "report_photo_embeddings":
+            stored.setdefault("id", self._new_id())
+        stored_id = stored.get("id")
+        if stored_id is not None:
+            index = self._ids.setdefault(table, {})
+            if str(stored_id) in index:
+                raise _api_error(f'duplicate key value violates unique constraint "{table}_pkey"', "23505")
+            index[str(stored_id)] = stored
+        self._tables.setdefault(table, []).append(stored)
+        if table == "reports":
+            self._vectors_version += 1
+        return stored
+
+    def _update_row(self, table: str, row: Dict[str, Any], values: Dict[str, Any]) -> None:
+        row.update({k: self._store_value(k, v) for k, v in values.items()})
+        if table == "reports":
+            self._vectors_version += 1
+
+    def _delete_row(self, table: str, row: Dict[str, Any]) -> None:
+        self._tables[table] = [r for r in self._tables.get(table, []) if r is not row]
+        if row.get("id") is not None:
+            self._ids.get(table, {}).pop(str(row["id"]), None)
+        if table == "reports":
+            self._vectors_version += 1
+
+    def _output(self, value: Any) -> Any:
+        if isinstance(value, np.ndarray):
+            # Como PostgREST, el vector viaja como texto; se memoiza por array
+            cached = self._vector_text.get(id(value))
+            if cached is None or cached[0] is not value:
+                cached = (value, to_pgvector_text(value))
+                self._vector_text[id(value)] = cached
+            return cached[1]
+        if isinstance(value, (dict, list)):
+            return _deep_copy(value)
+        return value
+
+    def _project(self, table: str, row: Dict[str, Any], columns: str) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for spec in (c.strip() for c in columns.split(",")):
+            if not spec:
+                continue
+            if spec == "*":
+                out.update({k: self._output(v) for k, v in row.items()})
+                continue
+            alias, _, column = spec.partition(":") if ":" in spec else (spec, "", spec)
+            if "(" in column:
+                raise _api_error(f"El fake no soporta recursos embebidos: {spec}", "PGRST100")
+            if column in COMPUTED_COLUMNS:
+                out[alias] = COMPUTED_COLUMNS[column](row)
+            else:
+                out[alias] = self._output(row.get(column))
+        return out
+
+    def _report_matrix(self) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Reportes con embedding y su matriz L2-normalizada (se reconstruye si cambiaron)."""
+        cache = self._matrix_cache
+        if cache is not None and cache[0] == self._vectors_version:
+            return cache[1], cache[2]
+        rows = [r for r in self._tables.get("reports", []) if isinstance(r.get("embedding"), np.ndarray)]
+        if rows:
+            matrix = np.stack([r["embedding"] for r in rows]).astype(np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1.0, norms)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self._matrix_cache = (self._vectors_version, rows, matrix)
+        return rows, matrix
+
+
+def _deep_copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _deep_copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_deep_copy(v) for v in value]
+    return value
+
+
+# =========================
+# RPCs (misma semántica que las migraciones)
+# =========================
+def _rpc_match_reports_by_embedding(fake: FakeSupabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Migración 012: top-k coseno con filtros; el umbral se aplica después del LIMIT (sin filter_ids)."""
+    query = decode_vector(params.get("query_embedding"))
+    rows, matrix = fake._report_matrix()
+    if query is None or not rows:
+        return []
+    norm = float(np.linalg.norm(query))
+    if norm == 0.0 or matrix.shape[1] != query.shape[0]:
+        return []
+    target_type = params.get("target_type")
+    species = params.get("filter_species")
+    status = params.get("filter_status", "active")
+    exclude = params.get("exclude_report_id")
+    only = {str(i) for i in params["filter_ids"]} if params.get("filter_ids") is not None else None
+    mask = np.fromiter((
+        (only is None or str(r.get("id")) in only)
+        and (status is None or r.get("status") == status)
+        and (target_type is None or r.get("type") == target_type)
+        and (species is None or r.get("species") == species)
+        and (exclude is None or str(r.get("id")) != str(exclude))
+        for r in rows
+    ), dtype=bool, count=len(rows))
+    candidates = np.flatnonzero(mask)
+    if candidates.size == 0:
+        return []
+    scores = matrix[candidates] @ (query / norm)
+    count = int(params.get("match_count", 10))
+    top = np.argsort(-scores, kind="stable")[:count]
+    threshold = float(params.get("match_threshold", 0.0))
+    return [
+        {"id": rows[candidates[i]]["id"], "similarity_score": float(scores[i])}
+        for i in top if scores[i] >= threshold
+    ]
+
+
+def _rpc_match_reports_for_report(fake: FakeSupabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    report_id = str(params.get("p_report_id"))
+    report = fake._ids.get("reports", {}).get(report_id)
+    if report is None:
+        raise _api_error(f"REPORT_NOT_FOUND: {report_id}")
+    if report.get("embedding") is None:
+        raise _api_error(f"REPORT_WITHOUT_EMBEDDING: {report_id}")
+    return _rpc_match_reports_by_embedding(fake, {
+        "query_embedding": report["embedding"],
+        "target_type": "found" if report.get("type") == "lost" else "lost",
+        "filter_species": params.get("filter_species"),
+        "filter_status": "active",
+        "match_threshold": params.get("match_threshold", 0.1),
+        "match_count": params.get("match_count", 10),
+        "exclude_report_id": report_id,
+    })
+
+
+def _rpc_upsert_matches(fake: FakeSupabase, params: Dict[str, Any]) -> int:
+    """Migración 017: inserta pares nuevos y mejora la similitud de los existentes (sin tocar su status)."""
+    best: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for item in params.get("payload") or []:
+        key = (str(item["lost_report_id"]), str(item["found_report_id"]))
+        if key not in best or float(item["similarity_score"]) > float(best[key]["similarity_score"]):
+            best[key] = item
+    existing = {
+        (str(m.get("lost_report_id")), str(m.get("found_report_id"))): m
+        for m in fake._tables.get("matches", [])
+    }
+    affected = 0
+    for key, item in best.items():
+        score = float(item["similarity_score"])
+        matched_by = item.get("matched_by") or "ai_visual"
+        match = existing.get(key)
+        if match is None:
+            fake._insert_row("matches", {
+                "lost_report_id": key[0], "found_report_id": key[1],
+                "similarity_score": score, "matched_by": matched_by, "status": "pending",
+            })
+            affected += 1
+        elif match.get("similarity_score") is None or score > float(match["similarity_score"]):
+            fake._update_row("matches", match, {"similarity_score": score, "matched_by": matched_by})
+            affected += 1
+    return affected
+
+
+def _rpc_prune_match_lists(fake: FakeSupabase, params: Dict[str, Any]) -> int:
+    """Migración 018: un par se borra solo si queda fuera del top-k de ambos lados."""
+    ids = {str(i) for i in params.get("report_ids") or []}
+    keep = int(params.get("keep", 10))
+    affected = [
+        m for m in fake._tables.get("matches", [])
+        if m.get("status") == "pending" and m.get("matched_by") == "ai_visual"
+        and (str(m.get("lost_report_id")) in ids or str(m.get("found_report_id")) in ids)
+    ]
+
+    def ranks(side: str) -> Dict[int, int]:
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for m in affected:
+            groups.setdefault(str(m.get(side)), []).append(m)
+        out = {}
+        for group in groups.values():
+            group.sort(key=lambda m: (-(m.get("similarity_score") or -math.inf), str(m.get("id"))))
+            out.update({id(m): rank for rank, m in enumerate(group, start=1)})
+        return out
+
+    lost_rank, found_rank = ranks("lost_report_id"), ranks("found_report_id")
+    doomed = [m for m in affected if lost_rank[id(m)] > keep and found_rank[id(m)] > keep]
+    for m in doomed:
+        fake._delete_row("matches", m)
+    return len(doomed)
+
+
+def _rpc_search_reports_within_radius(fake: FakeSupabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Migración 015: reportes dentro del radio, del más cercano al más lejano."""
+    lat, lon = float(params["p_lat"]), float(params["p_lng"])
+    radius_km = float(params.get("radius_km", 10.0))
+    filters = (params.get("filter_type"), params.get("filter_species"), params.get("filter_status", "active"))
+    exclude = params.get("exclude_report_id")
+    hits = []
+    lat_rad, cos_lat = math.radians(lat), math.cos(math.radians(lat))
+    for r in fake._tables.get("reports", []):
+        if (filters[0] is not None and r.get("type") != filters[0]) \
+                or (filters[1] is not None and r.get("species") != filters[1]) \
+                or (filters[2] is not None and r.get("status") != filters[2]) \
+                or (exclude is not None and str(r.get("id")) == str(exclude)):
+            continue
+        coords = extract_coords(r.get("location"))
+        if coords is None:
+            continue
+        dlat = math.radians(coords[0]) - lat_rad
+        dlon = math.radians(coords[1] - lon)
+        a = math.sin(dlat / 2) ** 2 + cos_lat * math.cos(math.radians(coords[0])) * math.sin(dlon / 2) ** 2
+        distance = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+        if distance <= radius_km:
+            hits.append({"id": r["id"], "distance_km": distance})
+    hits.sort(key=lambda h: h["distance_km"])
+    limit = params.get("max_results")
+    return hits[:int(limit)] if limit is not None else hits
+
+
+DEFAULT_RPCS: Dict[str, Callable[[FakeSupabase, Dict[str, Any]], Any]] = {
+    "match_reports_by_embedding": _rpc_match_reports_by_embedding,
+    "match_reports_for_report": _rpc_match_reports_for_report,
+    "upsert_matches": _rpc_upsert_matches,
+    "prune_match_lists": _rpc_prune_match_lists,
+    "search_reports_within_radius": _rpc_search_reports_within_radius,
+}
+
+
+@contextlib.contextmanager
+def installed(fake: FakeSupabase) -> Iterator[FakeSupabase]:
+    """Hace que get_supabase_client() devuelva `fake` en este proceso mientras dure el bloque."""
+    import utils.supabase_client as supabase_client
+
+    with supabase_client._lock:
+        saved = (
+            supabase_client._shared_client, supabase_client._shared_http_client,
+            supabase_client._shared_pid, supabase_client._shared_created_at,
+        )
+        supabase_client._shared_client = fake
+        supabase_client._shared_http_client = None
+        supabase_client._shared_pid = os.getpid()
+        supabase_client._shared_created_at = time.time()
+    try:
+        yield fake
+    finally:
+        with supabase_client._lock:
+            (
+                supabase_client._shared_client, supabase_client._shared_http_client,
+                supabase_client._shared_pid, supabase_client._shared_created_at,
+            ) = saved
@@ -0,0 +1,111 @@
+# backend/benchmarks/harness.py
+"""
+Medición de los benchmarks y comparación contra una corrida base.
+
+Cada caso se ejecuta `warmup` veces sin medir y `repeats` veces midiendo con
+time.perf_counter; se informa la mediana (lo que se compara entre corridas),
+el mínimo, el p95 y la media en milisegundos. Una regresión es un caso cuya
+mediana supera la de la base en más de `tolerance` (0.2 = 20 %).
+"""
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def measure(fn: Callable[[], Any], repeats: int = 5, warmup: int = 1) -> Dict[str, float]:
+    """
+    Mide la duración de `fn()`.
+
+    Returns:
+        Dict con repeats, min_ms, median_ms, p95_ms y mean_ms
+    """
+    for _ in range(max(0, warmup)):
+        fn()
+    samples = []
+    for _ in range(max(1, repeats)):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return {
+        "repeats": len(samples),
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+    }
+
+
+def case_id(suite: str, params: Dict[str, Any]) -> str:
+    """Identificador estable de un caso: suite/param=valor,... (clave de comparación)."""
+    if not params:
+        return suite
+    return suite + "/" + ",".join(f"{key}={params[key]}" for key in sorted(params))
+
+
+def result(suite: str, params: Dict[str, Any], timings: Dict[str, float], items: Optional[int] = None, **extra) -> Dict[str, Any]:
+    """Entrada del reporte; con `items` agrega el throughput por elemento."""
+    entry: Dict[str, Any] = {"id": case_id(suite, params), "suite": suite, "params": params, **timings}
+    if items:
+        entry["items"] = items
+        entry["ms_per_item"] = round(timings["median_ms"] / items, 4)
+        entry["items_per_second"] = round(items * 1000.0 / timings["median_ms"], 2) if timings["median_ms"] > 0 else None
+    entry.update(extra)
+    return entry
+
+
+def skipped(suite: str, params: Dict[str, Any], reason: str) -> Dict[str, Any]:
+    """Entrada de un caso que no se pudo ejecutar en esta máquina."""
+    return {"id": case_id(suite, params), "suite": suite, "params": params, "skipped": reason}
+
+
+def machine_info() -> Dict[str, Any]:
+    """Datos del entorno para interpretar los números (no se comparan)."""
+    info: Dict[str, Any] = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    torch_module = sys.modules.get("torch")
+    if torch_module is not None:
+        info["torch"] = torch_module.__version__
+        info["torch_threads"] = torch_module.get_num_threads()
+    return info
+
+
+def build_report(results: List[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": machine_info(),
+        "config": config,
+        "results": results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    Casos cuya mediana empeoró más de `tolerance` respecto de la base.
+    Los casos que faltan o se saltearon en alguna de las dos corridas no se comparan.
+    """
+    base = {entry["id"]: entry for entry in baseline.get("results", []) if "median_ms" in entry}
+    regressions = []
+    for entry in report.get("results", []):
+        previous = base.get(entry["id"])
+        if previous is None or "median_ms" not in entry or previous["median_ms"] <= 0:
+            continue
+        ratio = entry["median_ms"] / previous["median_ms"]
+        if ratio > 1.0 + tolerance:
+            regressions.append({
+                "id": entry["id"],
+                "baseline_ms": previous["median_ms"],
+                "current_ms": entry["median_ms"],
+                "ratio": round(ratio, 3),
+            })
+    return regressions
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de la API contra el Supabase en memoria (benchmarks/fake_supabase.py).
+
+Levanta la app real (main.app) con el fake instalado como cliente compartido y
+le envía peticiones a una tasa fija (lazo abierto: la petición i sale en
+t0 + i/rps aunque las anteriores no hayan terminado). La latencia se mide desde
+el instante programado, así que la espera en cola del servidor cuenta.
+
+Endpoints del mix (nombre=peso):
+    reports         GET  /reports/
+    reports_create  POST /reports/
+    pending         GET  /matches/pending?report_id=...
+    direct          POST /direct-matches/find/{report_id}
+
+Modos:
+    http  uvicorn en un thread de este proceso y httpx por TCP (default)
+    asgi  httpx.ASGITransport: sin red, app y generador comparten el event loop
+
+Uso (desde backend/):
+    python benchmarks/load_test.py --rps 50 --duration 20 --latency-ms 5 --jitter-ms 3
+    python benchmarks/load_test.py --mix direct=1 --rps 20 --rpc-latency match_reports_for_report=30
+    python benchmarks/load_test.py --reports 5000 --json carga.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from benchmarks.cases import EMBEDDING_DIM
+from benchmarks.fake_supabase import FakeSupabase, installed
+from benchmarks.harness import machine_info
+from benchmarks.synthetic_data import generate_blocks, load_into_fake
+
+ENDPOINTS = ("reports", "reports_create", "pending", "direct")
+DEFAULT_MIX = {"reports": 1, "reports_create": 1, "pending": 4, "direct": 4}
+
+
+# =========================
+# Peticiones
+# =========================
+def build_request(name: str, ids: Dict[str, List[str]], rng: random.Random) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    """(método, path, cuerpo JSON) de una petición del endpoint `name`."""
+    if name == "reports":
+        return "GET", "/reports/", None
+    if name == "reports_create":
+        return "POST", "/reports/", {
+            "type": rng.choice(["lost", "found"]),
+            "reporter_id": f"load-{rng.randrange(1000)}",
+            "species": rng.choice(["dog", "cat"]),
+            "description": "Reporte de la prueba de carga",
+            "location": {"type": "Point", "coordinates": [rng.uniform(-58.53, -58.34), rng.uniform(-34.70, -34.53)]},
+        }
+    if name == "pending":
+        return "GET", f"/matches/pending?report_id={rng.choice(ids['reports'])}", None
+    if name == "direct":
+        return "POST", f"/direct-matches/find/{rng.choice(ids['embedded'])}", None
+    raise ValueError(f"Endpoint desconocido: {name}")
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'pending=4,direct=1' -> pesos por endpoint."""
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Endpoint desconocido en el mix: {name} (opciones: {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("El mix no tiene endpoints con peso positivo")
+    return mix
+
+
+def _percentile(samples: List[float], q: float) -> Optional[float]:
+    return round(float(np.percentile(samples, q)), 2) if samples else None
+
+
+def summarize(samples: Dict[str, List[Tuple[float, Optional[int]]]], elapsed: float) -> Dict[str, Any]:
+    """Latencias (ms), errores y códigos de estado por endpoint y en total."""
+    def stats(items: List[Tuple[float, Optional[int]]]) -> Dict[str, Any]:
+        latencies = [latency for latency, _ in items]
+        statuses: Dict[str, int] = {}
+        for _, status in items:
+            key = str(status) if status is not None else "error"
+            statuses[key] = statuses.get(key, 0) + 1
+        return {
+            "requests": len(items),
+            "errors": sum(1 for _, status in items if status is None or status >= 500),
+            "statuses": statuses,
+            "p50_ms": _percentile(latencies, 50),
+            "p90_ms": _percentile(latencies, 90),
+            "p99_ms": _percentile(latencies, 99),
+            "max_ms": round(max(latencies), 2) if latencies else None,
+        }
+
+    everything = [item for items in samples.values() for item in items]
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "achieved_rps": round(len(everything) / elapsed, 2) if elapsed > 0 else None,
+        "total": stats(everything),
+        "endpoints": {name: stats(items) for name, items in samples.items()},
+    }
+
+
+async def drive(
+    client,
+    ids: Dict[str, List[str]],
+    rps: float,
+    duration: float,
+    mix: Dict[str, float],
+    seed: int = 0,
+    timeout: float = 30.0,
+) -> Dict[str, Any]:
+    """
+    Envía round(rps * duration) peticiones en lazo abierto con `client` (httpx.AsyncClient).
+
+    Returns:
+        Resumen de `summarize`
+    """
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    total = max(1, int(round(rps * duration)))
+    samples: Dict[str, List[Tuple[float, Optional[int]]]] = {name: [] for name in names}
+
+    async def one(name: str, scheduled: float) -> None:
+        method, path, body = build_request(name, ids, rng)
+        status = None
+        try:
+            response = await client.request(method, path, json=body, timeout=timeout)
+            status = response.status_code
+        except Exception:
+            pass
+        samples[name].append(((time.perf_counter() - scheduled) * 1000.0, status))
+
+    loop_start = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        scheduled = loop_start + i / rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(rng.choices(names, weights)[0], scheduled)))
+    await asyncio.gather(*tasks)
+    return summarize(samples, time.perf_counter() - loop_start)
+
+
+# =========================
+# Servidor
+# =========================
+def load_app():
+    """Importa main.app (llamar con el fake ya instalado para que nunca se cree el cliente real)."""
+    import main
+    return main.app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve_in_thread(app):
+    """uvicorn en un thread propio; devuelve la URL base."""
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("uvicorn no arrancó")
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+async def run_load(
+    fake: FakeSupabase,
+    ids: Dict[str, List[str]],
+    rps: float,
+    duration: float,
+    mix: Dict[str, float],
+    mode: str = "http",
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Corre la carga contra la app con `fake` instalado como cliente de Supabase."""
+    import httpx
+
+    with installed(fake):
+        app = load_app()
+        start_roundtrips = fake.total_roundtrips()
+        if mode == "asgi":
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+                summary = await drive(client, ids, rps, duration, mix, seed)
+        elif mode == "http":
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+            with serve_in_thread(app) as base_url:
+                async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+                    summary = await drive(client, ids, rps, duration, mix, seed)
+        else:
+            raise ValueError(f"Modo desconocido: {mode}")
+    roundtrips = fake.total_roundtrips() - start_roundtrips
+    summary["supabase_roundtrips"] = roundtrips
+    summary["roundtrips_per_request"] = round(roundtrips / max(1, summary["total"]["requests"]), 2)
+    return summary
+
+
+# =========================
+# CLI
+# =========================
+def _rpc_latencies(text: str) -> Dict[str, float]:
+    latencies = {}
+    for part in text.split(","):
+        if part.strip():
+            name, _, value = part.partition("=")
+            latencies[name.strip()] = float(value)
+    return latencies
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API contra un Supabase en memoria")
+    parser.add_argument("--rps", type=float, default=20.0, help="Peticiones por segundo objetivo")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duración en segundos")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"Pesos por endpoint, p.ej. pending=4,direct=1 ({', '.join(ENDPOINTS)})")
+    parser.add_argument("--mode", choices=("http", "asgi"), default="http", help="http (uvicorn + TCP) o asgi (en el mismo loop)")
+    parser.add_argument("--reports", type=int, default=500, help="Reportes sintéticos a cargar")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="Dimensión de los embeddings")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latencia de cada round trip al fake")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Latencia extra aleatoria (uniforme) por round trip")
+    parser.add_argument("--rpc-latency", type=_rpc_latencies, default={},
+                        help="Latencia extra por RPC, p.ej. match_reports_for_report=30,upsert_matches=10")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los datos y del mix")
+    parser.add_argument("--json", default=None, help="Archivo donde guardar el resumen")
+    parser.add_argument("--app-logs", action="store_true", help="No silenciar los print() de la app durante la carga")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # El modelo no participa de la carga: que el startup no lo pre-cargue
+    os.environ["GENERATE_EMBEDDINGS_LOCALLY"] = "false"
+    fake = FakeSupabase(args.latency_ms, args.jitter_ms, args.rpc_latency, seed=args.seed)
+    print(f"🌱 Cargando {args.reports} reportes sintéticos (dim={args.dim})...")
+    ids = load_into_fake(fake, generate_blocks(args.reports, args.seed, dim=args.dim))
+    print(f"🏁 {args.rps:g} rps durante {args.duration:g}s ({args.mode}), mix={args.mix}")
+
+    with open(os.devnull, "w") as devnull:
+        quiet = contextlib.nullcontext() if args.app_logs else contextlib.redirect_stdout(devnull)
+        with quiet:
+            summary = asyncio.run(run_load(fake, ids, args.rps, args.duration, args.mix, args.mode, args.seed))
+
+    report = {
+        "config": {
+            "rps": args.rps, "duration": args.duration, "mix": args.mix, "mode": args.mode,
+            "reports": args.reports, "dim": args.dim, "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms, "rpc_latency_ms": args.rpc_latency, "seed": args.seed,
+        },
+        "machine": machine_info(),
+        **summary,
+    }
+
+    print("=" * 60)
+    print(f"📊 {summary['total']['requests']} peticiones en {summary['elapsed_s']}s "
+          f"({summary['achieved_rps']} rps, {summary['roundtrips_per_request']} round trips/petición)")
+    for name, stats in [*summary["endpoints"].items(), ("total", summary["total"])]:
+        print(f"   {name:<15} n={stats['requests']:<6} p50={stats['p50_ms']}ms p90={stats['p90_ms']}ms "
+              f"p99={stats['p99_ms']}ms errores={stats['errors']} {stats['statuses']}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, default=str))
+        print(f"📝 Resumen guardado en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
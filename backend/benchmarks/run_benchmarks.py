@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks offline de embeddings, matching y búsqueda geográfica.
+
+No usa Supabase ni red: todos los datos son sintéticos y deterministas. El
+resultado se guarda en JSON; con --baseline se compara contra una corrida
+anterior y el proceso termina con código 1 si algún caso empeoró más que
+--tolerance, para frenar el deploy.
+
+Uso (desde backend/):
+    python benchmarks/run_benchmarks.py --json bench.json
+    python benchmarks/run_benchmarks.py --quick --suites topk,nearby,ai_scoring
+    python benchmarks/run_benchmarks.py --json nuevo.json --baseline bench.json --tolerance 0.2
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Agregar el directorio backend al path
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from benchmarks.cases import SUITES, run_suites
+from benchmarks.harness import build_report, compare
+
+QUICK_CONFIG = {
+    "batch_sizes": (1, 4),
+    "embedding_repeats": 1,
+    "decode_images": 2,
+    "decode_repeats": 3,
+    "topk_sizes": (10_000, 100_000),
+    "topk_repeats": 5,
+    "nearby_reports": 20_000,
+    "nearby_repeats": 10,
+    "ai_sizes": (1_000, 10_000),
+    "ai_repeats": 5,
+}
+
+
+def _int_list(text: str):
+    return tuple(int(value) for value in text.split(",") if value.strip())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks offline de los caminos calientes del backend")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Suites separadas por comas ({', '.join(SUITES)})")
+    parser.add_argument("--quick", action="store_true", help="Tamaños y repeticiones reducidos (chequeo rápido)")
+    parser.add_argument("--json", default=None, help="Archivo donde guardar el reporte")
+    parser.add_argument("--baseline", default=None, help="Reporte anterior contra el cual comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento máximo de la mediana (0.2 = 20%%)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los datos sintéticos")
+    parser.add_argument("--embedding-model", default="random",
+                        help="random (arquitectura de MegaDescriptor sin pesos), megadescriptor (pesos reales) u otra arquitectura de timm")
+    parser.add_argument("--batch-sizes", type=_int_list, default=None, help="Lotes de la suite embedding (default: 1,4,8,16)")
+    parser.add_argument("--topk-sizes", type=_int_list, default=None, help="Vectores de la suite topk (default: 10000,100000,1000000)")
+    parser.add_argument("--max-memory-gb", type=float, default=None,
+                        help="Memoria máxima para la matriz de topk (default: la mitad de la memoria disponible)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = dict(QUICK_CONFIG) if args.quick else {}
+    config["seed"] = args.seed
+    config["embedding_model"] = args.embedding_model
+    if args.batch_sizes:
+        config["batch_sizes"] = args.batch_sizes
+    if args.topk_sizes:
+        config["topk_sizes"] = args.topk_sizes
+    if args.max_memory_gb is not None:
+        config["max_memory_bytes"] = int(args.max_memory_gb * 1e9)
+
+    suites = [name.strip() for name in args.suites.split(",") if name.strip()]
+    print("=" * 60)
+    print(f"🏁 BENCHMARKS ({', '.join(suites)}{', quick' if args.quick else ''})")
+    print("=" * 60)
+    report = build_report(run_suites(suites, config), {**config, "suites": suites, "quick": args.quick})
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        report["baseline"] = {"path": args.baseline, "created_at": baseline.get("created_at"), "tolerance": args.tolerance}
+        report["regressions"] = regressions
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, default=str))
+        print(f"📝 Reporte guardado en {args.json}")
+
+    print("=" * 60)
+    if args.baseline and regressions:
+        print(f"❌ {len(regressions)} caso(s) más lentos que la base (tolerancia {args.tolerance:.0%}):")
+        for item in regressions:
+            print(f"   {item['id']}: {item['baseline_ms']:.3f} -> {item['current_ms']:.3f} ms (x{item['ratio']})")
+        sys.exit(1)
+    if args.baseline:
+        print(f"✅ Sin regresiones contra {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Generador determinista de datos sintéticos: reportes, embeddings, ubicaciones y matches.
+
+Los datos se generan por mascota, en bloques de PETS_PER_BLOCK mascotas con su
+propia semilla ([seed, bloque]): la misma semilla produce exactamente los
+mismos datos sin importar cuántos reportes se pidan (solo se recorta el último
+bloque) ni dónde se escriban.
+
+Cada mascota tiene un vector unitario "verdadero" de 1536 dimensiones que
+comparte una fracción `species_similarity` con la dirección de su especie; sus
+fotos son ese vector más ruido (`spread`) y el embedding del reporte es la media
+renormalizada de sus fotos (como en la migración 019). Dos reportes de la misma
+mascota quedan cerca, los de la misma especie algo parecidos y el resto casi
+ortogonales. Por mascota:
+
+- un reporte "lost" (LOST_RATIO) y, con probabilidad `found_ratio`, uno o dos
+  "found" de la misma mascota: esos pares son la verdad de referencia
+  (ground truth) para medir umbrales, ef_search o parámetros del índice;
+- o solo un "found" (animal visto en la calle sin reporte de pérdida).
+
+La ubicación es GeoJSON dentro de la huella de una ciudad real (CITIES, con
+peso por población) y el "found" aparece cerca del "lost". labels/colors
+siguen el formato de la app ({"labels": [{"label", "score"}]} y ["#RRGGBB"]) y
+comparten la mayoría de los términos entre reportes de la misma mascota. Los
+matches imitan los que guarda el matcher: el par verdadero (si ambos tienen
+embedding) más `distractors` candidatos de la misma especie, con la similitud
+coseno real.
+
+Destinos: el Supabase en memoria (load_into_fake, lo usa
+benchmarks/load_test.py) o Postgres con psycopg (PostgresWriter, COPY por
+bloque). Uso (desde backend/):
+
+    python benchmarks/synthetic_data.py --reports 300000 --ground-truth gt.csv
+    python benchmarks/synthetic_data.py --reports 300000 --dsn "$DATABASE_URL" --ground-truth gt.csv
+"""
+import argparse
+import csv
+import json
+import math
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from benchmarks.cases import COLOR_POOL, EMBEDDING_DIM, LABEL_POOL, city_points
+from utils.vector_codec import to_pgvector_text
+
+# Huellas aproximadas (lat mín, lat máx, lon mín, lon máx) y peso por población
+CITIES: Dict[str, Tuple[Tuple[float, float, float, float], float]] = {
+    "buenos_aires": ((-34.705, -34.527, -58.531, -58.335), 0.45),
+    "cordoba": ((-31.480, -31.330, -64.280, -64.100), 0.18),
+    "rosario": ((-33.020, -32.880, -60.770, -60.600), 0.15),
+    "mendoza": ((-32.950, -32.850, -68.900, -68.800), 0.12),
+    "la_plata": ((-34.980, -34.870, -58.030, -57.900), 0.10),
+}
+SPECIES = ("dog", "cat", "bird", "rabbit", "other")
+SPECIES_WEIGHTS = (0.60, 0.32, 0.04, 0.02, 0.02)
+SIZES = ("small", "medium", "large")
+PET_NAMES = ("Luna", "Toby", "Simba", "Milo", "Lola", "Rocky", "Nina", "Coco", "Bruno", "Kira", "Max", "Mora")
+
+PETS_PER_BLOCK = 1000
+LOST_RATIO = 0.55            # mascotas con reporte de pérdida (el resto: solo "found")
+HISTORY_DAYS = 180           # antigüedad máxima de los reportes
+RESOLVED_RATIO = 0.3         # pares reencontrados que ya se marcaron como resueltos
+
+_SPECIES_LABEL = {"dog": "dog", "cat": "cat", "bird": "bird", "rabbit": "rabbit", "other": "mammal"}
+
+
+def _uuid(rng: np.random.Generator) -> str:
+    return str(uuid.UUID(bytes=rng.bytes(16), version=4))
+
+
+def _unit(vecs: np.ndarray) -> np.ndarray:
+    return vecs / np.linalg.norm(vecs, axis=-1, keepdims=True)
+
+
+def _pick(rng: np.random.Generator, pool: Sequence[str], low: int, high: int) -> List[str]:
+    return [pool[i] for i in rng.choice(len(pool), size=int(rng.integers(low, high + 1)), replace=False)]
+
+
+def generate_block(
+    block: int,
+    seed: int = 0,
+    dim: int = EMBEDDING_DIM,
+    spread: float = 0.5,
+    species_similarity: float = 0.3,
+    found_ratio: float = 0.6,
+    missing_embedding: float = 0.1,
+    distractors: int = 3,
+    reporters: int = 20_000,
+    photo_embeddings: bool = False,
+    now: Optional[datetime] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Datos de las mascotas del bloque `block`.
+
+    Returns:
+        Dict con "reports", "matches", "ground_truth" (pares lost/found de la
+        misma mascota) y "photo_embeddings" (vacío salvo con photo_embeddings=True)
+    """
+    rng = np.random.default_rng([seed, block])
+    now = now or datetime(2025, 1, 1, tzinfo=timezone.utc)
+    pets = PETS_PER_BLOCK
+    species = rng.choice(len(SPECIES), size=pets, p=SPECIES_WEIGHTS)
+    # La dirección de cada especie es la misma en todos los bloques
+    species_dirs = _unit(np.random.default_rng([seed, 2 ** 32 - 1]).standard_normal((len(SPECIES), dim), dtype=np.float32))
+    centers = _unit(
+        math.sqrt(species_similarity) * species_dirs[species]
+        + math.sqrt(1.0 - species_similarity) * _unit(rng.standard_normal((pets, dim), dtype=np.float32))
+    )
+    noise_scale = spread / math.sqrt(dim)
+    city_names = list(CITIES)
+    city_of = rng.choice(len(city_names), size=pets, p=[CITIES[c][1] for c in city_names])
+    homes = np.zeros((pets, 2))
+    for c, name in enumerate(city_names):
+        members = np.flatnonzero(city_of == c)
+        if members.size:
+            homes[members] = city_points(members.size, rng, CITIES[name][0])
+
+    reports: List[Dict[str, Any]] = []
+    vectors: List[Optional[np.ndarray]] = []
+    photo_rows: List[Dict[str, Any]] = []
+    ground_truth: List[Dict[str, Any]] = []
+    pet_reports: List[Tuple[Optional[int], List[int], bool]] = []
+
+    def add_report(pet: int, report_type: str, created_at: datetime, near: np.ndarray, labels, colors) -> int:
+        report_id = _uuid(rng)
+        bbox = CITIES[city_names[city_of[pet]]][0]
+        lat = float(np.clip(near[0] + rng.normal(0.0, 0.008), bbox[0], bbox[1]))
+        lon = float(np.clip(near[1] + rng.normal(0.0, 0.008), bbox[2], bbox[3]))
+        n_photos = int(rng.integers(1, 4))
+        photos = [f"https://example.invalid/reports/{report_id}/{k}.jpg" for k in range(n_photos)]
+        # Mayoría de términos de la mascota, alguno se pierde y a veces aparece uno nuevo
+        report_labels = [l for l in labels if rng.random() > 0.2] or labels[:1]
+        if rng.random() < 0.3:
+            report_labels.append(LABEL_POOL[int(rng.integers(len(LABEL_POOL)))])
+        report_colors = [c for c in colors if rng.random() > 0.15] or colors[:1]
+
+        vec = None
+        if rng.random() >= missing_embedding:
+            photo_vecs = _unit(centers[pet] + noise_scale * rng.standard_normal((n_photos, dim), dtype=np.float32))
+            vec = _unit(photo_vecs.mean(axis=0))
+            if photo_embeddings:
+                photo_rows.extend(
+                    {"report_id": report_id, "photo_index": k, "photo_url": photos[k], "embedding": photo_vecs[k]}
+                    for k in range(n_photos)
+                )
+        species_name = SPECIES[species[pet]]
+        reports.append({
+            "id": report_id,
+            "type": report_type,
+            "reporter_id": str(uuid.uuid5(uuid.NAMESPACE_OID, f"reporter-{seed}-{int(rng.integers(reporters))}")),
+            "species": species_name,
+            "pet_name": f"{PET_NAMES[pet % len(PET_NAMES)]} {block}-{pet}" if report_type == "lost" else None,
+            "color": colors[0],
+            "size": SIZES[pet % len(SIZES)],
+            "description": f"{'Perdido' if report_type == 'lost' else 'Encontrado'}: {species_name} {', '.join(report_labels[:3])}",
+            "photos": photos,
+            "location": {"type": "Point", "coordinates": [lon, lat]},
+            "status": "active",
+            "labels": {"labels": [
+                {"label": l, "score": round(float(rng.uniform(60.0, 99.0)), 1)} for l in dict.fromkeys(report_labels)
+            ]},
+            "colors": list(dict.fromkeys(report_colors)),
+            "embedding": vec,
+            "created_at": created_at.isoformat(),
+        })
+        vectors.append(vec)
+        return len(reports) - 1
+
+    for pet in range(pets):
+        labels = [_SPECIES_LABEL[SPECIES[species[pet]]]] + _pick(rng, LABEL_POOL, 2, 5)
+        colors = _pick(rng, COLOR_POOL, 1, 3)
+        seen_at = now - timedelta(days=float(rng.uniform(0.0, HISTORY_DAYS)))
+        lost = None
+        if rng.random() < LOST_RATIO:
+            lost = add_report(pet, "lost", seen_at, homes[pet], labels, colors)
+            n_found = 0 if rng.random() >= found_ratio else (2 if rng.random() < 0.1 else 1)
+        else:
+            n_found = 1
+        found = []
+        for _ in range(n_found):
+            days_later = float(rng.uniform(0.1, 10.0)) if lost is not None else 0.0
+            found.append(add_report(pet, "found", seen_at + timedelta(days=days_later), homes[pet], labels, colors))
+        resolved = lost is not None and bool(found) and rng.random() < RESOLVED_RATIO
+        if resolved:
+            for i in [lost, *found]:
+                reports[i]["status"] = "resolved"
+        if lost is not None:
+            ground_truth.extend(
+                {"lost_report_id": reports[lost]["id"], "found_report_id": reports[i]["id"],
+                 "species": reports[lost]["species"]}
+                for i in found
+            )
+        pet_reports.append((lost, found, resolved))
+
+    # Matches: el par verdadero y distractores de la misma especie, con la similitud real
+    found_by_species: Dict[str, List[int]] = {}
+    for i, row in enumerate(reports):
+        if row["type"] == "found" and vectors[i] is not None:
+            found_by_species.setdefault(row["species"], []).append(i)
+    matches: List[Dict[str, Any]] = []
+    for lost, found, resolved in pet_reports:
+        if lost is None or vectors[lost] is None:
+            continue
+        pool = found_by_species.get(reports[lost]["species"], [])
+        candidates = [i for i in found if vectors[i] is not None]
+        if pool and distractors:
+            candidates += [pool[int(j)] for j in rng.choice(len(pool), size=min(distractors, len(pool)), replace=False)]
+        for i in dict.fromkeys(candidates):
+            same_pet = i in found
+            matches.append({
+                "lost_report_id": reports[lost]["id"],
+                "found_report_id": reports[i]["id"],
+                "similarity_score": round(float(vectors[lost] @ vectors[i]), 6),
+                "matched_by": "ai_visual",
+                "status": "accepted" if same_pet and resolved else "pending",
+            })
+
+    return {"reports": reports, "matches": matches, "ground_truth": ground_truth, "photo_embeddings": photo_rows}
+
+
+def generate_blocks(reports: int, seed: int = 0, **options) -> Iterator[Dict[str, List[Dict[str, Any]]]]:
+    """
+    Bloques hasta completar exactamente `reports` reportes (el último se recorta).
+    Las opciones son las de `generate_block`.
+    """
+    remaining = reports
+    block = 0
+    while remaining > 0:
+        data = generate_block(block, seed, **options)
+        if len(data["reports"]) > remaining:
+            data = _truncate(data, remaining)
+        remaining -= len(data["reports"])
+        block += 1
+        yield data
+
+
+def _truncate(data: Dict[str, List[Dict[str, Any]]], size: int) -> Dict[str, List[Dict[str, Any]]]:
+    reports = data["reports"][:size]
+    kept = {row["id"] for row in reports}
+
+    def both(row):
+        return row["lost_report_id"] in kept and row["found_report_id"] in kept
+
+    return {
+        "reports": reports,
+        "matches": [m for m in data["matches"] if both(m)],
+        "ground_truth": [g for g in data["ground_truth"] if both(g)],
+        "photo_embeddings": [p for p in data["photo_embeddings"] if p["report_id"] in kept],
+    }
+
+
+def load_into_fake(fake, blocks: Iterable[Dict[str, List[Dict[str, Any]]]]) -> Dict[str, List[Any]]:
+    """
+    Carga los bloques en el Supabase en memoria (benchmarks/fake_supabase.py).
+
+    Returns:
+        Dict con los ids de "reports", de "embedded" (activos con embedding) y
+        los pares de "ground_truth"
+    """
+    ids: Dict[str, List[Any]] = {"reports": [], "embedded": [], "ground_truth": []}
+    for data in blocks:
+        fake.seed("reports", data["reports"])
+        fake.seed("matches", data["matches"])
+        if data["photo_embeddings"]:
+            fake.seed("report_photo_embeddings", data["photo_embeddings"])
+        ids["reports"].extend(row["id"] for row in data["reports"])
+        ids["embedded"].extend(
+            row["id"] for row in data["reports"] if row["embedding"] is not None and row["status"] == "active"
+        )
+        ids["ground_truth"].extend((g["lost_report_id"], g["found_report_id"]) for g in data["ground_truth"])
+    return ids
+
+
+def score_pairs(predicted: Iterable[Tuple[str, str]], ground_truth: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+    """Precisión y recall de pares (lost, found) predichos contra los pares de la misma mascota."""
+    predicted_set: Set[Tuple[str, str]] = set(predicted)
+    truth: Set[Tuple[str, str]] = set(ground_truth)
+    hits = len(predicted_set & truth)
+    return {
+        "predicted": len(predicted_set),
+        "ground_truth": len(truth),
+        "true_positives": hits,
+        "precision": round(hits / len(predicted_set), 4) if predicted_set else None,
+        "recall": round(hits / len(truth), 4) if truth else None,
+    }
+
+
+class PostgresWriter:
+    """
+    Escribe los bloques con psycopg (COPY, una transacción por bloque).
+
+    reports.reporter_id referencia a profiles: los ids sintéticos se reemplazan
+    por perfiles existentes (de forma estable) o por NULL si no hay ninguno.
+    """
+
+    REPORT_COLUMNS = (
+        "id", "type", "reporter_id", "species", "pet_name", "color", "size", "description",
+        "photos", "location", "status", "labels", "colors", "embedding", "created_at",
+    )
+    MATCH_COLUMNS = ("lost_report_id", "found_report_id", "similarity_score", "matched_by", "status")
+    PHOTO_COLUMNS = ("report_id", "photo_index", "photo_url", "embedding")
+
+    def __init__(self, dsn: str):
+        import psycopg
+
+        self.conn = psycopg.connect(dsn)
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT id::text FROM public.profiles ORDER BY id LIMIT 1000")
+            self._profiles = [row[0] for row in cur.fetchall()]
+        self.conn.commit()
+        self._reporters: Dict[str, Optional[str]] = {}
+
+    def _reporter(self, synthetic_id: str) -> Optional[str]:
+        if not self._profiles:
+            return None
+        if synthetic_id not in self._reporters:
+            self._reporters[synthetic_id] = self._profiles[len(self._reporters) % len(self._profiles)]
+        return self._reporters[synthetic_id]
+
+    def _report_row(self, row: Dict[str, Any]) -> Tuple[Any, ...]:
+        lon, lat = row["location"]["coordinates"]
+        values = {
+            **row,
+            "reporter_id": self._reporter(row["reporter_id"]),
+            "location": f"SRID=4326;POINT({lon} {lat})",
+            "labels": json.dumps(row["labels"]),
+            "colors": json.dumps(row["colors"]),
+            "embedding": to_pgvector_text(row["embedding"]) if row["embedding"] is not None else None,
+        }
+        return tuple(values[column] for column in self.REPORT_COLUMNS)
+
+    def _copy(self, cur, table: str, columns: Sequence[str], rows: Iterable[Tuple[Any, ...]]) -> None:
+        with cur.copy(f"COPY public.{table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+
+    def write(self, data: Dict[str, List[Dict[str, Any]]]) -> None:
+        with self.conn.cursor() as cur:
+            self._copy(cur, "reports", self.REPORT_COLUMNS, (self._report_row(r) for r in data["reports"]))
+            self._copy(cur, "matches", self.MATCH_COLUMNS,
+                       (tuple(m[c] for c in self.MATCH_COLUMNS) for m in data["matches"]))
+            if data["photo_embeddings"]:
+                self._copy(cur, "report_photo_embeddings", self.PHOTO_COLUMNS, (
+                    (p["report_id"], p["photo_index"], p["photo_url"], to_pgvector_text(p["embedding"]))
+                    for p in data["photo_embeddings"]
+                ))
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Genera reportes, embeddings, ubicaciones y matches sintéticos")
+    parser.add_argument("--reports", type=int, default=10_000, help="Cantidad de reportes")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla (mismos datos para la misma semilla)")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="Dimensión de los embeddings")
+    parser.add_argument("--spread", type=float, default=0.5, help="Ruido entre fotos de la misma mascota")
+    parser.add_argument("--species-similarity", type=float, default=0.3, help="Parecido entre mascotas de la misma especie")
+    parser.add_argument("--found-ratio", type=float, default=0.6, help="Probabilidad de que una mascota perdida sea encontrada")
+    parser.add_argument("--missing-embedding", type=float, default=0.1, help="Fracción de reportes sin embedding")
+    parser.add_argument("--distractors", type=int, default=3, help="Matches incorrectos por reporte perdido")
+    parser.add_argument("--photo-embeddings", action="store_true", help="Generar también report_photo_embeddings")
+    parser.add_argument("--dsn", default=None, help="Postgres destino (psycopg); sin --dsn solo se generan y cuentan")
+    parser.add_argument("--ground-truth", default=None, help="CSV donde guardar los pares lost/found de la misma mascota")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.dsn and args.dim != EMBEDDING_DIM:
+        raise SystemExit(f"reports.embedding es vector({EMBEDDING_DIM}); --dim no puede cambiar al escribir en Postgres")
+    options = {
+        "dim": args.dim, "spread": args.spread, "species_similarity": args.species_similarity, "found_ratio": args.found_ratio,
+        "missing_embedding": args.missing_embedding, "distractors": args.distractors,
+        "photo_embeddings": args.photo_embeddings,
+    }
+    writer = PostgresWriter(args.dsn) if args.dsn else None
+    truth_file = open(args.ground_truth, "w", newline="") if args.ground_truth else None
+    truth_csv = csv.writer(truth_file) if truth_file else None
+    if truth_csv:
+        truth_csv.writerow(["lost_report_id", "found_report_id", "species"])
+
+    print(f"🌱 Generando {args.reports} reportes (seed={args.seed}, dim={args.dim})"
+          f"{' -> Postgres' if writer else ''}")
+    totals = {"reports": 0, "embedded": 0, "matches": 0, "ground_truth": 0, "photo_embeddings": 0}
+    start = time.perf_counter()
+    try:
+        for data in generate_blocks(args.reports, args.seed, **options):
+            if writer:
+                writer.write(data)
+            if truth_csv:
+                truth_csv.writerows((g["lost_report_id"], g["found_report_id"], g["species"]) for g in data["ground_truth"])
+            totals["reports"] += len(data["reports"])
+            totals["embedded"] += sum(1 for r in data["reports"] if r["embedding"] is not None)
+            totals["matches"] += len(data["matches"])
+            totals["ground_truth"] += len(data["ground_truth"])
+            totals["photo_embeddings"] += len(data["photo_embeddings"])
+            elapsed = time.perf_counter() - start
+            print(f"   {totals['reports']}/{args.reports} reportes ({totals['reports'] / elapsed:.0f}/s)")
+    finally:
+        if writer:
+            writer.close()
+        if truth_file:
+            truth_file.close()
+
+    print(f"✅ {json.dumps(totals)} en {time.perf_counter() - start:.1f}s")
+    if args.ground_truth:
+        print(f"📝 Pares de referencia guardados en {args.ground_truth}")
+
+
+if __name__ == "__main__":
+    main()
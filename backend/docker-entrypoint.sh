@@ -0,0 +1,46 @@
+#!/bin/bash
+
+# Arranque del contenedor del backend de PetAlert
+#
+# - Con GENERATE_EMBEDDINGS_LOCALLY=true e INFERENCE_SERVER_SOCKET definido se
+#   levanta el servidor de inferencia compartido (services/inference_server.py)
+#   junto a la API; si no, solo la API y los workers no esperan ningún socket.
+# - Si cualquiera de los dos procesos termina, se detiene el otro y el
+#   contenedor sale con ese código: la política de reinicio
+#   (restart: unless-stopped en docker-compose.yml) lo vuelve a levantar.
+
+case "$(echo "${GENERATE_EMBEDDINGS_LOCALLY:-false}" | tr '[:upper:]' '[:lower:]')" in
+    1|true|yes) LOCAL_INFERENCE=1 ;;
+    *) LOCAL_INFERENCE=0 ;;
+esac
+
+# Métricas de una corrida anterior del contenedor (pids que ya no existen)
+if [ -n "${METRICS_MULTIPROC_DIR:-}" ]; then
+    mkdir -p "$METRICS_MULTIPROC_DIR"
+    rm -f "$METRICS_MULTIPROC_DIR"/*.json "$METRICS_MULTIPROC_DIR"/*.json.tmp
+fi
+
+PIDS=()
+
+if [ "$LOCAL_INFERENCE" = 1 ] && [ -n "${INFERENCE_SERVER_SOCKET:-}" ]; then
+    echo "🔄 [entrypoint] Iniciando servidor de inferencia en $INFERENCE_SERVER_SOCKET"
+    python -m services.inference_server --socket "$INFERENCE_SERVER_SOCKET" &
+    PIDS+=($!)
+else
+    echo "ℹ️ [entrypoint] Sin inferencia local: no se inicia el servidor de inferencia"
+    unset INFERENCE_SERVER_SOCKET
+fi
+
+uvicorn main:app --host 0.0.0.0 --port 8003 --workers 2 &
+PIDS+=($!)
+
+trap 'kill -TERM "${PIDS[@]}" 2>/dev/null' TERM INT
+
+# Espera al primero que termine (por error o por la señal de docker stop)
+wait -n "${PIDS[@]}"
+STATUS=$?
+
+echo "🛑 [entrypoint] Un proceso terminó (código $STATUS); deteniendo el contenedor"
+kill -TERM "${PIDS[@]}" 2>/dev/null
+wait
+exit $STATUS
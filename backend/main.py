@@ -1,3 +1,6 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 from pathlib import Path
 from dotenv import load_dotenv
 import os, sys
@@ -14,13 +17,27 @@ else:
 
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from supabase import Client
 import traceback, asyncio
 from typing import List, Dict, Any
 
 # Importar utils
 sys.path.insert(0, str(Path(__file__).parent))
-from utils.supabase_client import get_supabase_client
+from utils.supabase_client import (
+    get_supabase_client,
+    init_supabase_client,
+    close_supabase_client,
+    get_pool_stats,
+)
+from services.jobs import get_job_manager
+from utils.metrics import (
+    MetricsMiddleware,
+    PROMETHEUS_CONTENT_TYPE,
+    STARTUP_IMPORT_SECONDS,
+    render_metrics,
+    start_metrics_sync,
+)
 
 # Importar los routers
 from routers import reports as reports_router
@@ -33,6 +50,11 @@ from routers import direct_matches as direct_matches_router
 from routers import fix_embeddings as fix_embeddings_router
 from routers import pets as pets_router
 
+# Los routers no importan torch/timm: el stack de ML se carga en la primera
+# inferencia o en el startup con EMBEDDING_PRELOAD (ver services/embeddings.py)
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+STARTUP_IMPORT_SECONDS.set(IMPORT_SECONDS, component="app")
+
 # =========================
 # Configuración base
 # =========================
@@ -47,8 +69,9 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     supabase_client = None
 else:
     try:
+        # Cliente compartido del proceso: un único pool HTTP reutilizado por todos los routers
         supabase_client: Client = get_supabase_client()
-        print("✅ Cliente de Supabase creado con configuración optimizada")
+        print("✅ Cliente de Supabase creado con configuración optimizada (pool compartido)")
     except Exception as e:
         print(f"❌ Error creando cliente de Supabase: {e}")
         supabase_client = None
@@ -69,16 +92,37 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Latencia por ruta y round trips a Supabase por petición (ver /metrics)
+app.add_middleware(MetricsMiddleware)
 
 # =========================
 # Startup: Pre-cargar MegaDescriptor
 # =========================
 @app.on_event("startup")
 async def startup_event():
-    """Pre-carga el modelo MegaDescriptor al iniciar el servidor"""
+    """Inicializa el cliente de Supabase compartido y pre-carga el modelo MegaDescriptor"""
+    # Con METRICS_MULTIPROC_DIR cada worker publica sus métricas para que /metrics las sume
+    start_metrics_sync()
+
+    if SUPABASE_URL and SUPABASE_KEY:
+        try:
+            init_supabase_client()
+        except Exception as e:
+            print(f"⚠️ Error inicializando cliente de Supabase: {e}")
+
     generate_locally = os.getenv("GENERATE_EMBEDDINGS_LOCALLY", "false").lower() in ("1", "true", "yes")
+    preload = os.getenv("EMBEDDING_PRELOAD", "true").lower() in ("1", "true", "yes")
+    print(
+        f"⏱️ [startup] App importada en {IMPORT_SECONDS * 1000:.0f} ms "
+        f"(torch {'cargado' if 'torch' in sys.modules else 'sin cargar'})"
+    )
     
-    if generate_locally:
+    if generate_locally and os.getenv("INFERENCE_SERVER_SOCKET"):
+        # El modelo vive en el servidor de inferencia compartido (services/inference_server.py)
+        print(f"ℹ️ Inferencia delegada al servidor en {os.getenv('INFERENCE_SERVER_SOCKET')}; no se carga el modelo en este worker")
+    elif generate_locally and not preload:
+        print("ℹ️ Pre-carga desactivada (EMBEDDING_PRELOAD=false): torch y el modelo se cargan en la primera inferencia")
+    elif generate_locally:
         print("🔄 Pre-cargando modelo MegaDescriptor...")
         try:
             from services.embeddings import _load_model
@@ -90,6 +134,15 @@ async def startup_event():
     else:
         print("ℹ️ Generación local de embeddings desactivada (GENERATE_EMBEDDINGS_LOCALLY=false)")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Cancela trabajos en curso, detiene el recolector de lotes de inferencia y cierra el pool HTTP de Supabase"""
+    await get_job_manager().shutdown()
+    embeddings_module = sys.modules.get("services.embeddings")
+    if embeddings_module is not None:
+        await embeddings_module.shutdown_batcher()
+    close_supabase_client()
+
 # Incluir los routers
 app.include_router(reports_router.router)
 app.include_router(reports_labels_router.router)
@@ -134,6 +187,14 @@ async def health():
         "supabase": supabase_status
     }
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Métricas en formato Prometheus (latencias, etapas de embeddings, round trips):
+    de todos los procesos del host con METRICS_MULTIPROC_DIR, si no solo de este worker.
+    """
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/version")
 async def version():
     """Endpoint para obtener información de la versión."""
@@ -159,6 +220,19 @@ async def supabase_status():
     except Exception as e:
         return {"status": "error", "message": f"Error conectando con Supabase: {e}"}
 
+@app.get("/supabase/pool")
+async def supabase_pool():
+    """Estadísticas del pool HTTP compartido hacia Supabase (conexiones y round trips)."""
+    return get_pool_stats()
+
+@app.get("/embeddings/cache")
+async def embeddings_cache():
+    """Estadísticas de la caché de embeddings por hash de imagen."""
+    embeddings_module = sys.modules.get("services.embeddings")
+    if embeddings_module is None:
+        return {"loaded": False}
+    return {"loaded": True, **embeddings_module.get_cache_stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8003)
\ No newline at end of file
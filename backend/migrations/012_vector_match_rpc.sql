@@ -0,0 +1,163 @@
+-- ==============================================
+-- MIGRACIÓN: Top-k de matches dentro de pgvector (índice HNSW)
+-- ==============================================
+-- Hasta ahora direct_matches, reports.find_and_save_matches y
+-- embeddings/search_image descargaban TODOS los embeddings candidatos
+-- (1536 floats como texto JSON cada uno) y calculaban la similitud en Python.
+--
+-- Estas funciones ejecutan la búsqueda en la base usando el índice
+-- idx_reports_embedding_hnsw (vector_cosine_ops, migración 005) y devuelven
+-- solo (id, similarity_score) de los top-k.
+--
+-- NOTA: el índice usa vector_cosine_ops, por lo que el ORDER BY debe usar el
+-- operador de distancia coseno (<=>) para que el planner lo utilice.
+-- search_similar_reports (migración 005) ordena por <#> y no usa el índice.
+
+-- ----------------------------------------------
+-- 1. Búsqueda por vector de consulta
+-- ----------------------------------------------
+-- filter_ids restringe la búsqueda a un subconjunto ya conocido (p.ej. los
+-- reportes dentro de un radio, migración 015). El HNSW no sabe de ese filtro y
+-- podría devolver vecinos que luego se descartan, así que el subconjunto se
+-- puntúa de forma exacta (el ORDER BY no coincide con el índice a propósito).
+--
+-- Versiones anteriores de esta migración no tenían filter_ids: se elimina la
+-- firma vieja para que PostgREST no vea dos sobrecargas ambiguas.
+DROP FUNCTION IF EXISTS match_reports_by_embedding(vector, text, text, text, float, int, uuid, int);
+
+CREATE OR REPLACE FUNCTION match_reports_by_embedding(
+    query_embedding vector(1536),
+    target_type text DEFAULT NULL,
+    filter_species text DEFAULT NULL,
+    filter_status text DEFAULT 'active',
+    match_threshold float DEFAULT 0.0,
+    match_count int DEFAULT 10,
+    exclude_report_id uuid DEFAULT NULL,
+    ef_search int DEFAULT 40,
+    filter_ids uuid[] DEFAULT NULL
+)
+RETURNS TABLE (
+    id uuid,
+    similarity_score float
+) AS $$
+BEGIN
+    IF filter_ids IS NOT NULL THEN
+        RETURN QUERY
+        SELECT c.id, c.similarity_score
+        FROM (
+            SELECT
+                r.id,
+                (1 - (r.embedding <=> query_embedding))::float AS similarity_score
+            FROM public.reports r
+            WHERE
+                r.id = ANY(filter_ids)
+                AND r.embedding IS NOT NULL
+                AND (filter_status IS NULL OR r.status = filter_status)
+                AND (target_type IS NULL OR r.type = target_type)
+                AND (filter_species IS NULL OR r.species = filter_species)
+                AND (exclude_report_id IS NULL OR r.id <> exclude_report_id)
+        ) c
+        WHERE c.similarity_score >= match_threshold
+        ORDER BY c.similarity_score DESC
+        LIMIT match_count;
+        RETURN;
+    END IF;
+
+    -- ef_search controla recall/latencia del recorrido HNSW (solo para esta transacción)
+    PERFORM set_config('hnsw.ef_search', GREATEST(ef_search, match_count)::text, true);
+    -- pgvector >= 0.8: seguir recorriendo el grafo si los filtros descartan candidatos.
+    -- En versiones anteriores el parámetro no existe y set_config falla: se ignora.
+    BEGIN
+        PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+    EXCEPTION WHEN others THEN
+        NULL;
+    END;
+
+    RETURN QUERY
+    SELECT c.id, c.similarity_score
+    FROM (
+        SELECT
+            r.id,
+            (1 - (r.embedding <=> query_embedding))::float AS similarity_score
+        FROM public.reports r
+        WHERE
+            r.embedding IS NOT NULL
+            AND (filter_status IS NULL OR r.status = filter_status)
+            AND (target_type IS NULL OR r.type = target_type)
+            AND (filter_species IS NULL OR r.species = filter_species)
+            AND (exclude_report_id IS NULL OR r.id <> exclude_report_id)
+        ORDER BY r.embedding <=> query_embedding
+        LIMIT match_count
+    ) c
+    WHERE c.similarity_score >= match_threshold
+    ORDER BY c.similarity_score DESC;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION match_reports_by_embedding IS
+'Top-k de reportes por similitud coseno usando el índice HNSW. Devuelve solo id y similarity_score.';
+
+-- ----------------------------------------------
+-- 2. Búsqueda a partir del embedding guardado de un reporte
+-- ----------------------------------------------
+-- Busca en el tipo opuesto (lost <-> found) sin que el vector viaje por la red.
+CREATE OR REPLACE FUNCTION match_reports_for_report(
+    p_report_id uuid,
+    match_threshold float DEFAULT 0.1,
+    match_count int DEFAULT 10,
+    filter_species text DEFAULT NULL,
+    ef_search int DEFAULT 40
+)
+RETURNS TABLE (
+    id uuid,
+    similarity_score float
+) AS $$
+DECLARE
+    v_embedding vector(1536);
+    v_type text;
+BEGIN
+    SELECT r.embedding, r.type
+    INTO v_embedding, v_type
+    FROM public.reports r
+    WHERE r.id = p_report_id;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'REPORT_NOT_FOUND: %', p_report_id;
+    END IF;
+
+    IF v_embedding IS NULL THEN
+        RAISE EXCEPTION 'REPORT_WITHOUT_EMBEDDING: %', p_report_id;
+    END IF;
+
+    RETURN QUERY
+    SELECT m.id, m.similarity_score
+    FROM match_reports_by_embedding(
+        v_embedding,
+        CASE WHEN v_type = 'lost' THEN 'found' ELSE 'lost' END,
+        filter_species,
+        'active',
+        match_threshold,
+        match_count,
+        p_report_id,
+        ef_search
+    ) m;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION match_reports_for_report IS
+'Top-k de reportes del tipo opuesto similares al embedding guardado de p_report_id.';
+
+GRANT EXECUTE ON FUNCTION match_reports_by_embedding TO service_role;
+GRANT EXECUTE ON FUNCTION match_reports_for_report TO service_role;
+
+-- ==============================================
+-- NOTAS:
+-- ==============================================
+-- 1. ef_search más alto = mejor recall y más latencia (default de pgvector: 40).
+--    El backend lo configura con MATCH_EF_SEARCH.
+-- 2. Con filter_ids la búsqueda es exacta sobre ese subconjunto (no usa HNSW);
+--    pensado para pocos cientos/miles de ids, como los de un radio.
+-- 3. hnsw.iterative_scan requiere pgvector 0.8+; en versiones anteriores el
+--    set_config lanza un error, que match_reports_by_embedding atrapa y descarta
+--    (la búsqueda sigue sin iterative scan y puede devolver menos de match_count
+--    filas cuando los filtros descartan muchos candidatos).
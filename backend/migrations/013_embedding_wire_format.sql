@@ -0,0 +1,32 @@
+-- ==============================================
+-- MIGRACIÓN: Formato compacto de embeddings para PostgREST
+-- ==============================================
+-- Leer `embedding` por PostgREST devuelve el vector como texto JSON
+-- ('[0.0123456,...]', ~20 bytes por dimensión) que el backend tiene que
+-- parsear a floats de Python. Esta columna calculada devuelve el formato
+-- binario de pgvector (vector_send) en base64: 4 bytes de cabecera
+-- (dim int16 + reservado int16) y dim float32 big-endian, ~5.3 bytes por
+-- dimensión, que el backend decodifica con numpy.frombuffer
+-- (utils/vector_codec.py).
+--
+-- Uso desde PostgREST (columna calculada):
+--   .select("id, type, species, embedding:embedding_b64")
+
+CREATE OR REPLACE FUNCTION embedding_b64(r public.reports)
+RETURNS text AS $$
+    SELECT translate(encode(vector_send(r.embedding), 'base64'), E'\n', '');
+$$ LANGUAGE sql IMMUTABLE STRICT;
+
+COMMENT ON FUNCTION embedding_b64(public.reports) IS
+'Embedding del reporte en el formato binario de pgvector codificado en base64 (columna calculada para PostgREST).';
+
+GRANT EXECUTE ON FUNCTION embedding_b64(public.reports) TO service_role;
+
+-- ==============================================
+-- NOTAS:
+-- ==============================================
+-- 1. Las escrituras siguen usando el literal de texto de pgvector
+--    ('[x1,x2,...]', 9 dígitos significativos) porque vector_recv no se puede
+--    invocar desde SQL; ver utils/vector_codec.to_pgvector_text.
+-- 2. encode(..., 'base64') inserta saltos de línea cada 76 caracteres; se
+--    quitan para que el valor sea una sola cadena.
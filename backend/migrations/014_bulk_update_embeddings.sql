@@ -0,0 +1,31 @@
+-- ==============================================
+-- MIGRACIÓN: Escritura de embeddings en lote
+-- ==============================================
+-- update_report_embedding (migración 006) escribe un reporte por llamada.
+-- El pipeline de backfill (services/backfill.py) acumula decenas de vectores
+-- y los escribe con un único round trip usando esta función.
+--
+-- Formato esperado del payload:
+--   [{"id": "<uuid>", "embedding": "[0.0123,...]"}, ...]
+-- (embedding en el literal de texto de pgvector, ver utils/vector_codec.py)
+
+CREATE OR REPLACE FUNCTION bulk_update_report_embeddings(
+    payload jsonb
+) RETURNS integer AS $$
+DECLARE
+    updated_count integer;
+BEGIN
+    UPDATE public.reports r
+    SET embedding = (item->>'embedding')::vector(1536)
+    FROM jsonb_array_elements(payload) AS item
+    WHERE r.id = (item->>'id')::uuid;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public, pg_temp;
+
+COMMENT ON FUNCTION bulk_update_report_embeddings IS
+'Actualiza los embeddings de varios reportes en una sola llamada. Devuelve la cantidad de filas actualizadas.';
+
+GRANT EXECUTE ON FUNCTION bulk_update_report_embeddings TO service_role;
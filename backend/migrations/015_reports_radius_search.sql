@@ -0,0 +1,68 @@
+-- ==============================================
+-- MIGRACIÓN: Búsqueda de reportes por radio con PostGIS
+-- ==============================================
+-- /reports/nearby, /ai-search/ y /matches/auto-match descargaban todos los
+-- reportes activos y filtraban por distancia en Python, y
+-- embeddings/search_image usaba una expresión con acos() que no puede usar
+-- ningún índice. idx_reports_location (migración 003) está definido sobre
+-- latitude/longitude, no sobre la columna geography `location`.
+--
+-- Esta migración indexa `reports.location` con GIST (igual que
+-- user_locations en la migración 011) y expone una única función de búsqueda
+-- por radio + filtros que usan todos esos endpoints (services/geo_search.py).
+
+-- ----------------------------------------------
+-- 1. Índices GIST sobre reports.location
+-- ----------------------------------------------
+CREATE INDEX IF NOT EXISTS idx_reports_location_geog
+ON public.reports USING GIST (location);
+
+-- La gran mayoría de las búsquedas son sobre reportes activos
+CREATE INDEX IF NOT EXISTS idx_reports_location_active
+ON public.reports USING GIST (location)
+WHERE status = 'active';
+
+-- ----------------------------------------------
+-- 2. Reportes dentro de un radio
+-- ----------------------------------------------
+CREATE OR REPLACE FUNCTION search_reports_within_radius(
+    p_lat float,
+    p_lng float,
+    radius_km float,
+    filter_type text DEFAULT NULL,
+    filter_species text DEFAULT NULL,
+    filter_status text DEFAULT 'active',
+    exclude_report_id uuid DEFAULT NULL,
+    max_results int DEFAULT NULL
+)
+RETURNS TABLE (
+    id uuid,
+    distance_km float
+) AS $$
+DECLARE
+    v_origin geography := ST_SetSRID(ST_MakePoint(p_lng, p_lat), 4326)::geography;
+BEGIN
+    RETURN QUERY
+    SELECT
+        r.id,
+        -- Filtro, distancia y orden usan la esfera (use_spheroid = false), igual que
+        -- el operador <-> y el haversine de services/geo_index.py: un reporte
+        -- dentro del radio nunca informa una distancia mayor a radius_km
+        (ST_Distance(r.location, v_origin, false) / 1000.0)::float AS distance_km
+    FROM public.reports r
+    WHERE
+        r.location IS NOT NULL
+        AND ST_DWithin(r.location, v_origin, radius_km * 1000.0, false)
+        AND (filter_status IS NULL OR r.status = filter_status)
+        AND (filter_type IS NULL OR r.type = filter_type)
+        AND (filter_species IS NULL OR r.species = filter_species)
+        AND (exclude_report_id IS NULL OR r.id <> exclude_report_id)
+    ORDER BY r.location <-> v_origin
+    LIMIT max_results;  -- NULL = sin límite
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION search_reports_within_radius IS
+'Reportes dentro de radius_km de (p_lat, p_lng) usando el índice GIST de location, ordenados por distancia. Devuelve solo id y distance_km.';
+
+GRANT EXECUTE ON FUNCTION search_reports_within_radius TO service_role;
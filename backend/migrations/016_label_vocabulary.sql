@@ -0,0 +1,138 @@
+-- ==============================================
+-- MIGRACIÓN: Vocabulario de etiquetas y colores
+-- ==============================================
+-- /ai-search/ y /matches/auto-match comparaban etiquetas reconstruyendo en
+-- Python, para cada candidato y en cada búsqueda, un set de strings en
+-- minúsculas a partir del JSON de `labels` (y lo mismo con `colors`).
+--
+-- Esta migración interna cada término a un id entero (label_vocabulary) y
+-- guarda en cada reporte los ids ordenados de sus etiquetas y colores
+-- (label_ids / color_ids). Un trigger los recalcula cuando cambian labels o
+-- colors, sea desde POST /reports/{id}/labels o desde cualquier otro
+-- escritor, de modo que las búsquedas comparan arreglos de enteros
+-- (services/label_vocab.py) sin volver a parsear el JSON.
+--
+-- Normalización (igual que label_set/color_set en Python):
+--   labels: {"labels": [{"label": "...", "description": "..."}]} -> lower(label o description)
+--   colors: ["#AABBCC", ...] -> lower(color)
+
+-- ----------------------------------------------
+-- 1. Vocabulario y columnas de ids
+-- ----------------------------------------------
+CREATE TABLE IF NOT EXISTS public.label_vocabulary (
+    id serial PRIMARY KEY,
+    term text NOT NULL UNIQUE,
+    created_at timestamptz DEFAULT now()
+);
+
+COMMENT ON TABLE public.label_vocabulary IS
+'Términos (etiquetas y colores normalizados) internados a ids enteros';
+
+ALTER TABLE public.reports ADD COLUMN IF NOT EXISTS label_ids integer[];
+ALTER TABLE public.reports ADD COLUMN IF NOT EXISTS color_ids integer[];
+
+-- ----------------------------------------------
+-- 2. Normalización de términos
+-- ----------------------------------------------
+CREATE OR REPLACE FUNCTION label_terms(p_labels jsonb)
+RETURNS text[] AS $$
+    SELECT COALESCE(array_agg(DISTINCT lower(COALESCE(
+               NULLIF(item->>'label', ''),
+               NULLIF(item->>'description', ''),
+               ''
+           ))), ARRAY[]::text[])
+    FROM jsonb_array_elements(
+        CASE WHEN jsonb_typeof(p_labels->'labels') = 'array' THEN p_labels->'labels' ELSE '[]'::jsonb END
+    ) AS item
+    WHERE jsonb_typeof(item) = 'object' AND item <> '{}'::jsonb;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION color_terms(p_colors jsonb)
+RETURNS text[] AS $$
+    SELECT COALESCE(array_agg(DISTINCT lower(c)), ARRAY[]::text[])
+    FROM jsonb_array_elements_text(
+        CASE WHEN jsonb_typeof(p_colors) = 'array' THEN p_colors ELSE '[]'::jsonb END
+    ) AS c
+    WHERE c <> '';
+$$ LANGUAGE sql IMMUTABLE;
+
+-- ----------------------------------------------
+-- 3. Internar términos
+-- ----------------------------------------------
+-- Devuelve los ids ordenados de los términos, creando los que no existan.
+CREATE OR REPLACE FUNCTION intern_terms(p_terms text[])
+RETURNS integer[] AS $$
+DECLARE
+    v_ids integer[];
+BEGIN
+    IF p_terms IS NULL OR cardinality(p_terms) = 0 THEN
+        RETURN ARRAY[]::integer[];
+    END IF;
+
+    INSERT INTO public.label_vocabulary (term)
+    SELECT DISTINCT t FROM unnest(p_terms) AS t WHERE t IS NOT NULL
+    ON CONFLICT (term) DO NOTHING;
+
+    SELECT COALESCE(array_agg(v.id ORDER BY v.id), ARRAY[]::integer[])
+    INTO v_ids
+    FROM public.label_vocabulary v
+    WHERE v.term = ANY(p_terms);
+
+    RETURN v_ids;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public, pg_temp;
+
+COMMENT ON FUNCTION intern_terms IS
+'Interna términos en label_vocabulary y devuelve sus ids ordenados.';
+
+-- ----------------------------------------------
+-- 4. Trigger: mantener label_ids / color_ids al día
+-- ----------------------------------------------
+-- Lee NEW.labels / NEW.colors directamente (sin to_jsonb(NEW), que serializaría
+-- también el embedding de 1536 dimensiones en cada escritura) y solo se dispara
+-- cuando cambian labels/colors o faltan los ids: escribir el embedding no lo toca.
+ALTER TABLE public.reports ADD COLUMN IF NOT EXISTS labels jsonb;
+ALTER TABLE public.reports ADD COLUMN IF NOT EXISTS colors jsonb;
+
+CREATE OR REPLACE FUNCTION trigger_reports_intern_terms()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.label_ids IS NULL
+       OR NEW.labels::jsonb IS DISTINCT FROM OLD.labels::jsonb THEN
+        NEW.label_ids := intern_terms(label_terms(NEW.labels::jsonb));
+    END IF;
+    IF TG_OP = 'INSERT' OR NEW.color_ids IS NULL
+       OR NEW.colors::jsonb IS DISTINCT FROM OLD.colors::jsonb THEN
+        NEW.color_ids := intern_terms(color_terms(NEW.colors::jsonb));
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_reports_intern_terms ON public.reports;
+DROP TRIGGER IF EXISTS trigger_reports_intern_terms_update ON public.reports;
+
+CREATE TRIGGER trigger_reports_intern_terms
+    BEFORE INSERT ON public.reports
+    FOR EACH ROW
+    EXECUTE FUNCTION trigger_reports_intern_terms();
+
+CREATE TRIGGER trigger_reports_intern_terms_update
+    BEFORE UPDATE OF labels, colors, label_ids, color_ids ON public.reports
+    FOR EACH ROW
+    WHEN (
+        NEW.labels::jsonb IS DISTINCT FROM OLD.labels::jsonb
+        OR NEW.colors::jsonb IS DISTINCT FROM OLD.colors::jsonb
+        OR NEW.label_ids IS NULL
+        OR NEW.color_ids IS NULL
+    )
+    EXECUTE FUNCTION trigger_reports_intern_terms();
+
+-- ----------------------------------------------
+-- 5. Backfill de reportes existentes
+-- ----------------------------------------------
+-- El trigger completa label_ids / color_ids porque están en NULL
+UPDATE public.reports SET label_ids = NULL WHERE label_ids IS NULL OR color_ids IS NULL;
+
+GRANT SELECT ON public.label_vocabulary TO service_role;
+GRANT EXECUTE ON FUNCTION intern_terms TO service_role;
@@ -0,0 +1,86 @@
+-- ==============================================
+-- MIGRACIÓN: Guardado de matches en lote (upsert por par lost/found)
+-- ==============================================
+-- direct_matches._save_matches_to_db y reports.find_and_save_matches hacían
+-- un SELECT y luego un UPDATE o INSERT por cada match: hasta 2k round trips
+-- secuenciales por corrida. Con una restricción única sobre
+-- (lost_report_id, found_report_id), upsert_matches guarda toda la corrida en
+-- una sola llamada (services/match_store.py).
+
+-- ----------------------------------------------
+-- 1. Eliminar pares duplicados antes de crear la restricción
+-- ----------------------------------------------
+-- Se conserva el match ya revisado (accepted/rejected) y, entre iguales,
+-- el de mayor similitud y el más antiguo.
+DELETE FROM public.matches m
+USING (
+    SELECT
+        id,
+        row_number() OVER (
+            PARTITION BY lost_report_id, found_report_id
+            ORDER BY (status <> 'pending') DESC,
+                     similarity_score DESC NULLS LAST,
+                     created_at ASC,
+                     id
+        ) AS rn
+    FROM public.matches
+) d
+WHERE m.id = d.id AND d.rn > 1;
+
+-- ----------------------------------------------
+-- 2. Restricción única (lost_report_id, found_report_id)
+-- ----------------------------------------------
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'matches_lost_found_key'
+    ) THEN
+        ALTER TABLE public.matches
+            ADD CONSTRAINT matches_lost_found_key UNIQUE (lost_report_id, found_report_id);
+    END IF;
+END;
+$$;
+
+-- ----------------------------------------------
+-- 3. Upsert en lote
+-- ----------------------------------------------
+-- Formato esperado del payload:
+--   [{"lost_report_id": "<uuid>", "found_report_id": "<uuid>",
+--     "similarity_score": 0.87, "matched_by": "ai_visual"}, ...]
+-- Un par existente solo se actualiza si la nueva similitud es mayor, igual que
+-- el SELECT + UPDATE anterior. El status no se toca: un match ya aceptado o
+-- rechazado no se reabre porque una búsqueda posterior puntúe mejor.
+CREATE OR REPLACE FUNCTION upsert_matches(
+    payload jsonb
+) RETURNS integer AS $$
+DECLARE
+    affected integer;
+BEGIN
+    INSERT INTO public.matches (lost_report_id, found_report_id, similarity_score, matched_by, status)
+    SELECT DISTINCT ON (lost_report_id, found_report_id)
+        lost_report_id, found_report_id, similarity_score, matched_by, 'pending'
+    FROM (
+        SELECT
+            (item->>'lost_report_id')::uuid AS lost_report_id,
+            (item->>'found_report_id')::uuid AS found_report_id,
+            (item->>'similarity_score')::float AS similarity_score,
+            COALESCE(item->>'matched_by', 'ai_visual') AS matched_by
+        FROM jsonb_array_elements(payload) AS item
+    ) p
+    -- Un mismo par no puede actualizarse dos veces en la misma sentencia
+    ORDER BY lost_report_id, found_report_id, similarity_score DESC
+    ON CONFLICT (lost_report_id, found_report_id) DO UPDATE
+    SET similarity_score = EXCLUDED.similarity_score,
+        matched_by = EXCLUDED.matched_by
+    WHERE matches.similarity_score IS NULL
+       OR EXCLUDED.similarity_score > matches.similarity_score;
+
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public, pg_temp;
+
+COMMENT ON FUNCTION upsert_matches IS
+'Inserta o mejora varios matches en una sola llamada, conservando la mayor similitud por par. Devuelve la cantidad de filas insertadas o actualizadas.';
+
+GRANT EXECUTE ON FUNCTION upsert_matches TO service_role;
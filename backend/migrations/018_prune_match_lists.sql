@@ -0,0 +1,64 @@
+-- ==============================================
+-- MIGRACIÓN: Listas top-k de matches por reporte
+-- ==============================================
+-- El matcher incremental (services/incremental_matcher.py) compara el vector
+-- recién escrito de un reporte contra sus candidatos y guarda los pares con
+-- upsert_matches (migración 017). Después recorta las listas de los reportes
+-- involucrados para que cada uno conserve a lo sumo `keep` matches
+-- pendientes generados por IA.
+--
+-- Un par (lost, found) es una sola fila compartida por las dos listas: solo se
+-- borra si queda fuera del top-k de AMBOS reportes. Los matches ya revisados
+-- (accepted/rejected) o creados por otros medios nunca se recortan.
+
+CREATE INDEX IF NOT EXISTS idx_matches_lost_pending
+ON public.matches (lost_report_id, similarity_score DESC)
+WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_matches_found_pending
+ON public.matches (found_report_id, similarity_score DESC)
+WHERE status = 'pending';
+
+CREATE OR REPLACE FUNCTION prune_match_lists(
+    report_ids uuid[],
+    keep int DEFAULT 10
+) RETURNS integer AS $$
+DECLARE
+    deleted_count integer;
+BEGIN
+    WITH affected AS (
+        SELECT m.id, m.lost_report_id, m.found_report_id, m.similarity_score
+        FROM public.matches m
+        WHERE m.status = 'pending'
+          AND m.matched_by = 'ai_visual'
+          AND (m.lost_report_id = ANY(report_ids) OR m.found_report_id = ANY(report_ids))
+    ),
+    ranked AS (
+        SELECT
+            a.id,
+            row_number() OVER (
+                PARTITION BY a.lost_report_id ORDER BY a.similarity_score DESC NULLS LAST, a.id
+            ) AS lost_rank,
+            row_number() OVER (
+                PARTITION BY a.found_report_id ORDER BY a.similarity_score DESC NULLS LAST, a.id
+            ) AS found_rank
+        FROM affected a
+    )
+    DELETE FROM public.matches m
+    USING ranked r
+    WHERE m.id = r.id
+      -- Para un reporte que no está en report_ids, `affected` tiene solo parte
+      -- de su lista: su posición ahí nunca supera a la real, así que si ya
+      -- queda fuera del top-k también lo está en la lista completa
+      AND r.lost_rank > keep
+      AND r.found_rank > keep;
+
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+    RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public, pg_temp;
+
+COMMENT ON FUNCTION prune_match_lists IS
+'Recorta a `keep` los matches pendientes de IA de cada reporte dado; un par solo se borra si queda fuera del top-k de ambos lados. Devuelve la cantidad de filas borradas.';
+
+GRANT EXECUTE ON FUNCTION prune_match_lists TO service_role;
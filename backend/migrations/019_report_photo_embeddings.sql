@@ -0,0 +1,120 @@
+-- ==============================================
+-- MIGRACIÓN: Embeddings por foto y vector agregado por reporte
+-- ==============================================
+-- Hasta ahora solo se embebía photos[0]. Ahora todas las fotos de un reporte
+-- pasan por el modelo en el mismo lote y cada vector se guarda en
+-- report_photo_embeddings. reports.embedding pasa a ser el agregado
+-- (media de los vectores por foto, renormalizada) y sigue siendo el que usa
+-- el índice HNSW; la similitud máxima entre fotos se calcula al consultar
+-- sobre un conjunto acotado de candidatos (services/photo_embeddings.py).
+
+-- ----------------------------------------------
+-- 1. Tabla de vectores por foto
+-- ----------------------------------------------
+CREATE TABLE IF NOT EXISTS public.report_photo_embeddings (
+    report_id uuid NOT NULL REFERENCES public.reports(id) ON DELETE CASCADE,
+    photo_index int NOT NULL,
+    photo_url text,
+    embedding vector(1536) NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (report_id, photo_index)
+);
+
+ALTER TABLE public.report_photo_embeddings ENABLE ROW LEVEL SECURITY;
+
+-- ----------------------------------------------
+-- 2. Escritura en lote (vectores por foto + agregado)
+-- ----------------------------------------------
+-- Formato esperado del payload:
+--   [{"id": "<uuid>", "embedding": "[...]",
+--     "photos": [{"photo_index": 0, "photo_url": "https://...", "embedding": "[...]"}, ...]}, ...]
+-- (embeddings en el literal de texto de pgvector, ver utils/vector_codec.py)
+-- Las fotos anteriores de cada reporte se reemplazan por completo.
+CREATE OR REPLACE FUNCTION save_report_photo_embeddings(
+    payload jsonb
+) RETURNS integer AS $$
+DECLARE
+    updated_count integer;
+BEGIN
+    DELETE FROM public.report_photo_embeddings e
+    USING jsonb_array_elements(payload) AS item
+    WHERE e.report_id = (item->>'id')::uuid;
+
+    INSERT INTO public.report_photo_embeddings (report_id, photo_index, photo_url, embedding)
+    SELECT
+        (item->>'id')::uuid,
+        (photo->>'photo_index')::int,
+        photo->>'photo_url',
+        (photo->>'embedding')::vector(1536)
+    FROM jsonb_array_elements(payload) AS item,
+         jsonb_array_elements(COALESCE(item->'photos', '[]'::jsonb)) AS photo;
+
+    UPDATE public.reports r
+    SET embedding = (item->>'embedding')::vector(1536)
+    FROM jsonb_array_elements(payload) AS item
+    WHERE r.id = (item->>'id')::uuid;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public, pg_temp;
+
+COMMENT ON FUNCTION save_report_photo_embeddings IS
+'Reemplaza los vectores por foto de varios reportes y guarda su vector agregado en reports.embedding. Devuelve la cantidad de reportes actualizados.';
+
+-- ----------------------------------------------
+-- 3. Similitud máxima entre fotos
+-- ----------------------------------------------
+-- Para cada candidato devuelve la mayor similitud coseno entre cualquiera de
+-- las fotos de consulta y cualquiera de sus fotos. Los reportes sin vectores
+-- por foto (anteriores a esta migración) se comparan con reports.embedding.
+-- Las fotos de consulta son las de p_report_id o, si es NULL, query_embeddings.
+CREATE OR REPLACE FUNCTION max_photo_similarity(
+    candidate_ids uuid[],
+    p_report_id uuid DEFAULT NULL,
+    query_embeddings text[] DEFAULT NULL
+)
+RETURNS TABLE (
+    id uuid,
+    similarity_score float
+) AS $$
+    WITH query_vectors AS (
+        SELECT e.embedding
+        FROM public.report_photo_embeddings e
+        WHERE p_report_id IS NOT NULL AND e.report_id = p_report_id
+        UNION ALL
+        SELECT r.embedding
+        FROM public.reports r
+        WHERE p_report_id IS NOT NULL AND r.id = p_report_id AND r.embedding IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM public.report_photo_embeddings e WHERE e.report_id = p_report_id
+          )
+        UNION ALL
+        SELECT q::vector(1536)
+        FROM unnest(query_embeddings) AS q
+        WHERE p_report_id IS NULL
+    ),
+    candidate_vectors AS (
+        SELECT e.report_id AS id, e.embedding
+        FROM public.report_photo_embeddings e
+        WHERE e.report_id = ANY(candidate_ids)
+        UNION ALL
+        SELECT r.id, r.embedding
+        FROM public.reports r
+        WHERE r.id = ANY(candidate_ids) AND r.embedding IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM public.report_photo_embeddings e WHERE e.report_id = r.id
+          )
+    )
+    SELECT c.id, max(1 - (c.embedding <=> q.embedding))::float AS similarity_score
+    FROM candidate_vectors c
+    CROSS JOIN query_vectors q
+    GROUP BY c.id
+    ORDER BY similarity_score DESC;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION max_photo_similarity IS
+'Mayor similitud coseno entre las fotos de consulta (de p_report_id o query_embeddings) y las fotos de cada candidato.';
+
+GRANT EXECUTE ON FUNCTION save_report_photo_embeddings TO service_role;
+GRANT EXECUTE ON FUNCTION max_photo_similarity TO service_role;
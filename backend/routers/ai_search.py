@@ -1,12 +1,17 @@
 from fastapi import APIRouter, HTTPException, File, UploadFile, Query
 from typing import List, Dict, Any, Optional
-import os, math, traceback, sys
+import os, traceback, sys
+import asyncio
 from pathlib import Path
 from supabase import Client
 
 # Agregar la carpeta parent al path para poder importar utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from utils.supabase_client import get_supabase_client
+from services.geo_index import fetch_reports_by_ids
+from services.geo_search import search_nearby
+from services.ai_scoring import score_candidates, select_top, MAX_RESULTS
+from services.label_vocab import label_set, color_set
 
 router = APIRouter(prefix="/ai-search", tags=["ai-search"])
 
@@ -17,38 +22,6 @@ def _sb() -> Client:
     except Exception as e:
         raise HTTPException(500, f"Error conectando a Supabase: {str(e)}")
 
-def _coords(loc: Optional[dict]) -> Optional[tuple]:
-    """Extrae coordenadas de un objeto de ubicación GeoJSON."""
-    if isinstance(loc, dict) and "coordinates" in loc:
-        lon, lat = loc["coordinates"]
-        return (lat, lon)
-    return None
-
-def haversine_km(lat1, lon1, lat2, lon2):
-    """Calcula distancia entre dos puntos usando fórmula de Haversine."""
-    R = 6371.0
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    return 2 * R * math.asin(math.sqrt(a))
-
-def label_set(labels_json) -> set:
-    """Convierte etiquetas JSON a un conjunto de strings."""
-    if not labels_json:
-        return set()
-    items = labels_json.get("labels") if isinstance(labels_json, dict) else None
-    if not isinstance(items, list):
-        return set()
-    return {(it.get("label") or it.get("description") or "").lower() for it in items if it}
-
-def color_set(colors_json) -> set:
-    """Convierte colores JSON a un conjunto de strings."""
-    if not colors_json:
-        return set()
-    if isinstance(colors_json, list):
-        return set(color.lower() for color in colors_json if color)
-    return set()
-
 def calculate_visual_similarity(analysis_labels, candidate_labels):
     """Calcula similitud visual entre dos conjuntos de etiquetas."""
     if not analysis_labels or not candidate_labels:
@@ -87,41 +60,6 @@ def calculate_color_similarity(analysis_colors, candidate_colors):
     
     return (intersection / union) * 100
 
-def calculate_location_score(distance_km, max_distance_km=50):
-    """Calcula puntuación de ubicación basada en distancia."""
-    if distance_km <= 0:
-        return 100
-    if distance_km >= max_distance_km:
-        return 0
-    
-    # Puntuación decrece linealmente con la distancia
-    return max(0, 100 - (distance_km / max_distance_km) * 100)
-
-def calculate_time_score(created_at):
-    """Calcula puntuación basada en la antigüedad del reporte."""
-    from datetime import datetime, timezone
-    
-    try:
-        if isinstance(created_at, str):
-            report_date = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-        else:
-            report_date = created_at
-        
-        now = datetime.now(timezone.utc)
-        days_old = (now - report_date).days
-        
-        # Reportes más recientes tienen mayor puntuación
-        if days_old <= 1:
-            return 100
-        elif days_old <= 7:
-            return 80
-        elif days_old <= 30:
-            return 60
-        else:
-            return 40
-    except:
-        return 50  # Puntuación neutral si hay error
-
 @router.post("/")
 async def ai_search(
     file: UploadFile = File(...),
@@ -155,7 +93,7 @@ async def ai_search(
         image = vision.Image(content=content)
         
         # Análisis de etiquetas
-        label_resp = vision_client.label_detection(image=image)
+        label_resp = await asyncio.to_thread(vision_client.label_detection, image=image)
         if label_resp.error.message:
             raise HTTPException(502, f"Vision label_detection: {label_resp.error.message}")
         
@@ -168,7 +106,7 @@ async def ai_search(
             })
         
         # Análisis de colores dominantes
-        prop_resp = vision_client.image_properties(image=image)
+        prop_resp = await asyncio.to_thread(vision_client.image_properties, image=image)
         colors = []
         if not prop_resp.error.message:
             try:
@@ -212,91 +150,67 @@ async def ai_search(
         # Buscar candidatos en la base de datos
         sb = _sb()
         
-        # Construir consulta según tipo de búsqueda
-        query = sb.table("reports").select("*").eq("status", "active")
-        
-        if search_type != "both":
-            query = query.eq("type", search_type)
-        
-        # Filtrar por especie si se detectó
-        if detected_species and detected_species != "other":
-            query = query.eq("species", detected_species)
-        
-        candidates = query.execute().data
+        # Candidatos dentro del radio resueltos por la búsqueda geográfica (ya filtrados por tipo y especie)
+        hits = await asyncio.to_thread(
+            search_nearby,
+            sb,
+            user_lat,
+            user_lng,
+            radius_km,
+            report_type=search_type if search_type != "both" else None,
+            species=detected_species if detected_species and detected_species != "other" else None
+        )
+        candidates = await asyncio.to_thread(fetch_reports_by_ids, sb, [report_id for report_id, _ in hits])
         
-        # Filtrar por distancia y calcular puntuaciones
-        results = []
-        for candidate in candidates:
-            candidate_coords = _coords(candidate.get("location"))
-            if not candidate_coords:
-                continue
-            
-            cand_lat, cand_lng = candidate_coords
-            distance_km = haversine_km(user_lat, user_lng, cand_lat, cand_lng)
-            
-            if distance_km > radius_km:
-                continue
-            
-            # Calcular puntuaciones
-            visual_score = calculate_visual_similarity(
-                {"labels": labels}, 
-                candidate.get("labels", {})
-            )
-            
-            color_score = calculate_color_similarity(
-                colors, 
-                candidate.get("colors", [])
-            )
-            
-            location_score = calculate_location_score(distance_km, radius_km)
-            time_score = calculate_time_score(candidate.get("created_at"))
-            
-            # Puntuación total ponderada
-            total_score = (
-                visual_score * 0.4 +      # 40% similitud visual
-                color_score * 0.3 +       # 30% similitud de colores
-                location_score * 0.2 +    # 20% proximidad geográfica
-                time_score * 0.1          # 10% relevancia temporal
-            )
-            
-            # Solo incluir resultados con puntuación mínima
-            if total_score >= 30:  # Umbral mínimo de relevancia
-                results.append({
-                    "candidate": {
-                        "id": candidate["id"],
-                        "pet_name": candidate.get("pet_name"),
-                        "species": candidate.get("species"),
-                        "breed": candidate.get("breed"),
-                        "color": candidate.get("color"),
-                        "size": candidate.get("size"),
-                        "description": candidate.get("description"),
-                        "location": candidate.get("location"),
-                        "photos": candidate.get("photos", []),
-                        "labels": candidate.get("labels"),
-                        "reporter_id": candidate.get("reporter_id"),
-                        "created_at": candidate.get("created_at"),
-                    },
-                    "distance_km": round(distance_km, 2),
-                    "visual_similarity": round(visual_score, 1),
-                    "color_similarity": round(color_score, 1),
-                    "location_score": round(location_score, 1),
-                    "time_score": round(time_score, 1),
-                    "total_score": round(total_score, 1),
-                    "match_confidence": "Alta" if total_score >= 70 else "Media" if total_score >= 50 else "Baja"
-                })
+        rows = []
+        distances = []
+        for candidate_id, distance_km in hits:
+            candidate = candidates.get(candidate_id)
+            if candidate and candidate.get("status", "active") == "active":
+                rows.append(candidate)
+                distances.append(distance_km)
         
-        # Ordenar por puntuación total
-        results.sort(key=lambda x: x["total_score"], reverse=True)
+        # Puntuaciones de todos los candidatos en bloque y top por total ponderado
+        scores = await asyncio.to_thread(
+            score_candidates,
+            rows, distances, label_set({"labels": labels}), color_set(colors), radius_km, sb=sb
+        )
+        top, filtered_count = select_top(scores["total"], MAX_RESULTS)
         
-        # Limitar resultados a los mejores 20
-        top_results = results[:20]
+        top_results = []
+        for i in top:
+            candidate = rows[i]
+            total_score = float(scores["total"][i])
+            top_results.append({
+                "candidate": {
+                    "id": candidate["id"],
+                    "pet_name": candidate.get("pet_name"),
+                    "species": candidate.get("species"),
+                    "breed": candidate.get("breed"),
+                    "color": candidate.get("color"),
+                    "size": candidate.get("size"),
+                    "description": candidate.get("description"),
+                    "location": candidate.get("location"),
+                    "photos": candidate.get("photos", []),
+                    "labels": candidate.get("labels"),
+                    "reporter_id": candidate.get("reporter_id"),
+                    "created_at": candidate.get("created_at"),
+                },
+                "distance_km": round(distances[i], 2),
+                "visual_similarity": round(float(scores["visual"][i]), 1),
+                "color_similarity": round(float(scores["color"][i]), 1),
+                "location_score": round(float(scores["location"][i]), 1),
+                "time_score": round(float(scores["time"][i]), 1),
+                "total_score": round(total_score, 1),
+                "match_confidence": "Alta" if total_score >= 70 else "Media" if total_score >= 50 else "Baja"
+            })
         
         return {
             "analysis": analysis_data,
             "matches": top_results,
             "search_metadata": {
-                "total_candidates": len(candidates),
-                "filtered_results": len(results),
+                "total_candidates": len(hits),
+                "filtered_results": filtered_count,
                 "returned_results": len(top_results),
                 "search_type": search_type,
                 "radius_km": radius_km,
@@ -1,18 +1,25 @@
 """
 Router para búsqueda directa de coincidencias sin depender de n8n.
-Usa los embeddings almacenados en Supabase para encontrar matches.
+Usa los embeddings almacenados en Supabase (top-k resuelto por pgvector) para encontrar matches.
 """
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List, Dict, Any
 import os
+import asyncio
 from supabase import Client
-import numpy as np
 import sys
 from pathlib import Path
 
 # Agregar la carpeta parent al path para poder importar utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from utils.supabase_client import get_supabase_client
+from services.match_search import (
+    count_candidates,
+    search_similar_to_report_with_total,
+    ReportNotFoundError,
+    ReportWithoutEmbeddingError,
+)
+from services.match_store import upsert_matches
 
 router = APIRouter(prefix="/direct-matches", tags=["direct-matches"])
 
@@ -36,9 +43,9 @@ async def find_matches_for_report(
     try:
         sb = _sb()
         
-        # Obtener el reporte base con su embedding
+        # Obtener el reporte base (sin el embedding: la búsqueda lo resuelve en la base)
         base_result = sb.table("reports")\
-            .select("id, embedding, type, species, photos, pet_name, description, color")\
+            .select("id, type, species, photos, pet_name, description, color")\
             .eq("id", report_id)\
             .single()\
             .execute()
@@ -47,19 +54,6 @@ async def find_matches_for_report(
             raise HTTPException(404, f"Reporte {report_id} no encontrado")
         
         base_report = base_result.data
-        base_embedding = base_report.get("embedding")
-        
-        if not base_embedding:
-            raise HTTPException(400, f"El reporte {report_id} no tiene embedding generado")
-        
-        # Postgrest devuelve vectores como strings JSON, necesitamos parsearlos
-        if isinstance(base_embedding, str):
-            import json
-            try:
-                base_embedding = json.loads(base_embedding)
-            except:
-                raise HTTPException(400, f"El reporte {report_id} tiene un embedding inválido")
-        
         base_type = base_report.get("type")
         base_species = base_report.get("species")
         
@@ -69,17 +63,13 @@ async def find_matches_for_report(
         print(f"🔍 [direct-match] Buscando coincidencias para reporte {report_id}")
         print(f"   Tipo base: {base_type}, buscando: {target_type}")
         print(f"   Especie: {base_species}")
-        print(f"   Dimensiones embedding: {len(base_embedding)}")
         
-        # Obtener todos los reportes del tipo opuesto con embeddings
-        candidates_result = sb.table("reports")\
-            .select("id, embedding, species, type, photos, pet_name, description, color, created_at")\
-            .eq("type", target_type)\
-            .eq("status", "active")\
-            .not_.is_("embedding", "null")\
-            .execute()
+        total_candidates = await asyncio.to_thread(
+            count_candidates, sb, target_type, base_species or None
+        )
+        print(f"   Candidatos: {total_candidates}")
         
-        if not candidates_result.data:
+        if total_candidates == 0:
             return {
                 "report_id": report_id,
                 "matches": [],
@@ -87,74 +77,48 @@ async def find_matches_for_report(
                 "message": f"No hay reportes de tipo '{target_type}' con embeddings"
             }
         
-        candidates = candidates_result.data
-        print(f"   Candidatos encontrados: {len(candidates)}")
-        
-        # Filtrar por especie si está disponible
-        if base_species:
-            candidates = [c for c in candidates if c.get("species") == base_species]
-            print(f"   Candidatos después de filtrar por especie: {len(candidates)}")
-        
-        # Convertir embedding base a numpy
-        base_vec = np.array(base_embedding, dtype=np.float32)
-        base_norm = np.linalg.norm(base_vec)
+        # Top-k resuelto por pgvector (o el índice en memoria): solo viajan ids y scores
+        try:
+            top, total_above_threshold = await asyncio.to_thread(
+                search_similar_to_report_with_total,
+                sb,
+                report_id,
+                species=base_species or None,
+                k=top_k,
+                threshold=match_threshold
+            )
+        except ReportWithoutEmbeddingError as e:
+            raise HTTPException(400, str(e))
+        except ReportNotFoundError as e:
+            raise HTTPException(404, str(e))
+        
+        # Traer los datos de presentación solo de los top-k
+        details: Dict[str, Dict[str, Any]] = {}
+        if top:
+            details_result = sb.table("reports")\
+                .select("id, species, type, photos, pet_name, description, color, created_at")\
+                .in_("id", [candidate_id for candidate_id, _ in top])\
+                .execute()
+            details = {row["id"]: row for row in (details_result.data or [])}
         
-        # Calcular similitud con cada candidato
-        matches = []
-        for candidate in candidates:
-            # Evitar comparar consigo mismo
-            if candidate["id"] == report_id:
+        top_matches = []
+        for candidate_id, similarity in top:
+            candidate = details.get(candidate_id)
+            if candidate is None:
                 continue
-            
-            candidate_embedding = candidate.get("embedding")
-            if not candidate_embedding:
-                continue
-            
-            # Parsear si es string JSON
-            if isinstance(candidate_embedding, str):
-                import json
-                try:
-                    candidate_embedding = json.loads(candidate_embedding)
-                except:
-                    continue
-            
-            try:
-                # Convertir embedding del candidato a numpy
-                candidate_vec = np.array(candidate_embedding, dtype=np.float32)
-                
-                # Verificar que las dimensiones coincidan
-                if len(candidate_vec) != len(base_vec):
-                    print(f"   ⚠️ Dimensiones no coinciden: {len(candidate_vec)} vs {len(base_vec)}")
-                    continue
-                
-                # Calcular similitud coseno
-                candidate_norm = np.linalg.norm(candidate_vec)
-                similarity = float(np.dot(base_vec, candidate_vec) / (base_norm * candidate_norm))
-                
-                # Filtrar por umbral
-                if similarity >= match_threshold:
-                    matches.append({
-                        "report_id": candidate["id"],
-                        "similarity_score": round(similarity, 4),
-                        "pet_name": candidate.get("pet_name"),
-                        "species": candidate.get("species"),
-                        "color": candidate.get("color"),
-                        "type": candidate.get("type"),
-                        "photo": (candidate.get("photos") or [None])[0] if isinstance(candidate.get("photos"), list) else None,
-                        "description": candidate.get("description"),
-                        "created_at": candidate.get("created_at")
-                    })
-            except Exception as e:
-                print(f"   ⚠️ Error calculando similitud con {candidate['id']}: {str(e)}")
-                continue
-        
-        # Ordenar por similitud descendente
-        matches.sort(key=lambda x: x["similarity_score"], reverse=True)
-        
-        # Limitar resultados
-        top_matches = matches[:top_k]
-        
-        print(f"   ✅ Encontradas {len(top_matches)} coincidencias (de {len(matches)} sobre umbral)")
+            top_matches.append({
+                "report_id": candidate_id,
+                "similarity_score": round(similarity, 4),
+                "pet_name": candidate.get("pet_name"),
+                "species": candidate.get("species"),
+                "color": candidate.get("color"),
+                "type": candidate.get("type"),
+                "photo": (candidate.get("photos") or [None])[0] if isinstance(candidate.get("photos"), list) else None,
+                "description": candidate.get("description"),
+                "created_at": candidate.get("created_at")
+            })
+        
+        print(f"   ✅ Encontradas {len(top_matches)} coincidencias (de {total_above_threshold} sobre umbral)")
         
         # Guardar matches en la tabla matches
         if top_matches:
@@ -163,8 +127,8 @@ async def find_matches_for_report(
         return {
             "report_id": report_id,
             "matches": top_matches,
-            "total_candidates": len(candidates),
-            "total_above_threshold": len(matches),
+            "total_candidates": total_candidates,
+            "total_above_threshold": total_above_threshold,
             "returned": len(top_matches),
             "search_params": {
                 "match_threshold": match_threshold,
@@ -184,49 +148,15 @@ async def find_matches_for_report(
         raise HTTPException(500, f"Error buscando coincidencias: {str(e)}")
 
 async def _save_matches_to_db(sb: Client, report_id: str, report_type: str, matches: List[Dict[str, Any]]):
-    """Guarda los matches en la tabla matches"""
+    """Guarda los matches en la tabla matches con un único upsert"""
     try:
-        saved_count = 0
-        for match in matches:
-            match_report_id = match["report_id"]
-            similarity_score = match["similarity_score"]
-            
-            # Determinar qué es lost y qué es found
-            if report_type == "lost":
-                lost_report_id = report_id
-                found_report_id = match_report_id
-            else:
-                lost_report_id = match_report_id
-                found_report_id = report_id
-            
-            # Verificar si ya existe este match
-            existing = sb.table("matches")\
-                .select("id, similarity_score")\
-                .eq("lost_report_id", lost_report_id)\
-                .eq("found_report_id", found_report_id)\
-                .execute()
-            
-            if existing.data:
-                # Actualizar si la similitud es mayor
-                existing_match = existing.data[0]
-                if similarity_score > existing_match.get("similarity_score", 0):
-                    sb.table("matches").update({
-                        "similarity_score": similarity_score,
-                        "matched_by": "ai_visual",
-                        "status": "pending"
-                    }).eq("id", existing_match["id"]).execute()
-                    saved_count += 1
-            else:
-                # Crear nuevo match
-                sb.table("matches").insert({
-                    "lost_report_id": lost_report_id,
-                    "found_report_id": found_report_id,
-                    "similarity_score": similarity_score,
-                    "matched_by": "ai_visual",
-                    "status": "pending"
-                }).execute()
-                saved_count += 1
-        
+        saved_count = await asyncio.to_thread(
+            upsert_matches,
+            sb,
+            report_id,
+            report_type,
+            [(match["report_id"], match["similarity_score"]) for match in matches]
+        )
         print(f"   💾 Guardados {saved_count} matches en la base de datos")
     except Exception as e:
         print(f"   ⚠️ Error guardando matches: {str(e)}")
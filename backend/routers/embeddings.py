@@ -1,9 +1,12 @@
 # backend/routers/embeddings.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
-import os, psycopg
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+import os, asyncio, psycopg
 from typing import Optional
-from services.embeddings import image_bytes_to_vec
-from supabase import create_client, Client
+from utils.inference import embed_image_for_request
+from supabase import Client
+from utils.supabase_client import get_supabase_client
+from utils.vector_codec import register_vector
+from services.match_store import upsert_matches
 
 router = APIRouter(prefix="/embeddings", tags=["embeddings"])
 
@@ -11,19 +14,21 @@ def get_conn():
     dsn = os.getenv("DATABASE_URL")
     if not dsn:
         raise RuntimeError("DATABASE_URL no configurada")
-    return psycopg.connect(dsn, autocommit=True)
+    conn = psycopg.connect(dsn, autocommit=True)
+    # numpy <-> vector en el formato binario de pgvector (sin pasar por texto)
+    register_vector(conn)
+    return conn
 
-def get_supabase():
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_KEY")
-    if not url or not key:
-        raise RuntimeError("SUPABASE_URL o SUPABASE_SERVICE_KEY no configuradas")
-    return create_client(url, key)
+def get_supabase() -> Client:
+    """Devuelve el cliente de Supabase compartido del proceso"""
+    return get_supabase_client()
 
 @router.post("/index/{report_id}")
-async def index_report_embedding(report_id: str, file: UploadFile = File(...)):
+async def index_report_embedding(report_id: str, request: Request, file: UploadFile = File(...)):
     try:
-        vec = image_bytes_to_vec(await file.read())
+        vec = await embed_image_for_request(request, await file.read())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(400, f"No se pudo procesar la imagen: {e}")
     with get_conn() as conn, conn.cursor() as cur:
@@ -38,6 +43,7 @@ async def index_report_embedding(report_id: str, file: UploadFile = File(...)):
 
 @router.post("/search_image")
 async def search_image(
+    request: Request,
     file: UploadFile = File(...),
     top_k: int = Query(10, ge=1, le=50),
     lost_id: Optional[str] = Query(None),
@@ -46,7 +52,9 @@ async def search_image(
     max_km: Optional[float] = Query(None, description="Radio máximo en km")
 ):
     try:
-        qvec = image_bytes_to_vec(await file.read())
+        qvec = await embed_image_for_request(request, await file.read())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(400, f"No se pudo procesar la imagen: {e}")
 
@@ -60,16 +68,12 @@ async def search_image(
     params = {"qvec": qvec, "qvec2": qvec, "top_k": top_k}
 
     if lat is not None and lng is not None and max_km and max_km > 0:
-        base_sql += """
-          join public.reports_with_coords rc on rc.id = r.id
-        """
-        # Haversine en SQL (aprox) para filtrar por radio
+        # Radio resuelto por search_reports_within_radius (migración 015, índice GIST)
         where.append("""
-          ( 6371 * acos(
-              cos(radians(%(lat)s)) * cos(radians(rc.latitude))
-              * cos(radians(rc.longitude) - radians(%(lng)s))
-              + sin(radians(%(lat)s)) * sin(radians(rc.latitude))
-            ) ) <= %(max_km)s
+          r.id in (
+            select nr.id
+              from search_reports_within_radius(%(lat)s, %(lng)s, %(max_km)s, filter_status => null) nr
+          )
         """)
         params.update({"lat": lat, "lng": lng, "max_km": max_km})
 
@@ -92,12 +96,15 @@ async def search_image(
                 "photo": (photos or [None])[0] if isinstance(photos, list) else None,
                 "labels": labels
             })
-        if results:
-            top1 = results[0]
-            cur.execute("""
-                insert into public.matches
-                    (lost_report_id, found_report_id, similarity_score, matched_by, status)
-                values (%s::uuid, %s::uuid, %s, 'auto_clip', 'pending')
-            """, (lost_id if lost_id else None, top1["report_id"],
-                  round(top1["score_clip"], 4) if top1["score_clip"] is not None else None))
+    # Guardar top-1 con upsert_matches (migración 017): un INSERT directo fallaba
+    # con UNIQUE(lost_report_id, found_report_id) al repetir la búsqueda
+    if results and lost_id and results[0]["score_clip"] is not None:
+        top1 = results[0]
+        try:
+            await asyncio.to_thread(
+                upsert_matches, get_supabase(), lost_id, "lost",
+                [(str(top1["report_id"]), top1["score_clip"])], "auto_clip",
+            )
+        except Exception as e:
+            print(f"Error guardando match: {e}")
     return {"results": results}
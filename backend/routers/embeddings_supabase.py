@@ -1,21 +1,26 @@
 # backend/routers/embeddings_supabase.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
 import os
+import asyncio
 from typing import Optional
-from services.embeddings import image_bytes_to_vec
-from supabase import create_client, Client
+from utils.inference import embed_image_for_request
+from services.match_index import index_report_vector
+from services.match_search import search_similar_to_vector
+from services.geo_search import search_nearby
+from services.incremental_matcher import update_matches_for_report
+from services.match_store import upsert_matches
+from utils.vector_codec import to_pgvector_text
+from supabase import Client
+from utils.supabase_client import get_supabase_client
 
 router = APIRouter(prefix="/embeddings", tags=["embeddings"])
 
-def get_supabase():
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_KEY")
-    if not url or not key:
-        raise RuntimeError("SUPABASE_URL o SUPABASE_SERVICE_KEY no configuradas")
-    return create_client(url, key)
+def get_supabase() -> Client:
+    """Devuelve el cliente de Supabase compartido del proceso"""
+    return get_supabase_client()
 
 @router.post("/generate")
-async def generate_embedding(file: UploadFile = File(...)):
+async def generate_embedding(request: Request, file: UploadFile = File(...)):
     """
     Genera un embedding de 1536 dimensiones para una imagen usando MegaDescriptor.
     """
@@ -24,7 +29,7 @@ async def generate_embedding(file: UploadFile = File(...)):
         if not image_bytes:
             raise HTTPException(400, "Archivo vacío o no leído")
         
-        vec = image_bytes_to_vec(image_bytes)
+        vec = await embed_image_for_request(request, image_bytes)
         
         return {
             "embedding": vec.tolist(),
@@ -33,29 +38,37 @@ async def generate_embedding(file: UploadFile = File(...)):
             "file_name": file.filename,
             "file_size": len(image_bytes)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Error generando embedding: {str(e)}")
 
 @router.post("/index/{report_id}")
-async def index_report_embedding(report_id: str, file: UploadFile = File(...)):
+async def index_report_embedding(report_id: str, request: Request, file: UploadFile = File(...)):
     try:
-        vec = image_bytes_to_vec(await file.read())
+        vec = await embed_image_for_request(request, await file.read())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(400, f"No se pudo procesar la imagen: {e}")
     
     sb = get_supabase()
     try:
-        # Convertir vector numpy a lista para Supabase
-        vec_list = vec.tolist()
-        
-        # Usar SQL directo para insertar el vector correctamente
+        # La RPC recibe el literal de texto de pgvector y lo convierte a vector
         result = sb.rpc('update_report_embedding', {
             'report_id': report_id,
-            'embedding_vector': vec_list
+            'embedding_vector': to_pgvector_text(vec)
         }).execute()
         
         if not result.data:
             raise HTTPException(404, "report_id no encontrado")
+        
+        await asyncio.to_thread(index_report_vector, sb, report_id, vec)
+        
+        try:
+            await asyncio.to_thread(update_matches_for_report, sb, report_id)
+        except Exception as match_error:
+            print(f"⚠️ [matches] Error buscando matches (no crítico): {str(match_error)}")
             
         return {"status": "ok", "report_id": report_id, "dims": 1536}
     except Exception as e:
@@ -63,6 +76,7 @@ async def index_report_embedding(report_id: str, file: UploadFile = File(...)):
 
 @router.post("/search_image")
 async def search_image(
+    request: Request,
     file: UploadFile = File(...),
     top_k: int = Query(10, ge=1, le=50),
     lost_id: Optional[str] = Query(None),
@@ -71,83 +85,63 @@ async def search_image(
     max_km: Optional[float] = Query(None, description="Radio máximo en km")
 ):
     try:
-        qvec = image_bytes_to_vec(await file.read())
+        qvec = await embed_image_for_request(request, await file.read())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(400, f"No se pudo procesar la imagen: {e}")
 
     sb = get_supabase()
     
-    # Construir query base
-    query = sb.table("reports").select("id, species, color, photos, labels, embedding")
-    
-    # Filtrar por embedding no nulo
-    query = query.not_.is_("embedding", "null")
-    
-    # Aplicar filtro geográfico si se proporciona
-    if lat is not None and lng is not None and max_km and max_km > 0:
-        # Para Supabase, necesitaríamos usar una función RPC o filtrar después
-        # Por ahora, obtenemos todos y filtramos después
-        pass
-    
     try:
-        result = query.execute()
-        reports = result.data
+        nearby = None
+        if lat is not None and lng is not None and max_km and max_km > 0:
+            # Reportes activos dentro del radio (migración 015, índice GIST)
+            nearby = dict(await asyncio.to_thread(search_nearby, sb, lat, lng, max_km))
+            if not nearby:
+                return {"results": []}
         
-        # Calcular similitud para cada reporte
-        results = []
-        import numpy as np
+        # Top-k de reportes activos resuelto por pgvector (sin descargar embeddings);
+        # con radio se puntúan solo los reportes cercanos
+        top = await asyncio.to_thread(
+            search_similar_to_vector, sb, qvec, k=top_k,
+            ids=list(nearby) if nearby is not None else None
+        )
         
-        for report in reports:
-            if not report.get("embedding"):
-                continue
-                
-            # Convertir embedding de Supabase a numpy array
-            report_vec = report["embedding"]
-            if isinstance(report_vec, list):
-                # Asegurar que todos los elementos son números
-                try:
-                    report_vec = np.array([float(x) for x in report_vec], dtype=np.float32)
-                except (ValueError, TypeError):
-                    continue
-            else:
-                continue
-            
-            # Calcular similitud coseno
-            try:
-                similarity = np.dot(qvec, report_vec) / (np.linalg.norm(qvec) * np.linalg.norm(report_vec))
-            except:
+        details = {}
+        if top:
+            details_result = sb.table("reports")\
+                .select("id, species, color, photos, labels")\
+                .in_("id", [report_id for report_id, _ in top])\
+                .execute()
+            details = {row["id"]: row for row in (details_result.data or [])}
+        
+        results = []
+        for report_id, similarity in top:
+            report = details.get(report_id)
+            if report is None:
                 continue
-            
-            # Aplicar filtro geográfico si es necesario
-            if lat is not None and lng is not None and max_km and max_km > 0:
-                # Aquí necesitarías las coordenadas del reporte
-                # Por ahora, saltamos el filtro geográfico
-                pass
-            
             results.append({
-                "report_id": report["id"],
-                "score_clip": float(similarity),
+                "report_id": report_id,
+                "score_clip": similarity,
                 "species": report.get("species"),
                 "color": report.get("color"),
                 "photo": (report.get("photos") or [None])[0] if isinstance(report.get("photos"), list) else None,
-                "labels": report.get("labels")
+                "labels": report.get("labels"),
+                "distance_km": round(nearby[report_id], 3) if nearby is not None else None
             })
         
-        # Ordenar por similitud y tomar top_k
-        results.sort(key=lambda x: x["score_clip"], reverse=True)
-        results = results[:top_k]
-        
         # Guardar top-1 en matches si hay resultados
         if results and lost_id:
             top1 = results[0]
             try:
-                sb.table("matches").insert({
-                    "lost_report_id": lost_id,
-                    "found_report_id": top1["report_id"],
-                    "similarity_score": round(top1["score_clip"], 4),
-                    "matched_by": "ai_visual",  # Usa embeddings de imágenes (MegaDescriptor)
-                    "status": "pending"
-                }).execute()
+                # upsert_matches respeta UNIQUE(lost_report_id, found_report_id):
+                # repetir la búsqueda solo mejora la similitud del par existente
+                await asyncio.to_thread(
+                    upsert_matches, sb, lost_id, "lost",
+                    [(top1["report_id"], top1["score_clip"])],
+                    "ai_visual",  # Usa embeddings de imágenes (MegaDescriptor)
+                )
             except Exception as e:
                 print(f"Error guardando match: {e}")
         
@@ -1,20 +1,39 @@
 """
 Router para regenerar embeddings de reportes que no los tienen.
 """
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional
 import os, sys
 from pathlib import Path
 from supabase import Client
-import httpx
-from services.embeddings import image_bytes_to_vec
+import asyncio
 
 # Agregar la carpeta parent al path para poder importar utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from utils.supabase_client import get_supabase_client
+from utils.inference import embed_images_for_request
+from services.match_index import index_report_vector
+from services.photo_embeddings import embed_report_photos, photo_urls, save_photo_embeddings
+from services.incremental_matcher import update_matches_for_report
+from services.backfill import (
+    BackfillPipeline,
+    SupabaseBackfillStore,
+    MODES,
+    BACKFILL_BATCH_SIZE,
+    BACKFILL_DOWNLOAD_CONCURRENCY,
+)
+from services.jobs import get_job_manager
 
 router = APIRouter(prefix="/fix-embeddings", tags=["fix-embeddings"])
 
+def _update_matches_quietly(sb: Client, report_id: str) -> None:
+    """Matching incremental tras escribir un embedding; un error no invalida la escritura."""
+    try:
+        stats = update_matches_for_report(sb, report_id)
+        print(f"✅ [matches] {stats['saved']} coincidencias guardadas para reporte {report_id}")
+    except Exception as e:
+        print(f"⚠️ [matches] Error buscando matches para {report_id} (no crítico): {str(e)}")
+
 def _sb() -> Client:
     """Crea un cliente de Supabase con configuración optimizada de timeouts"""
     try:
@@ -23,7 +42,7 @@ def _sb() -> Client:
         raise HTTPException(500, f"Error conectando a Supabase: {str(e)}")
 
 @router.post("/regenerate/{report_id}")
-async def regenerate_embedding_for_report(report_id: str):
+async def regenerate_embedding_for_report(report_id: str, request: Request):
     """
     Regenera el embedding para un reporte específico que tiene foto pero no embedding.
     """
@@ -32,7 +51,7 @@ async def regenerate_embedding_for_report(report_id: str):
         
         # Obtener el reporte
         result = sb.table("reports")\
-            .select("id, photos, embedding")\
+            .select("id, photos")\
             .eq("id", report_id)\
             .single()\
             .execute()
@@ -41,40 +60,39 @@ async def regenerate_embedding_for_report(report_id: str):
             raise HTTPException(404, f"Reporte {report_id} no encontrado")
         
         report = result.data
-        photos = report.get("photos", [])
+        urls = photo_urls(report.get("photos", []))
         
-        if not photos or len(photos) == 0:
+        if not urls:
             raise HTTPException(400, f"El reporte {report_id} no tiene fotos")
         
-        first_photo = photos[0]
-        
         print(f"🔄 Generando embedding para reporte {report_id}")
-        print(f"   Foto: {first_photo}")
-        
-        # Descargar la imagen
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(first_photo)
-            response.raise_for_status()
-            image_bytes = response.content
+        print(f"   Fotos: {len(urls)}")
         
-        # Generar embedding
-        vec = image_bytes_to_vec(image_bytes)
-        vec_list = vec.tolist()
+        # Descargar las fotos y embeberlas en un único lote (se cancela si el cliente se desconecta)
+        vec, photo_vecs, errors = await embed_report_photos(
+            urls,
+            lambda images: embed_images_for_request(request, images)
+        )
+        for error in errors:
+            print(f"   ⚠️ Foto descartada: {error}")
+        if vec is None:
+            raise HTTPException(502, f"No se pudo procesar ninguna foto del reporte {report_id}")
         
-        print(f"   Dimensiones del embedding: {len(vec_list)}")
+        print(f"   Dimensiones del embedding: {len(vec)}")
         
-        # Guardar en Supabase
-        update_result = sb.table('reports').update({
-            'embedding': vec_list
-        }).eq('id', report_id).execute()
+        # Guardar vectores por foto y agregado en Supabase
+        saved = await asyncio.to_thread(save_photo_embeddings, sb, [(report_id, vec, photo_vecs)])
         
-        if update_result.data:
+        if saved:
+            await asyncio.to_thread(index_report_vector, sb, report_id, vec)
             print(f"✅ Embedding regenerado exitosamente para reporte {report_id}")
+            await asyncio.to_thread(_update_matches_quietly, sb, report_id)
             return {
                 "success": True,
                 "report_id": report_id,
                 "message": "Embedding regenerado exitosamente",
-                "embedding_dimensions": len(vec_list)
+                "embedding_dimensions": len(vec),
+                "photos_embedded": len(photo_vecs)
             }
         else:
             raise HTTPException(500, "No se pudo guardar el embedding")
@@ -87,84 +105,84 @@ async def regenerate_embedding_for_report(report_id: str):
         traceback.print_exc()
         raise HTTPException(500, f"Error regenerando embedding: {str(e)}")
 
-@router.post("/regenerate-all")
-async def regenerate_all_missing_embeddings():
+@router.post("/regenerate-all", status_code=202)
+async def regenerate_all_missing_embeddings(
+    mode: str = Query("missing", description="'missing' = solo sin embedding, 'all' = regenerar todos"),
+    limit: Optional[int] = Query(None, ge=1, description="Máximo de reportes a procesar"),
+    batch_size: int = Query(BACKFILL_BATCH_SIZE, ge=1, le=64, description="Imágenes por forward pass"),
+    download_concurrency: int = Query(BACKFILL_DOWNLOAD_CONCURRENCY, ge=1, le=64, description="Descargas simultáneas"),
+    update_matches: bool = Query(False, description="Actualizar matches de cada reporte al escribir su embedding")
+):
     """
-    Regenera embeddings para todos los reportes que tienen fotos pero no tienen embedding.
+    Encola la regeneración de embeddings como trabajo en segundo plano.
+    Devuelve el id del trabajo de inmediato; el progreso se consulta en
+    GET /fix-embeddings/jobs/{job_id}.
     """
-    try:
-        sb = _sb()
-        
-        # Obtener reportes sin embedding pero con fotos
-        result = sb.table("reports")\
-            .select("id, photos")\
-            .is_("embedding", "null")\
-            .execute()
-        
-        if not result.data:
-            return {
-                "success": True,
-                "message": "No hay reportes sin embeddings",
-                "processed": 0
-            }
-        
-        reports = result.data
-        reports_with_photos = [r for r in reports if r.get("photos") and len(r.get("photos", [])) > 0]
-        
-        if not reports_with_photos:
-            return {
-                "success": True,
-                "message": "No hay reportes con fotos sin embeddings",
-                "processed": 0
-            }
-        
-        print(f"🔄 Regenerando embeddings para {len(reports_with_photos)} reportes...")
-        
-        success_count = 0
-        errors: List[Dict] = []
-        
-        for report in reports_with_photos:
-            report_id = report["id"]
-            photos = report["photos"]
-            first_photo = photos[0]
-            
-            try:
-                # Descargar la imagen
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.get(first_photo)
-                    response.raise_for_status()
-                    image_bytes = response.content
-                
-                # Generar embedding
-                vec = image_bytes_to_vec(image_bytes)
-                vec_list = vec.tolist()
-                
-                # Guardar en Supabase
-                sb.table('reports').update({
-                    'embedding': vec_list
-                }).eq('id', report_id).execute()
-                
-                success_count += 1
-                print(f"   ✅ {success_count}/{len(reports_with_photos)}: {report_id}")
-                
-            except Exception as e:
-                error_msg = str(e)
-                errors.append({"report_id": report_id, "error": error_msg})
-                print(f"   ❌ Error con {report_id}: {error_msg}")
-        
-        return {
-            "success": True,
-            "message": f"Procesados {success_count} reportes exitosamente",
-            "total_processed": success_count,
-            "total_errors": len(errors),
-            "errors": errors[:10]  # Mostrar solo los primeros 10 errores
-        }
-        
-    except Exception as e:
-        print(f"❌ Error en regeneración masiva: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(500, f"Error en regeneración masiva: {str(e)}")
+    if mode not in MODES:
+        raise HTTPException(400, f"Modo inválido: {mode} (usar {', '.join(MODES)})")
+    
+    sb = _sb()
+    
+    async def on_written(report_id: str, vec) -> None:
+        # Llamadas bloqueantes fuera del event loop; el pipeline espera a que terminen
+        await asyncio.to_thread(index_report_vector, sb, report_id, vec)
+        if update_matches:
+            await asyncio.to_thread(_update_matches_quietly, sb, report_id)
+    
+    params = {
+        "mode": mode,
+        "limit": limit,
+        "batch_size": batch_size,
+        "download_concurrency": download_concurrency,
+        "update_matches": update_matches
+    }
+    job = get_job_manager().submit(
+        "regenerate-embeddings",
+        lambda: BackfillPipeline(
+            SupabaseBackfillStore(sb),
+            mode=mode,
+            limit=limit,
+            batch_size=batch_size,
+            download_concurrency=download_concurrency,
+            on_written=on_written
+        ),
+        params
+    )
+    
+    return {
+        "success": True,
+        "message": "Regeneración encolada",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/fix-embeddings/jobs/{job.id}"
+    }
+
+@router.get("/jobs")
+async def list_jobs():
+    """
+    Lista los trabajos de regeneración de todos los workers (más recientes primero).
+    """
+    return {"jobs": get_job_manager().list_status("regenerate-embeddings")}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Estado y progreso de un trabajo: procesados, fallidos y throughput por etapa.
+    """
+    job = get_job_manager().status(job_id)
+    if job is None:
+        raise HTTPException(404, f"Trabajo {job_id} no encontrado")
+    return job
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancela un trabajo. Si está corriendo, termina lo que ya está en curso y se detiene.
+    """
+    job = get_job_manager().request_cancel(job_id)
+    if job is None:
+        raise HTTPException(404, f"Trabajo {job_id} no encontrado")
+    return job
 
 @router.get("/check-missing")
 async def check_missing_embeddings():
@@ -1,12 +1,16 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import List, Dict, Any, Optional
-import os, math, sys
+import os, sys
+import asyncio
 from pathlib import Path
 from supabase import Client
 
 # Agregar la carpeta parent al path para poder importar utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from utils.supabase_client import get_supabase_client
+from utils.supabase_client import get_supabase_client, select_in_chunks
+from services.geo_index import extract_coords, fetch_reports_by_ids
+from services.geo_search import search_nearby
+from services.label_vocab import LABEL_IDS_FIELD, TermColumn, label_set, query_term_ids
 
 router = APIRouter(prefix="/matches", tags=["matches"])
 
@@ -17,52 +21,35 @@ def _sb() -> Client:
     except Exception as e:
         raise HTTPException(500, f"Error conectando a Supabase: {str(e)}")
 
-def _coords(loc: Optional[dict]) -> Optional[tuple]:
-    # GeoJSON {"type":"Point","coordinates":[lon,lat]}
-    if isinstance(loc, dict) and "coordinates" in loc:
-        lon, lat = loc["coordinates"]; return (lat, lon)
-    return None
-
-def haversine_km(lat1, lon1, lat2, lon2):
-    R=6371.0
-    dlat=math.radians(lat2-lat1); dlon=math.radians(lon2-lon1)
-    a=math.sin(dlat/2)**2+math.cos(math.radians(lat1))*math.cos(math.radians(lat2))*math.sin(dlon/2)**2
-    return 2*R*math.asin(math.sqrt(a))
-
-def label_set(labels_json) -> set:
-    if not labels_json: return set()
-    items = labels_json.get("labels") if isinstance(labels_json, dict) else None
-    if not isinstance(items, list): return set()
-    return {(it.get("label") or it.get("description") or "").lower() for it in items if it}
-
 @router.get("/auto-match")
 def auto_match(report_id: str = Query(...), radius_km: float = 10.0, top_k: int = 5):
     sb = _sb()
     base = sb.table("reports").select("*").eq("id", report_id).single().execute().data
     if not base: raise HTTPException(404, "Reporte base no encontrado")
 
-    base_pt = _coords(base.get("location"))
+    base_pt = extract_coords(base.get("location"))
     if not base_pt: raise HTTPException(400, "El reporte base no tiene location válido (GeoJSON Point)")
     base_lat, base_lon = base_pt
-    base_labels = label_set(base.get("labels"))
+    base_labels = query_term_ids(sb, label_set(base.get("labels")))
     target_type = "found" if base.get("type") == "lost" else "lost"
 
-    candidates = sb.table("reports").select("*") \
-        .eq("type", target_type).eq("status", "active").eq("species", base.get("species")).execute().data
+    # Candidatos dentro del radio resueltos por la búsqueda geográfica
+    hits = search_nearby(
+        sb, base_lat, base_lon, radius_km,
+        report_type=target_type, species=base.get("species"), exclude_id=report_id
+    )
+    candidates = fetch_reports_by_ids(
+        sb, [cid for cid, _ in hits], "id, status, pet_name, species, color, location, photos, labels, label_ids"
+    )
+    rows = [(candidates[cid], d) for cid, d in hits
+            if cid in candidates and candidates[cid].get("status", "active") == "active"]
+    # Etiquetas en común con el reporte base, para todos los candidatos a la vez
+    overlaps = TermColumn.from_rows(
+        [c for c, _ in rows], LABEL_IDS_FIELD, "labels", label_set, base_labels
+    ).intersection_counts(base_labels.values())
 
     results: List[Dict[str, Any]] = []
-    lat_pad = radius_km/111.0; lon_pad = radius_km/111.0
-
-    for c in candidates:
-        pt = _coords(c.get("location"))
-        if not pt: continue
-        lat, lon = pt
-        if not (base_lat-lat_pad <= lat <= base_lat+lat_pad and base_lon-lon_pad <= lon <= base_lon+lon_pad):
-            continue
-        d = haversine_km(base_lat, base_lon, lat, lon)
-        if d > radius_km: continue
-
-        overlap = len(base_labels & label_set(c.get("labels")))
+    for (c, d), overlap in zip(rows, overlaps.tolist()):
         score = overlap*10 - d*0.2
         results.append({
             "candidate": {
@@ -80,6 +67,41 @@ def auto_match(report_id: str = Query(...), radius_km: float = 10.0, top_k: int
     return {"report_id": report_id, "radius_km": radius_km, "total_candidates": len(results), "top_k": results[:top_k]}
 
 
+# Columnas de los reportes que acompañan a cada match
+_MATCH_REPORT_COLUMNS = "id, type, pet_name, species, photos, description, location, created_at"
+
+
+async def _fetch_matches_both_sides(sb: Client, ids: List[str], status: str) -> List[Dict[str, Any]]:
+    """Trae en paralelo los matches donde los reportes son el perdido o el encontrado."""
+    matches_lost, matches_found = await asyncio.gather(
+        asyncio.to_thread(select_in_chunks, sb, "matches", "*", "lost_report_id", ids, {"status": status}),
+        asyncio.to_thread(select_in_chunks, sb, "matches", "*", "found_report_id", ids, {"status": status})
+    )
+    return matches_lost + matches_found
+
+
+async def _enrich_matches(sb: Client, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Agrega lost_report/found_report a cada match con una sola tanda de consultas."""
+    reports = await asyncio.to_thread(
+        fetch_reports_by_ids,
+        sb,
+        [m.get("lost_report_id") for m in matches] + [m.get("found_report_id") for m in matches],
+        _MATCH_REPORT_COLUMNS
+    )
+    return [
+        {
+            "match_id": match.get("id"),
+            "similarity_score": match.get("similarity_score"),
+            "matched_by": match.get("matched_by"),
+            "status": match.get("status"),
+            "created_at": match.get("created_at"),
+            "lost_report": reports.get(match.get("lost_report_id")),
+            "found_report": reports.get(match.get("found_report_id"))
+        }
+        for match in matches
+    ]
+
+
 @router.get("/pending")
 async def get_pending_matches(
     user_id: Optional[str] = Query(None, description="ID del usuario para filtrar matches de sus reportes"),
@@ -96,40 +118,9 @@ async def get_pending_matches(
         sb = _sb()
         
         if report_id:
-            # Obtener matches de un reporte específico
-            # Puede ser lost_report_id o found_report_id
-            matches_lost = sb.table("matches").select("*").eq("lost_report_id", report_id).eq("status", status).execute()
-            matches_found = sb.table("matches").select("*").eq("found_report_id", report_id).eq("status", status).execute()
-            
-            all_matches = (matches_lost.data or []) + (matches_found.data or [])
-            
-            # Enriquecer con información de los reportes relacionados
-            enriched_matches = []
-            for match in all_matches:
-                lost_id = match.get("lost_report_id")
-                found_id = match.get("found_report_id")
-                
-                # Obtener reporte perdido
-                lost_report = None
-                if lost_id:
-                    lost_result = sb.table("reports").select("id, type, pet_name, species, photos, description, location, created_at").eq("id", lost_id).single().execute()
-                    lost_report = lost_result.data if lost_result.data else None
-                
-                # Obtener reporte encontrado
-                found_report = None
-                if found_id:
-                    found_result = sb.table("reports").select("id, type, pet_name, species, photos, description, location, created_at").eq("id", found_id).single().execute()
-                    found_report = found_result.data if found_result.data else None
-                
-                enriched_matches.append({
-                    "match_id": match.get("id"),
-                    "similarity_score": match.get("similarity_score"),
-                    "matched_by": match.get("matched_by"),
-                    "status": match.get("status"),
-                    "created_at": match.get("created_at"),
-                    "lost_report": lost_report,
-                    "found_report": found_report
-                })
+            # Matches donde el reporte es lost_report_id o found_report_id
+            all_matches = await _fetch_matches_both_sides(sb, [report_id], status)
+            enriched_matches = await _enrich_matches(sb, all_matches)
             
             return {
                 "matches": enriched_matches,
@@ -147,36 +138,8 @@ async def get_pending_matches(
                 return {"matches": [], "count": 0, "user_id": user_id}
             
             # Obtener matches donde los reportes del usuario están involucrados
-            matches_lost = sb.table("matches").select("*").in_("lost_report_id", report_ids).eq("status", status).execute()
-            matches_found = sb.table("matches").select("*").in_("found_report_id", report_ids).eq("status", status).execute()
-            
-            all_matches = (matches_lost.data or []) + (matches_found.data or [])
-            
-            # Enriquecer con información de los reportes (similar al caso anterior)
-            enriched_matches = []
-            for match in all_matches:
-                lost_id = match.get("lost_report_id")
-                found_id = match.get("found_report_id")
-                
-                lost_report = None
-                if lost_id:
-                    lost_result = sb.table("reports").select("id, type, pet_name, species, photos, description, location, created_at").eq("id", lost_id).single().execute()
-                    lost_report = lost_result.data if lost_result.data else None
-                
-                found_report = None
-                if found_id:
-                    found_result = sb.table("reports").select("id, type, pet_name, species, photos, description, location, created_at").eq("id", found_id).single().execute()
-                    found_report = found_result.data if found_result.data else None
-                
-                enriched_matches.append({
-                    "match_id": match.get("id"),
-                    "similarity_score": match.get("similarity_score"),
-                    "matched_by": match.get("matched_by"),
-                    "status": match.get("status"),
-                    "created_at": match.get("created_at"),
-                    "lost_report": lost_report,
-                    "found_report": found_report
-                })
+            all_matches = await _fetch_matches_both_sides(sb, report_ids, status)
+            enriched_matches = await _enrich_matches(sb, all_matches)
             
             return {
                 "matches": enriched_matches,
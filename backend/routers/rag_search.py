@@ -9,6 +9,7 @@ from supabase import Client
 # Agregar la carpeta parent al path para poder importar utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from utils.supabase_client import get_supabase_client
+from utils.vector_codec import to_pgvector_text
 
 router = APIRouter(prefix="/rag", tags=["rag-search"])
 
@@ -147,7 +148,7 @@ async def save_embedding(
         # Usar la función RPC para actualizar el embedding
         result = sb.rpc('update_report_embedding', {
             'report_id': report_id,
-            'embedding_vector': embedding
+            'embedding_vector': to_pgvector_text(embedding)
         }).execute()
         
         if not result.data:
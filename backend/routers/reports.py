@@ -1,11 +1,22 @@
 from fastapi import APIRouter, HTTPException, Query, Body, BackgroundTasks
 from typing import List, Dict, Any, Optional
-import os, math, sys
+import os, sys
 from pathlib import Path
 from supabase import Client
 import httpx
 import asyncio
-from services.embeddings import image_bytes_to_vec
+from services.embeddings import images_bytes_to_vecs_async
+from services.match_index import get_match_index, index_report_row, index_report_vector
+from services.photo_embeddings import embed_report_photos, photo_urls, save_photo_embeddings
+from services.geo_index import get_geo_index, index_report_location, fetch_reports_by_ids
+from services.geo_search import search_nearby
+from services.match_search import ReportNotFoundError, ReportWithoutEmbeddingError
+from services.incremental_matcher import (
+    MATCH_MIN_SIMILARITY,
+    MATCH_TOP_K,
+    remove_report_from_matches,
+    update_matches_for_report,
+)
 
 # Agregar la carpeta parent al path para poder importar utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -24,75 +35,41 @@ def _sb() -> Client:
     except Exception as e:
         raise HTTPException(500, f"Error conectando a Supabase: {str(e)}")
 
-def _extract_coords(location_data) -> Optional[tuple]:
-    """Extrae coordenadas de diferentes formatos de location"""
-    if not location_data:
-        return None
-    
-    # Formato PostGIS: "SRID=4326;POINT(lon lat)"
-    if isinstance(location_data, str) and "POINT(" in location_data:
-        try:
-            # Extraer coordenadas del string POINT
-            coords_str = location_data.split("POINT(")[1].split(")")[0]
-            lon, lat = map(float, coords_str.split())
-            return (lat, lon)
-        except:
-            return None
-    
-    # Formato GeoJSON: {"type":"Point","coordinates":[lon,lat]}
-    if isinstance(location_data, dict) and "coordinates" in location_data:
-        try:
-            lon, lat = location_data["coordinates"]
-            return (lat, lon)
-        except:
-            return None
-    
-    return None
-
-def haversine_km(lat1, lon1, lat2, lon2):
-    """Calcula distancia en kilómetros entre dos puntos"""
-    R = 6371.0
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    return 2 * R * math.asin(math.sqrt(a))
-
-async def generate_and_save_embedding(report_id: str, photo_url: str):
+async def generate_and_save_embedding(report_id: str, photos: List[str]):
     """
-    Genera y guarda el embedding de una imagen para un reporte.
-    Se ejecuta en segundo plano para no bloquear la respuesta.
+    Genera y guarda los embeddings de las fotos de un reporte.
+    Todas las fotos se embeben en el mismo lote; se guardan los vectores por
+    foto y su agregado en reports.embedding (ver services/photo_embeddings.py).
     """
+    urls = photo_urls(photos)
+    if not urls:
+        print(f"⚠️ [embedding] Reporte {report_id} sin fotos válidas")
+        return
     max_retries = 3
     for attempt in range(max_retries):
         try:
             if attempt > 0:
                 print(f"🔄 [embedding] Reintento {attempt + 1}/{max_retries} para reporte {report_id}")
             else:
-                print(f"🔄 [embedding] Generando embedding para reporte {report_id} desde {photo_url}")
-            
-            # Descargar la imagen con timeouts aumentados para Windows
-            timeout = httpx.Timeout(60.0, connect=60.0)  # 60s total y para conectar
-            async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-                response = await client.get(photo_url)
-                response.raise_for_status()
-                image_bytes = response.content
-            
-            print(f"🔍 Embedding generado: {len(image_bytes)} bytes de imagen descargados")
+                print(f"🔄 [embedding] Generando embeddings para reporte {report_id} desde {len(urls)} foto(s)")
             
-            # Generar embedding
-            vec = image_bytes_to_vec(image_bytes)
-            vec_list = vec.tolist()
+            # Descargar las fotos en paralelo y embeberlas en un único lote
+            # (no bloquea el event loop; comparte lote con otras peticiones)
+            vec, photo_vecs, errors = await embed_report_photos(urls, images_bytes_to_vecs_async)
+            for error in errors:
+                print(f"⚠️ [embedding] Foto descartada: {error}")
+            if vec is None:
+                raise RuntimeError("ninguna foto pudo procesarse")
             
-            print(f"🔍 Embedding generado: {len(vec_list)} dimensiones")
+            print(f"🔍 Embedding generado: {len(photo_vecs)} foto(s), {len(vec)} dimensiones")
             
-            # Guardar en Supabase directamente (pgvector acepta arrays de Python)
+            # Guardar vectores por foto y agregado en un solo round trip
             sb = _sb()
-            result = sb.table('reports').update({
-                'embedding': vec_list
-            }).eq('id', report_id).execute()
+            saved = await asyncio.to_thread(save_photo_embeddings, sb, [(report_id, vec, photo_vecs)])
             
-            if result.data:
+            if saved:
                 print(f"✅ [embedding] Embedding guardado exitosamente para reporte {report_id}")
+                await asyncio.to_thread(index_report_vector, sb, report_id, vec)
                 
                 # Buscar matches automáticamente después de generar el embedding
                 try:
@@ -118,156 +95,54 @@ async def generate_and_save_embedding(report_id: str, photo_url: str):
             # No lanzar excepción, solo loguear el error
 
 
-async def find_and_save_matches(report_id: str, threshold: float = 0.1, max_matches: int = 10):
+async def find_and_save_matches(report_id: str, threshold: float = MATCH_MIN_SIMILARITY, max_matches: int = MATCH_TOP_K):
     """
-    Busca matches similares para un reporte y los guarda automáticamente.
+    Actualiza incrementalmente los matches de un reporte tras escribir su embedding.
+
+    Solo el vector nuevo se compara contra los candidatos; el reporte entra en
+    las listas top-k de los candidatos donde corresponde y las de ambos lados
+    se recortan a `max_matches` (ver services/incremental_matcher.py).
     """
     try:
         print(f"🔍 [matches] Buscando coincidencias para reporte {report_id}...")
         
         sb = _sb()
-        
-        # Obtener el reporte con su embedding
-        report_result = sb.table("reports")\
-            .select("id, embedding, type, species")\
-            .eq("id", report_id)\
-            .execute()
-        
-        if not report_result.data:
+        try:
+            stats = await asyncio.to_thread(
+                update_matches_for_report,
+                sb,
+                report_id,
+                top_k=max_matches,
+                threshold=threshold
+            )
+        except ReportNotFoundError:
             print(f"⚠️ [matches] Reporte {report_id} no encontrado")
             return
-        
-        report = report_result.data[0]
-        report_embedding = report.get("embedding")
-        report_type = report.get("type")
-        
-        if not report_embedding:
+        except ReportWithoutEmbeddingError:
             print(f"⚠️ [matches] Reporte {report_id} no tiene embedding")
             return
         
-        # Postgrest devuelve vectores como strings JSON, parsearlos
-        if isinstance(report_embedding, str):
-            import json
-            try:
-                report_embedding = json.loads(report_embedding)
-            except Exception as e:
-                print(f"⚠️ [matches] Error parseando embedding: {e}")
-                return
-        
-        # Determinar tipo opuesto para buscar matches
-        opposite_type = "found" if report_type == "lost" else "lost"
-        
-        # Buscar reportes del tipo opuesto con embeddings
-        candidates = sb.table("reports")\
-            .select("id, embedding, species")\
-            .eq("type", opposite_type)\
-            .eq("status", "active")\
-            .not_.is_("embedding", "null")\
-            .execute()
-        
-        if not candidates.data:
-            print(f"ℹ️ [matches] No hay reportes de tipo '{opposite_type}' para comparar")
-            return
-        
-        # Calcular similitud con todos los candidatos
-        import numpy as np
-        base_vec = np.array(report_embedding, dtype=np.float32)
-        
-        matches_found = []
-        for candidate in candidates.data:
-            try:
-                candidate_embedding = candidate.get("embedding")
-                if not candidate_embedding:
-                    continue
-                
-                # Parsear si es string JSON
-                if isinstance(candidate_embedding, str):
-                    try:
-                        candidate_embedding = json.loads(candidate_embedding)
-                    except:
-                        continue
-                
-                candidate_vec = np.array(candidate_embedding, dtype=np.float32)
-                
-                # Similitud coseno (embeddings ya están normalizados)
-                similarity = float(np.dot(base_vec, candidate_vec))
-                
-                if similarity >= threshold:
-                    matches_found.append({
-                        "candidate_id": candidate["id"],
-                        "similarity": similarity,
-                        "species": candidate.get("species")
-                    })
-            except Exception as e:
-                print(f"⚠️ [matches] Error procesando candidato: {e}")
-                continue
-        
-        # Ordenar por similitud descendente y tomar los mejores
-        matches_found.sort(key=lambda x: x["similarity"], reverse=True)
-        matches_found = matches_found[:max_matches]
-        
-        if not matches_found:
+        if not stats["candidates"]:
             print(f"ℹ️ [matches] No se encontraron coincidencias con similitud >= {threshold}")
             return
         
-        # Guardar matches en la base de datos
-        matches_saved = 0
-        for match in matches_found:
-            try:
-                match_data = {
-                    "similarity_score": round(match["similarity"], 4),
-                    "matched_by": "ai_visual",
-                    "status": "pending"
-                }
-                
-                # Configurar IDs según el tipo de reporte
-                if report_type == "lost":
-                    match_data["lost_report_id"] = report_id
-                    match_data["found_report_id"] = match["candidate_id"]
-                else:
-                    match_data["lost_report_id"] = match["candidate_id"]
-                    match_data["found_report_id"] = report_id
-                
-                # Verificar si ya existe el match
-                if report_type == "lost":
-                    existing = sb.table("matches")\
-                        .select("id, similarity_score")\
-                        .eq("lost_report_id", report_id)\
-                        .eq("found_report_id", match["candidate_id"])\
-                        .execute()
-                else:
-                    existing = sb.table("matches")\
-                        .select("id, similarity_score")\
-                        .eq("lost_report_id", match["candidate_id"])\
-                        .eq("found_report_id", report_id)\
-                        .execute()
-                
-                if existing.data:
-                    # Actualizar si la nueva similitud es mejor
-                    existing_match = existing.data[0]
-                    if match["similarity"] > (existing_match.get("similarity_score") or 0):
-                        sb.table("matches")\
-                            .update(match_data)\
-                            .eq("id", existing_match["id"])\
-                            .execute()
-                        matches_saved += 1
-                        print(f"  ✅ [matches] Match actualizado: {match['candidate_id']} (similitud: {match['similarity']:.3f})")
-                else:
-                    # Crear nuevo match
-                    sb.table("matches").insert(match_data).execute()
-                    matches_saved += 1
-                    print(f"  ✅ [matches] Match creado: {match['candidate_id']} (similitud: {match['similarity']:.3f})")
-                    
-            except Exception as e:
-                print(f"⚠️ [matches] Error guardando match: {e}")
-                continue
-        
-        print(f"✅ [matches] {matches_saved} coincidencias guardadas para reporte {report_id}")
+        print(
+            f"✅ [matches] {stats['saved']} coincidencias guardadas para reporte {report_id} "
+            f"({stats['candidates']} candidatos, {stats['pruned']} recortadas)"
+        )
         
     except Exception as e:
         print(f"❌ [matches] Error en búsqueda de matches: {str(e)}")
         # No lanzar excepción, solo loguear el error
 
+
+async def _remove_from_match_lists(sb: Client, report_id: str):
+    """Quita un reporte resuelto o cancelado de las listas de matches de los demás (no crítico)."""
+    try:
+        await asyncio.to_thread(remove_report_from_matches, sb, report_id)
+    except Exception as e:
+        print(f"⚠️ [matches] Error quitando matches pendientes de {report_id}: {str(e)}")
+
 @router.get("/")
 async def get_all_reports():
     """Obtiene todos los reportes activos"""
@@ -282,26 +157,24 @@ async def get_all_reports():
 async def get_nearby_reports(
     lat: float = Query(..., description="Latitud"),
     lng: float = Query(..., description="Longitud"),
-    radius_km: float = Query(10.0, description="Radio en kilómetros")
+    radius_km: float = Query(10.0, description="Radio en kilómetros"),
+    limit: Optional[int] = Query(None, ge=1, description="Cantidad máxima de reportes (los más cercanos)")
 ):
     """Obtiene reportes cercanos a una ubicación"""
     try:
         sb = _sb()
-        result = sb.table("reports").select("*").eq("status", "active").execute()
-        
+        # La búsqueda devuelve los ids ya ordenados por distancia; solo se traen esas filas
+        hits = await asyncio.to_thread(search_nearby, sb, lat, lng, radius_km, limit=limit)
+        reports = await asyncio.to_thread(fetch_reports_by_ids, sb, [report_id for report_id, _ in hits])
+
         nearby_reports = []
-        for report in result.data:
-            coords = _extract_coords(report.get("location"))
-            if coords:
-                report_lat, report_lon = coords
-                distance = haversine_km(lat, lng, report_lat, report_lon)
-                if distance <= radius_km:
-                    report["distance_km"] = round(distance, 2)
-                    nearby_reports.append(report)
-        
-        # Ordenar por distancia
-        nearby_reports.sort(key=lambda x: x["distance_km"])
-        
+        for report_id, distance in hits:
+            report = reports.get(report_id)
+            if not report or report.get("status", "active") != "active":
+                continue
+            report["distance_km"] = round(distance, 2)
+            nearby_reports.append(report)
+
         return {"reports": nearby_reports, "count": len(nearby_reports)}
     except Exception as e:
         raise HTTPException(500, f"Error obteniendo reportes cercanos: {str(e)}")
@@ -346,16 +219,16 @@ async def create_report(
         
         created_report = result.data[0]
         report_id = created_report.get("id")
+        index_report_location(created_report)
         
         # Generar embedding automáticamente si hay fotos (de forma síncrona para asegurar que se guarde)
         photos = created_report.get("photos") or report_data.get("photos", [])
         if GENERATE_EMBEDDINGS_LOCALLY and photos and isinstance(photos, list) and len(photos) > 0:
-            first_photo = photos[0]
-            if first_photo:
+            if photo_urls(photos):
                 print(f"📸 [embedding] Reporte creado con fotos. Generando embedding para reporte {report_id}...")
                 # Generar embedding de forma síncrona para asegurar que se guarde antes de retornar
                 try:
-                    await generate_and_save_embedding(report_id, first_photo)
+                    await generate_and_save_embedding(report_id, photos)
                     print(f"✅ [embedding] Embedding generado y guardado para reporte {report_id}")
                 except Exception as e:
                     print(f"⚠️ [embedding] Error generando embedding (no crítico): {str(e)}")
@@ -379,12 +252,18 @@ async def update_report(
     try:
         sb = _sb()
         
-        # Obtener el reporte actual para verificar si tiene embedding
-        current_result = sb.table("reports").select("id, photos, embedding").eq("id", report_id).execute()
-        current_report = current_result.data[0] if current_result.data else None
-        
-        if not current_report:
-            raise HTTPException(404, "Reporte no encontrado")
+        # Verificar si existe y si ya tiene embedding sin descargar el vector:
+        # el filtro not-null se resuelve en la base y solo viaja el id
+        current_result = sb.table("reports")\
+            .select("id")\
+            .eq("id", report_id)\
+            .not_.is_("embedding", "null")\
+            .execute()
+        has_embedding = bool(current_result.data)
+        if not has_embedding:
+            exists = sb.table("reports").select("id").eq("id", report_id).execute()
+            if not exists.data:
+                raise HTTPException(404, "Reporte no encontrado")
         
         # Actualizar reporte
         result = sb.table("reports").update(updates).eq("id", report_id).execute()
@@ -393,20 +272,20 @@ async def update_report(
             raise HTTPException(404, "Reporte no encontrado")
         
         updated_report = result.data[0]
+        index_report_row(updated_report)
+        index_report_location(updated_report)
         
         # Generar embedding si:
         # 1. Hay fotos nuevas o actualizadas
         # 2. El reporte no tiene embedding aún
         photos = updated_report.get("photos") or updates.get("photos", [])
-        has_embedding = current_report.get("embedding") is not None
         
         if GENERATE_EMBEDDINGS_LOCALLY and photos and isinstance(photos, list) and len(photos) > 0:
-            first_photo = photos[0]
-            if first_photo and (not has_embedding or "photos" in updates):
+            if photo_urls(photos) and (not has_embedding or "photos" in updates):
                 print(f"📸 [embedding] Reporte actualizado con fotos. Generando embedding para reporte {report_id}...")
                 # Generar embedding de forma síncrona para asegurar que se guarde
                 try:
-                    await generate_and_save_embedding(report_id, first_photo)
+                    await generate_and_save_embedding(report_id, photos)
                     print(f"✅ [embedding] Embedding generado y guardado para reporte {report_id}")
                 except Exception as e:
                     print(f"⚠️ [embedding] Error generando embedding (no crítico): {str(e)}")
@@ -430,6 +309,10 @@ async def delete_report(report_id: str):
         if not result.data:
             raise HTTPException(404, "Reporte no encontrado")
         
+        get_match_index().remove(report_id)
+        get_geo_index().remove(report_id)
+        await _remove_from_match_lists(sb, report_id)
+        
         return {"message": "Reporte eliminado exitosamente"}
     except Exception as e:
         if "404" in str(e):
@@ -449,6 +332,10 @@ async def resolve_report(report_id: str):
         if not result.data:
             raise HTTPException(404, "Reporte no encontrado")
         
+        get_match_index().remove(report_id)
+        get_geo_index().remove(report_id)
+        await _remove_from_match_lists(sb, report_id)
+        
         return {"report": result.data[0], "message": "Reporte marcado como resuelto"}
     except Exception as e:
         if "404" in str(e):
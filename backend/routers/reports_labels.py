@@ -23,7 +23,9 @@ def save_labels(report_id: str = Path(...), payload: Dict[str, Any] = Body(...))
         raise HTTPException(400, "Se espera {'labels': [...]}")
 
     sb = _sb()
+    # El trigger de la migración 016 interna las etiquetas y completa label_ids
+    # en la misma escritura, así las búsquedas no vuelven a parsear el JSON
     res = sb.table("reports").update({"labels": payload}).eq("id", report_id).execute()
     if not res.data:
         raise HTTPException(404, "Reporte no encontrado")
-    return {"ok": True, "updated": res.data[0]["id"]}
\ No newline at end of file
+    return {"ok": True, "updated": res.data[0]["id"], "label_ids": res.data[0].get("label_ids")}
\ No newline at end of file
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Chequeo de paridad de los backends de inferencia de MegaDescriptor.
+
+Embebe las mismas imágenes con cada backend (fp32, traced, compiled, int8,
+bf16), informa la desviación coseno contra fp32 y la latencia por imagen, y
+recomienda el backend más rápido cuya desviación máxima no supera
+EMBEDDING_MAX_DRIFT. El resultado se configura con EMBEDDING_BACKEND.
+
+Uso:
+    python scripts/check_inference_backends.py fotos/*.jpg --json paridad.json
+    python scripts/check_inference_backends.py --synthetic 16 --backends fp32,int8
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+ENV_PATH = Path(__file__).resolve().parent.parent / ".env"
+load_dotenv(dotenv_path=ENV_PATH, override=False)
+
+# Agregar el directorio backend al path
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import numpy as np
+
+EMBEDDING_MAX_DRIFT = float(os.getenv("EMBEDDING_MAX_DRIFT", "0.005"))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compara los backends de inferencia contra fp32")
+    parser.add_argument("images", nargs="*", help="Imágenes de prueba (idealmente fotos reales de mascotas)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Cantidad de imágenes sintéticas si no se pasan archivos")
+    parser.add_argument("--backends", default=None, help="Lista separada por comas (default: todos)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Imágenes por forward pass")
+    parser.add_argument("--repeats", type=int, default=3, help="Repeticiones para medir latencia")
+    parser.add_argument("--max-drift", type=float, default=EMBEDDING_MAX_DRIFT, help="Desviación coseno máxima aceptada")
+    parser.add_argument("--json", default=None, help="Archivo donde guardar el reporte")
+    return parser.parse_args()
+
+def _synthetic_images(count: int):
+    """JPEGs con ruido suave: no son fotos reales, solo sirven para medir latencia"""
+    import io
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, size=(96, 128, 3), dtype=np.uint8)
+        img = Image.fromarray(pixels).resize((1024, 768), Image.BICUBIC)
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+def main():
+    args = parse_args()
+
+    from services.embeddings import DEVICE, MODEL_NAME
+    from services.image_preprocess import MODEL_INPUT_SIZE, preprocess_array
+    from services.inference_backends import BACKENDS, parity_report, pick_fastest
+    import timm
+
+    images = [Path(path).read_bytes() for path in args.images]
+    if not images:
+        images = _synthetic_images(args.synthetic or 8)
+    tensors = [preprocess_array(image_bytes) for image_bytes in images]
+    backends = [b.strip() for b in args.backends.split(",")] if args.backends else list(BACKENDS)
+
+    print("=" * 60)
+    print(f"🔬 PARIDAD DE BACKENDS ({len(tensors)} imágenes, {DEVICE})")
+    print("=" * 60)
+
+    model = timm.create_model(MODEL_NAME, pretrained=True, num_classes=0).to(DEVICE).eval()
+    report = parity_report(
+        model, tensors, MODEL_INPUT_SIZE, DEVICE,
+        backends=backends, batch_size=args.batch_size, repeats=args.repeats
+    )
+
+    for entry in report:
+        if "error" in entry:
+            print(f"   {entry['backend']:>9}: ❌ {entry['error']}")
+            continue
+        effective = "" if entry["effective_backend"] == entry["backend"] else f" (usó {entry['effective_backend']})"
+        print(f"   {entry['backend']:>9}: {entry['ms_per_image']:>9.2f} ms/img  "
+              f"drift medio {entry['drift']['mean']:.2e}  máx {entry['drift']['max']:.2e}{effective}")
+
+    best = pick_fastest(report, args.max_drift)
+    print("=" * 60)
+    if best:
+        print(f"✅ Recomendado: EMBEDDING_BACKEND={best} (drift máx <= {args.max_drift})")
+    else:
+        print(f"⚠️ Ningún backend quedó bajo el drift máximo {args.max_drift}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "device": DEVICE,
+            "images": len(tensors),
+            "max_drift": args.max_drift,
+            "recommended": best,
+            "backends": report,
+        }, indent=2))
+        print(f"📝 Reporte guardado en {args.json}")
+
+if __name__ == "__main__":
+    main()
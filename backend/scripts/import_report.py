@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Reporte del costo de importar la app (o cualquier módulo del backend).
+
+Importa el módulo en un proceso nuevo con `python -X importtime` y muestra el
+tiempo total, los paquetes de primer nivel más pesados, la memoria máxima del
+proceso y si se cargó el stack de ML (torch/timm/torchvision). Con --fail-on-ml
+termina con código 1 si importar el módulo carga torch: sirve como chequeo en
+CI para que las rutas sin inferencia sigan arrancando sin el modelo.
+
+Uso (desde backend/):
+    python scripts/import_report.py
+    python scripts/import_report.py --module routers.reports --top 10 --fail-on-ml
+    python scripts/import_report.py --json import.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+backend_dir = Path(__file__).resolve().parent.parent
+
+ML_MODULES = ("torch", "timm", "torchvision")
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """
+    Líneas de `-X importtime` -> [{"module", "self_us", "cumulative_us", "depth"}].
+    depth 0 = importado directamente por el módulo raíz del proceso.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            entries.append({
+                "module": name.strip(),
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            })
+        except ValueError:
+            continue
+    return entries
+
+
+def summarize(entries: List[Dict[str, Any]], module: str, top: int = 15) -> Dict[str, Any]:
+    """Total del módulo, paquetes de primer nivel más pesados y módulos de ML cargados."""
+    root = next((e for e in entries if e["module"] == module and e["depth"] == 0), None)
+    packages: Dict[str, int] = {}
+    for entry in entries:
+        package = entry["module"].split(".")[0]
+        packages[package] = packages.get(package, 0) + entry["self_us"]
+    loaded = {e["module"] for e in entries}
+    return {
+        "module": module,
+        "total_ms": round(root["cumulative_us"] / 1000, 1) if root else None,
+        "modules": len(entries),
+        "ml_stack_loaded": [name for name in ML_MODULES if name in loaded],
+        "heaviest_packages": [
+            {"package": name, "self_ms": round(us / 1000, 1)}
+            for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ],
+    }
+
+
+def run(module: str, env: Dict[str, str], top: int = 15) -> Dict[str, Any]:
+    """Importa `module` en un proceso nuevo y devuelve el resumen (incluye la memoria máxima)."""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"No se pudo importar {module}:\n" + "\n".join(errors[-20:]))
+    report = summarize(parse_importtime(completed.stderr), module, top)
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss está en KB en Linux; si otro hijo previo tuvo más memoria no se puede separar
+    report["max_rss_mb"] = round(max_rss / 1024, 1) if max_rss > before else None
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tiempo y memoria de importar la app")
+    parser.add_argument("--module", default="main", help="Módulo a importar (default: main)")
+    parser.add_argument("--top", type=int, default=15, help="Paquetes más pesados a mostrar")
+    parser.add_argument("--json", default=None, help="Archivo donde guardar el reporte")
+    parser.add_argument("--fail-on-ml", action="store_true", help="Código 1 si la importación carga torch/timm")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    report = run(args.module, env, args.top)
+
+    print("=" * 60)
+    print(f"📦 import {report['module']}: {report['total_ms']} ms, {report['modules']} módulos, "
+          f"memoria máx. {report['max_rss_mb']} MB")
+    print("=" * 60)
+    for item in report["heaviest_packages"]:
+        print(f"   {item['package']:<28} {item['self_ms']:>9.1f} ms")
+    if report["ml_stack_loaded"]:
+        print(f"⚠️ Se cargó el stack de ML: {', '.join(report['ml_stack_loaded'])}")
+    else:
+        print("✅ Sin torch/timm: el stack de ML se carga en la primera inferencia")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"📝 Reporte guardado en {args.json}")
+    if args.fail_on_ml and report["ml_stack_loaded"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
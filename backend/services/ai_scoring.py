@@ -0,0 +1,168 @@
+# backend/services/ai_scoring.py
+"""
+Puntuación híbrida de candidatos para /ai-search/.
+
+En lugar de recorrer los candidatos calculando cada componente fila por fila
+(incluido un datetime.fromisoformat por reporte), el conjunto de candidatos se
+convierte una sola vez a arreglos numpy y las cuatro puntuaciones (visual,
+color, ubicación y antigüedad) y el total ponderado se calculan en bloque.
+El top final se elige con np.argpartition en lugar de ordenar todo. Las
+similitudes de etiquetas y colores comparan los ids del vocabulario
+(services/label_vocab.py) en lugar de sets de strings.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.label_vocab import (
+    COLOR_IDS_FIELD,
+    LABEL_IDS_FIELD,
+    TermColumn,
+    color_set,
+    label_set,
+    query_term_ids,
+)
+
+# Pesos del total: 40% visual, 30% colores, 20% proximidad, 10% antigüedad
+VISUAL_WEIGHT = 0.4
+COLOR_WEIGHT = 0.3
+LOCATION_WEIGHT = 0.2
+TIME_WEIGHT = 0.1
+
+MIN_TOTAL_SCORE = 30.0  # Umbral mínimo de relevancia
+MAX_RESULTS = 20
+
+# Puntuación por antigüedad: (días máximos, puntuación); más viejo = 40, inválido = 50
+_TIME_BUCKETS = ((1, 100.0), (7, 80.0), (30, 60.0))
+_TIME_SCORE_OLD = 40.0
+_TIME_SCORE_UNKNOWN = 50.0
+
+
+def location_scores(distances_km: np.ndarray, max_distance_km: float) -> np.ndarray:
+    """Puntuación de ubicación: 100 en el centro y decrece linealmente hasta 0 en el radio."""
+    d = np.asarray(distances_km, dtype=np.float64)
+    if max_distance_km <= 0:
+        return np.where(d <= 0, 100.0, 0.0)
+    linear = np.maximum(0.0, 100.0 - (d / max_distance_km) * 100.0)
+    return np.where(d <= 0, 100.0, np.where(d >= max_distance_km, 0.0, linear))
+
+
+def _parse_timestamps(values: Sequence[Any]) -> np.ndarray:
+    """
+    Convierte created_at (ISO 8601 de Supabase, o datetime) a segundos UTC.
+    Se parsea el arreglo completo con numpy; los valores inválidos quedan en NaN.
+    """
+    n = len(values)
+    seconds = np.full(n, np.nan)
+    texts: List[str] = []
+    rows: List[int] = []
+    for i, value in enumerate(values):
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            seconds[i] = value.timestamp()
+        elif isinstance(value, str) and value:
+            texts.append(value)
+            rows.append(i)
+    if not texts:
+        return seconds
+
+    # numpy no acepta el offset: se separa "YYYY-MM-DDTHH:MM:SS" de ".ffffff+HH:MM"/"Z"
+    # (las fracciones de segundo no cambian la puntuación, que es por días)
+    bare = np.array([t[:19] for t in texts])
+    offsets = np.zeros(len(texts))
+    for j, text in enumerate(texts):
+        tail = text[19:].lstrip(".0123456789")
+        if tail[:1] in ("+", "-") and len(tail) >= 6:
+            sign = 1.0 if tail[0] == "+" else -1.0
+            offsets[j] = sign * (int(tail[1:3]) * 3600 + int(tail[4:6]) * 60)
+    try:
+        parsed = bare.astype("datetime64[us]")
+    except ValueError:
+        parsed = np.array([_safe_datetime64(t) for t in bare], dtype="datetime64[us]")
+    epoch = parsed.astype(np.int64) / 1e6
+    epoch[np.isnat(parsed)] = np.nan
+    seconds[np.asarray(rows)] = epoch - offsets
+    return seconds
+
+
+def _safe_datetime64(text: str) -> np.datetime64:
+    try:
+        return np.datetime64(text, "us")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def time_scores(created_at: Sequence[Any], now: Optional[datetime] = None) -> np.ndarray:
+    """Puntuación por antigüedad: los reportes más recientes puntúan más."""
+    now_ts = (now or datetime.now(timezone.utc)).timestamp()
+    seconds = _parse_timestamps(created_at)
+    days_old = np.floor((now_ts - seconds) / 86400.0)
+    scores = np.full(seconds.shape[0], _TIME_SCORE_OLD)
+    for max_days, score in reversed(_TIME_BUCKETS):
+        scores[days_old <= max_days] = score
+    scores[np.isnan(seconds)] = _TIME_SCORE_UNKNOWN
+    return scores
+
+
+def score_candidates(
+    candidates: Sequence[Dict[str, Any]],
+    distances_km: Sequence[float],
+    query_labels: set,
+    query_colors: set,
+    radius_km: float,
+    now: Optional[datetime] = None,
+    sb=None,
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula en bloque las puntuaciones de todos los candidatos.
+
+    Args:
+        candidates: Filas de `reports` (label_ids/labels, color_ids/colors, created_at)
+        distances_km: Distancia de cada candidato al usuario
+        query_labels: Etiquetas de la imagen buscada (ver label_set)
+        query_colors: Colores de la imagen buscada (ver color_set)
+        radius_km: Radio de búsqueda (distancia a la que la ubicación puntúa 0)
+        now: Momento de referencia para la antigüedad (por defecto ahora)
+        sb: Cliente de Supabase para resolver los términos de la consulta en el
+            vocabulario (services/label_vocab.py); sin cliente solo se usa la caché
+
+    Returns:
+        Dict con arreglos "visual", "color", "location", "time" y "total"
+    """
+    label_ids = query_term_ids(sb, query_labels)
+    color_ids = query_term_ids(sb, query_colors)
+    visual = TermColumn.from_rows(candidates, LABEL_IDS_FIELD, "labels", label_set, label_ids).jaccard(label_ids)
+    color = TermColumn.from_rows(candidates, COLOR_IDS_FIELD, "colors", color_set, color_ids).jaccard(color_ids)
+    location = location_scores(np.asarray(distances_km, dtype=np.float64), radius_km)
+    age = time_scores([c.get("created_at") for c in candidates], now)
+    total = (
+        visual * VISUAL_WEIGHT
+        + color * COLOR_WEIGHT
+        + location * LOCATION_WEIGHT
+        + age * TIME_WEIGHT
+    )
+    return {"visual": visual, "color": color, "location": location, "time": age, "total": total}
+
+
+def select_top(
+    total: np.ndarray,
+    k: int = MAX_RESULTS,
+    min_score: float = MIN_TOTAL_SCORE,
+) -> Tuple[np.ndarray, int]:
+    """
+    Índices de los k mejores totales que superan `min_score`, de mayor a menor
+    (a igual total se respeta el orden original).
+
+    Returns:
+        (índices, cantidad de candidatos que superan el umbral)
+    """
+    passing = np.flatnonzero(total >= min_score)
+    n_passing = int(passing.size)
+    if n_passing == 0 or k <= 0:
+        return passing[:0], n_passing
+    if n_passing > k:
+        passing = passing[np.argpartition(-total[passing], k - 1)[:k]]
+    order = np.lexsort((passing, -total[passing]))
+    return passing[order], n_passing
@@ -0,0 +1,662 @@
+# backend/services/backfill.py
+"""
+Pipeline de backfill/regeneración de embeddings.
+
+Reemplaza el procesamiento reporte por reporte de los scripts (descargar,
+decodificar, inferir y escribir en serie con pausas) por cuatro etapas que
+corren en paralelo, conectadas por colas acotadas (backpressure):
+
+    fuente (páginas de reports) -> descarga (N conexiones concurrentes)
+        -> decodificación/preprocesamiento (pool de threads)
+        -> inferencia en lotes (un forward pass por lote)
+        -> escritura en lote (una RPC por lote)
+
+Cada reporte viaja con todas sus fotos (hasta PHOTO_EMBEDDINGS_MAX_PHOTOS):
+las fotos comparten forward pass y se escriben los vectores por foto junto con
+el agregado (services/photo_embeddings.py). Las etapas de descarga,
+decodificación e inferencia cuentan fotos; la de escritura, reportes.
+
+Las imágenes que ya están en la caché de embeddings saltan la inferencia.
+Con INFERENCE_SERVER_SOCKET (services/inference_client.py) la decodificación
+solo consulta la caché y la etapa de inferencia manda los bytes al servidor
+compartido: el proceso que corre el backfill (p.ej. un worker de uvicorn) no
+carga una segunda copia del modelo.
+El progreso se guarda en un checkpoint JSON (último id con todo lo anterior
+terminado), así que una corrida interrumpida se retoma sin repetir trabajo.
+Los ids que fallaron quedan en el checkpoint; con retry_failed la corrida
+siguiente los vuelve a procesar antes de seguir desde el último id.
+"""
+import asyncio
+import inspect
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+
+import httpx
+import numpy as np
+
+from services.inference_client import get_inference_client
+from services.photo_embeddings import PhotoVector, aggregate_embeddings, photo_urls, save_photo_embeddings
+from utils.supabase_client import select_in_chunks
+from utils.vector_codec import register_vector
+
+BACKFILL_DOWNLOAD_CONCURRENCY = max(1, int(os.getenv("BACKFILL_DOWNLOAD_CONCURRENCY", "16")))
+BACKFILL_DECODE_WORKERS = max(1, int(os.getenv("BACKFILL_DECODE_WORKERS", str(min(4, os.cpu_count() or 1)))))
+BACKFILL_BATCH_SIZE = max(1, int(os.getenv("BACKFILL_BATCH_SIZE", "16")))
+BACKFILL_WRITE_BATCH_SIZE = max(1, int(os.getenv("BACKFILL_WRITE_BATCH_SIZE", "50")))
+BACKFILL_QUEUE_SIZE = max(1, int(os.getenv("BACKFILL_QUEUE_SIZE", "64")))
+BACKFILL_PAGE_SIZE = 500
+BACKFILL_DOWNLOAD_RETRIES = 3
+
+MODES = ("missing", "all")
+
+# Tiempo máximo que una etapa espera para completar un lote parcial
+_BATCH_WAIT_SECONDS = 0.05
+_WRITE_FLUSH_SECONDS = 1.0
+_MAX_FAILED_IDS = 1000
+
+
+# (report_id, vector agregado, vectores por foto)
+WriteItem = Tuple[str, np.ndarray, List[PhotoVector]]
+
+
+# =========================
+# Fuentes / destinos
+# =========================
+class SupabaseBackfillStore:
+    """Lee reportes y escribe embeddings vía PostgREST (cliente compartido de Supabase)."""
+
+    def __init__(self, sb):
+        self.sb = sb
+
+    def fetch_page(self, mode: str, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        query = self.sb.table("reports").select("id, photos").not_.is_("photos", "null")
+        if mode == "missing":
+            query = query.is_("embedding", "null")
+        if after_id:
+            query = query.gt("id", after_id)
+        return query.order("id").limit(limit).execute().data or []
+
+    def fetch_ids(self, ids: List[str]) -> List[Dict[str, Any]]:
+        return select_in_chunks(self.sb, "reports", "id, photos", "id", ids)
+
+    def write_embeddings(self, items: List[WriteItem]) -> int:
+        return save_photo_embeddings(self.sb, items)
+
+
+class PostgresBackfillStore:
+    """Lee reportes y escribe embeddings con psycopg (DATABASE_URL), en formato binario."""
+
+    def __init__(self, dsn: str):
+        import psycopg
+
+        self.conn = psycopg.connect(dsn, autocommit=True)
+        register_vector(self.conn)
+
+    def fetch_page(self, mode: str, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        where = ["photos is not null", "jsonb_array_length(photos) > 0"]
+        if mode == "missing":
+            where.append("embedding is null")
+        params: List[Any] = []
+        if after_id:
+            where.append("id > %s::uuid")
+            params.append(after_id)
+        params.append(limit)
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f"select id::text, photos from public.reports where {' and '.join(where)} order by id limit %s",
+                params
+            )
+            return [{"id": rid, "photos": photos} for rid, photos in cur.fetchall()]
+
+    def fetch_ids(self, ids: List[str]) -> List[Dict[str, Any]]:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "select id::text, photos from public.reports where id = any(%s::uuid[]) order by id",
+                (list(ids),)
+            )
+            return [{"id": rid, "photos": photos} for rid, photos in cur.fetchall()]
+
+    def write_embeddings(self, items: List[WriteItem]) -> int:
+        with self.conn.transaction(), self.conn.cursor() as cur:
+            cur.execute(
+                "delete from public.report_photo_embeddings where report_id = any(%s::uuid[])",
+                ([report_id for report_id, _, _ in items],)
+            )
+            cur.executemany(
+                "insert into public.report_photo_embeddings (report_id, photo_index, photo_url, embedding) "
+                "values (%s::uuid, %s, %s, %s)",
+                [(report_id, index, url, photo_vec)
+                 for report_id, _, photos in items for index, url, photo_vec in photos]
+            )
+            cur.executemany(
+                "update public.reports set embedding = %s where id = %s::uuid",
+                [(vec, report_id) for report_id, vec, _ in items]
+            )
+        return len(items)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+# =========================
+# Estadísticas y checkpoint
+# =========================
+def _write_item(report_id: str, photos: List[PhotoVector]) -> WriteItem:
+    return report_id, aggregate_embeddings([vec for _, _, vec in photos]), photos
+
+
+class StageStats:
+    """Contadores de una etapa del pipeline."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def as_dict(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "failed": self.failed,
+            "items_per_sec": round(self.items / elapsed, 2) if elapsed > 0 else None,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "busy_items_per_sec": round(self.items / self.busy_seconds, 2) if self.busy_seconds > 0 else None,
+        }
+
+
+class Checkpoint:
+    """Archivo JSON con el avance de una corrida (escritura atómica)."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = Path(path) if path else None
+
+    def load(self, mode: str) -> Dict[str, Any]:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text())
+        except Exception as e:
+            print(f"⚠️ [backfill] Checkpoint ilegible ({self.path}): {e}; se empieza de cero")
+            return {}
+        if data.get("mode") != mode:
+            print(f"ℹ️ [backfill] Checkpoint de otro modo ({data.get('mode')}); se ignora")
+            return {}
+        return data
+
+    def save(self, data: Dict[str, Any]) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+
+
+class _Watermark:
+    """Último id (en orden de la fuente) tal que todos los anteriores ya terminaron."""
+
+    def __init__(self, start: Optional[str]):
+        self.value = start
+        self._pending: Deque[str] = deque()
+        self._dispatched: Set[str] = set()
+        self._done: Set[str] = set()
+
+    def dispatch(self, report_id: str) -> None:
+        self._pending.append(report_id)
+        self._dispatched.add(report_id)
+
+    def complete(self, report_id: str) -> None:
+        # Los reintentos de ids fallidos no se despacharon: no mueven la marca
+        if report_id not in self._dispatched:
+            return
+        self._dispatched.discard(report_id)
+        self._done.add(report_id)
+        while self._pending and self._pending[0] in self._done:
+            self.value = self._pending.popleft()
+            self._done.discard(self.value)
+
+
+# =========================
+# Pipeline
+# =========================
+class BackfillPipeline:
+    """
+    Pipeline concurrente de generación de embeddings.
+
+    Args:
+        store: Fuente/destino (SupabaseBackfillStore o PostgresBackfillStore)
+        mode: 'missing' (solo reportes sin embedding) o 'all' (regenerar todos)
+        checkpoint_path: Archivo de checkpoint; None = sin checkpoint
+        limit: Máximo de reportes a procesar en esta corrida
+        retry_failed: Reprocesar primero los ids fallidos guardados en el checkpoint
+        on_written: Callback opcional (report_id, vector) tras cada escritura exitosa.
+            Puede ser async: los de un lote corren en paralelo y la escritura del
+            lote siguiente espera a que terminen (nada queda suelto al terminar)
+    """
+
+    def __init__(
+        self,
+        store,
+        mode: str = "missing",
+        checkpoint_path: Optional[str] = None,
+        download_concurrency: int = BACKFILL_DOWNLOAD_CONCURRENCY,
+        decode_workers: int = BACKFILL_DECODE_WORKERS,
+        batch_size: int = BACKFILL_BATCH_SIZE,
+        write_batch_size: int = BACKFILL_WRITE_BATCH_SIZE,
+        queue_size: int = BACKFILL_QUEUE_SIZE,
+        limit: Optional[int] = None,
+        report_every: float = 10.0,
+        retry_failed: bool = False,
+        on_written: Optional[Callable[[str, np.ndarray], Union[None, Awaitable[None]]]] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Modo inválido: {mode} (usar {', '.join(MODES)})")
+        self.store = store
+        self.mode = mode
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.download_concurrency = download_concurrency
+        self.decode_workers = decode_workers
+        self.batch_size = batch_size
+        self.write_batch_size = write_batch_size
+        self.queue_size = queue_size
+        self.limit = limit
+        self.report_every = report_every
+        self.retry_failed = retry_failed
+        self.on_written = on_written
+
+        self.stats = {name: StageStats(name) for name in ("download", "decode", "inference", "write")}
+        self.discovered = 0
+        self.skipped = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.failed_ids: List[str] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = asyncio.Event()
+        self._watermark = _Watermark(None)
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._exhausted = False
+        self._inference_client = None
+
+    # -- API pública --
+
+    def cancel(self) -> None:
+        """Deja de leer reportes nuevos; lo que ya está en curso termina y se guarda."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado actual: contadores, throughput por etapa y profundidad de colas."""
+        end = self.finished_at or time.monotonic()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        processed = self.succeeded + self.failed
+        return {
+            "mode": self.mode,
+            "discovered": self.discovered,
+            "processed": processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "cache_hits": self.cache_hits,
+            "elapsed_seconds": round(elapsed, 2),
+            "reports_per_sec": round(processed / elapsed, 2) if elapsed > 0 else None,
+            "checkpoint_id": self._watermark.value,
+            "stages": {name: stage.as_dict(elapsed) for name, stage in self.stats.items()},
+            "queues": {name: q.qsize() for name, q in self._queues.items()},
+        }
+
+    async def run(self) -> Dict[str, Any]:
+        """Ejecuta el pipeline hasta agotar la fuente, alcanzar `limit` o ser cancelado."""
+        state = self.checkpoint.load(self.mode)
+        start_after = state.get("last_id")
+        if start_after:
+            print(f"↩️ [backfill] Retomando después de {start_after}")
+        self._watermark = _Watermark(start_after)
+        retry_ids: List[str] = []
+        if self.retry_failed:
+            # Se reintentan; los que vuelvan a fallar se agregan de nuevo
+            retry_ids = list(state.get("failed_ids", []))
+            self.failed_ids = []
+            if retry_ids:
+                print(f"🔁 [backfill] Reintentando {len(retry_ids)} reportes fallidos")
+        else:
+            self.failed_ids = list(state.get("failed_ids", []))
+
+        self._queues = {
+            "download": asyncio.Queue(self.queue_size),
+            "decode": asyncio.Queue(self.queue_size),
+            "inference": asyncio.Queue(self.queue_size),
+            "write": asyncio.Queue(self.queue_size),
+        }
+        self._inference_client = get_inference_client()
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        decode_pool = ThreadPoolExecutor(self.decode_workers, thread_name_prefix="backfill-decode")
+        limits = httpx.Limits(
+            max_connections=self.download_concurrency,
+            max_keepalive_connections=self.download_concurrency
+        )
+        reporter = asyncio.create_task(self._report_loop())
+        try:
+            async with httpx.AsyncClient(
+                timeout=httpx.Timeout(60.0, connect=10.0),
+                limits=limits,
+                follow_redirects=True
+            ) as client:
+                await asyncio.gather(
+                    self._produce(start_after, retry_ids),
+                    self._stage(
+                        [self._download_worker(client) for _ in range(self.download_concurrency)],
+                        self._queues["decode"], self.decode_workers
+                    ),
+                    self._stage(
+                        [self._decode_worker(decode_pool) for _ in range(self.decode_workers)],
+                        self._queues["inference"], 1,
+                        also=(self._queues["write"], 1)
+                    ),
+                    self._stage([self._inference_worker()], self._queues["write"], 1),
+                    self._write_worker(expected_sentinels=2),
+                )
+        finally:
+            reporter.cancel()
+            decode_pool.shutdown(wait=False)
+            self.finished_at = time.monotonic()
+            if self._exhausted and not self.failed:
+                # Corrida completa: la próxima vuelve a empezar desde el principio
+                self.checkpoint.clear()
+            else:
+                self._save_checkpoint()
+
+        summary = self.snapshot()
+        print(f"✅ [backfill] {summary['succeeded']} ok, {summary['failed']} fallidos, "
+              f"{summary['skipped']} sin foto en {summary['elapsed_seconds']}s "
+              f"({summary['reports_per_sec']} reportes/s)")
+        for name, stage in summary["stages"].items():
+            print(f"   {name:>9}: {stage['items']} items, {stage['items_per_sec']} items/s, "
+                  f"{stage['busy_seconds']}s ocupada")
+        return summary
+
+    # -- etapas --
+
+    async def _stage(self, workers, next_queue: asyncio.Queue, downstream: int, also=None) -> None:
+        """Espera a los workers de una etapa y propaga el fin a la siguiente."""
+        await asyncio.gather(*workers)
+        for _ in range(downstream):
+            await next_queue.put(None)
+        if also is not None:
+            queue, count = also
+            for _ in range(count):
+                await queue.put(None)
+
+    async def _enqueue(self, row: Dict[str, Any], track: bool = True) -> None:
+        report_id = row["id"]
+        self.discovered += 1
+        if track:
+            self._watermark.dispatch(report_id)
+        urls = photo_urls(row.get("photos"))
+        if not urls:
+            self.skipped += 1
+            self._watermark.complete(report_id)
+            return
+        await self._queues["download"].put((report_id, urls))
+
+    async def _produce(self, after_id: Optional[str], retry_ids: Optional[List[str]] = None) -> None:
+        queue = self._queues["download"]
+        retried = set(retry_ids or ())
+        try:
+            if retry_ids:
+                # Ids fallidos de corridas anteriores: no avanzan la marca del checkpoint
+                for row in await asyncio.to_thread(self.store.fetch_ids, retry_ids):
+                    if self.cancelled or (self.limit is not None and self.discovered >= self.limit):
+                        return
+                    await self._enqueue(row, track=False)
+            while not self.cancelled:
+                page = await asyncio.to_thread(self.store.fetch_page, self.mode, after_id, BACKFILL_PAGE_SIZE)
+                if not page:
+                    break
+                for row in page:
+                    if self.cancelled or (self.limit is not None and self.discovered >= self.limit):
+                        return
+                    after_id = row["id"]
+                    if after_id not in retried:  # ya encolado como reintento
+                        await self._enqueue(row)
+                if len(page) < BACKFILL_PAGE_SIZE:
+                    break
+            self._exhausted = not self.cancelled
+        finally:
+            for _ in range(self.download_concurrency):
+                await queue.put(None)
+
+    async def _download_worker(self, client: httpx.AsyncClient) -> None:
+        inbox, outbox, stats = self._queues["download"], self._queues["decode"], self.stats["download"]
+        while (item := await inbox.get()) is not None:
+            report_id, urls = item
+            started = time.monotonic()
+            try:
+                results = await asyncio.gather(
+                    *(self._download(client, url) for _, url in urls), return_exceptions=True
+                )
+            finally:
+                stats.busy_seconds += time.monotonic() - started
+            photos = []
+            for (index, url), content in zip(urls, results):
+                if isinstance(content, Exception):
+                    stats.failed += 1
+                    print(f"⚠️ [backfill] {report_id}: foto {index} descartada ({content})")
+                else:
+                    stats.items += 1
+                    photos.append((index, url, content))
+            if not photos:
+                self._fail(report_id, f"descarga: {results[0]}")
+                continue
+            await outbox.put((report_id, photos))
+
+    async def _download(self, client: httpx.AsyncClient, url: str) -> bytes:
+        for attempt in range(BACKFILL_DOWNLOAD_RETRIES):
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+                return response.content
+            except (httpx.TimeoutException, httpx.TransportError):
+                if attempt == BACKFILL_DOWNLOAD_RETRIES - 1:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def _decode_worker(self, pool: ThreadPoolExecutor) -> None:
+        from services.embeddings import cached_embedding, preprocess_image
+
+        remote = self._inference_client is not None
+
+        def decode(photos):
+            """
+            (index, url, key, vector en caché o None, entrada del modelo o None) por
+            foto, o la excepción. La entrada es el tensor preprocesado, o los bytes
+            tal cual si la inferencia la hace el servidor compartido.
+            """
+            entries = []
+            for index, url, image_bytes in photos:
+                try:
+                    key, cached = cached_embedding(image_bytes)
+                    if cached is not None:
+                        payload = None
+                    else:
+                        payload = image_bytes if remote else preprocess_image(image_bytes)
+                    entries.append((index, url, key, cached, payload))
+                except Exception as e:
+                    entries.append(e)
+            return entries
+
+        loop = asyncio.get_running_loop()
+        inbox, stats = self._queues["decode"], self.stats["decode"]
+        while (item := await inbox.get()) is not None:
+            report_id, photos = item
+            started = time.monotonic()
+            try:
+                decoded = await loop.run_in_executor(pool, decode, photos)
+            finally:
+                stats.busy_seconds += time.monotonic() - started
+            entries = [entry for entry in decoded if not isinstance(entry, Exception)]
+            stats.failed += len(decoded) - len(entries)
+            stats.items += len(entries)
+            if not entries:
+                self._fail(report_id, f"imagen inválida: {decoded[0]}")
+                continue
+            self.cache_hits += sum(1 for entry in entries if entry[3] is not None)
+            if all(entry[3] is not None for entry in entries):
+                await self._queues["write"].put(
+                    _write_item(report_id, [(index, url, cached) for index, url, _, cached, _ in entries])
+                )
+            else:
+                await self._queues["inference"].put((report_id, entries))
+
+    async def _collect(self, queue: asyncio.Queue, size: int, wait: float) -> Tuple[List[Any], bool]:
+        """Junta hasta `size` items: bloquea por el primero y espera `wait` por el resto."""
+        first = await queue.get()
+        if first is None:
+            return [], True
+        items = [first]
+        deadline = time.monotonic() + wait
+        while len(items) < size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(queue.get(), remaining)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is None:
+                return items, True
+            items.append(item)
+        return items, False
+
+    async def _inference_worker(self) -> None:
+        from services.embeddings import cache_embedding, embed_preprocessed
+
+        def embed_all(tensors):
+            # Un lote de reportes puede traer más de batch_size fotos
+            chunks = [
+                embed_preprocessed(tensors[start:start + self.batch_size])
+                for start in range(0, len(tensors), self.batch_size)
+            ]
+            return list(np.concatenate(chunks))
+
+        async def embed_remote(images):
+            # El servidor arma sus propios lotes; una imagen rechazada no tumba el resto
+            return await asyncio.gather(
+                *(self._inference_client.embed(image_bytes) for image_bytes in images),
+                return_exceptions=True
+            )
+
+        inbox, outbox, stats = self._queues["inference"], self._queues["write"], self.stats["inference"]
+        finished = False
+        while not finished:
+            batch, finished = await self._collect(inbox, self.batch_size, _BATCH_WAIT_SECONDS)
+            if not batch:
+                continue
+            payloads = [entry[4] for _, entries in batch for entry in entries if entry[4] is not None]
+            started = time.monotonic()
+            try:
+                if self._inference_client is not None:
+                    vecs = await embed_remote(payloads)
+                else:
+                    vecs = await asyncio.to_thread(embed_all, payloads)
+            except Exception as e:
+                stats.failed += len(payloads)
+                for report_id, _ in batch:
+                    self._fail(report_id, f"inferencia: {e}")
+                continue
+            finally:
+                stats.busy_seconds += time.monotonic() - started
+            row = 0
+            for report_id, entries in batch:
+                photos, error = [], None
+                for index, url, key, cached, payload in entries:
+                    if cached is None:
+                        vec = vecs[row]
+                        row += 1
+                        if isinstance(vec, Exception):
+                            stats.failed += 1
+                            error = vec
+                            print(f"⚠️ [backfill] {report_id}: foto {index} descartada ({vec})")
+                            continue
+                        stats.items += 1
+                        cached = np.array(vec, dtype=np.float32)
+                        cache_embedding(key, cached)
+                    photos.append((index, url, cached))
+                if not photos:
+                    self._fail(report_id, f"inferencia: {error}")
+                    continue
+                await outbox.put(_write_item(report_id, photos))
+
+    async def _write_worker(self, expected_sentinels: int) -> None:
+        inbox, stats = self._queues["write"], self.stats["write"]
+        remaining_sentinels = expected_sentinels
+        while remaining_sentinels > 0:
+            batch, finished = await self._collect(inbox, self.write_batch_size, _WRITE_FLUSH_SECONDS)
+            if finished:
+                remaining_sentinels -= 1
+            if not batch:
+                continue
+            started = time.monotonic()
+            try:
+                await asyncio.to_thread(self.store.write_embeddings, batch)
+            except Exception as e:
+                stats.failed += len(batch)
+                for report_id, _, _ in batch:
+                    self._fail(report_id, f"escritura: {e}")
+                self._save_checkpoint()
+                continue
+            finally:
+                stats.busy_seconds += time.monotonic() - started
+            stats.items += len(batch)
+            for report_id, _, _ in batch:
+                self.succeeded += 1
+                self._watermark.complete(report_id)
+            if self.on_written is not None:
+                await asyncio.gather(*(self._notify_written(report_id, vec) for report_id, vec, _ in batch))
+            self._save_checkpoint()
+
+    # -- helpers --
+
+    async def _notify_written(self, report_id: str, vec: np.ndarray) -> None:
+        try:
+            result = self.on_written(report_id, vec)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"⚠️ [backfill] Callback falló para {report_id}: {e}")
+
+    def _fail(self, report_id: str, reason: str) -> None:
+        print(f"❌ [backfill] {report_id}: {reason}")
+        self.failed += 1
+        if len(self.failed_ids) < _MAX_FAILED_IDS:
+            self.failed_ids.append(report_id)
+        self._watermark.complete(report_id)
+
+    def _save_checkpoint(self) -> None:
+        self.checkpoint.save({
+            "mode": self.mode,
+            "last_id": self._watermark.value,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "failed_ids": self.failed_ids,
+            "updated_at": time.time(),
+        })
+
+    async def _report_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.report_every)
+            snap = self.snapshot()
+            rates = ", ".join(f"{name} {stage['items_per_sec']}/s" for name, stage in snap["stages"].items())
+            print(f"📈 [backfill] {snap['processed']}/{snap['discovered']} ({rates}) colas={snap['queues']}")
@@ -0,0 +1,264 @@
+# backend/services/embedding_cache.py
+"""
+Caché de embeddings direccionada por contenido.
+
+La clave es el sha256 de los bytes de la imagen dentro de un namespace que
+identifica al modelo, así que la misma foto (re-descargada por regenerate-all,
+un update de `photos`, /embeddings/generate o una búsqueda repetida) cuesta un
+hash en lugar de un forward pass. Cambiar de modelo cambia el namespace y
+nunca devuelve vectores de otro modelo.
+
+Dos niveles:
+- Memoria: LRU de EMBEDDING_CACHE_SIZE entradas (0 = deshabilitada).
+- Disco (opcional): un archivo float32 por imagen en EMBEDDING_CACHE_DIR,
+  con desalojo por tamaño total (EMBEDDING_CACHE_DISK_MAX_MB) de los archivos
+  usados hace más tiempo. Sobrevive reinicios y se comparte entre workers.
+
+Desde el event loop se usan `aget`/`aput`: solo el LRU corre inline y la E/S
+de disco va a un thread. El escaneo inicial del directorio y el desalojo
+corren en un thread de mantenimiento aparte, nunca en el camino de la petición.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+EMBEDDING_CACHE_SIZE = max(0, int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "")
+EMBEDDING_CACHE_DISK_MAX_MB = max(0.0, float(os.getenv("EMBEDDING_CACHE_DISK_MAX_MB", "512")))
+
+_FILE_SUFFIX = ".f32"
+
+
+class EmbeddingCache:
+    """Caché LRU en memoria + disco de vectores float32 por hash de imagen."""
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = EMBEDDING_CACHE_SIZE,
+        disk_dir: Optional[str] = EMBEDDING_CACHE_DIR or None,
+        disk_max_bytes: int = int(EMBEDDING_CACHE_DISK_MAX_MB * 1024 * 1024),
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_dir: Optional[Path] = None
+        if disk_dir:
+            slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", namespace).strip("_") or "default"
+            self.disk_dir = Path(disk_dir) / slug
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self._maintenance: Optional[threading.Thread] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    def key(self, image_bytes: bytes) -> str:
+        """Clave de contenido: sha256 de los bytes de la imagen."""
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Busca un vector en memoria y luego en disco. Devuelve una copia o None."""
+        vec = self._memory_get(key)
+        return vec if vec is not None else self._disk_lookup(key)
+
+    async def aget(self, key: str) -> Optional[np.ndarray]:
+        """Igual que `get`, pero la lectura de disco no bloquea el event loop."""
+        vec = self._memory_get(key)
+        if vec is not None:
+            return vec
+        if self.disk_dir is None:
+            return self._disk_lookup(key)
+        return await asyncio.to_thread(self._disk_lookup, key)
+
+    def put(self, key: str, vec: np.ndarray) -> None:
+        """Guarda un vector en ambos niveles."""
+        vec = np.ascontiguousarray(vec, dtype=np.float32).reshape(-1)
+        self._memory_put(key, vec.copy())
+        self._disk_put(key, vec)
+
+    async def aput(self, key: str, vec: np.ndarray) -> None:
+        """Igual que `put`, pero la escritura en disco no bloquea el event loop."""
+        vec = np.ascontiguousarray(vec, dtype=np.float32).reshape(-1)
+        self._memory_put(key, vec.copy())
+        if self.disk_dir is not None:
+            await asyncio.to_thread(self._disk_put, key, vec)
+
+    def clear(self) -> None:
+        """Vacía el nivel en memoria (el de disco se conserva)."""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "memory_entries": len(self._memory),
+                "memory_max_entries": self.max_entries,
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes if self.disk_dir else None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+            }
+
+    # -- memoria --
+
+    def _memory_get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vec = self._memory.get(key)
+            if vec is None:
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return vec.copy()
+
+    def _memory_put(self, key: str, vec: np.ndarray) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = vec
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    # -- disco --
+
+    def _path(self, key: str) -> Path:
+        # Subdirectorio por prefijo para no tener un único directorio gigante
+        return self.disk_dir / key[:2] / f"{key}{_FILE_SUFFIX}"
+
+    def _disk_lookup(self, key: str) -> Optional[np.ndarray]:
+        """Nivel de disco de `get`: cuenta el acierto/fallo y sube el vector a memoria."""
+        vec = self._disk_get(key)
+        with self._lock:
+            if vec is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory_put(key, vec)
+        return vec.copy()
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"⚠️ [embedding-cache] No se pudo leer {path}: {e}")
+            return None
+        if not data or len(data) % 4:
+            return None
+        try:
+            # Marcar como usado recientemente para el desalojo
+            os.utime(path)
+        except OSError:
+            pass
+        return np.frombuffer(data, dtype=np.float32).copy()
+
+    def _disk_put(self, key: str, vec: np.ndarray) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._path(key)
+        data = vec.tobytes()
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Si la entrada ya existía, el reemplazo solo suma la diferencia de tamaño
+            try:
+                previous = path.stat().st_size
+            except FileNotFoundError:
+                previous = 0
+            # Escritura atómica: otro worker nunca ve un archivo a medio escribir
+            tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ [embedding-cache] No se pudo escribir {path}: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data) - previous
+            # Sin escaneo previo el tamaño es desconocido: lo calcula el mantenimiento
+            if self._disk_bytes is None or self._disk_bytes > self.disk_max_bytes:
+                self._start_maintenance()
+
+    def _start_maintenance(self) -> None:
+        """Lanza el thread de escaneo/desalojo si no hay uno corriendo (llamar con el lock tomado)."""
+        if self._maintenance is not None:
+            return
+        self._maintenance = threading.Thread(
+            target=self._maintain_disk, name="embedding-cache-disk", daemon=True
+        )
+        self._maintenance.start()
+
+    def _maintain_disk(self) -> None:
+        """Desaloja hasta que el disco quede bajo el límite, contando lo que se escribió mientras tanto."""
+        while True:
+            try:
+                removed = self._evict_disk()
+            except Exception as e:
+                print(f"⚠️ [embedding-cache] Falló el mantenimiento del disco: {e}")
+                removed = 0
+            with self._lock:
+                # Sin nada que borrar no se reintenta hasta la próxima escritura
+                if not removed or self._disk_bytes is None or self._disk_bytes <= self.disk_max_bytes:
+                    self._maintenance = None
+                    return
+
+    def wait_for_maintenance(self, timeout: Optional[float] = None) -> None:
+        """Espera a que termine el escaneo/desalojo en curso (scripts y pruebas)."""
+        thread = self._maintenance
+        if thread is not None:
+            thread.join(timeout)
+
+    def _evict_disk(self) -> int:
+        """
+        Recalcula el tamaño del disco y, si supera el límite, borra los archivos
+        usados hace más tiempo hasta quedar en el 90%. Devuelve cuántos borró.
+        """
+        entries = []
+        for p in self.disk_dir.glob(f"*/*{_FILE_SUFFIX}"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9) if total > self.disk_max_bytes else total
+        removed = 0
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._disk_bytes = total
+        if removed:
+            print(f"🧹 [embedding-cache] {removed} vectores desalojados del disco ({total / 1e6:.1f} MB)")
+        return removed
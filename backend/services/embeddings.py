@@ -1,102 +1,494 @@
 # backend/services/embeddings.py
-import io
+"""
+Embeddings de imágenes con MegaDescriptor.
+
+torch, timm y el modelo se importan/cargan recién en la primera inferencia (o en
+el startup con EMBEDDING_PRELOAD): importar este módulo no carga el stack de ML,
+así los workers que solo sirven rutas sin inferencia arrancan rápido y sin la
+memoria de torch.
+"""
+import os
+import sys
+import time
 import asyncio
-from typing import Optional
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
 import numpy as np
-from PIL import Image
-import torch
-import torchvision.transforms as T
-import timm
 
-# Configuración para MegaDescriptor
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+from services.embedding_cache import EmbeddingCache
+from services.image_preprocess import MODEL_INPUT_SIZE, PREPROCESS_VERSION, preprocess_array, submit_preprocess
+from services.inference_client import get_inference_client
+from utils.metrics import (
+    EMBEDDING_STAGE_SECONDS,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_QUEUE_DEPTH,
+    STARTUP_IMPORT_SECONDS,
+    stage_timer,
+)
+
+if TYPE_CHECKING:
+    import torch
+    from services.inference_backends import InferenceBackend
+
+# Configuración para MegaDescriptor (DEVICE se resuelve en el primer acceso, ver __getattr__)
 MODEL_NAME = "hf-hub:BVRA/MegaDescriptor-L-384"
 EMBEDDING_DIM = None  # Se detectará automáticamente al cargar el modelo
+# Backend del forward pass: fp32 | traced | compiled | int8 | bf16 (ver services/inference_backends.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "fp32").lower()
+
+# Configuración del micro-batching (peticiones concurrentes comparten un forward pass)
+EMBEDDING_BATCH_SIZE = max(1, int(os.getenv("EMBEDDING_BATCH_SIZE", "8")))
+EMBEDDING_BATCH_WAIT_MS = max(0.0, float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "15")))
+EMBEDDING_MAX_CONCURRENT_BATCHES = max(1, int(os.getenv("EMBEDDING_MAX_CONCURRENT_BATCHES", "1")))
+
+# Timeout por llamada (0 = sin límite) y frecuencia de chequeo de desconexión del cliente
+EMBEDDING_TIMEOUT_SECONDS = max(0.0, float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "120")))
+DISCONNECT_POLL_SECONDS = 0.5
 
 _model = None
-_transforms = None
+_backend: Optional["InferenceBackend"] = None
 _actual_dim = None
+_device: Optional[str] = None
+
+
+def _ml_stack():
+    """Importa torch y timm en el primer uso y registra cuánto tardó la importación."""
+    if "timm" not in sys.modules:
+        started = time.perf_counter()
+        import torch
+        import timm
+        elapsed = time.perf_counter() - started
+        STARTUP_IMPORT_SECONDS.set(elapsed, component="ml_stack")
+        print(f"📦 [embeddings] torch y timm importados en {elapsed * 1000:.0f} ms")
+    import torch
+    import timm
+    return torch, timm
+
+
+def get_device() -> str:
+    """cuda si está disponible, si no cpu (importa torch la primera vez)."""
+    global _device
+    if _device is None:
+        torch, _ = _ml_stack()
+        _device = "cuda" if torch.cuda.is_available() else "cpu"
+    return _device
+
+
+def __getattr__(name: str):
+    # embeddings.DEVICE sigue disponible para scripts y benchmarks sin importar torch al cargar el módulo
+    if name == "DEVICE":
+        return get_device()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class InferenceTimeoutError(TimeoutError):
+    """La inferencia no terminó dentro del timeout de la llamada."""
+
+
+class InferenceCancelledError(Exception):
+    """La inferencia se canceló porque el cliente se desconectó."""
 
-# Semáforo para limitar concurrencia (máximo 2 inferencias simultáneas)
-_inference_semaphore = asyncio.Semaphore(2)
 
 def _load_model():
-    """Carga el modelo MegaDescriptor y sus transformaciones"""
-    global _model, _transforms, _actual_dim
+    """Carga MegaDescriptor y prepara el backend de inferencia (EMBEDDING_BACKEND)"""
+    global _model, _backend, _actual_dim
     if _model is None:
-        print(f"🔄 Cargando MegaDescriptor en {DEVICE}...")
+        torch, timm = _ml_stack()
+        from services.inference_backends import build_backend
+
+        device = get_device()
+        print(f"🔄 Cargando MegaDescriptor en {device}...")
         # Cargar modelo desde Hugging Face Hub
         # num_classes=0 para obtener solo features (sin capa de clasificación)
         _model = timm.create_model(MODEL_NAME, pretrained=True, num_classes=0)
-        _model = _model.to(DEVICE)
+        _model = _model.to(device)
         _model.eval()
-        
+
         # Verificar dimensión real del embedding
         with torch.no_grad():
-            dummy_input = torch.randn(1, 3, 384, 384).to(DEVICE)
+            dummy_input = torch.randn(1, 3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE).to(device)
             dummy_output = _model(dummy_input)
             _actual_dim = dummy_output.shape[-1]
             print(f"📊 Dimensión del modelo: {_actual_dim}")
-        
-        # Transformaciones específicas para MegaDescriptor (384x384)
-        _transforms = T.Compose([
-            T.Resize(size=(384, 384)),
-            T.ToTensor(),
-            T.Normalize([0.5, 0.5, 0.5], [0.5, 0.5, 0.5])
-        ])
-        print(f"✅ MegaDescriptor cargado exitosamente")
-    return _model, _transforms, _actual_dim
-
-async def image_bytes_to_vec_async(image_bytes: bytes) -> np.ndarray:
-    """
-    Genera embedding de forma asíncrona con control de concurrencia.
-    
-    Args:
-        image_bytes: Bytes de la imagen
-        
+
+        _backend = build_backend(EMBEDDING_BACKEND, _model, MODEL_INPUT_SIZE, device)
+        print(f"✅ MegaDescriptor cargado exitosamente (backend {_backend.name})")
+    return _backend, _actual_dim
+
+
+class MicroBatcher:
+    """
+    Agrupa peticiones concurrentes en lotes y ejecuta una sola llamada a `batch_fn`
+    por lote (en un thread para no bloquear el event loop).
+
+    Un lote se despacha cuando alcanza `max_batch_size` elementos o cuando vence la
+    ventana de espera `max_wait_ms` desde que llegó el primero. `batch_fn` recibe la
+    lista de elementos y devuelve una lista del mismo largo donde cada posición es el
+    resultado o una instancia de Exception (que solo falla a ese llamador).
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS,
+        max_concurrent_batches: int = EMBEDDING_MAX_CONCURRENT_BATCHES,
+    ):
+        self._batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # Primer uso o cambio de event loop (p.ej. tests): recrear las primitivas
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = loop.create_task(self._collect_loop())
+
+    async def submit(self, item: Any) -> Any:
+        """Encola un elemento y espera su resultado individual."""
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        INFERENCE_QUEUE_DEPTH.set(self._queue.qsize())
+        return await future
+
+    async def _collect_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._slots.acquire()
+            # Mientras esperábamos un slot libre pudieron llegar más peticiones
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            INFERENCE_QUEUE_DEPTH.set(self._queue.qsize())
+            batch = [(item, fut) for item, fut in batch if not fut.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            INFERENCE_BATCH_SIZE.observe(len(batch))
+            task = loop.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            items = [item for item, _ in batch]
+            try:
+                results = await asyncio.to_thread(self._batch_fn, items)
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, fut), result in zip(batch, results):
+                if fut.done():
+                    continue
+                if isinstance(result, Exception):
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+        finally:
+            self._slots.release()
+
+    async def aclose(self) -> None:
+        """Detiene el recolector de lotes (se recrea en el próximo submit)."""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+
+
+def preprocess_image(image_bytes: bytes) -> "torch.Tensor":
+    """
+    Decodifica una imagen y la deja lista para el modelo (sin inferencia).
+
+    Raises:
+        InvalidImageError: Si la imagen está corrupta o excede los límites
+    """
+    torch, _ = _ml_stack()
+    return torch.from_numpy(preprocess_array(image_bytes))
+
+def embed_preprocessed(tensors: Sequence["torch.Tensor"]) -> np.ndarray:
+    """
+    Ejecuta un único forward pass sobre imágenes ya preprocesadas.
+
     Returns:
-        numpy array float32 normalizado
+        Matriz float32 (len(tensors), dim) con una fila L2-normalizada por imagen
     """
-    async with _inference_semaphore:
-        # Ejecutar en thread pool para no bloquear el event loop
-        return await asyncio.to_thread(_generate_embedding, image_bytes)
+    torch, _ = _ml_stack()
+    backend, _ = _load_model()
+    device = get_device()
 
-def _generate_embedding(image_bytes: bytes) -> np.ndarray:
-    """Genera el embedding (función interna)"""
-    model, transforms, actual_dim = _load_model()
-    
-    # Cargar y convertir imagen
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    
-    # Aplicar transformaciones y generar embedding
-    with torch.inference_mode():
-        img_tensor = transforms(img).unsqueeze(0).to(DEVICE)
-        feats = model(img_tensor)
-        
-        # Normalización L2
+    with torch.inference_mode(), stage_timer("forward"):
+        batch = torch.stack([torch.as_tensor(t) for t in tensors]).to(device)
+        feats = backend.forward(batch)
+
+        # Normalización L2 por fila
         feats = feats / feats.norm(dim=-1, keepdim=True)
-        
+
         # Convertir a numpy ANTES de liberar memoria
-        vec = feats.squeeze(0).detach().cpu().numpy().astype("float32")
-    
+        vecs = feats.detach().cpu().numpy().astype("float32")
+
     # Limpiar memoria explícitamente
-    del img, img_tensor, feats
-    if DEVICE == "cuda":
+    del batch, feats
+    if device == "cuda":
         torch.cuda.empty_cache()
-    
-    print(f"🔍 Embedding generado: {vec.shape[-1]} dimensiones")
-    
+
+    return vecs
+
+def _generate_embeddings_batch(images: Sequence[Union[bytes, "Future[np.ndarray]"]]) -> List[Union[np.ndarray, Exception]]:
+    """
+    Genera embeddings para varias imágenes en un único forward pass.
+
+    Args:
+        images: Bytes de cada imagen, o el Future de `submit_preprocess` si la
+            decodificación ya se lanzó en el pool de decodificación
+
+    Returns:
+        Lista alineada con `images`: vector float32 L2-normalizado por imagen, o la
+        excepción producida al decodificar esa imagen.
+    """
+    results: List[Union[np.ndarray, Exception]] = [None] * len(images)
+    # Las imágenes se decodifican en paralelo en el pool de decodificación
+    decoding = [item if isinstance(item, Future) else submit_preprocess(item) for item in images]
+    tensors = []
+    positions = []
+    for i, future in enumerate(decoding):
+        try:
+            tensors.append(future.result())
+            positions.append(i)
+        except Exception as e:
+            results[i] = e
+
+    if not tensors:
+        return results
+
+    vecs = embed_preprocessed(tensors)
+    del tensors
+
+    for row, i in enumerate(positions):
+        results[i] = vecs[row].copy()
+
+    print(f"🔍 Embeddings generados: {len(positions)} imágenes, {vecs.shape[-1]} dimensiones")
+    return results
+
+def _generate_embedding(image_bytes: bytes) -> np.ndarray:
+    """Genera el embedding de una sola imagen (función interna)"""
+    result = _generate_embeddings_batch([image_bytes])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+_batcher = MicroBatcher(_generate_embeddings_batch)
+
+# Caché por hash de contenido; el namespace incluye el modelo, la versión del
+# preprocesamiento (vectores de otra decodificación no son intercambiables) y
+# el backend si no es fp32 (distinta precisión)
+_cache = EmbeddingCache(
+    namespace=f"{MODEL_NAME}:pre{PREPROCESS_VERSION}"
+    + ("" if EMBEDDING_BACKEND == "fp32" else f":{EMBEDDING_BACKEND}")
+)
+
+def _start_local_inference(image_bytes: bytes) -> "asyncio.Future[np.ndarray]":
+    """Encola una imagen en el micro-batcher de este proceso."""
+    # La decodificación arranca ya en su propio pool y se solapa con el forward
+    # pass en curso; el lote solo espera el resultado cuando le toca
+    decoding = submit_preprocess(image_bytes)
+    task = asyncio.ensure_future(_batcher.submit(decoding))
+    task.add_done_callback(lambda t: decoding.cancel() if t.cancelled() else None)
+    return task
+
+def _start_inference(image_bytes: bytes) -> "asyncio.Future[np.ndarray]":
+    """Inferencia en el servidor compartido si está configurado; si no, en este proceso."""
+    client = get_inference_client()
+    if client is not None:
+        return asyncio.ensure_future(client.embed(image_bytes))
+    return _start_local_inference(image_bytes)
+
+async def image_bytes_to_vec_local_async(image_bytes: bytes) -> np.ndarray:
+    """
+    Embedding calculado siempre en este proceso (usado por el servidor de
+    inferencia), con caché y micro-batching pero sin timeout.
+    """
+    cache_key = _cache.key(image_bytes) if _cache.enabled else None
+    if cache_key is not None:
+        cached = await _cache.aget(cache_key)
+        if cached is not None:
+            return cached
+    vec = await _start_local_inference(image_bytes)
+    if cache_key is not None:
+        await _cache.aput(cache_key, vec)
     return vec
 
+async def image_bytes_to_vec_async(
+    image_bytes: bytes,
+    timeout: Optional[float] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> np.ndarray:
+    """
+    Genera embedding de forma asíncrona sin bloquear el event loop. Las peticiones
+    concurrentes se agrupan en lotes (EMBEDDING_BATCH_SIZE / EMBEDDING_BATCH_WAIT_MS)
+    que comparten un único forward pass ejecutado en un thread aparte. Con
+    INFERENCE_SERVER_SOCKET el lote lo arma el servidor de inferencia compartido.
+
+    Args:
+        image_bytes: Bytes de la imagen
+        timeout: Segundos máximos de espera (default: EMBEDDING_TIMEOUT_SECONDS, 0 = sin límite)
+        is_disconnected: Corrutina opcional (p.ej. `request.is_disconnected`); si devuelve
+            True la petición se retira del lote y se lanza InferenceCancelledError
+
+    Returns:
+        numpy array float32 normalizado
+
+    Raises:
+        InferenceTimeoutError: Si se supera el timeout
+        InferenceCancelledError: Si el cliente se desconectó antes de terminar
+    """
+    if timeout is None:
+        timeout = EMBEDDING_TIMEOUT_SECONDS
+
+    # La misma imagen ya embebida no vuelve a pasar por el modelo
+    cache_key = _cache.key(image_bytes) if _cache.enabled else None
+    if cache_key is not None:
+        cached = await _cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout if timeout else None
+    task = _start_inference(image_bytes)
+    try:
+        while True:
+            wait = DISCONNECT_POLL_SECONDS if is_disconnected is not None else None
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise InferenceTimeoutError(f"Inferencia excedió el timeout de {timeout:.0f}s")
+                wait = remaining if wait is None else min(wait, remaining)
+
+            done, _ = await asyncio.wait({task}, timeout=wait)
+            if done:
+                vec = task.result()
+                # Espera total del llamador: cola + lote (+ socket con servidor de inferencia)
+                EMBEDDING_STAGE_SECONDS.observe(loop.time() - started, stage="inference")
+                if cache_key is not None:
+                    await _cache.aput(cache_key, vec)
+                return vec
+            if is_disconnected is not None and await is_disconnected():
+                raise InferenceCancelledError("Cliente desconectado durante la inferencia")
+    finally:
+        # Si la petición sigue encolada, el batcher la descarta al ver el futuro cancelado
+        if not task.done():
+            task.cancel()
+
+async def images_bytes_to_vecs_async(
+    images: Sequence[bytes],
+    timeout: Optional[float] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> List[Union[np.ndarray, Exception]]:
+    """
+    Genera los embeddings de varias imágenes (p.ej. todas las fotos de un reporte).
+    Se encolan juntas en el batcher, así que comparten forward pass en lugar de
+    sumar una inferencia por foto a la latencia.
+
+    Returns:
+        Lista alineada con `images`: vector float32 normalizado o la excepción de esa imagen
+
+    Raises:
+        InferenceCancelledError: Si el cliente se desconectó antes de terminar
+    """
+    results = await asyncio.gather(
+        *(image_bytes_to_vec_async(image_bytes, timeout, is_disconnected) for image_bytes in images),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, InferenceCancelledError):
+            raise result
+    return list(results)
+
+async def shutdown_batcher() -> None:
+    """Detiene el recolector de lotes de inferencia."""
+    await _batcher.aclose()
+
 def image_bytes_to_vec(image_bytes: bytes) -> np.ndarray:
     """
     Genera embedding L2-normalizado usando MegaDescriptor (versión síncrona).
-    
+
     Args:
         image_bytes: Bytes de la imagen
-        
+
     Returns:
         numpy array float32 normalizado (dimensión automática según el modelo)
     """
     # Versión síncrona simple para mantener compatibilidad con código existente
-    return _generate_embedding(image_bytes)
+    if not _cache.enabled:
+        return _generate_embedding(image_bytes)
+    cache_key = _cache.key(image_bytes)
+    vec = _cache.get(cache_key)
+    if vec is None:
+        vec = _generate_embedding(image_bytes)
+        _cache.put(cache_key, vec)
+    return vec
+
+def images_bytes_to_vecs(images: Sequence[bytes]) -> List[Union[np.ndarray, Exception]]:
+    """
+    Genera embeddings para varias imágenes en un único forward pass (versión síncrona).
+    Útil para scripts de backfill que ya tienen un lote de imágenes en memoria.
+    Las imágenes que ya están en la caché no se incluyen en el forward pass.
+    """
+    images = list(images)
+    if not _cache.enabled:
+        return _generate_embeddings_batch(images)
+
+    keys = [_cache.key(image_bytes) for image_bytes in images]
+    results: List[Union[np.ndarray, Exception, None]] = [_cache.get(key) for key in keys]
+    pending = [i for i, vec in enumerate(results) if vec is None]
+    if pending:
+        computed = _generate_embeddings_batch([images[i] for i in pending])
+        for i, vec in zip(pending, computed):
+            results[i] = vec
+            if not isinstance(vec, Exception):
+                _cache.put(keys[i], vec)
+    return results
+
+def cached_embedding(image_bytes: bytes) -> Tuple[Optional[str], Optional[np.ndarray]]:
+    """
+    Consulta la caché para una imagen.
+
+    Returns:
+        (clave de la imagen o None si la caché está deshabilitada, vector en caché o None)
+    """
+    if not _cache.enabled:
+        return None, None
+    key = _cache.key(image_bytes)
+    return key, _cache.get(key)
+
+def cache_embedding(key: Optional[str], vec: np.ndarray) -> None:
+    """Guarda en la caché un vector calculado fuera de las funciones de este módulo."""
+    if key is not None:
+        _cache.put(key, vec)
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Estadísticas de la caché de embeddings (aciertos, tamaño en memoria y disco)."""
+    return _cache.stats()
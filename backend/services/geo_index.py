@@ -0,0 +1,367 @@
+# backend/services/geo_index.py
+"""
+Índice espacial en memoria con las coordenadas de los reportes activos.
+
+Los puntos se agrupan en una grilla de celdas de GEO_INDEX_CELL_DEG grados
+(lat, lon). Una búsqueda por radio solo visita las celdas que cubren el
+rectángulo del círculo y calcula la distancia haversine vectorizada con numpy
+sobre los puntos de esas celdas, en lugar de descargar todos los reportes con
+select("*") y recorrerlos en Python. Al igual que services/match_index.py, se
+mantiene al día de forma incremental cuando se crean, actualizan, resuelven o
+cancelan reportes, y se recarga desde Supabase cada GEO_INDEX_REFRESH_SECONDS.
+"""
+import itertools
+import math
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.supabase_client import select_in_chunks
+
+GEO_INDEX_CELL_DEG = float(os.getenv("GEO_INDEX_CELL_DEG", "0.1"))
+GEO_INDEX_REFRESH_SECONDS = float(os.getenv("GEO_INDEX_REFRESH_SECONDS", "60"))
+GEO_INDEX_PAGE_SIZE = int(os.getenv("GEO_INDEX_PAGE_SIZE", "1000"))
+
+EARTH_RADIUS_KM = 6371.0
+# Kilómetros por grado de latitud (cota inferior, para que el rectángulo de
+# búsqueda nunca quede más chico que el círculo)
+_KM_PER_DEG = 110.5
+
+Cell = Tuple[int, int]
+
+
+def _parse_ewkb_point(hex_str: str) -> Optional[Tuple[float, float]]:
+    """Lee un POINT en (E)WKB hexadecimal, el formato en que PostgREST puede devolver geography."""
+    try:
+        raw = bytes.fromhex(hex_str)
+    except ValueError:
+        return None
+    if len(raw) < 21:
+        return None
+    endian = "<" if raw[0] == 1 else ">"
+    geom_type = struct.unpack(endian + "I", raw[1:5])[0]
+    if geom_type & 0xFF != 1:  # solo Point
+        return None
+    offset = 9 if geom_type & 0x20000000 else 5  # con SRID embebido
+    if len(raw) < offset + 16:
+        return None
+    lon, lat = struct.unpack(endian + "dd", raw[offset:offset + 16])
+    return (lat, lon)
+
+
+def extract_coords(location: Any) -> Optional[Tuple[float, float]]:
+    """
+    Extrae (lat, lon) de los formatos de location que aparecen en `reports`:
+    GeoJSON {"type":"Point","coordinates":[lon,lat]}, texto
+    "SRID=4326;POINT(lon lat)" o EWKB hexadecimal.
+    """
+    if not location:
+        return None
+    try:
+        if isinstance(location, dict) and "coordinates" in location:
+            lon, lat = location["coordinates"][:2]
+            return (float(lat), float(lon))
+        if isinstance(location, str):
+            if "POINT(" in location:
+                lon, lat = map(float, location.split("POINT(")[1].split(")")[0].split()[:2])
+                return (lat, lon)
+            return _parse_ewkb_point(location)
+    except (TypeError, ValueError, IndexError, struct.error):
+        return None
+    return None
+
+
+class GeoIndex:
+    """Grilla en memoria de puntos de reportes activos con filtros por type/species."""
+
+    def __init__(self, cell_deg: float = GEO_INDEX_CELL_DEG, capacity: int = 1024):
+        self.cell_deg = cell_deg
+        self._n_cols = int(math.ceil(360.0 / cell_deg))
+        self._n_rows = int(math.ceil(180.0 / cell_deg))
+        # Arreglos por slot: coordenadas en radianes precalculadas y códigos de filtros
+        self._lat_rad = np.empty(capacity, dtype=np.float64)
+        self._lon_rad = np.empty(capacity, dtype=np.float64)
+        self._cos_lat = np.empty(capacity, dtype=np.float64)
+        self._type_code = np.empty(capacity, dtype=np.int32)
+        self._species_code = np.empty(capacity, dtype=np.int32)
+        self._ids: List[Optional[str]] = []
+        self._slot_cells: List[Optional[Cell]] = []
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._cells: Dict[Cell, Set[int]] = {}
+        self._codes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, report_id: str) -> bool:
+        return report_id in self._slots
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        row = min(int((lat + 90.0) // self.cell_deg), self._n_rows - 1)
+        col = int((lon + 180.0) // self.cell_deg) % self._n_cols
+        return (row, col)
+
+    def _code(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._codes)
+        return code
+
+    def _grow(self) -> None:
+        capacity = max(1024, self._lat_rad.shape[0] * 2)
+        for name in ("_lat_rad", "_lon_rad", "_cos_lat", "_type_code", "_species_code"):
+            old = getattr(self, name)
+            grown = np.empty(capacity, dtype=old.dtype)
+            grown[:old.shape[0]] = old
+            setattr(self, name, grown)
+
+    def upsert(
+        self,
+        report_id: str,
+        lat: float,
+        lon: float,
+        report_type: Optional[str] = None,
+        species: Optional[str] = None,
+    ) -> bool:
+        """Agrega o mueve el punto de un reporte. Devuelve False si las coordenadas son inválidas."""
+        if not (math.isfinite(lat) and math.isfinite(lon) and -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+            return False
+        cell = self._cell(lat, lon)
+        with self._lock:
+            slot = self._slots.get(report_id)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    slot = len(self._ids)
+                    if slot == self._lat_rad.shape[0]:
+                        self._grow()
+                    self._ids.append(None)
+                    self._slot_cells.append(None)
+                self._ids[slot] = report_id
+                self._slots[report_id] = slot
+            else:
+                old_cell = self._slot_cells[slot]
+                self._cells[old_cell].discard(slot)
+                if not self._cells[old_cell]:
+                    del self._cells[old_cell]
+            lat_rad = math.radians(lat)
+            self._lat_rad[slot] = lat_rad
+            self._lon_rad[slot] = math.radians(lon)
+            self._cos_lat[slot] = math.cos(lat_rad)
+            self._type_code[slot] = self._code(report_type)
+            self._species_code[slot] = self._code(species)
+            self._slot_cells[slot] = cell
+            self._cells.setdefault(cell, set()).add(slot)
+        return True
+
+    def update_metadata(self, report_id: str, report_type: Optional[str], species: Optional[str]) -> None:
+        """Actualiza type/species de un reporte ya indexado sin tocar su posición."""
+        with self._lock:
+            slot = self._slots.get(report_id)
+            if slot is not None:
+                self._type_code[slot] = self._code(report_type)
+                self._species_code[slot] = self._code(species)
+
+    def remove(self, report_id: str) -> None:
+        """Quita un reporte del índice (resuelto, cancelado o sin ubicación)."""
+        with self._lock:
+            slot = self._slots.pop(report_id, None)
+            if slot is None:
+                return
+            cell = self._slot_cells[slot]
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del self._cells[cell]
+            self._ids[slot] = None
+            self._slot_cells[slot] = None
+            self._free.append(slot)
+
+    def _candidate_slots(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Slots de las celdas que cubren el rectángulo que contiene al círculo de búsqueda."""
+        lat_pad = radius_km / _KM_PER_DEG
+        lat_lo, lat_hi = lat - lat_pad, lat + lat_pad
+        row_lo = self._cell(max(lat_lo, -90.0), lon)[0]
+        row_hi = self._cell(min(lat_hi, 90.0), lon)[0]
+
+        all_cols = lat_lo <= -89.0 or lat_hi >= 89.0
+        if not all_cols:
+            # El grado de longitud es más corto cuanto más lejos del ecuador:
+            # se usa la latitud más extrema del rectángulo
+            lon_pad = lat_pad / math.cos(math.radians(max(abs(lat_lo), abs(lat_hi))))
+            span = int((lon + lon_pad + 180.0) // self.cell_deg) - int((lon - lon_pad + 180.0) // self.cell_deg)
+            all_cols = lon_pad >= 180.0 or span + 1 >= self._n_cols
+        col_lo = 0 if all_cols else int((lon - lon_pad + 180.0) // self.cell_deg) % self._n_cols
+        col_span = self._n_cols - 1 if all_cols else span
+
+        n_cells = (row_hi - row_lo + 1) * (col_span + 1)
+        if n_cells <= len(self._cells):
+            cells = (
+                self._cells.get((row, (col_lo + offset) % self._n_cols))
+                for row in range(row_lo, row_hi + 1)
+                for offset in range(col_span + 1)
+            )
+            members = [m for m in cells if m]
+        else:
+            # Radio grande: conviene recorrer solo las celdas ocupadas
+            members = [
+                m for (row, col), m in self._cells.items()
+                if row_lo <= row <= row_hi and (col - col_lo) % self._n_cols <= col_span
+            ]
+        return np.fromiter(itertools.chain.from_iterable(members), dtype=np.int64)
+
+    def query(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        report_type: Optional[str] = None,
+        species: Optional[str] = None,
+        exclude_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Reportes dentro de un radio, ordenados del más cercano al más lejano.
+
+        Args:
+            lat, lon: Centro de la búsqueda en grados
+            radius_km: Radio en kilómetros
+            report_type: Filtrar por type ('lost'/'found'); None = todos
+            species: Filtrar por especie; None = todas
+            exclude_id: Reporte a excluir (normalmente el propio reporte base)
+            limit: Cantidad máxima de resultados; None = todos
+
+        Returns:
+            Lista de (report_id, distancia_km)
+        """
+        if radius_km < 0 or not (math.isfinite(lat) and math.isfinite(lon)):
+            return []
+        with self._lock:
+            slots = self._candidate_slots(lat, lon, radius_km)
+            if slots.size == 0:
+                return []
+            if report_type is not None:
+                code = self._codes.get(report_type)
+                if code is None:
+                    return []
+                slots = slots[self._type_code[slots] == code]
+            if species is not None:
+                code = self._codes.get(species)
+                if code is None:
+                    return []
+                slots = slots[self._species_code[slots] == code]
+            if exclude_id is not None and exclude_id in self._slots:
+                slots = slots[slots != self._slots[exclude_id]]
+            if slots.size == 0:
+                return []
+
+            lat1 = math.radians(lat)
+            dlat = self._lat_rad[slots] - lat1
+            dlon = self._lon_rad[slots] - math.radians(lon)
+            a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * self._cos_lat[slots] * np.sin(dlon / 2) ** 2
+            dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+            inside = np.flatnonzero(dist <= radius_km)
+            if limit is not None and 0 <= limit < inside.size:
+                inside = inside[np.argpartition(dist[inside], limit - 1)[:limit]] if limit > 0 else inside[:0]
+            inside = inside[np.argsort(dist[inside], kind="stable")]
+            return [(self._ids[int(slots[i])], float(dist[i])) for i in inside]
+
+    def rebuild(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Reemplaza el contenido del índice con las filas dadas (id, type, species, location)."""
+        fresh = GeoIndex(self.cell_deg)
+        for row in rows:
+            coords = extract_coords(row.get("location"))
+            if coords and row.get("id"):
+                fresh.upsert(row["id"], coords[0], coords[1], row.get("type"), row.get("species"))
+        with self._lock:
+            self._lat_rad, self._lon_rad, self._cos_lat = fresh._lat_rad, fresh._lon_rad, fresh._cos_lat
+            self._type_code, self._species_code = fresh._type_code, fresh._species_code
+            self._ids, self._slot_cells, self._slots = fresh._ids, fresh._slot_cells, fresh._slots
+            self._free, self._cells, self._codes = fresh._free, fresh._cells, fresh._codes
+            self.loaded_at = time.time()
+        return len(self)
+
+    def load_from_supabase(self, sb, page_size: int = GEO_INDEX_PAGE_SIZE) -> int:
+        """Carga la ubicación de todos los reportes activos desde Supabase, paginando."""
+        started = time.perf_counter()
+        rows: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            page = sb.table("reports")\
+                .select("id, type, species, location")\
+                .eq("status", "active")\
+                .order("id")\
+                .range(offset, offset + page_size - 1)\
+                .execute()
+            data = page.data or []
+            rows.extend(data)
+            if len(data) < page_size:
+                break
+            offset += page_size
+        total = self.rebuild(rows)
+        print(f"🗺️ [geo-index] {total} ubicaciones activas cargadas en {time.perf_counter() - started:.2f}s")
+        return total
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or (time.time() - self.loaded_at) > GEO_INDEX_REFRESH_SECONDS
+
+    def ensure_fresh(self, sb) -> "GeoIndex":
+        """Carga el índice si nunca se cargó o si venció el intervalo de refresco."""
+        if self.is_stale():
+            self.load_from_supabase(sb)
+        return self
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._slots),
+                "cells": len(self._cells),
+                "cell_deg": self.cell_deg,
+                "loaded_at": self.loaded_at,
+            }
+
+
+_index = GeoIndex()
+
+
+def get_geo_index() -> GeoIndex:
+    """Índice espacial compartido del proceso."""
+    return _index
+
+
+def index_report_location(row: Optional[Dict[str, Any]]) -> None:
+    """
+    Sincroniza el índice espacial con una fila de `reports` recién escrita.
+    Si el reporte está activo y tiene ubicación lo agrega/mueve; si no, lo quita.
+    Si el índice todavía no se cargó no hace nada (la carga inicial lo incluirá).
+    """
+    if not row or _index.loaded_at is None:
+        return
+    report_id = row.get("id")
+    if not report_id:
+        return
+    if row.get("status", "active") != "active":
+        _index.remove(report_id)
+        return
+    coords = extract_coords(row.get("location"))
+    if coords is not None:
+        _index.upsert(report_id, coords[0], coords[1], row.get("type"), row.get("species"))
+    else:
+        _index.update_metadata(report_id, row.get("type"), row.get("species"))
+
+
+def fetch_reports_by_ids(sb, ids: List[str], columns: str = "*") -> Dict[str, Dict[str, Any]]:
+    """Trae las filas de `reports` de los ids dados con consultas in_() en lotes."""
+    return {row["id"]: row for row in select_in_chunks(sb, "reports", columns, "id", ids)}
@@ -0,0 +1,65 @@
+# backend/services/geo_search.py
+"""
+Búsqueda de reportes por radio.
+
+Por defecto el radio se resuelve dentro de Postgres con la RPC de la
+migración 015 (`search_reports_within_radius`), que usa el índice GIST de
+`reports.location` y devuelve solo (id, distance_km) ordenado por distancia.
+Con GEO_SEARCH_BACKEND=memory se usa el índice espacial en memoria del
+proceso (services/geo_index.py), útil cuando la base no tiene la migración
+aplicada.
+"""
+import os
+from typing import List, Optional, Tuple
+
+from services.geo_index import get_geo_index
+
+GEO_SEARCH_BACKEND = os.getenv("GEO_SEARCH_BACKEND", "postgis").lower()  # postgis | memory
+
+NearbyResults = List[Tuple[str, float]]
+
+
+def search_nearby(
+    sb,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    report_type: Optional[str] = None,
+    species: Optional[str] = None,
+    status: Optional[str] = "active",
+    exclude_id: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> NearbyResults:
+    """
+    Reportes dentro de un radio que cumplen los filtros, del más cercano al más lejano.
+
+    Args:
+        sb: Cliente de Supabase
+        lat, lon: Centro de la búsqueda en grados
+        radius_km: Radio en kilómetros
+        report_type: Filtrar por type ('lost'/'found'); None = todos
+        species: Filtrar por especie; None = todas
+        status: Filtrar por estado; None = todos (el backend memory solo indexa activos)
+        exclude_id: Reporte a excluir (normalmente el propio reporte base)
+        limit: Cantidad máxima de resultados; None = todos
+
+    Returns:
+        Lista de (report_id, distancia_km)
+    """
+    if GEO_SEARCH_BACKEND == "memory":
+        return get_geo_index().ensure_fresh(sb).query(
+            lat, lon, radius_km,
+            report_type=report_type, species=species, exclude_id=exclude_id, limit=limit
+        )
+
+    result = sb.rpc("search_reports_within_radius", {
+        "p_lat": lat,
+        "p_lng": lon,
+        "radius_km": radius_km,
+        "filter_type": report_type,
+        "filter_species": species,
+        "filter_status": status,
+        "exclude_report_id": exclude_id,
+        "max_results": limit,
+    }).execute()
+    return [(row["id"], float(row["distance_km"])) for row in (result.data or [])]
@@ -0,0 +1,106 @@
+# backend/services/image_preprocess.py
+"""
+Decodificación y preprocesamiento de imágenes para MegaDescriptor.
+
+Antes se decodificaba la foto completa (`Image.open(...).convert("RGB")`, 12 MP
+en fotos de celular) y recién después `T.Resize((384, 384))`: decodificar y
+redimensionar costaba casi lo mismo que un forward pass. Ahora:
+
+- Los JPEG se decodifican en modo draft: libjpeg escala en el dominio DCT
+  (1/2, 1/4, 1/8) y entrega directamente una imagen apenas mayor que 384x384.
+- Se aplica la orientación EXIF para que las fotos verticales no lleguen rotadas.
+- Las entradas demasiado pesadas, con demasiados píxeles o corruptas se
+  rechazan con InvalidImageError antes de decodificarlas por completo.
+- El resultado es un arreglo float32 (3, 384, 384) normalizado a [-1, 1],
+  igual que T.ToTensor() + T.Normalize([0.5]*3, [0.5]*3).
+
+El trabajo corre en un pool de threads propio (IMAGE_DECODE_WORKERS), separado
+del thread de inferencia, así que la decodificación de las próximas fotos se
+solapa con el forward pass en curso. Pillow libera el GIL al decodificar.
+"""
+import io
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from utils.metrics import stage_timer
+
+MODEL_INPUT_SIZE = 384
+# Versión del preprocesamiento: cambia los píxeles que ve el modelo (y por lo
+# tanto los embeddings), así que forma parte del namespace de la caché.
+# 1 = decodificación completa + T.Resize; 2 = modo draft + orientación EXIF.
+# Al subirla, los embeddings guardados deben regenerarse con el backfill
+# (POST /fix-embeddings/regenerate-all?mode=all).
+PREPROCESS_VERSION = 2
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+IMAGE_DECODE_WORKERS = max(1, int(os.getenv("IMAGE_DECODE_WORKERS", str(min(4, os.cpu_count() or 1)))))
+
+_decode_pool: Optional[ThreadPoolExecutor] = None
+
+
+class InvalidImageError(ValueError):
+    """La imagen está corrupta, no es un formato soportado o excede los límites."""
+
+
+def decode_image(image_bytes: bytes, size: int = MODEL_INPUT_SIZE) -> Image.Image:
+    """
+    Decodifica una imagen cerca del tamaño de entrada del modelo y la redimensiona.
+
+    Args:
+        image_bytes: Bytes de la imagen
+        size: Lado del cuadrado de salida
+
+    Returns:
+        Imagen RGB de size x size, con la orientación EXIF aplicada
+
+    Raises:
+        InvalidImageError: Si la imagen excede los límites o no se puede decodificar
+    """
+    if not image_bytes:
+        raise InvalidImageError("Imagen vacía")
+    if len(image_bytes) > IMAGE_MAX_BYTES:
+        raise InvalidImageError(f"Imagen demasiado grande: {len(image_bytes)} bytes (máximo {IMAGE_MAX_BYTES})")
+    try:
+        # Image.open solo lee el encabezado: el tamaño se valida antes de decodificar
+        img = Image.open(io.BytesIO(image_bytes))
+        width, height = img.size
+        if width * height > IMAGE_MAX_PIXELS:
+            raise InvalidImageError(f"Imagen demasiado grande: {width}x{height} píxeles")
+        if img.format == "JPEG":
+            # Escalado DCT: el resultado mide al menos size x size
+            img.draft("RGB", (size, size))
+        img.load()
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return img.resize((size, size), Image.BILINEAR)
+    except InvalidImageError:
+        raise
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise InvalidImageError(f"Imagen inválida: {e}") from e
+
+
+def preprocess_array(image_bytes: bytes, size: int = MODEL_INPUT_SIZE) -> np.ndarray:
+    """Imagen lista para el modelo: float32 (3, size, size) normalizado a [-1, 1]."""
+    with stage_timer("decode"):
+        img = decode_image(image_bytes, size)
+    with stage_timer("preprocess"):
+        pixels = np.asarray(img, dtype=np.float32)
+        return np.ascontiguousarray((pixels * (2.0 / 255.0) - 1.0).transpose(2, 0, 1))
+
+
+def get_decode_pool() -> ThreadPoolExecutor:
+    """Pool de threads de decodificación, separado del de inferencia."""
+    global _decode_pool
+    if _decode_pool is None:
+        _decode_pool = ThreadPoolExecutor(IMAGE_DECODE_WORKERS, thread_name_prefix="image-decode")
+    return _decode_pool
+
+
+def submit_preprocess(image_bytes: bytes) -> "Future[np.ndarray]":
+    """Empieza a preprocesar una imagen en el pool de decodificación."""
+    return get_decode_pool().submit(preprocess_array, image_bytes)
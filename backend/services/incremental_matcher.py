@@ -0,0 +1,75 @@
+# backend/services/incremental_matcher.py
+"""
+Matching incremental disparado por escrituras de embeddings.
+
+Cuando se escribe el embedding de un reporte, solo ese vector se compara
+contra los candidatos del tipo opuesto (índice HNSW de pgvector o índice en
+memoria, ver services/match_search.py). Los MATCH_INCREMENTAL_FANOUT más
+parecidos se guardan con un único upsert y luego se recortan las listas del
+reporte y de cada candidato a MATCH_TOP_K: así el reporte nuevo entra en el
+top-k de los candidatos para los que es mejor que lo que ya tenían, sin volver
+a recorrer todos los reportes.
+
+Cuando un reporte se resuelve o se cancela se borran sus matches pendientes,
+lo que lo quita de las listas de los demás.
+"""
+import os
+from typing import Dict
+
+from services.match_search import ReportNotFoundError, search_similar_to_report
+from services.match_store import prune_match_lists, remove_pending_matches, upsert_matches
+
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "10"))
+MATCH_MIN_SIMILARITY = float(os.getenv("MATCH_MIN_SIMILARITY", "0.1"))
+# Candidatos puntuados por escritura: más que el top-k propio para poder
+# entrar en las listas de reportes que todavía tienen lugar o peores matches
+MATCH_INCREMENTAL_FANOUT = int(os.getenv("MATCH_INCREMENTAL_FANOUT", "50"))
+
+
+def update_matches_for_report(
+    sb,
+    report_id: str,
+    top_k: int = MATCH_TOP_K,
+    threshold: float = MATCH_MIN_SIMILARITY,
+    fanout: int = MATCH_INCREMENTAL_FANOUT,
+) -> Dict[str, int]:
+    """
+    Actualiza las listas de matches tras escribir el embedding de un reporte.
+
+    Args:
+        sb: Cliente de Supabase
+        report_id: Reporte cuyo embedding se acaba de escribir
+        top_k: Matches pendientes que conserva cada reporte
+        threshold: Similitud mínima para guardar un par
+        fanout: Candidatos a puntuar (como mínimo top_k)
+
+    Returns:
+        Dict con "candidates", "saved" y "pruned"
+
+    Raises:
+        ReportNotFoundError: Si el reporte no existe
+        ReportWithoutEmbeddingError: Si el reporte no tiene embedding
+    """
+    result = sb.table("reports").select("id, type, status").eq("id", report_id).execute()
+    if not result.data:
+        raise ReportNotFoundError(f"Reporte {report_id} no encontrado")
+    report = result.data[0]
+    if report.get("status", "active") != "active":
+        removed = remove_pending_matches(sb, report_id)
+        return {"candidates": 0, "saved": 0, "pruned": removed}
+
+    candidates = search_similar_to_report(sb, report_id, k=max(top_k, fanout), threshold=threshold)
+    if not candidates:
+        return {"candidates": 0, "saved": 0, "pruned": 0}
+
+    saved = upsert_matches(sb, report_id, report.get("type"), candidates)
+    pruned = prune_match_lists(sb, [report_id] + [candidate_id for candidate_id, _ in candidates], top_k)
+    return {"candidates": len(candidates), "saved": saved, "pruned": pruned}
+
+
+def remove_report_from_matches(sb, report_id: str) -> int:
+    """Quita un reporte resuelto o cancelado de las listas de matches de los demás."""
+    removed = remove_pending_matches(sb, report_id)
+    if removed:
+        print(f"🧹 [matches] {removed} matches pendientes eliminados para reporte {report_id}")
+    return removed
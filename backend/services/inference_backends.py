@@ -0,0 +1,162 @@
+# backend/services/inference_backends.py
+"""
+Backends de inferencia para MegaDescriptor.
+
+El modelo eager fp32 de timm es muy lento en las VMs sin GPU donde corre el
+contenedor. EMBEDDING_BACKEND elige cómo se ejecuta el forward pass detrás de
+la misma API de services/embeddings.py:
+
+- fp32:   modelo eager tal cual (referencia)
+- traced: grafo TorchScript (torch.jit.trace + freeze) con fusiones de operadores
+- compiled: torch.compile (Inductor; en CPU necesita compilador de C++, el
+            Dockerfile ya instala build-essential). El primer lote compila.
+- int8:   cuantización dinámica int8 de las capas Linear (solo CPU)
+- bf16:   autocast a bfloat16 si la CPU/GPU lo soporta (si no, cae a fp32)
+
+Los vectores de cada backend se desvían un poco de los de fp32. `parity_report`
+mide esa desviación (1 - coseno contra fp32) y la latencia de cada backend;
+scripts/check_inference_backends.py la ejecuta y recomienda el backend más
+rápido cuya desviación queda bajo EMBEDDING_MAX_DRIFT.
+"""
+import contextlib
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+BACKENDS = ("fp32", "traced", "compiled", "int8", "bf16")
+
+
+def bf16_supported(device: str) -> bool:
+    """True si el dispositivo ejecuta bfloat16 de forma nativa."""
+    if device == "cuda":
+        return torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    check = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    if check is not None and check():
+        return True
+    return torch.backends.cpu.get_cpu_capability() == "AMX"
+
+
+class InferenceBackend:
+    """Forward pass de un modelo según el backend elegido."""
+
+    def __init__(self, name: str, model: Callable[[torch.Tensor], torch.Tensor], device: str, dtype: Optional[torch.dtype] = None):
+        self.name = name
+        self.model = model
+        self.device = device
+        self.dtype = dtype
+
+    def _autocast(self):
+        if self.dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device, dtype=self.dtype)
+
+    def forward(self, batch: torch.Tensor) -> torch.Tensor:
+        """Features float32 (n, dim) sin normalizar."""
+        with torch.inference_mode(), self._autocast():
+            feats = self.model(batch)
+        return feats.float()
+
+
+def build_backend(name: str, model: torch.nn.Module, input_size: int, device: str) -> InferenceBackend:
+    """
+    Prepara `model` (ya en eval y en `device`) para el backend pedido.
+    Si el backend no aplica al dispositivo se usa fp32 y se avisa.
+    """
+    name = (name or "fp32").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de inferencia inválido: {name} (usar {', '.join(BACKENDS)})")
+
+    if name == "traced":
+        example = torch.randn(1, 3, input_size, input_size, device=device)
+        with torch.inference_mode():
+            traced = torch.jit.trace(model, example, check_trace=False)
+            traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+        return InferenceBackend(name, traced, device)
+
+    if name == "compiled":
+        return InferenceBackend(name, torch.compile(model, dynamic=True), device)
+
+    if name == "int8":
+        if device != "cpu":
+            print(f"⚠️ [inference] int8 dinámico solo corre en CPU; usando fp32 en {device}")
+            return InferenceBackend("fp32", model, device)
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return InferenceBackend(name, quantized, device)
+
+    if name == "bf16":
+        if not bf16_supported(device):
+            print(f"⚠️ [inference] {device} sin soporte bf16 nativo; usando fp32")
+            return InferenceBackend("fp32", model, device)
+        return InferenceBackend(name, model, device, dtype=torch.bfloat16)
+
+    return InferenceBackend("fp32", model, device)
+
+
+def _embed(backend: InferenceBackend, tensors: Sequence[Any], batch_size: int) -> np.ndarray:
+    rows = []
+    for start in range(0, len(tensors), batch_size):
+        batch = torch.stack([torch.as_tensor(t) for t in tensors[start:start + batch_size]]).to(backend.device)
+        feats = backend.forward(batch)
+        feats = feats / feats.norm(dim=-1, keepdim=True)
+        rows.append(feats.cpu().numpy().astype(np.float32))
+    return np.concatenate(rows)
+
+
+def cosine_drift(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """1 - coseno fila a fila entre dos matrices de vectores L2-normalizados."""
+    drift = 1.0 - np.sum(reference * candidate, axis=1)
+    return {"mean": float(np.mean(drift)), "max": float(np.max(drift))}
+
+
+def parity_report(
+    model: torch.nn.Module,
+    tensors: Sequence[Any],
+    input_size: int,
+    device: str,
+    backends: Sequence[str] = BACKENDS,
+    batch_size: int = 8,
+    repeats: int = 3,
+) -> List[Dict[str, Any]]:
+    """
+    Compara cada backend contra fp32 sobre las mismas imágenes preprocesadas.
+
+    Returns:
+        Una entrada por backend: nombre efectivo, desviación coseno (media y
+        máxima), latencia por imagen (mejor de `repeats`) y error si no se pudo construir
+    """
+    reference = None
+    report = []
+    for name in ["fp32"] + [b for b in backends if b != "fp32"]:
+        entry: Dict[str, Any] = {"backend": name}
+        try:
+            backend = build_backend(name, model, input_size, device)
+            entry["effective_backend"] = backend.name
+            vecs = _embed(backend, tensors, batch_size)  # calentamiento y resultado
+            best = float("inf")
+            for _ in range(max(1, repeats)):
+                started = time.perf_counter()
+                _embed(backend, tensors, batch_size)
+                best = min(best, time.perf_counter() - started)
+            entry["ms_per_image"] = round(best * 1000 / max(1, len(tensors)), 3)
+            if reference is None:
+                reference = vecs
+            entry["drift"] = cosine_drift(reference, vecs)
+        except Exception as e:
+            entry["error"] = str(e)
+        report.append(entry)
+    return report
+
+
+def pick_fastest(report: Sequence[Dict[str, Any]], max_drift: float) -> Optional[str]:
+    """Backend más rápido cuya desviación máxima contra fp32 no supera `max_drift`."""
+    eligible = [
+        entry for entry in report
+        if "error" not in entry
+        and entry.get("effective_backend") == entry["backend"]
+        and entry["drift"]["max"] <= max_drift
+    ]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda entry: entry["ms_per_image"])["backend"]
@@ -0,0 +1,157 @@
+# backend/services/inference_client.py
+"""
+Cliente del servidor de inferencia compartido (services/inference_server.py).
+
+Con `uvicorn --workers N` cada worker cargaba su propia copia de
+MegaDescriptor-L (cientos de MB de pesos más activaciones). Con
+INFERENCE_SERVER_SOCKET configurado, un único proceso carga el modelo y los
+workers HTTP le envían las imágenes por un socket Unix local: agregar workers
+para concurrencia de I/O ya no multiplica la memoria residente, y las
+peticiones de todos los workers comparten lotes en el mismo micro-batcher.
+
+Este módulo no importa torch: los workers en modo servidor no cargan el
+stack de ML.
+
+Protocolo (un frame por mensaje, varios por conexión):
+    petición:  largo uint32 big-endian + bytes de la imagen
+    respuesta: estado uint8 + largo uint32 + payload
+               (OK: vector en formato binario de pgvector, ver utils/vector_codec;
+                IMAGEN_INVALIDA / ERROR: mensaje utf-8)
+"""
+import asyncio
+import os
+import struct
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from services.image_preprocess import IMAGE_MAX_BYTES, InvalidImageError
+from utils.vector_codec import decode_vector_binary
+
+INFERENCE_SERVER_SOCKET = os.getenv("INFERENCE_SERVER_SOCKET", "")
+INFERENCE_SERVER_RETRY_SECONDS = 0.5
+# Cuánto esperar a que aparezca el socket (el servidor carga el modelo al arrancar)
+INFERENCE_SERVER_CONNECT_TIMEOUT = float(os.getenv("INFERENCE_SERVER_CONNECT_TIMEOUT", "180"))
+# Tamaño máximo de un frame de petición: el mismo límite que las imágenes locales
+MAX_REQUEST_BYTES = IMAGE_MAX_BYTES
+
+STATUS_OK = 0
+STATUS_INVALID_IMAGE = 1
+STATUS_ERROR = 2
+
+_REQUEST_HEADER = struct.Struct(">I")
+_RESPONSE_HEADER = struct.Struct(">BI")
+
+_client: Optional["InferenceClient"] = None
+
+
+class InferenceServerError(RuntimeError):
+    """El servidor de inferencia no pudo generar el embedding."""
+
+
+class FrameTooLargeError(ValueError):
+    """El frame de la petición supera MAX_REQUEST_BYTES."""
+
+
+def _frame_too_large(length: int) -> str:
+    return f"Imagen demasiado grande: {length} bytes (máximo {MAX_REQUEST_BYTES})"
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """
+    Lee una petición; None si el cliente cerró la conexión.
+
+    Raises:
+        FrameTooLargeError: Si el largo declarado supera MAX_REQUEST_BYTES
+            (no se lee el cuerpo: la conexión queda inutilizable)
+    """
+    try:
+        header = await reader.readexactly(_REQUEST_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = _REQUEST_HEADER.unpack(header)
+    if length > MAX_REQUEST_BYTES:
+        raise FrameTooLargeError(_frame_too_large(length))
+    return await reader.readexactly(length)
+
+
+def write_request(writer: asyncio.StreamWriter, image_bytes: bytes) -> None:
+    writer.write(_REQUEST_HEADER.pack(len(image_bytes)))
+    writer.write(image_bytes)
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    status, length = _RESPONSE_HEADER.unpack(await reader.readexactly(_RESPONSE_HEADER.size))
+    return status, await reader.readexactly(length)
+
+
+def write_response(writer: asyncio.StreamWriter, status: int, payload: bytes) -> None:
+    writer.write(_RESPONSE_HEADER.pack(status, len(payload)))
+    writer.write(payload)
+
+
+class InferenceClient:
+    """
+    Envía imágenes al servidor de inferencia. Cada llamada usa su propia
+    conexión (en un socket Unix abrirla cuesta microsegundos frente a un
+    forward pass) y la cancelación de la llamada simplemente la cierra.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._warned = False
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        # Mientras el servidor carga el modelo el socket todavía no existe: se
+        # reintenta hasta INFERENCE_SERVER_CONNECT_TIMEOUT (si el servidor murió,
+        # el error llega al llamador en lugar de colgar la petición)
+        deadline = time.monotonic() + INFERENCE_SERVER_CONNECT_TIMEOUT
+        while True:
+            try:
+                return await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise InferenceServerError(
+                        f"Servidor de inferencia no disponible en {self.path} "
+                        f"tras {INFERENCE_SERVER_CONNECT_TIMEOUT:g}s: {e}"
+                    ) from e
+                if not self._warned:
+                    print(f"⏳ [inference] Esperando servidor de inferencia en {self.path}: {e}")
+                    self._warned = True
+                await asyncio.sleep(INFERENCE_SERVER_RETRY_SECONDS)
+
+    async def embed(self, image_bytes: bytes) -> np.ndarray:
+        """
+        Embedding L2-normalizado de una imagen, calculado por el servidor.
+
+        Raises:
+            InvalidImageError: Si el servidor rechazó la imagen
+            InferenceServerError: Si la inferencia falló en el servidor o no está disponible
+        """
+        if len(image_bytes) > MAX_REQUEST_BYTES:
+            raise InvalidImageError(_frame_too_large(len(image_bytes)))
+        reader, writer = await self._connect()
+        self._warned = False
+        try:
+            write_request(writer, image_bytes)
+            await writer.drain()
+            status, payload = await read_response(reader)
+        finally:
+            writer.close()
+        if status == STATUS_OK:
+            return decode_vector_binary(payload)
+        message = payload.decode("utf-8", errors="replace")
+        if status == STATUS_INVALID_IMAGE:
+            raise InvalidImageError(message)
+        raise InferenceServerError(message)
+
+
+def get_inference_client() -> Optional[InferenceClient]:
+    """Cliente compartido del proceso, o None si la inferencia es local."""
+    global _client
+    if not INFERENCE_SERVER_SOCKET:
+        return None
+    if _client is None:
+        _client = InferenceClient(INFERENCE_SERVER_SOCKET)
+    return _client
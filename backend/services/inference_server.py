@@ -0,0 +1,100 @@
+# backend/services/inference_server.py
+"""
+Servidor de inferencia: un único proceso con MegaDescriptor cargado que
+atiende a todos los workers HTTP por un socket Unix local.
+
+    python -m services.inference_server --socket /tmp/petalert-inference.sock
+
+Los workers se configuran con el mismo INFERENCE_SERVER_SOCKET y envían las
+imágenes con services/inference_client.py. El servidor las decodifica en su
+pool de decodificación y las agrupa en su micro-batcher, así que peticiones de
+distintos workers comparten forward pass. El socket se crea recién cuando el
+modelo terminó de cargar: mientras tanto los clientes reintentan la conexión.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+from pathlib import Path
+
+# Permite ejecutarlo como `python -m services.inference_server` desde backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.image_preprocess import InvalidImageError
+from services.inference_client import (
+    INFERENCE_SERVER_SOCKET,
+    STATUS_ERROR,
+    STATUS_INVALID_IMAGE,
+    STATUS_OK,
+    FrameTooLargeError,
+    read_request,
+    write_response,
+)
+from utils.metrics import start_metrics_sync
+from utils.vector_codec import encode_vector_binary
+
+DEFAULT_SOCKET = "/tmp/petalert-inference.sock"
+
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Atiende las peticiones de una conexión hasta que el cliente la cierre."""
+    from services.embeddings import image_bytes_to_vec_local_async
+
+    try:
+        while (image_bytes := await read_request(reader)) is not None:
+            try:
+                vec = await image_bytes_to_vec_local_async(image_bytes)
+                write_response(writer, STATUS_OK, encode_vector_binary(vec))
+            except InvalidImageError as e:
+                write_response(writer, STATUS_INVALID_IMAGE, str(e).encode("utf-8"))
+            except Exception as e:
+                print(f"❌ [inference-server] Error generando embedding: {e}")
+                write_response(writer, STATUS_ERROR, str(e).encode("utf-8"))
+            await writer.drain()
+    except FrameTooLargeError as e:
+        # El cuerpo no se leyó: se responde y se cierra la conexión
+        write_response(writer, STATUS_INVALID_IMAGE, str(e).encode("utf-8"))
+        await writer.drain()
+    except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+        # El cliente se desconectó o canceló la petición
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(path: str) -> None:
+    """Carga el modelo y atiende peticiones hasta recibir SIGINT/SIGTERM."""
+    from services.embeddings import _load_model, shutdown_batcher
+
+    # Las etapas decode/preprocess/forward se publican junto a las de los workers
+    start_metrics_sync()
+    print("🔄 [inference-server] Cargando MegaDescriptor...")
+    await asyncio.to_thread(_load_model)
+
+    if os.path.exists(path):
+        os.unlink(path)  # socket de una corrida anterior
+    server = await asyncio.start_unix_server(handle_connection, path=path)
+    os.chmod(path, 0o660)
+    print(f"✅ [inference-server] Escuchando en {path} (pid {os.getpid()})")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+    await shutdown_batcher()
+    if os.path.exists(path):
+        os.unlink(path)
+    print("👋 [inference-server] Detenido")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Servidor de inferencia compartido por los workers HTTP")
+    parser.add_argument("--socket", default=INFERENCE_SERVER_SOCKET or DEFAULT_SOCKET, help="Ruta del socket Unix")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parse_args().socket))
@@ -0,0 +1,393 @@
+# backend/services/jobs.py
+"""
+Trabajos en segundo plano del proceso (p.ej. regeneración masiva de embeddings).
+
+Un endpoint envía el trabajo y devuelve un id de inmediato; el trabajo corre
+en el event loop con un límite de trabajos simultáneos
+(EMBEDDING_JOBS_MAX_CONCURRENT) y su progreso se consulta por id.
+
+El trabajo corre en el worker que lo recibió, pero con `uvicorn --workers N`
+la siguiente petición puede caer en otro worker. Por eso el gestor del
+proceso refleja el estado de cada trabajo en EMBEDDING_JOBS_DIR (un JSON por
+trabajo, actualizado cada EMBEDDING_JOBS_SYNC_SECONDS), compartido por todos
+los workers del host:
+    - cualquier worker puede consultar y listar los trabajos
+    - cancelar un trabajo de otro worker deja una marca que su dueño lee
+    - el límite de concurrencia es global (un lock de archivo por slot)
+Un trabajo que figura activo pero cuyo worker ya no existe se informa como
+fallido. Con EMBEDDING_JOBS_DIR vacío (o entre contenedores distintos) cada
+worker solo ve sus propios trabajos.
+
+Los archivos de trabajos terminados se borran al enviar o listar trabajos:
+los de más de EMBEDDING_JOBS_RETENTION_HOURS y los que exceden
+EMBEDDING_JOBS_HISTORY (los más viejos primero).
+
+Un "runner" es cualquier objeto con:
+    async run() -> dict      (resultado final)
+    cancel() -> None         (cancelación cooperativa)
+    snapshot() -> dict       (progreso actual)
+como services.backfill.BackfillPipeline.
+"""
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: el límite de concurrencia queda por worker
+    fcntl = None
+
+EMBEDDING_JOBS_MAX_CONCURRENT = max(1, int(os.getenv("EMBEDDING_JOBS_MAX_CONCURRENT", "1")))
+EMBEDDING_JOBS_HISTORY = max(1, int(os.getenv("EMBEDDING_JOBS_HISTORY", "50")))
+EMBEDDING_JOBS_DIR = os.getenv("EMBEDDING_JOBS_DIR", os.path.join(tempfile.gettempdir(), "petalert-jobs"))
+EMBEDDING_JOBS_SYNC_SECONDS = float(os.getenv("EMBEDDING_JOBS_SYNC_SECONDS", "2"))
+EMBEDDING_JOBS_RETENTION_HOURS = float(os.getenv("EMBEDDING_JOBS_RETENTION_HOURS", "72"))
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class Job:
+    """Estado de un trabajo en segundo plano."""
+
+    def __init__(self, kind: str, runner: Any, params: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.runner = runner
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.cancel_requested = False
+        self.worker_pid = os.getpid()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL_STATES
+
+    def as_dict(self) -> Dict[str, Any]:
+        progress = self.result
+        if progress is None and self.status == RUNNING:
+            progress = self.runner.snapshot()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "cancel_requested": self.cancel_requested,
+            "worker_pid": self.worker_pid,
+            "error": self.error,
+            "progress": progress,
+        }
+
+
+class JobManager:
+    """
+    Cola de trabajos con límite de concurrencia e historial acotado.
+
+    Args:
+        max_concurrent: Trabajos corriendo a la vez
+        history: Trabajos terminados que se conservan (en memoria y en state_dir)
+        state_dir: Directorio compartido entre workers; None = solo en memoria
+        sync_seconds: Cada cuánto se publica el progreso y se leen cancelaciones
+        retention_seconds: Antigüedad máxima de un trabajo terminado en state_dir
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = EMBEDDING_JOBS_MAX_CONCURRENT,
+        history: int = EMBEDDING_JOBS_HISTORY,
+        state_dir: Optional[str] = None,
+        sync_seconds: float = EMBEDDING_JOBS_SYNC_SECONDS,
+        retention_seconds: float = EMBEDDING_JOBS_RETENTION_HOURS * 3600,
+    ):
+        self.max_concurrent = max_concurrent
+        self.history = history
+        self.state_dir = state_dir
+        self.sync_seconds = sync_seconds
+        self.retention_seconds = retention_seconds
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    def submit(self, kind: str, runner_factory: Callable[[], Any], params: Optional[Dict[str, Any]] = None) -> Job:
+        """Crea el trabajo y lo encola; debe llamarse desde el event loop."""
+        job = Job(kind, runner_factory(), params)
+        self._jobs[job.id] = job
+        self._prune()
+        self._load_shared()
+        self._persist(job)
+        job.task = asyncio.create_task(self._run(job))
+        print(f"📝 [jobs] Trabajo {job.id} ({kind}) encolado")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Trabajo de este worker (None si no existe o corre en otro worker)."""
+        return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None) -> List[Job]:
+        jobs = [job for job in self._jobs.values() if kind is None or job.kind == kind]
+        return list(reversed(jobs))
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancela un trabajo: si está encolado no llega a empezar; si está corriendo
+        se le pide al runner que termine lo que tiene en curso y se detenga.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        job.cancel_requested = True
+        if job.status == QUEUED:
+            job.task.cancel()
+        else:
+            job.runner.cancel()
+        self._persist(job)
+        return job
+
+    # -- vista compartida entre workers --
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado de un trabajo de cualquier worker del host (as_dict)."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.as_dict()
+        return self._load(job_id)
+
+    def list_status(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Trabajos de todos los workers del host, más recientes primero."""
+        states = {job.id: job.as_dict() for job in self._jobs.values()}
+        for job_id, data in self._load_shared().items():
+            states.setdefault(job_id, data)
+        jobs = [data for data in states.values() if kind is None or data.get("kind") == kind]
+        return sorted(jobs, key=lambda data: data.get("created_at") or 0, reverse=True)
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancela un trabajo de cualquier worker: si es de este, directamente; si no,
+        deja una marca que el worker dueño lee en su próxima sincronización.
+        """
+        job = self.cancel(job_id)
+        if job is not None:
+            return job.as_dict()
+        data = self._load(job_id)
+        if data is None or data["status"] in FINAL_STATES:
+            return data
+        with open(self._path(job_id, ".cancel"), "w"):
+            pass
+        data["cancel_requested"] = True
+        return data
+
+    async def shutdown(self) -> None:
+        """Cancela todos los trabajos pendientes y espera a que terminen."""
+        pending = [job for job in self._jobs.values() if not job.done]
+        for job in pending:
+            self.cancel(job.id)
+        tasks = [job.task for job in pending if job.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: Job) -> None:
+        slot = None
+        sync = None
+        try:
+            slot = await self._acquire_slot(job)
+            if job.cancel_requested:
+                raise asyncio.CancelledError()
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._persist(job)
+            print(f"▶️ [jobs] Trabajo {job.id} ({job.kind}) iniciado")
+            if self.state_dir:
+                sync = asyncio.create_task(self._sync_loop(job))
+            job.result = await job.runner.run()
+            job.status = CANCELLED if job.cancel_requested else COMPLETED
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            job.result = job.runner.snapshot()
+            print(f"❌ [jobs] Trabajo {job.id} falló: {e}")
+        finally:
+            if sync is not None:
+                sync.cancel()
+            self._release_slot(slot)
+            job.finished_at = time.time()
+            self._persist(job)
+            self._remove(job.id, ".cancel")
+            print(f"⏹️ [jobs] Trabajo {job.id} terminó con estado '{job.status}'")
+
+    async def _acquire_slot(self, job: Job) -> Any:
+        """
+        Espera un lugar para correr. Con state_dir el lugar es un lock de archivo
+        (global entre workers); si no, el semáforo del proceso.
+        """
+        if not self.state_dir or fcntl is None:
+            semaphore = self._get_semaphore()
+            await semaphore.acquire()
+            return semaphore
+        os.makedirs(self.state_dir, exist_ok=True)
+        while True:
+            if self._take_cancel_mark(job):
+                raise asyncio.CancelledError()
+            for index in range(self.max_concurrent):
+                handle = open(os.path.join(self.state_dir, f"slot-{index}.lock"), "a")
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return handle
+                except OSError:
+                    handle.close()
+            await asyncio.sleep(min(self.sync_seconds, 0.5))
+
+    @staticmethod
+    def _release_slot(slot: Any) -> None:
+        if isinstance(slot, asyncio.Semaphore):
+            slot.release()
+        elif slot is not None:
+            slot.close()  # cerrar el archivo libera el flock
+
+    async def _sync_loop(self, job: Job) -> None:
+        """Publica el progreso y atiende cancelaciones pedidas desde otros workers."""
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            if self._take_cancel_mark(job):
+                print(f"🛑 [jobs] Cancelación de {job.id} pedida desde otro worker")
+                job.runner.cancel()
+            self._persist(job)
+
+    def _take_cancel_mark(self, job: Job) -> bool:
+        path = self._path(job.id, ".cancel")
+        if not path or not os.path.exists(path):
+            return False
+        self._remove(job.id, ".cancel")
+        job.cancel_requested = True
+        return True
+
+    # -- archivos de estado --
+
+    def _path(self, job_id: str, suffix: str = ".json") -> Optional[str]:
+        if not self.state_dir or not _JOB_ID.fullmatch(job_id):
+            return None
+        return os.path.join(self.state_dir, job_id + suffix)
+
+    def _persist(self, job: Job) -> None:
+        path = self._path(job.id)
+        if path is None:
+            return
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(job.as_dict(), f, default=str)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"⚠️ [jobs] No se pudo guardar el estado de {job.id}: {e}")
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("status") not in FINAL_STATES and not _process_alive(data.get("worker_pid")):
+            data["status"] = FAILED
+            data["error"] = data.get("error") or f"El worker {data.get('worker_pid')} terminó sin cerrar el trabajo"
+        return data
+
+    def _load_shared(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Estados de state_dir tras aplicar la retención: borra los trabajos
+        terminados más viejos que retention_seconds o que exceden el historial.
+        """
+        if not self.state_dir or not os.path.isdir(self.state_dir):
+            return {}
+        states: Dict[str, Dict[str, Any]] = {}
+        for name in os.listdir(self.state_dir):
+            job_id, ext = os.path.splitext(name)
+            if ext == ".json":
+                data = self._load(job_id)
+                if data is not None:
+                    states[job_id] = data
+
+        def ended(data: Dict[str, Any]) -> float:
+            # Un trabajo de un worker muerto no tiene finished_at: cuenta desde su creación
+            return data.get("finished_at") or data.get("created_at") or 0
+
+        cutoff = time.time() - self.retention_seconds
+        finished = sorted(
+            (job_id for job_id, data in states.items() if data.get("status") in FINAL_STATES),
+            key=lambda job_id: ended(states[job_id]),
+            reverse=True
+        )
+        for rank, job_id in enumerate(finished):
+            if rank >= self.history or ended(states[job_id]) < cutoff:
+                del states[job_id]
+                self._jobs.pop(job_id, None)
+                self._remove(job_id)
+                self._remove(job_id, ".cancel")
+        return states
+
+    def _remove(self, job_id: str, suffix: str = ".json") -> None:
+        path = self._path(job_id, suffix)
+        if path is not None:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _prune(self) -> None:
+        """Descarta los trabajos terminados más viejos por encima del historial."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+            self._remove(job_id)
+
+
+def _process_alive(pid: Any) -> bool:
+    if not isinstance(pid, int):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # existe pero es de otro usuario
+    return True
+
+
+_manager = JobManager(state_dir=EMBEDDING_JOBS_DIR or None)
+
+
+def get_job_manager() -> JobManager:
+    """Gestor de trabajos compartido del proceso."""
+    return _manager
@@ -0,0 +1,161 @@
+# backend/services/label_vocab.py
+"""
+Vocabulario de etiquetas y colores internados a ids enteros.
+
+Cada reporte guarda los ids ordenados de sus etiquetas (`label_ids`) y colores
+(`color_ids`), calculados por la base al guardar labels/colors (migración 016).
+Las búsquedas arman con esos arreglos una columna de términos de todos los
+candidatos y calculan el Jaccard contra la consulta en forma vectorizada
+(np.isin + np.bincount), sin reconstruir sets de strings desde el JSON.
+
+Los reportes que todavía no tienen ids (p.ej. base sin la migración) se
+resuelven parseando el JSON como antes; para el Jaccard solo importa qué
+términos coinciden con la consulta y cuántos términos tiene cada reporte.
+"""
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from utils.supabase_client import select_in_chunks
+
+LABEL_IDS_FIELD = "label_ids"
+COLOR_IDS_FIELD = "color_ids"
+
+
+def label_set(labels_json) -> set:
+    """Convierte etiquetas JSON a un conjunto de strings."""
+    if not labels_json:
+        return set()
+    items = labels_json.get("labels") if isinstance(labels_json, dict) else None
+    if not isinstance(items, list):
+        return set()
+    return {(it.get("label") or it.get("description") or "").lower() for it in items if it}
+
+
+def color_set(colors_json) -> set:
+    """Convierte colores JSON a un conjunto de strings."""
+    if not colors_json:
+        return set()
+    if isinstance(colors_json, list):
+        return set(color.lower() for color in colors_json if color)
+    return set()
+
+
+class LabelVocabulary:
+    """Caché del proceso de la tabla label_vocabulary (término -> id)."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def lookup(self, sb, terms: Iterable[str]) -> Dict[str, int]:
+        """
+        Ids de los términos que existen en el vocabulario. Los que no están en
+        caché se consultan a la base; los desconocidos no aparecen en el resultado.
+        """
+        terms = set(terms)
+        with self._lock:
+            found = {t: self._ids[t] for t in terms if t in self._ids}
+        missing = sorted(terms - found.keys())
+        if not missing or sb is None:
+            return found
+        try:
+            for row in select_in_chunks(sb, "label_vocabulary", "id, term", "term", missing):
+                found[row["term"]] = int(row["id"])
+        except Exception as e:
+            print(f"⚠️ [labels] No se pudo consultar el vocabulario de etiquetas: {e}")
+            return found
+        with self._lock:
+            self._ids.update(found)
+        return found
+
+
+_vocabulary = LabelVocabulary()
+
+
+def get_label_vocabulary() -> LabelVocabulary:
+    """Vocabulario compartido del proceso."""
+    return _vocabulary
+
+
+def query_term_ids(sb, terms: Iterable[str], vocabulary: Optional[LabelVocabulary] = None) -> Dict[str, int]:
+    """
+    Ids de los términos de una consulta. Los que no están en el vocabulario
+    reciben un id negativo local: ningún reporte con ids los contiene, pero un
+    reporte sin ids (resuelto desde el JSON) sí puede coincidir por texto.
+    """
+    terms = sorted(set(terms))
+    known = (vocabulary or _vocabulary).lookup(sb, terms) if terms else {}
+    local = -1
+    ids: Dict[str, int] = {}
+    for term in terms:
+        if term in known:
+            ids[term] = known[term]
+        else:
+            ids[term] = local
+            local -= 1
+    return ids
+
+
+class TermColumn:
+    """Conjuntos de términos de N reportes como ids concatenados + fila de cada id."""
+
+    def __init__(self, ids: np.ndarray, rows: np.ndarray, sizes: np.ndarray):
+        self.ids = ids
+        self.rows = rows
+        self.sizes = sizes
+
+    def __len__(self) -> int:
+        return int(self.sizes.shape[0])
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Sequence[Dict[str, Any]],
+        ids_field: str,
+        json_field: str,
+        terms_fn: Callable[[Any], set],
+        query_ids: Dict[str, int],
+    ) -> "TermColumn":
+        """
+        Arma la columna con los ids guardados de cada reporte. Si un reporte no
+        tiene ids, se parsea su JSON y solo se conservan los términos de la consulta.
+        """
+        id_lists: List[Sequence[int]] = []
+        sizes = np.zeros(len(rows), dtype=np.int64)
+        for i, row in enumerate(rows):
+            stored = row.get(ids_field)
+            if isinstance(stored, list):
+                id_lists.append(stored)
+                sizes[i] = len(stored)
+            else:
+                terms = terms_fn(row.get(json_field))
+                id_lists.append([query_ids[t] for t in terms if t in query_ids])
+                sizes[i] = len(terms)
+        lengths = np.fromiter((len(ids) for ids in id_lists), dtype=np.int64, count=len(id_lists))
+        total = int(lengths.sum())
+        flat = np.fromiter((i for ids in id_lists for i in ids), dtype=np.int64, count=total)
+        row_of = np.repeat(np.arange(len(id_lists), dtype=np.int64), lengths)
+        return cls(flat, row_of, sizes)
+
+    def intersection_counts(self, query_ids: Iterable[int]) -> np.ndarray:
+        """Cantidad de términos de la consulta presentes en cada reporte."""
+        query = np.fromiter(query_ids, dtype=np.int64)
+        if query.size == 0 or self.ids.size == 0:
+            return np.zeros(len(self), dtype=np.int64)
+        members = np.isin(self.ids, query)
+        return np.bincount(self.rows[members], minlength=len(self))
+
+    def jaccard(self, query_ids: Dict[str, int]) -> np.ndarray:
+        """Jaccard (0-100) de cada reporte contra la consulta; 0 si alguno está vacío."""
+        n_query = len(query_ids)
+        if n_query == 0:
+            return np.zeros(len(self))
+        inter = self.intersection_counts(query_ids.values()).astype(np.float64)
+        union = self.sizes + n_query - inter
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where((self.sizes > 0) & (union > 0), inter / union * 100.0, 0.0)
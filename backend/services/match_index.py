@@ -0,0 +1,398 @@
+# backend/services/match_index.py
+"""
+Índice vectorial en memoria con los embeddings de los reportes activos.
+
+Los vectores se guardan en matrices float32 contiguas particionadas por
+(type, species). Un top-k es un único producto matriz-vector más
+`np.argpartition`, en lugar de descargar todos los embeddings como JSON y
+compararlos uno por uno en Python. El índice se mantiene al día de forma
+incremental cuando se crean, actualizan, resuelven o cancelan reportes, y se
+reconstruye desde Supabase cada MATCH_INDEX_REFRESH_SECONDS para incorporar
+cambios hechos por otros workers o procesos externos.
+
+Solo un thread recarga a la vez; mientras tanto los demás siguen buscando en
+la instantánea vigente. Los cambios incrementales que llegan durante la
+recarga se anotan y se vuelven a aplicar sobre el índice nuevo al
+reemplazarlo, así no se pierden.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.vector_codec import decode_vector
+
+MATCH_INDEX_REFRESH_SECONDS = float(os.getenv("MATCH_INDEX_REFRESH_SECONDS", "300"))
+MATCH_INDEX_PAGE_SIZE = int(os.getenv("MATCH_INDEX_PAGE_SIZE", "1000"))
+
+PartitionKey = Tuple[Optional[str], Optional[str]]
+
+
+def to_unit_vector(embedding: Any) -> Optional[np.ndarray]:
+    """Convierte un embedding (lista, texto, base64 binario o ndarray) a float32 L2-normalizado."""
+    vec = decode_vector(embedding)
+    if vec is None or vec.size == 0:
+        return None
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0 or not np.isfinite(norm):
+        return None
+    return vec / norm
+
+
+class _Partition:
+    """Matriz contigua de vectores de una partición (type, species)."""
+
+    def __init__(self, dim: int, capacity: int = 256):
+        self.matrix = np.empty((capacity, dim), dtype=np.float32)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, report_id: str, vec: np.ndarray) -> None:
+        row = self.rows.get(report_id)
+        if row is not None:
+            self.matrix[row] = vec
+            return
+        n = len(self.ids)
+        if n == self.matrix.shape[0]:
+            grown = np.empty((max(256, n * 2), self.matrix.shape[1]), dtype=np.float32)
+            grown[:n] = self.matrix[:n]
+            self.matrix = grown
+        self.matrix[n] = vec
+        self.ids.append(report_id)
+        self.rows[report_id] = n
+
+    def remove(self, report_id: str) -> Optional[np.ndarray]:
+        row = self.rows.pop(report_id, None)
+        if row is None:
+            return None
+        vec = self.matrix[row].copy()
+        last = len(self.ids) - 1
+        if row != last:
+            # Mover la última fila al hueco para mantener la matriz compacta
+            last_id = self.ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = last_id
+            self.rows[last_id] = row
+        self.ids.pop()
+        return vec
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        return self.matrix[:len(self.ids)] @ query
+
+
+class MatchIndex:
+    """Índice en memoria de embeddings de reportes activos, particionado por (type, species)."""
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim
+        self._partitions: Dict[PartitionKey, _Partition] = {}
+        self._keys: Dict[str, PartitionKey] = {}
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        # Cambios recibidos durante una recarga: (método, *args) a repetir sobre el índice nuevo
+        self._journal: Optional[List[Tuple[Any, ...]]] = None
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, report_id: str) -> bool:
+        return report_id in self._keys
+
+    def upsert(self, report_id: str, embedding: Any, report_type: Optional[str], species: Optional[str]) -> bool:
+        """Agrega o reemplaza el vector de un reporte. Devuelve False si el vector es inválido."""
+        vec = to_unit_vector(embedding)
+        if vec is None:
+            return False
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("upsert", report_id, vec, report_type, species))
+            if self.dim is None:
+                self.dim = vec.shape[0]
+            if vec.shape[0] != self.dim:
+                print(f"⚠️ [match-index] Dimensiones no coinciden para {report_id}: {vec.shape[0]} vs {self.dim}")
+                return False
+            key = (report_type, species)
+            old_key = self._keys.get(report_id)
+            if old_key is not None and old_key != key:
+                self._partitions[old_key].remove(report_id)
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition(self.dim)
+            partition.add(report_id, vec)
+            self._keys[report_id] = key
+        return True
+
+    def update_metadata(self, report_id: str, report_type: Optional[str], species: Optional[str]) -> None:
+        """Mueve un reporte de partición si cambió su type o species."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("update_metadata", report_id, report_type, species))
+            old_key = self._keys.get(report_id)
+            if old_key is None or old_key == (report_type, species):
+                return
+            vec = self._partitions[old_key].remove(report_id)
+            del self._keys[report_id]
+        self.upsert(report_id, vec, report_type, species)
+
+    def remove(self, report_id: str) -> None:
+        """Quita un reporte del índice (resuelto, cancelado o sin embedding)."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("remove", report_id))
+            key = self._keys.pop(report_id, None)
+            if key is not None:
+                self._partitions[key].remove(report_id)
+
+    def get_vector(self, report_id: str) -> Optional[np.ndarray]:
+        """Devuelve una copia del vector indexado de un reporte, si existe."""
+        with self._lock:
+            key = self._keys.get(report_id)
+            if key is None:
+                return None
+            partition = self._partitions[key]
+            return partition.matrix[partition.rows[report_id]].copy()
+
+    def _matching_partitions(self, report_type: Optional[str], species: Optional[str]) -> List[_Partition]:
+        return [
+            partition for (p_type, p_species), partition in self._partitions.items()
+            if (report_type is None or p_type == report_type)
+            and (species is None or p_species == species)
+            and len(partition) > 0
+        ]
+
+    def count(self, report_type: Optional[str] = None, species: Optional[str] = None) -> int:
+        """Cantidad de candidatos que tendría una búsqueda con esos filtros."""
+        with self._lock:
+            return sum(len(p) for p in self._matching_partitions(report_type, species))
+
+    def search(
+        self,
+        query: Any,
+        report_type: Optional[str] = None,
+        species: Optional[str] = None,
+        k: int = 10,
+        threshold: Optional[float] = None,
+        exclude_id: Optional[str] = None,
+        ids: Optional[Iterable[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Igual que `search_with_total` pero devuelve solo los resultados."""
+        return self.search_with_total(query, report_type, species, k, threshold, exclude_id, ids)[0]
+
+    def search_with_total(
+        self,
+        query: Any,
+        report_type: Optional[str] = None,
+        species: Optional[str] = None,
+        k: int = 10,
+        threshold: Optional[float] = None,
+        exclude_id: Optional[str] = None,
+        ids: Optional[Iterable[str]] = None,
+    ) -> Tuple[List[Tuple[str, float]], int]:
+        """
+        Top-k por similitud coseno dentro de las particiones que cumplen los filtros.
+
+        Args:
+            query: Vector de consulta (se normaliza)
+            report_type: Filtrar por type ('lost'/'found'); None = todos
+            species: Filtrar por especie; None = todas
+            k: Cantidad máxima de resultados
+            threshold: Similitud mínima
+            exclude_id: Reporte a excluir (normalmente el propio reporte base)
+            ids: Si se indica, considerar solo estos reportes
+
+        Returns:
+            (lista de (report_id, similitud) ordenada de mayor a menor,
+             cantidad total de candidatos que superan el umbral)
+        """
+        qvec = to_unit_vector(query)
+        if qvec is None or k <= 0:
+            return [], 0
+        with self._lock:
+            if self.dim is None or qvec.shape[0] != self.dim:
+                return [], 0
+            partitions = self._matching_partitions(report_type, species)
+            if not partitions:
+                return [], 0
+            scores = np.concatenate([p.scores(qvec) for p in partitions])
+            offsets = np.cumsum([0] + [len(p) for p in partitions])
+            if exclude_id is not None:
+                for p, offset in zip(partitions, offsets):
+                    if exclude_id in p.rows:
+                        scores[offset + p.rows[exclude_id]] = -np.inf
+                        break
+            if ids is not None:
+                allowed = np.zeros(scores.shape[0], dtype=bool)
+                for report_id in ids:
+                    for p, offset in zip(partitions, offsets):
+                        row = p.rows.get(report_id)
+                        if row is not None:
+                            allowed[offset + row] = True
+                            break
+                scores[~allowed] = -np.inf
+
+            if threshold is not None:
+                candidates = np.flatnonzero(scores >= threshold)
+            else:
+                candidates = np.flatnonzero(np.isfinite(scores))
+            if candidates.size == 0:
+                return [], 0
+            top = min(k, candidates.size)
+            cand_scores = scores[candidates]
+            if top < candidates.size:
+                best = np.argpartition(-cand_scores, top - 1)[:top]
+            else:
+                best = np.arange(candidates.size)
+            best = best[np.argsort(-cand_scores[best], kind="stable")]
+
+            results = []
+            for i in best:
+                global_row = int(candidates[i])
+                part_no = int(np.searchsorted(offsets, global_row, side="right")) - 1
+                report_id = partitions[part_no].ids[global_row - offsets[part_no]]
+                results.append((report_id, float(cand_scores[i])))
+            return results, int(candidates.size)
+
+    def rebuild(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Reemplaza el contenido del índice con las filas dadas (id, type, species, embedding).
+        Los cambios anotados desde que empezó la recarga se aplican encima.
+        """
+        fresh = MatchIndex(self.dim)
+        for row in rows:
+            fresh.upsert(row["id"], row.get("embedding"), row.get("type"), row.get("species"))
+        with self._lock:
+            journal, self._journal = self._journal, None
+            for method, *args in journal or []:
+                getattr(fresh, method)(*args)
+            self.dim = fresh.dim
+            self._partitions = fresh._partitions
+            self._keys = fresh._keys
+            self.loaded_at = time.time()
+        return len(self)
+
+    def load_from_supabase(self, sb, page_size: int = MATCH_INDEX_PAGE_SIZE) -> int:
+        """Carga todos los reportes activos con embedding desde Supabase, paginando."""
+        started = time.perf_counter()
+        with self._lock:
+            self._journal = []
+        try:
+            rows = self._fetch_active_rows(sb, page_size)
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        total = self.rebuild(rows)
+        print(f"📚 [match-index] {total} embeddings activos cargados en {time.perf_counter() - started:.2f}s")
+        return total
+
+    def _fetch_active_rows(self, sb, page_size: int) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            page = sb.table("reports")\
+                .select("id, type, species, embedding:embedding_b64")\
+                .eq("status", "active")\
+                .not_.is_("embedding", "null")\
+                .order("id")\
+                .range(offset, offset + page_size - 1)\
+                .execute()
+            data = page.data or []
+            rows.extend(data)
+            if len(data) < page_size:
+                break
+            offset += page_size
+        return rows
+
+    @property
+    def accepts_updates(self) -> bool:
+        """True si ya se cargó o si hay una carga en curso que anota los cambios."""
+        return self.loaded_at is not None or self._journal is not None
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or (time.time() - self.loaded_at) > MATCH_INDEX_REFRESH_SECONDS
+
+    def ensure_fresh(self, sb) -> "MatchIndex":
+        """
+        Carga el índice si nunca se cargó o si venció el intervalo de refresco.
+        Una sola recarga a la vez: en la primera carga los demás la esperan; en
+        las siguientes siguen con la instantánea vigente.
+        """
+        if not self.is_stale():
+            return self
+        if not self._reload_lock.acquire(blocking=self.loaded_at is None):
+            return self
+        try:
+            # Otro thread pudo terminar la recarga mientras se esperaba el lock
+            if self.is_stale():
+                self.load_from_supabase(sb)
+        finally:
+            self._reload_lock.release()
+        return self
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._keys),
+                "dim": self.dim,
+                "loaded_at": self.loaded_at,
+                "partitions": {
+                    f"{p_type}/{p_species}": len(partition)
+                    for (p_type, p_species), partition in self._partitions.items()
+                },
+            }
+
+
+_index = MatchIndex()
+
+
+def get_match_index() -> MatchIndex:
+    """Índice compartido del proceso."""
+    return _index
+
+
+def index_report_row(row: Optional[Dict[str, Any]], embedding: Any = None) -> None:
+    """
+    Sincroniza el índice con una fila de `reports` recién escrita.
+    Si el reporte está activo y tiene embedding lo agrega/actualiza; si no, lo quita.
+    Si el índice todavía no se cargó ni se está cargando no hace nada (la carga
+    inicial lo incluirá).
+    """
+    if not row or not _index.accepts_updates:
+        return
+    report_id = row.get("id")
+    if not report_id:
+        return
+    if row.get("status", "active") != "active":
+        _index.remove(report_id)
+        return
+    if embedding is None:
+        embedding = row.get("embedding")
+    if embedding is not None:
+        _index.upsert(report_id, embedding, row.get("type"), row.get("species"))
+    else:
+        _index.update_metadata(report_id, row.get("type"), row.get("species"))
+
+
+def index_report_vector(sb, report_id: str, embedding: Any) -> None:
+    """
+    Variante de `index_report_row` para cuando solo se conoce el id del reporte
+    (p.ej. tras guardar el embedding vía RPC): consulta type/species/status.
+    """
+    if not _index.accepts_updates:
+        return
+    try:
+        result = sb.table("reports")\
+            .select("id, type, species, status")\
+            .eq("id", report_id)\
+            .execute()
+    except Exception as e:
+        print(f"⚠️ [match-index] No se pudo actualizar el índice para {report_id}: {e}")
+        return
+    if result.data:
+        index_report_row(result.data[0], embedding)
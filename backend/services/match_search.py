@@ -0,0 +1,205 @@
+# backend/services/match_search.py
+"""
+Búsqueda de reportes similares por embedding.
+
+Por defecto el top-k se resuelve dentro de Postgres con las RPCs de la
+migración 012 (`match_reports_for_report` / `match_reports_by_embedding`), que
+recorren el índice HNSW de pgvector y devuelven solo (id, similarity_score).
+Con MATCH_SEARCH_BACKEND=memory se usa el índice en memoria del proceso
+(services/match_index.py), útil cuando la base no tiene la migración aplicada.
+
+Ambos índices contienen el vector agregado de cada reporte. Con
+MATCH_PHOTO_SIMILARITY=max (solo backend pgvector) los candidatos se vuelven a
+puntuar con la similitud máxima entre fotos (services/photo_embeddings.py).
+"""
+import os
+from typing import Any, Iterable, List, Optional, Tuple
+
+from services.match_index import get_match_index, to_unit_vector
+from services.photo_embeddings import MATCH_PHOTO_OVERFETCH, MATCH_PHOTO_SIMILARITY, rerank_by_max_photo
+from utils.metrics import MATCH_SCAN_CANDIDATES
+from utils.vector_codec import to_pgvector_text
+
+MATCH_SEARCH_BACKEND = os.getenv("MATCH_SEARCH_BACKEND", "pgvector").lower()  # pgvector | memory
+MATCH_EF_SEARCH = int(os.getenv("MATCH_EF_SEARCH", "40"))
+
+SearchResults = List[Tuple[str, float]]
+
+
+class ReportNotFoundError(LookupError):
+    """El reporte base no existe."""
+
+
+class ReportWithoutEmbeddingError(ValueError):
+    """El reporte base no tiene embedding generado."""
+
+
+def _opposite_type(report_type: Optional[str]) -> str:
+    return "found" if report_type == "lost" else "lost"
+
+
+def _rpc_rows(result) -> SearchResults:
+    return [(row["id"], float(row["similarity_score"])) for row in (result.data or [])]
+
+
+def _raise_for_rpc_error(report_id: str, error: Exception) -> None:
+    """Traduce los RAISE EXCEPTION de la RPC a excepciones de Python."""
+    message = str(error)
+    if "REPORT_WITHOUT_EMBEDDING" in message:
+        raise ReportWithoutEmbeddingError(f"El reporte {report_id} no tiene embedding generado") from error
+    if "REPORT_NOT_FOUND" in message:
+        raise ReportNotFoundError(f"Reporte {report_id} no encontrado") from error
+    raise error
+
+
+def search_similar_to_report_with_total(
+    sb,
+    report_id: str,
+    species: Optional[str] = None,
+    k: int = 10,
+    threshold: float = 0.0,
+) -> Tuple[SearchResults, int]:
+    """
+    Top-k de reportes activos del tipo opuesto similares al embedding guardado de `report_id`.
+
+    Args:
+        sb: Cliente de Supabase
+        report_id: Reporte base
+        species: Filtrar por especie; None = todas
+        k: Cantidad máxima de resultados
+        threshold: Similitud mínima
+
+    Returns:
+        (lista de (report_id, similitud) ordenada de mayor a menor,
+         cantidad de candidatos sobre el umbral; con pgvector es como máximo k)
+
+    Raises:
+        ReportNotFoundError: Si el reporte no existe
+        ReportWithoutEmbeddingError: Si el reporte no tiene embedding
+    """
+    if MATCH_SEARCH_BACKEND == "memory":
+        index = get_match_index().ensure_fresh(sb)
+        base_vec = index.get_vector(report_id)
+        columns = "id, type" if base_vec is not None else "id, type, embedding:embedding_b64"
+        result = sb.table("reports").select(columns).eq("id", report_id).execute()
+        if not result.data:
+            raise ReportNotFoundError(f"Reporte {report_id} no encontrado")
+        report = result.data[0]
+        if base_vec is None:
+            base_vec = to_unit_vector(report.get("embedding"))
+            if base_vec is None:
+                raise ReportWithoutEmbeddingError(f"El reporte {report_id} no tiene embedding generado")
+        rows, total = index.search_with_total(
+            base_vec,
+            report_type=_opposite_type(report.get("type")),
+            species=species,
+            k=k,
+            threshold=threshold,
+            exclude_id=report_id
+        )
+        MATCH_SCAN_CANDIDATES.observe(total, source="report")
+        return rows, total
+
+    rerank = MATCH_PHOTO_SIMILARITY == "max"
+    try:
+        result = sb.rpc("match_reports_for_report", {
+            "p_report_id": report_id,
+            # Con rerank la similitud agregada no es la final: no se corta por umbral
+            "match_threshold": 0.0 if rerank else threshold,
+            "match_count": k * MATCH_PHOTO_OVERFETCH if rerank else k,
+            "filter_species": species,
+            "ef_search": MATCH_EF_SEARCH
+        }).execute()
+    except Exception as e:
+        _raise_for_rpc_error(report_id, e)
+    rows = _rpc_rows(result)
+    MATCH_SCAN_CANDIDATES.observe(len(rows), source="report")
+    if rerank:
+        rows = rerank_by_max_photo(sb, rows, k, threshold, report_id=report_id)
+    return rows, len(rows)
+
+
+def search_similar_to_report(
+    sb,
+    report_id: str,
+    species: Optional[str] = None,
+    k: int = 10,
+    threshold: float = 0.0,
+) -> SearchResults:
+    """Igual que `search_similar_to_report_with_total` pero devuelve solo los resultados."""
+    return search_similar_to_report_with_total(sb, report_id, species, k, threshold)[0]
+
+
+def search_similar_to_vector(
+    sb,
+    query: Any,
+    report_type: Optional[str] = None,
+    species: Optional[str] = None,
+    k: int = 10,
+    threshold: float = 0.0,
+    exclude_id: Optional[str] = None,
+    ids: Optional[Iterable[str]] = None,
+) -> SearchResults:
+    """
+    Top-k de reportes activos similares a un vector de consulta (p.ej. una foto subida).
+
+    Args:
+        ids: Si se indica, buscar solo entre estos reportes (p.ej. los de un radio);
+            la similitud se calcula de forma exacta sobre ese subconjunto
+
+    Returns:
+        Lista de (report_id, similitud) ordenada de mayor a menor
+    """
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return []
+    if MATCH_SEARCH_BACKEND == "memory":
+        rows = get_match_index().ensure_fresh(sb).search(
+            query,
+            report_type=report_type,
+            species=species,
+            k=k,
+            threshold=threshold,
+            exclude_id=exclude_id,
+            ids=ids
+        )
+        MATCH_SCAN_CANDIDATES.observe(len(rows), source="vector")
+        return rows
+
+    qvec = to_unit_vector(query)
+    if qvec is None:
+        return []
+    rerank = MATCH_PHOTO_SIMILARITY == "max"
+    result = sb.rpc("match_reports_by_embedding", {
+        "query_embedding": to_pgvector_text(qvec),
+        "target_type": report_type,
+        "filter_species": species,
+        "filter_status": "active",
+        "match_threshold": 0.0 if rerank else threshold,
+        "match_count": k * MATCH_PHOTO_OVERFETCH if rerank else k,
+        "exclude_report_id": exclude_id,
+        "ef_search": MATCH_EF_SEARCH,
+        "filter_ids": ids
+    }).execute()
+    rows = _rpc_rows(result)
+    MATCH_SCAN_CANDIDATES.observe(len(rows), source="vector")
+    if rerank:
+        rows = rerank_by_max_photo(sb, rows, k, threshold, query_vectors=[qvec])
+    return rows
+
+
+def count_candidates(sb, report_type: Optional[str] = None, species: Optional[str] = None) -> int:
+    """Cantidad de reportes activos con embedding que cumplen los filtros."""
+    if MATCH_SEARCH_BACKEND == "memory":
+        return get_match_index().ensure_fresh(sb).count(report_type=report_type, species=species)
+
+    query = sb.table("reports")\
+        .select("id", count="exact", head=True)\
+        .eq("status", "active")\
+        .not_.is_("embedding", "null")
+    if report_type:
+        query = query.eq("type", report_type)
+    if species:
+        query = query.eq("species", species)
+    return query.execute().count or 0
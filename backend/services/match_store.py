@@ -0,0 +1,87 @@
+# backend/services/match_store.py
+"""
+Persistencia de matches en la tabla `matches`.
+
+Una corrida de matching (top-k de un reporte) se guarda con una única llamada
+a la RPC `upsert_matches` (migración 017): la restricción única sobre
+(lost_report_id, found_report_id) resuelve en la base si el par es nuevo o si
+hay que mejorar la similitud existente, en lugar de un SELECT + UPDATE/INSERT
+por match. Las listas top-k de cada reporte se recortan con `prune_match_lists`
+(migración 018).
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+def match_pair(report_id: str, report_type: str, candidate_id: str) -> Tuple[str, str]:
+    """(lost_report_id, found_report_id) según el tipo del reporte base."""
+    if report_type == "lost":
+        return report_id, candidate_id
+    return candidate_id, report_id
+
+
+def build_match_rows(
+    report_id: str,
+    report_type: str,
+    matches: Iterable[Tuple[str, float]],
+    matched_by: str = "ai_visual",
+) -> List[Dict[str, Any]]:
+    """Filas para upsert_matches a partir de (candidate_id, similitud)."""
+    rows = []
+    for candidate_id, similarity in matches:
+        lost_report_id, found_report_id = match_pair(report_id, report_type, candidate_id)
+        rows.append({
+            "lost_report_id": lost_report_id,
+            "found_report_id": found_report_id,
+            "similarity_score": round(float(similarity), 4),
+            "matched_by": matched_by,
+        })
+    return rows
+
+
+def upsert_matches(
+    sb,
+    report_id: str,
+    report_type: str,
+    matches: Iterable[Tuple[str, float]],
+    matched_by: str = "ai_visual",
+) -> int:
+    """
+    Guarda los matches de una corrida en un solo round trip.
+
+    Args:
+        sb: Cliente de Supabase
+        report_id: Reporte base de la corrida
+        report_type: Tipo del reporte base ('lost'/'found')
+        matches: Pares (candidate_id, similitud)
+        matched_by: Origen del match
+
+    Returns:
+        Cantidad de matches creados o mejorados
+    """
+    rows = build_match_rows(report_id, report_type, matches, matched_by)
+    if not rows:
+        return 0
+    result = sb.rpc("upsert_matches", {"payload": rows}).execute()
+    return int(result.data or 0)
+
+
+def prune_match_lists(sb, report_ids: Iterable[str], keep: int) -> int:
+    """
+    Recorta a `keep` los matches pendientes de IA de cada reporte (RPC de la
+    migración 018). Un par solo se borra si queda fuera del top-k de ambos lados.
+    """
+    ids = list(dict.fromkeys(i for i in report_ids if i))
+    if not ids:
+        return 0
+    result = sb.rpc("prune_match_lists", {"report_ids": ids, "keep": keep}).execute()
+    return int(result.data or 0)
+
+
+def remove_pending_matches(sb, report_id: str) -> int:
+    """Quita un reporte de las listas de los demás: borra sus matches pendientes de ambos lados."""
+    result = sb.table("matches")\
+        .delete()\
+        .eq("status", "pending")\
+        .or_(f"lost_report_id.eq.{report_id},found_report_id.eq.{report_id}")\
+        .execute()
+    return len(result.data or [])
@@ -0,0 +1,177 @@
+# backend/services/photo_embeddings.py
+"""
+Embeddings de todas las fotos de un reporte.
+
+Cada foto se embebe por separado (todas en el mismo lote de inferencia) y su
+vector se guarda en `report_photo_embeddings` (migración 019). En
+`reports.embedding` queda el agregado: la media de los vectores por foto,
+renormalizada, que es lo que recorre el índice HNSW.
+
+Al consultar, con MATCH_PHOTO_SIMILARITY=max los candidatos que devuelve el
+índice (MATCH_PHOTO_OVERFETCH veces k) se vuelven a puntuar con la mayor
+similitud entre cualquier par de fotos (RPC `max_photo_similarity`).
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import httpx
+import numpy as np
+
+from utils.metrics import stage_timer
+from utils.vector_codec import to_pgvector_text
+
+PHOTO_EMBEDDINGS_MAX_PHOTOS = max(1, int(os.getenv("PHOTO_EMBEDDINGS_MAX_PHOTOS", "5")))
+MATCH_PHOTO_SIMILARITY = os.getenv("MATCH_PHOTO_SIMILARITY", "mean").lower()  # mean | max
+MATCH_PHOTO_OVERFETCH = max(1, int(os.getenv("MATCH_PHOTO_OVERFETCH", "3")))
+
+# (photo_index, photo_url, vector)
+PhotoVector = Tuple[int, str, np.ndarray]
+
+
+def photo_urls(photos: Any, limit: int = PHOTO_EMBEDDINGS_MAX_PHOTOS) -> List[Tuple[int, str]]:
+    """(índice, url) de las primeras `limit` fotos válidas de un reporte."""
+    if not isinstance(photos, list):
+        return []
+    urls = [(i, url) for i, url in enumerate(photos) if isinstance(url, str) and url]
+    return urls[:limit]
+
+
+def aggregate_embeddings(vecs: Sequence[np.ndarray]) -> Optional[np.ndarray]:
+    """
+    Media de los vectores por foto, renormalizada a norma 1 (None si no hay vectores).
+    Con una sola foto (o si la media se anula) se devuelve el primer vector tal cual.
+    """
+    if not len(vecs):
+        return None
+    first = np.asarray(vecs[0], dtype=np.float32)
+    if len(vecs) == 1:
+        return first
+    mean = np.mean(np.stack([np.asarray(v, dtype=np.float32) for v in vecs]), axis=0)
+    norm = float(np.linalg.norm(mean))
+    if norm == 0.0:
+        return first
+    return (mean / norm).astype(np.float32)
+
+
+def photo_embeddings_payload(report_id: str, vec: np.ndarray, photos: Iterable[PhotoVector]) -> Dict[str, Any]:
+    """Item del payload de save_report_photo_embeddings."""
+    return {
+        "id": report_id,
+        "embedding": to_pgvector_text(vec),
+        "photos": [
+            {"photo_index": index, "photo_url": url, "embedding": to_pgvector_text(photo_vec)}
+            for index, url, photo_vec in photos
+        ],
+    }
+
+
+def save_photo_embeddings(sb, items: Iterable[Tuple[str, np.ndarray, Sequence[PhotoVector]]]) -> int:
+    """
+    Guarda vectores por foto y agregados de varios reportes en un solo round trip.
+
+    Args:
+        sb: Cliente de Supabase
+        items: (report_id, vector agregado, [(photo_index, photo_url, vector), ...])
+
+    Returns:
+        Cantidad de reportes actualizados
+    """
+    payload = [photo_embeddings_payload(report_id, vec, photos) for report_id, vec, photos in items]
+    if not payload:
+        return 0
+    with stage_timer("db_write"):
+        result = sb.rpc("save_report_photo_embeddings", {"payload": payload}).execute()
+    return int(result.data or 0)
+
+
+async def download_photos(
+    urls: Sequence[str],
+    timeout: Optional[httpx.Timeout] = None,
+) -> List[Union[bytes, Exception]]:
+    """Descarga varias fotos en paralelo; cada posición es el contenido o la excepción."""
+    async with httpx.AsyncClient(timeout=timeout or httpx.Timeout(60.0, connect=60.0), follow_redirects=True) as client:
+        async def fetch(url: str) -> bytes:
+            response = await client.get(url)
+            response.raise_for_status()
+            return response.content
+
+        with stage_timer("download"):
+            return await asyncio.gather(*(fetch(url) for url in urls), return_exceptions=True)
+
+
+async def embed_report_photos(
+    urls: Sequence[Tuple[int, str]],
+    embed: Callable[[Sequence[bytes]], Awaitable[List[Union[np.ndarray, Exception]]]],
+) -> Tuple[Optional[np.ndarray], List[PhotoVector], List[str]]:
+    """
+    Descarga y embebe las fotos de un reporte en un único lote.
+
+    Args:
+        urls: (photo_index, photo_url) según `photo_urls`
+        embed: Corrutina que embebe varias imágenes juntas
+            (p.ej. services.embeddings.images_bytes_to_vecs_async)
+
+    Returns:
+        (vector agregado o None si ninguna foto sirvió, vectores por foto, errores por foto)
+    """
+    downloads = await download_photos([url for _, url in urls])
+    errors: List[str] = []
+    pending: List[Tuple[int, str, bytes]] = []
+    for (index, url), content in zip(urls, downloads):
+        if isinstance(content, Exception):
+            errors.append(f"{url}: {content}")
+        else:
+            pending.append((index, url, content))
+
+    photos: List[PhotoVector] = []
+    if pending:
+        vecs = await embed([content for _, _, content in pending])
+        for (index, url, _), vec in zip(pending, vecs):
+            if isinstance(vec, Exception):
+                errors.append(f"{url}: {vec}")
+            else:
+                photos.append((index, url, vec))
+    return aggregate_embeddings([vec for _, _, vec in photos]), photos, errors
+
+
+def max_photo_similarity(
+    sb,
+    candidate_ids: Sequence[str],
+    report_id: Optional[str] = None,
+    query_vectors: Optional[Sequence[Any]] = None,
+) -> Dict[str, float]:
+    """
+    Mayor similitud entre las fotos de consulta y las fotos de cada candidato.
+
+    Las fotos de consulta son las guardadas de `report_id` o, si no se indica,
+    `query_vectors` (p.ej. la foto subida en una búsqueda).
+    """
+    if not candidate_ids:
+        return {}
+    params: Dict[str, Any] = {"candidate_ids": list(candidate_ids), "p_report_id": report_id}
+    if report_id is None:
+        params["query_embeddings"] = [to_pgvector_text(v) for v in (query_vectors or [])]
+    result = sb.rpc("max_photo_similarity", params).execute()
+    return {row["id"]: float(row["similarity_score"]) for row in (result.data or [])}
+
+
+def rerank_by_max_photo(
+    sb,
+    results: Sequence[Tuple[str, float]],
+    k: int,
+    threshold: float,
+    report_id: Optional[str] = None,
+    query_vectors: Optional[Sequence[Any]] = None,
+) -> List[Tuple[str, float]]:
+    """
+    Vuelve a puntuar candidatos del índice con la similitud máxima entre fotos.
+
+    Returns:
+        Top-k de (report_id, similitud) sobre el umbral, de mayor a menor
+    """
+    scores = max_photo_similarity(sb, [rid for rid, _ in results], report_id, query_vectors)
+    rescored = [(rid, scores.get(rid, similarity)) for rid, similarity in results]
+    rescored = [item for item in rescored if item[1] >= threshold]
+    rescored.sort(key=lambda item: item[1], reverse=True)
+    return rescored[:k]
@@ -1,7 +1,19 @@
 """Utilidades para el backend de PetFind"""
-from .supabase_client import create_supabase_client, get_supabase_client
+from .supabase_client import (
+    create_supabase_client,
+    get_supabase_client,
+    init_supabase_client,
+    close_supabase_client,
+    get_pool_stats,
+)
 
-__all__ = ['create_supabase_client', 'get_supabase_client']
+__all__ = [
+    'create_supabase_client',
+    'get_supabase_client',
+    'init_supabase_client',
+    'close_supabase_client',
+    'get_pool_stats',
+]
 
 
 
@@ -0,0 +1,74 @@
+"""
+Helper para que los routers generen embeddings sin bloquear el event loop,
+con timeout por llamada y cancelación si el cliente se desconecta.
+"""
+from typing import List, Optional, Sequence, Union
+import numpy as np
+from fastapi import HTTPException, Request
+
+from services.embeddings import (
+    image_bytes_to_vec_async,
+    images_bytes_to_vecs_async,
+    InferenceTimeoutError,
+    InferenceCancelledError,
+)
+from services.image_preprocess import InvalidImageError
+
+
+async def embed_image_for_request(
+    request: Request,
+    image_bytes: bytes,
+    timeout: Optional[float] = None
+) -> np.ndarray:
+    """
+    Genera el embedding de una imagen atado al ciclo de vida de la petición HTTP.
+
+    Args:
+        request: Petición en curso (se usa para detectar desconexión del cliente)
+        image_bytes: Bytes de la imagen
+        timeout: Segundos máximos de inferencia (default: EMBEDDING_TIMEOUT_SECONDS)
+
+    Returns:
+        numpy array float32 normalizado
+
+    Raises:
+        HTTPException 400: Si la imagen está corrupta o excede los límites
+        HTTPException 504: Si la inferencia excede el timeout
+        HTTPException 499: Si el cliente se desconectó antes de terminar
+    """
+    try:
+        return await image_bytes_to_vec_async(
+            image_bytes,
+            timeout=timeout,
+            is_disconnected=request.is_disconnected
+        )
+    except InvalidImageError as e:
+        raise HTTPException(400, str(e))
+    except InferenceTimeoutError as e:
+        raise HTTPException(504, f"Tiempo de inferencia agotado: {str(e)}")
+    except InferenceCancelledError as e:
+        raise HTTPException(499, str(e))
+
+
+async def embed_images_for_request(
+    request: Request,
+    images: Sequence[bytes],
+    timeout: Optional[float] = None
+) -> List[Union[np.ndarray, Exception]]:
+    """
+    Igual que `embed_image_for_request` para varias imágenes que comparten lote.
+
+    Returns:
+        Lista alineada con `images`: vector float32 normalizado o la excepción de esa imagen
+
+    Raises:
+        HTTPException 499: Si el cliente se desconectó antes de terminar
+    """
+    try:
+        return await images_bytes_to_vecs_async(
+            images,
+            timeout=timeout,
+            is_disconnected=request.is_disconnected
+        )
+    except InferenceCancelledError as e:
+        raise HTTPException(499, str(e))
@@ -0,0 +1,472 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (expuestas en /metrics).
+
+Hasta ahora la única telemetría eran los print(): no se podía saber si un
+POST /reports lento se iba en la descarga de fotos, en el modelo o en
+PostgREST. Este módulo registra:
+
+- Latencia por ruta (plantilla de la ruta, no la URL con ids).
+- Tiempo por etapa del pipeline de embeddings: download, decode, preprocess,
+  forward, inference (espera total del llamador, incluida la cola) y db_write.
+- Profundidad de la cola de inferencia y tamaño de cada lote.
+- Round trips a Supabase por petición HTTP (contados por el event hook de httpx).
+- Candidatos devueltos por cada búsqueda de matches.
+- Tiempo de importación de la app y, si se cargó, de torch/timm.
+
+Sin dependencias externas: contadores, gauges e histogramas con etiquetas,
+seguros entre threads.
+
+Cada worker de uvicorn tiene su propio registro, y un scrape de /metrics cae en
+un worker cualquiera. Con METRICS_MULTIPROC_DIR cada proceso (workers y
+servidor de inferencia) publica su registro ahí cada METRICS_SYNC_SECONDS (un
+JSON por pid) y /metrics devuelve la suma de todos: contadores e histogramas
+se suman y cada gauge se combina según su `multiprocess_mode` (sum o max).
+Así también aparecen las etapas decode/preprocess/forward que, con
+INFERENCE_SERVER_SOCKET, ocurren en el servidor de inferencia. Los archivos de
+procesos que dejaron de publicar se descartan. Sin el directorio cada worker
+expone solo sus propias métricas.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_SYNC_SECONDS = float(os.getenv("METRICS_SYNC_SECONDS", "5"))
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}, recibió {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    # -- agregación entre procesos --
+
+    def dump(self) -> List[Any]:
+        """Estado serializable a JSON (ver METRICS_MULTIPROC_DIR)."""
+        raise NotImplementedError
+
+    def merged(self, dumps: Sequence[List[Any]]) -> "_Metric":
+        """Métrica nueva con los estados de varios procesos combinados."""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Valor que solo crece (p.ej. total de peticiones)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def dump(self) -> List[Any]:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merged(self, dumps: Sequence[List[Any]]) -> "Counter":
+        result = self._empty()
+        for dump in dumps:
+            for key, value in dump:
+                key = tuple(key)
+                previous = result._values.get(key)
+                result._values[key] = value if previous is None else self._combine(previous, value)
+        return result
+
+    def _empty(self) -> "Counter":
+        return Counter(self.name, self.documentation, self.labelnames)
+
+    @staticmethod
+    def _combine(a: float, b: float) -> float:
+        return a + b
+
+
+class Gauge(Counter):
+    """
+    Valor instantáneo que sube y baja (p.ej. profundidad de una cola).
+
+    Args:
+        multiprocess_mode: Cómo se combinan los valores de varios procesos: "sum" o "max"
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), multiprocess_mode: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        if multiprocess_mode not in ("sum", "max"):
+            raise ValueError(f"multiprocess_mode inválido: {multiprocess_mode}")
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def _empty(self) -> "Gauge":
+        return Gauge(self.name, self.documentation, self.labelnames, self.multiprocess_mode)
+
+    def _combine(self, a: float, b: float) -> float:
+        return max(a, b) if self.multiprocess_mode == "max" else a + b
+
+
+class Histogram(_Metric):
+    """Distribución de observaciones en buckets acumulativos, con suma y cantidad."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # Por serie: [conteo por bucket (no acumulado), suma, cantidad]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observa la duración en segundos del bloque (también si lanza una excepción)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels: str) -> Tuple[int, float]:
+        """(cantidad de observaciones, suma) de una serie."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return (series[2], series[1]) if series is not None else (0, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*s[0]], s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def dump(self) -> List[Any]:
+        with self._lock:
+            return [[list(key), list(s[0]), s[1], s[2]] for key, s in self._series.items()]
+
+    def merged(self, dumps: Sequence[List[Any]]) -> "Histogram":
+        result = Histogram(self.name, self.documentation, self.labelnames, self.buckets)
+        for dump in dumps:
+            for key, counts, total, count in dump:
+                if len(counts) != len(self.buckets):
+                    continue  # proceso con otra versión de los buckets
+                series = result._series.setdefault(tuple(key), [[0] * len(self.buckets), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        return result
+
+
+# =========================
+# Métricas de la aplicación
+# =========================
+HTTP_REQUEST_SECONDS = Histogram(
+    "petalert_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP hasta enviar la respuesta completa",
+    ("method", "route", "status"),
+)
+SUPABASE_ROUNDTRIPS_PER_REQUEST = Histogram(
+    "petalert_supabase_roundtrips_per_request",
+    "Round trips a Supabase hechos durante una petición HTTP",
+    ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+SUPABASE_ROUNDTRIPS_TOTAL = Counter(
+    "petalert_supabase_roundtrips_total",
+    "Round trips a Supabase hechos por el proceso",
+)
+EMBEDDING_STAGE_SECONDS = Histogram(
+    "petalert_embedding_stage_duration_seconds",
+    "Duración de cada etapa del pipeline de embeddings",
+    ("stage",),
+)
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "petalert_inference_queue_depth",
+    "Imágenes esperando lote en el micro-batcher de inferencia",
+    multiprocess_mode="sum",
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "petalert_inference_batch_size",
+    "Imágenes por forward pass del micro-batcher",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+MATCH_SCAN_CANDIDATES = Histogram(
+    "petalert_match_scan_candidates",
+    "Candidatos devueltos por cada búsqueda de matches",
+    ("source",),
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+STARTUP_IMPORT_SECONDS = Gauge(
+    "petalert_startup_import_seconds",
+    "Tiempo de importación de la app y del stack de ML (este último solo si se cargó)",
+    ("component",),
+    multiprocess_mode="max",
+)
+
+REGISTRY: List[_Metric] = [
+    HTTP_REQUEST_SECONDS,
+    SUPABASE_ROUNDTRIPS_PER_REQUEST,
+    SUPABASE_ROUNDTRIPS_TOTAL,
+    EMBEDDING_STAGE_SECONDS,
+    INFERENCE_QUEUE_DEPTH,
+    INFERENCE_BATCH_SIZE,
+    MATCH_SCAN_CANDIDATES,
+    STARTUP_IMPORT_SECONDS,
+]
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render_metrics() -> str:
+    """
+    Todas las métricas en el formato de texto de Prometheus: las de todos los
+    procesos del host con METRICS_MULTIPROC_DIR, o solo las de este proceso.
+    """
+    metrics = REGISTRY
+    if METRICS_MULTIPROC_DIR:
+        dumps = [dump_registry()] + _read_other_dumps(METRICS_MULTIPROC_DIR)
+        metrics = [
+            metric.merged([dump["metrics"].get(metric.name, []) for dump in dumps])
+            for metric in REGISTRY
+        ]
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# =========================
+# Agregación entre procesos
+# =========================
+# Un proceso que no publica hace este tiempo se considera terminado
+_STALE_SECONDS = max(30.0, METRICS_SYNC_SECONDS * 6)
+_sync_thread: Optional[threading.Thread] = None
+
+
+def dump_registry() -> Dict[str, Any]:
+    """Estado de todas las métricas de este proceso."""
+    return {"pid": os.getpid(), "metrics": {metric.name: metric.dump() for metric in REGISTRY}}
+
+
+def publish_metrics(directory: str = METRICS_MULTIPROC_DIR) -> None:
+    """Escribe el registro del proceso en `directory` (escritura atómica)."""
+    if not directory:
+        return
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(dump_registry(), f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ [metrics] No se pudieron publicar las métricas en {path}: {e}")
+
+
+def _read_other_dumps(directory: str) -> List[Dict[str, Any]]:
+    """Registros publicados por los demás procesos; borra los de procesos terminados."""
+    dumps = []
+    now = time.time()
+    own = f"{os.getpid()}.json"
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    for name in names:
+        if not name.endswith(".json") or name == own:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > _STALE_SECONDS:
+                os.unlink(path)
+                continue
+            with open(path) as f:
+                dumps.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return dumps
+
+
+def start_metrics_sync(directory: str = METRICS_MULTIPROC_DIR) -> None:
+    """Publica el registro del proceso cada METRICS_SYNC_SECONDS en un thread de fondo."""
+    global _sync_thread
+    if not directory or (_sync_thread is not None and _sync_thread.is_alive()):
+        return
+
+    def loop() -> None:
+        while True:
+            publish_metrics(directory)
+            time.sleep(METRICS_SYNC_SECONDS)
+
+    _sync_thread = threading.Thread(target=loop, name="metrics-sync", daemon=True)
+    _sync_thread.start()
+
+
+def stage_timer(stage: str):
+    """Context manager que mide una etapa del pipeline de embeddings."""
+    return EMBEDDING_STAGE_SECONDS.time(stage=stage)
+
+
+# =========================
+# Round trips por petición
+# =========================
+# Lista mutable por petición: los threads de asyncio.to_thread copian el contexto
+# pero comparten el objeto, así que sus round trips suman a la misma petición
+_request_roundtrips: ContextVar[Optional[List[int]]] = ContextVar("request_roundtrips", default=None)
+
+
+def count_supabase_roundtrip() -> None:
+    """Registra un round trip a Supabase (llamado desde el event hook de httpx)."""
+    SUPABASE_ROUNDTRIPS_TOTAL.inc()
+    counter = _request_roundtrips.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: latencia por ruta y round trips a Supabase por petición.
+
+    La latencia se mide hasta el último fragmento del cuerpo de la respuesta; los
+    round trips incluyen las background tasks que corren después de responder.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        roundtrips = [0]
+        token = _request_roundtrips.set(roundtrips)
+        state = {"status": "500", "observed": False}
+
+        def observe() -> None:
+            if not state["observed"]:
+                state["observed"] = True
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start,
+                    method=scope["method"],
+                    route=_route_label(scope),
+                    status=state["status"],
+                )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = str(message["status"])
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                observe()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            observe()
+            _request_roundtrips.reset(token)
+            SUPABASE_ROUNDTRIPS_PER_REQUEST.observe(roundtrips[0], route=_route_label(scope))
+
+
+def _route_label(scope) -> str:
+    # El router de Starlette deja la ruta resuelta en el scope: se usa la plantilla
+    # (/reports/{report_id}) para no crear una serie por id
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
@@ -1,40 +1,48 @@
 """
 Utility para crear clientes de Supabase con configuración optimizada de timeouts.
 Resuelve problemas de WinError 10060 en Windows.
+
+Cada proceso (worker de uvicorn o script) comparte un único cliente con un
+transporte httpx con pool de conexiones, de modo que las conexiones keep-alive y
+las sesiones TLS hacia PostgREST se reutilizan entre peticiones.
 """
 import os
+import threading
+import time
 from supabase import create_client, Client, ClientOptions
 import httpx
-from typing import Optional
+from typing import Any, Dict, Iterable, List, Optional
 
-def create_supabase_client(
-    url: Optional[str] = None,
-    key: Optional[str] = None,
-    timeout: float = 30.0,
-    max_retries: int = 3
-) -> Client:
-    """
-    Crea un cliente de Supabase con configuración optimizada de timeouts.
-    
-    Args:
-        url: URL de Supabase (por defecto: SUPABASE_URL del .env)
-        key: Service key (por defecto: SUPABASE_SERVICE_KEY del .env)
-        timeout: Timeout en segundos para las peticiones (default: 30s)
-        max_retries: Número máximo de reintentos (default: 3)
-    
-    Returns:
-        Cliente de Supabase configurado
-    
-    Raises:
-        ValueError: Si no se encuentran las credenciales
-    """
-    # Obtener credenciales del entorno si no se proporcionan
-    supabase_url = url or os.getenv("SUPABASE_URL")
-    supabase_key = key or os.getenv("SUPABASE_SERVICE_KEY")
-    
-    if not supabase_url or not supabase_key:
-        raise ValueError("SUPABASE_URL y SUPABASE_SERVICE_KEY son requeridos")
-    
+from utils.metrics import count_supabase_roundtrip
+
+# Parámetros del pool HTTP compartido
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "3"))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+
+# Valores por consulta in_() para no exceder el largo de URL de PostgREST
+IN_CHUNK_SIZE = 150
+
+# Estado del cliente compartido del proceso
+_lock = threading.Lock()
+_shared_client: Optional[Client] = None
+_shared_http_client: Optional[httpx.Client] = None
+_shared_pid: Optional[int] = None
+_shared_created_at: Optional[float] = None
+_request_count = 0
+
+
+def _count_request(request: httpx.Request) -> None:
+    """Event hook de httpx: cuenta los round trips hechos con el pool compartido."""
+    global _request_count
+    _request_count += 1
+    count_supabase_roundtrip()
+
+
+def _create_http_client(timeout: float, max_retries: int) -> httpx.Client:
+    """Crea el cliente httpx con pool de conexiones y timeouts apropiados."""
     # Configurar httpx con timeouts apropiados y retry logic
     # Timeouts aumentados para conexiones lentas/firewalls de Windows
     timeout_config = httpx.Timeout(
@@ -43,72 +51,200 @@ def create_supabase_client(
         write=timeout,     # Tiempo para escribir la petición
         pool=10.0          # Tiempo para obtener una conexión del pool
     )
-    
+
     # Configurar límites de conexión
     limits = httpx.Limits(
-        max_connections=100,
-        max_keepalive_connections=20,
-        keepalive_expiry=30.0
+        max_connections=SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+        keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY
     )
-    
-    # Crear transporte con retry logic
+
+    # Crear transporte con retry logic (reintentos de conexión)
     transport = httpx.HTTPTransport(
         retries=max_retries,
         limits=limits
     )
-    
-    # Crear httpx client personalizado
-    http_client = httpx.Client(
+
+    return httpx.Client(
         timeout=timeout_config,
         transport=transport,
-        follow_redirects=True
+        follow_redirects=True,
+        event_hooks={"request": [_count_request]}
     )
-    
-    # Crear cliente de Supabase con httpx client personalizado
+
+
+def create_supabase_client(
+    url: Optional[str] = None,
+    key: Optional[str] = None,
+    timeout: float = SUPABASE_TIMEOUT,
+    max_retries: int = SUPABASE_MAX_RETRIES,
+    http_client: Optional[httpx.Client] = None
+) -> Client:
+    """
+    Crea un cliente de Supabase NUEVO con configuración optimizada de timeouts.
+    Para el uso normal en routers y scripts usar `get_supabase_client()`, que
+    reutiliza el cliente compartido del proceso.
+
+    Args:
+        url: URL de Supabase (por defecto: SUPABASE_URL del .env)
+        key: Service key (por defecto: SUPABASE_SERVICE_KEY del .env)
+        timeout: Timeout en segundos para las peticiones (default: SUPABASE_TIMEOUT o 30s)
+        max_retries: Número máximo de reintentos (default: SUPABASE_MAX_RETRIES o 3)
+        http_client: Cliente httpx a usar (por defecto se crea uno nuevo)
+
+    Returns:
+        Cliente de Supabase configurado
+
+    Raises:
+        ValueError: Si no se encuentran las credenciales
+    """
+    # Obtener credenciales del entorno si no se proporcionan
+    supabase_url = url or os.getenv("SUPABASE_URL")
+    supabase_key = key or os.getenv("SUPABASE_SERVICE_KEY")
+
+    if not supabase_url or not supabase_key:
+        raise ValueError("SUPABASE_URL y SUPABASE_SERVICE_KEY son requeridos")
+
+    owns_http_client = http_client is None
+    if http_client is None:
+        http_client = _create_http_client(timeout, max_retries)
+
+    # Crear cliente de Supabase usando nuestro cliente httpx para PostgREST y Storage
     try:
-        # Crear opciones del cliente correctamente
         options = ClientOptions(
             schema="public",
             headers={},
             auto_refresh_token=True,
-            persist_session=False
+            persist_session=False,
+            httpx_client=http_client
         )
-        
-        client = create_client(
+
+        return create_client(
             supabase_url,
             supabase_key,
             options=options
         )
-        
-        # Reemplazar el cliente HTTP interno con nuestra configuración
-        # El cliente de supabase-py usa httpx internamente
-        if hasattr(client, '_postgrest_client'):
-            if hasattr(client._postgrest_client, 'session'):
-                # Actualizar la sesión con nuestro cliente configurado
-                client._postgrest_client.session = http_client
-        
-        # También actualizar el cliente de storage si existe
-        if hasattr(client, '_storage_client'):
-            if hasattr(client._storage_client, 'session'):
-                client._storage_client.session = http_client
-        
-        return client
-        
+
     except Exception as e:
-        http_client.close()
+        if owns_http_client:
+            http_client.close()
         raise RuntimeError(f"Error creando cliente de Supabase: {str(e)}") from e
 
 
+def init_supabase_client() -> Client:
+    """
+    Crea (si no existe) el cliente compartido del proceso.
+    Pensado para llamarse en el startup de la app; es idempotente.
+    """
+    global _shared_client, _shared_http_client, _shared_pid, _shared_created_at
+    with _lock:
+        # Tras un fork el pool heredado no es reutilizable: crear uno propio
+        if _shared_client is not None and _shared_pid == os.getpid():
+            return _shared_client
+
+        http_client = _create_http_client(SUPABASE_TIMEOUT, SUPABASE_MAX_RETRIES)
+        try:
+            client = create_supabase_client(http_client=http_client)
+        except Exception:
+            http_client.close()
+            raise
+
+        _shared_client = client
+        _shared_http_client = http_client
+        _shared_pid = os.getpid()
+        _shared_created_at = time.time()
+        return client
+
+
+def close_supabase_client() -> None:
+    """Cierra el pool HTTP compartido. Pensado para el shutdown de la app."""
+    global _shared_client, _shared_http_client, _shared_pid, _shared_created_at
+    with _lock:
+        if _shared_http_client is not None and _shared_pid == os.getpid():
+            _shared_http_client.close()
+        _shared_client = None
+        _shared_http_client = None
+        _shared_pid = None
+        _shared_created_at = None
+
+
 def get_supabase_client() -> Client:
     """
-    Obtiene un cliente de Supabase con configuración por defecto.
-    Útil para uso rápido sin configuración personalizada.
-    
+    Obtiene el cliente de Supabase compartido del proceso (se crea en el primer uso).
+
     Returns:
         Cliente de Supabase configurado
-        
+
     Raises:
         ValueError: Si no se encuentran las credenciales
     """
-    return create_supabase_client()
+    client = _shared_client
+    if client is not None and _shared_pid == os.getpid():
+        return client
+    return init_supabase_client()
+
+
+def select_in_chunks(
+    sb: Client,
+    table: str,
+    columns: str,
+    column: str,
+    values: Iterable[Any],
+    eq: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Filas de `table` cuyo `column` está en `values`, con consultas in_() de a
+    IN_CHUNK_SIZE valores. Los valores vacíos o repetidos se descartan.
+
+    Args:
+        sb: Cliente de Supabase
+        table: Tabla a consultar
+        columns: Columnas del select
+        column: Columna del filtro in_()
+        values: Valores buscados
+        eq: Filtros de igualdad adicionales ({columna: valor}) para cada consulta
+
+    Returns:
+        Filas encontradas (sin orden garantizado)
+    """
+    unique_values = list(dict.fromkeys(v for v in values if v))
+    rows: List[Dict[str, Any]] = []
+    for i in range(0, len(unique_values), IN_CHUNK_SIZE):
+        query = sb.table(table).select(columns).in_(column, unique_values[i:i + IN_CHUNK_SIZE])
+        for key, value in (eq or {}).items():
+            query = query.eq(key, value)
+        rows.extend(query.execute().data or [])
+    return rows
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Estadísticas del pool HTTP compartido hacia Supabase.
+
+    Returns:
+        Diccionario con conexiones abiertas/ociosas/activas, límites y total de requests
+    """
+    stats: Dict[str, Any] = {
+        "initialized": _shared_http_client is not None,
+        "pid": os.getpid(),
+        "requests_total": _request_count,
+        "limits": {
+            "max_connections": SUPABASE_MAX_CONNECTIONS,
+            "max_keepalive_connections": SUPABASE_MAX_KEEPALIVE,
+            "keepalive_expiry": SUPABASE_KEEPALIVE_EXPIRY,
+        },
+    }
+    if _shared_http_client is None:
+        return stats
 
+    stats["uptime_seconds"] = round(time.time() - _shared_created_at, 1) if _shared_created_at else None
+    pool = getattr(getattr(_shared_http_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for c in connections if c.is_idle())
+    closed = sum(1 for c in connections if c.is_closed())
+    stats["connections"] = {
+        "open": len(connections) - closed,
+        "idle": idle,
+        "active": len(connections) - idle - closed,
+    }
+    return stats
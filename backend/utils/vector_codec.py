@@ -0,0 +1,130 @@
+"""
+Formato de transporte de embeddings entre Postgres (pgvector) y el backend.
+
+- Lectura vía PostgREST: la columna calculada `embedding_b64` (migración 013)
+  devuelve el formato binario de pgvector (`vector_send`) en base64:
+  cabecera de 4 bytes (dim int16, reservado int16) + dim float32 big-endian.
+  Se decodifica con `np.frombuffer`, sin pasar por JSON ni floats de Python.
+- Escritura vía PostgREST: literal de texto compacto '[x1,x2,...]' con 9
+  dígitos significativos (ida y vuelta exacta para float32), la mitad de
+  tamaño que `vec.tolist()` serializado como JSON.
+- psycopg: `register_vector(conn)` registra dumpers/loaders binarios para que
+  los numpy arrays se envíen y reciban en el formato binario de pgvector.
+"""
+import base64
+import json
+import struct
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+_HEADER = struct.Struct(">HH")
+_BE_FLOAT32 = np.dtype(">f4")
+
+# OID del tipo vector por base (conn.info.dsn, sin contraseña): una conexión
+# nueva no vuelve a consultar el catálogo con TypeInfo.fetch
+_VECTOR_OIDS: Dict[str, int] = {}
+
+
+def encode_vector_binary(vec: Any) -> bytes:
+    """Serializa un vector al formato binario de pgvector (vector_send/vector_recv)."""
+    arr = np.asarray(vec, dtype=_BE_FLOAT32).reshape(-1)
+    return _HEADER.pack(arr.shape[0], 0) + arr.tobytes()
+
+
+def decode_vector_binary(data: Any) -> np.ndarray:
+    """
+    Decodifica el formato binario de pgvector a float32 nativo.
+
+    Raises:
+        ValueError: Si el tamaño del buffer no coincide con la dimensión de la cabecera
+    """
+    dim, _ = _HEADER.unpack_from(data, 0)
+    if len(data) != _HEADER.size + 4 * dim:
+        raise ValueError(f"Vector binario inválido: {len(data)} bytes para {dim} dimensiones")
+    return np.frombuffer(data, dtype=_BE_FLOAT32, count=dim, offset=_HEADER.size).astype(np.float32)
+
+
+def decode_vector_b64(value: str) -> np.ndarray:
+    """Decodifica la salida de `embedding_b64` (base64 del formato binario de pgvector)."""
+    return decode_vector_binary(base64.b64decode(value))
+
+
+def to_pgvector_text(vec: Any) -> str:
+    """Serializa un vector al literal de texto de pgvector ('[x1,x2,...]')."""
+    values = np.asarray(vec, dtype=np.float32).reshape(-1).tolist()
+    return "[" + ",".join(map("{:.9g}".format, values)) + "]"
+
+
+def decode_vector(value: Any) -> Optional[np.ndarray]:
+    """
+    Convierte un embedding en cualquiera de los formatos que devuelve la base a float32.
+
+    Acepta: numpy array, lista de floats, texto de pgvector/JSON ('[...]')
+    o base64 del formato binario (`embedding_b64`).
+
+    Returns:
+        numpy array float32 (sin normalizar) o None si el valor es vacío/inválido
+    """
+    if value is None:
+        return None
+    if isinstance(value, np.ndarray):
+        return value.astype(np.float32, copy=False).reshape(-1)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return decode_vector_binary(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return None
+        try:
+            if text.startswith("["):
+                return np.array(json.loads(text), dtype=np.float32)
+            return decode_vector_b64(text)
+        except Exception:
+            return None
+    return np.asarray(value, dtype=np.float32).reshape(-1)
+
+
+def register_vector(conn) -> None:
+    """
+    Registra en una conexión psycopg 3 la adaptación binaria del tipo `vector`:
+    los numpy arrays se envían con el formato binario de pgvector y las columnas
+    vector se leen como numpy float32 (texto o binario). El OID del tipo se
+    consulta una sola vez por base y queda en caché para las conexiones siguientes.
+
+    Raises:
+        RuntimeError: Si la extensión pgvector no está instalada en la base
+    """
+    from psycopg.adapt import Dumper, Loader
+    from psycopg.pq import Format
+    from psycopg.types import TypeInfo
+
+    vector_oid = _VECTOR_OIDS.get(conn.info.dsn)
+    if vector_oid is None:
+        info = TypeInfo.fetch(conn, "vector")
+        if info is None:
+            raise RuntimeError("El tipo 'vector' no existe: ¿está instalada la extensión pgvector?")
+        vector_oid = _VECTOR_OIDS[conn.info.dsn] = info.oid
+
+    class VectorBinaryDumper(Dumper):
+        format = Format.BINARY
+        oid = vector_oid
+
+        def dump(self, obj):
+            return encode_vector_binary(obj)
+
+    class VectorBinaryLoader(Loader):
+        format = Format.BINARY
+
+        def load(self, data):
+            return decode_vector_binary(bytes(data))
+
+    class VectorTextLoader(Loader):
+        format = Format.TEXT
+
+        def load(self, data):
+            return decode_vector(bytes(data).decode())
+
+    conn.adapters.register_dumper(np.ndarray, VectorBinaryDumper)
+    conn.adapters.register_loader(vector_oid, VectorBinaryLoader)
+    conn.adapters.register_loader(vector_oid, VectorTextLoader)
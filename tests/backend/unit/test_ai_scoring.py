@@ -0,0 +1,65 @@
+"""
+Pruebas Unitarias: Puntuación híbrida de candidatos de búsqueda IA
+Basado en: services/ai_scoring
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.ai_scoring import score_candidates, select_top, time_scores
+
+NOW = datetime(2025, 10, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def _labels(*names):
+    return {"labels": [{"label": name} for name in names]}
+
+
+class TestAIScoring:
+    """Pruebas para el cálculo en bloque de puntuaciones"""
+
+    def test_components_and_weighted_total(self):
+        """Test: Cada componente y el total ponderado deben coincidir con el cálculo fila por fila"""
+        candidates = [
+            {"labels": _labels("dog", "golden"), "colors": ["#FFAA00"], "created_at": (NOW - timedelta(hours=3)).isoformat()},
+            {"labels": _labels("cat"), "colors": [], "created_at": "2025-09-01T10:00:00.5+00:00"},
+            {"labels": None, "colors": None, "created_at": None},
+        ]
+        scores = score_candidates(
+            candidates, [0.0, 5.0, 12.0], {"dog", "animal"}, {"#ffaa00"}, radius_km=10.0, now=NOW
+        )
+
+        assert np.allclose(scores["visual"], [100 / 3, 0.0, 0.0])
+        assert np.allclose(scores["color"], [100.0, 0.0, 0.0])
+        assert np.allclose(scores["location"], [100.0, 50.0, 0.0])
+        assert np.allclose(scores["time"], [100.0, 40.0, 50.0])
+        expected = 0.4 * scores["visual"] + 0.3 * scores["color"] + 0.2 * scores["location"] + 0.1 * scores["time"]
+        assert np.allclose(scores["total"], expected)
+
+    def test_time_buckets_and_offsets(self):
+        """Test: La antigüedad usa días completos y respeta el offset horario"""
+        values = [
+            (NOW - timedelta(days=1, hours=12)).isoformat(),
+            (NOW - timedelta(days=7)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "2025-09-15T23:00:00-03:00",  # 2025-09-16T02:00Z: 24 días
+            "fecha inválida",
+        ]
+        assert time_scores(values, NOW).tolist() == [100.0, 80.0, 60.0, 50.0]
+
+    def test_select_top_threshold_and_order(self):
+        """Test: Solo superan el umbral y se devuelven los k mejores en orden, con empates estables"""
+        total = np.array([10.0, 80.0, 45.0, 80.0, 31.0, 29.9, 95.0])
+
+        top, passing = select_top(total, k=3, min_score=30)
+
+        assert passing == 5
+        assert top.tolist() == [6, 1, 3]
+        assert select_top(np.array([]), k=20)[0].size == 0
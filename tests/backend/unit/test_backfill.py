@@ -0,0 +1,191 @@
+"""
+Pruebas Unitarias: Pipeline de backfill de embeddings
+Basado en: services/backfill.BackfillPipeline
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+import services.backfill as backfill
+import services.embeddings as embeddings
+from services.backfill import BackfillPipeline
+from services.image_preprocess import InvalidImageError
+
+
+class FakeStore:
+    """Fuente/destino en memoria con la misma interfaz que SupabaseBackfillStore"""
+
+    def __init__(self, n):
+        self.rows = [{"id": f"r{i:03d}", "photos": [f"https://img/{i}.jpg"]} for i in range(n)]
+        self.rows.append({"id": f"r{n:03d}", "photos": []})
+        self.writes = []
+        self.items = []
+
+    def fetch_page(self, mode, after_id, limit):
+        rows = [r for r in self.rows if after_id is None or r["id"] > after_id]
+        return rows[:limit]
+
+    def write_embeddings(self, items):
+        self.writes.append([report_id for report_id, _, _ in items])
+        self.items.extend(items)
+        return len(items)
+
+
+async def _fake_download(self, client, url):
+    if url.endswith("/3.jpg"):
+        raise RuntimeError("404")
+    return url.encode()
+
+
+def _fake_embed(tensors):
+    return np.stack([np.full(4, float(t), dtype=np.float32) for t in tensors])
+
+
+class TestBackfillPipeline:
+    """Pruebas para el pipeline concurrente"""
+
+    async def test_processes_all_reports_in_batches(self, tmp_path):
+        """Test: Todos los reportes con foto deben escribirse, agrupados en lotes"""
+        store = FakeStore(10)
+        checkpoint = tmp_path / "ckpt.json"
+        with patch.object(BackfillPipeline, "_download", _fake_download), \
+             patch.object(embeddings, "cached_embedding", lambda b: (None, None)), \
+             patch.object(embeddings, "preprocess_image", lambda b: int(b.split(b"/")[-1][:-4])), \
+             patch.object(embeddings, "embed_preprocessed", _fake_embed):
+            pipeline = BackfillPipeline(
+                store, checkpoint_path=str(checkpoint),
+                download_concurrency=4, decode_workers=2, batch_size=4, write_batch_size=5
+            )
+            summary = await pipeline.run()
+
+        written = sorted(report_id for batch in store.writes for report_id in batch)
+        assert written == [f"r{i:03d}" for i in range(10) if i != 3]
+        assert summary["failed"] == 1
+        assert summary["skipped"] == 1
+        assert summary["stages"]["inference"]["items"] == 9
+        assert all(len(batch) <= 5 for batch in store.writes)
+        # Hubo un fallo: el checkpoint se conserva con el id fallido
+        data = json.loads(checkpoint.read_text())
+        assert data["failed_ids"] == ["r003"]
+        assert data["last_id"] == "r010"
+
+    async def test_resumes_from_checkpoint(self, tmp_path):
+        """Test: Una corrida nueva debe empezar después del último id del checkpoint"""
+        store = FakeStore(6)
+        checkpoint = tmp_path / "ckpt.json"
+        checkpoint.write_text(json.dumps({"mode": "missing", "last_id": "r002", "failed_ids": []}))
+        with patch.object(BackfillPipeline, "_download", _fake_download), \
+             patch.object(embeddings, "cached_embedding", lambda b: (None, None)), \
+             patch.object(embeddings, "preprocess_image", lambda b: 1), \
+             patch.object(embeddings, "embed_preprocessed", _fake_embed):
+            await BackfillPipeline(store, checkpoint_path=str(checkpoint), batch_size=2).run()
+
+        written = sorted(report_id for batch in store.writes for report_id in batch)
+        assert written == ["r004", "r005"]
+
+    async def test_cached_images_skip_inference(self):
+        """Test: Las imágenes en caché van directo a escritura"""
+        store = FakeStore(3)
+        with patch.object(BackfillPipeline, "_download", _fake_download), \
+             patch.object(embeddings, "cached_embedding", lambda b: ("k", np.ones(4, dtype=np.float32))), \
+             patch.object(embeddings, "embed_preprocessed", _fake_embed):
+            summary = await BackfillPipeline(store).run()
+
+        assert summary["cache_hits"] == 3
+        assert summary["stages"]["inference"]["items"] == 0
+        assert summary["succeeded"] == 3
+
+    async def test_all_photos_share_batch_and_aggregate(self):
+        """Test: Todas las fotos de un reporte se embeben y se escribe su media renormalizada"""
+        store = FakeStore(0)
+        store.rows = [{"id": "r000", "photos": ["https://img/1.jpg", None, "https://img/2.jpg"]}]
+        calls = []
+
+        def embed(tensors):
+            calls.append(len(tensors))
+            return np.stack([np.eye(4, dtype=np.float32)[t] for t in tensors])
+
+        with patch.object(BackfillPipeline, "_download", _fake_download), \
+             patch.object(embeddings, "cached_embedding", lambda b: (None, None)), \
+             patch.object(embeddings, "preprocess_image", lambda b: int(b.split(b"/")[-1][:-4])), \
+             patch.object(embeddings, "embed_preprocessed", embed):
+            summary = await BackfillPipeline(store, batch_size=4).run()
+
+        assert calls == [2]
+        assert summary["succeeded"] == 1
+        report_id, vec, photos = store.items[0]
+        assert [(index, url) for index, url, _ in photos] == [(0, "https://img/1.jpg"), (2, "https://img/2.jpg")]
+        assert np.allclose(vec, [0, 1 / np.sqrt(2), 1 / np.sqrt(2), 0])
+
+    async def test_async_callbacks_finish_before_run_returns(self):
+        """Test: Un on_written async se espera (no queda suelto) y sus errores no frenan el pipeline"""
+        store = FakeStore(4)
+        done = []
+
+        async def on_written(report_id, vec):
+            await asyncio.sleep(0.01)
+            if report_id == "r001":
+                raise RuntimeError("fallo del callback")
+            done.append(report_id)
+
+        with patch.object(BackfillPipeline, "_download", _fake_download), \
+             patch.object(embeddings, "cached_embedding", lambda b: ("k", np.ones(4, dtype=np.float32))):
+            summary = await BackfillPipeline(store, on_written=on_written).run()
+
+        assert summary["succeeded"] == 3  # r003 falla en la descarga
+        assert sorted(done) == ["r000", "r002"]
+
+    async def test_retry_failed_requeues_checkpoint_failures(self, tmp_path):
+        """Test: Con retry_failed los ids fallidos del checkpoint se reprocesan sin mover la marca hacia atrás"""
+        store = FakeStore(6)
+        store.fetch_ids = lambda ids: [r for r in store.rows if r["id"] in ids]
+        checkpoint = tmp_path / "ckpt.json"
+        checkpoint.write_text(json.dumps({"mode": "missing", "last_id": "r003", "failed_ids": ["r001"]}))
+        with patch.object(BackfillPipeline, "_download", _fake_download), \
+             patch.object(embeddings, "cached_embedding", lambda b: ("k", np.ones(4, dtype=np.float32))):
+            pipeline = BackfillPipeline(store, checkpoint_path=str(checkpoint), retry_failed=True, limit=2)
+            summary = await pipeline.run()
+
+        written = sorted(report_id for batch in store.writes for report_id in batch)
+        assert written == ["r001", "r004"]
+        assert summary["failed"] == 0
+        data = json.loads(checkpoint.read_text())
+        assert data["last_id"] == "r004"
+        assert data["failed_ids"] == []
+
+    async def test_server_mode_sends_bytes_to_inference_server(self):
+        """Test: Con servidor de inferencia no se preprocesa ni se ejecuta el modelo en este proceso"""
+        store = FakeStore(6)
+        sent = []
+
+        class FakeClient:
+            async def embed(self, image_bytes):
+                sent.append(image_bytes)
+                if image_bytes.endswith(b"/5.jpg"):
+                    raise InvalidImageError("corrupta")
+                return np.full(4, float(image_bytes.split(b"/")[-1][:-4]), dtype=np.float32)
+
+        def forbidden(*args):
+            raise AssertionError("no debe usarse el modelo local")
+
+        with patch.object(BackfillPipeline, "_download", _fake_download), \
+             patch.object(backfill, "get_inference_client", lambda: FakeClient()), \
+             patch.object(embeddings, "cached_embedding", lambda b: (None, None)), \
+             patch.object(embeddings, "preprocess_image", forbidden), \
+             patch.object(embeddings, "embed_preprocessed", forbidden):
+            summary = await BackfillPipeline(store, batch_size=4).run()
+
+        assert sorted(sent) == [f"https://img/{i}.jpg".encode() for i in (0, 1, 2, 4, 5)]
+        assert summary["succeeded"] == 4  # r003 falla en la descarga y r005 en el servidor
+        assert summary["failed"] == 2
+        assert sorted(report_id for report_id, _, _ in store.items) == ["r000", "r001", "r002", "r004"]
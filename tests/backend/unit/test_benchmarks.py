@@ -0,0 +1,79 @@
+"""
+Pruebas Unitarias: Suite de benchmarks offline
+Basado en: benchmarks/harness, benchmarks/cases
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from benchmarks.cases import run_suites, synthetic_match_index
+from benchmarks.harness import compare
+
+
+def _quiet(message):
+    pass
+
+
+class TestBenchmarks:
+    """Pruebas para la medición y la comparación contra una corrida base"""
+
+    def test_compare_flags_only_real_regressions(self):
+        """Test: Solo las medianas que empeoran más que la tolerancia son regresiones"""
+        baseline = {"results": [
+            {"id": "topk/n=10", "median_ms": 10.0},
+            {"id": "nearby/n=10", "median_ms": 10.0},
+            {"id": "decode/megapixels=12", "median_ms": 10.0},
+        ]}
+        report = {"results": [
+            {"id": "topk/n=10", "median_ms": 11.5},
+            {"id": "nearby/n=10", "median_ms": 13.0},
+            {"id": "decode/megapixels=12", "skipped": "sin memoria"},
+            {"id": "ai_scoring/n=10", "median_ms": 99.0},
+        ]}
+
+        regressions = compare(report, baseline, tolerance=0.2)
+
+        assert [r["id"] for r in regressions] == ["nearby/n=10"]
+        assert regressions[0]["ratio"] == 1.3
+
+    def test_synthetic_index_is_deterministic_and_unit_norm(self):
+        """Test: Misma semilla = mismos vectores, todos L2-normalizados"""
+        a = synthetic_match_index(40, dim=16, seed=7, chunk=16)
+        b = synthetic_match_index(40, dim=16, seed=7, chunk=16)
+
+        assert len(a) == 40
+        vec = a.get_vector("found-cat-9")
+        assert np.allclose(vec, b.get_vector("found-cat-9"))
+        assert np.isclose(np.linalg.norm(vec), 1.0, atol=1e-5)
+
+    def test_small_suites_produce_json_entries(self):
+        """Test: topk, nearby y ai_scoring corren con tamaños chicos y saltean lo que no entra en memoria"""
+        config = {
+            "topk_sizes": (200, 10_000), "dim": 32, "topk_repeats": 2, "max_memory_bytes": 200 * 32 * 4,
+            "nearby_reports": 500, "nearby_repeats": 2, "nearby_radii": (3.0,), "nearby_limits": (None, 5),
+            "ai_sizes": (50,), "ai_repeats": 2,
+        }
+
+        results = run_suites(["topk", "nearby", "ai_scoring"], config, log=_quiet)
+
+        by_id = {entry["id"]: entry for entry in results}
+        topk = by_id["topk/dim=32,k=10,n=200"]
+        assert topk["median_ms"] > 0 and topk["top_similarity"] > 0.9
+        assert "skipped" in by_id["topk/dim=32,k=10,n=10000"]
+        assert by_id["nearby/limit=5,n=500,radius_km=3.0"]["returned"] <= 5
+        assert by_id["nearby/limit=all,n=500,radius_km=3.0"]["returned"] > 5
+        assert by_id["ai_scoring/n=50"]["median_ms"] > 0
+        assert 0 <= by_id["ai_scoring/n=50"]["passing"] <= 50
+
+    def test_unknown_suite_is_rejected(self):
+        """Test: Un nombre de suite inválido falla antes de medir"""
+        with pytest.raises(ValueError):
+            run_suites(["gpu"], {}, log=_quiet)
@@ -0,0 +1,84 @@
+"""
+Pruebas Unitarias: Micro-batching de inferencia
+Basado en: services/embeddings.MicroBatcher
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.embeddings import MicroBatcher
+
+
+class TestMicroBatcher:
+    """Pruebas para el agrupador de peticiones de inferencia"""
+
+    async def test_concurrent_requests_share_batch(self):
+        """Test: Peticiones concurrentes deben compartir una sola llamada"""
+        calls = []
+
+        def batch_fn(items):
+            calls.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.aclose()
+
+        assert results == [0, 2, 4, 6, 8]
+        assert len(calls) == 1
+        assert calls[0] == [0, 1, 2, 3, 4]
+
+    async def test_batch_size_limit(self):
+        """Test: Los lotes no deben superar max_batch_size"""
+        calls = []
+
+        def batch_fn(items):
+            calls.append(len(items))
+            return list(items)
+
+        batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+        await batcher.aclose()
+
+        assert results == list(range(7))
+        assert max(calls) <= 3
+        assert sum(calls) == 7
+
+    async def test_per_item_errors_are_isolated(self):
+        """Test: Un error en un elemento solo debe fallar a ese llamador"""
+        def batch_fn(items):
+            return [ValueError("imagen inválida") if item == "bad" else item for item in items]
+
+        batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=20)
+        results = await asyncio.gather(
+            batcher.submit("ok-1"), batcher.submit("bad"), batcher.submit("ok-2"),
+            return_exceptions=True
+        )
+        await batcher.aclose()
+
+        assert results[0] == "ok-1"
+        assert isinstance(results[1], ValueError)
+        assert results[2] == "ok-2"
+
+    async def test_async_api_timeout(self):
+        """Test: image_bytes_to_vec_async debe respetar el timeout por llamada"""
+        import time
+        from unittest.mock import patch
+        import services.embeddings as embeddings
+
+        def slow_batch_fn(items):
+            time.sleep(0.3)
+            return list(items)
+
+        slow_batcher = MicroBatcher(slow_batch_fn, max_batch_size=1, max_wait_ms=0)
+        with patch.object(embeddings, "_batcher", slow_batcher):
+            with pytest.raises(embeddings.InferenceTimeoutError):
+                await embeddings.image_bytes_to_vec_async(b"img", timeout=0.05)
+        await slow_batcher.aclose()
@@ -0,0 +1,110 @@
+"""
+Pruebas Unitarias: Caché de embeddings por hash de imagen
+Basado en: services/embedding_cache.EmbeddingCache
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.embedding_cache import EmbeddingCache
+
+
+def _vec(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(16).astype(np.float32)
+
+
+class TestEmbeddingCache:
+    """Pruebas para los niveles en memoria y en disco"""
+
+    def test_memory_lru_eviction(self):
+        """Test: El nivel en memoria debe desalojar la entrada menos usada"""
+        cache = EmbeddingCache("modelo", max_entries=2, disk_dir=None)
+        keys = [cache.key(f"img-{i}".encode()) for i in range(3)]
+        cache.put(keys[0], _vec(0))
+        cache.put(keys[1], _vec(1))
+        assert cache.get(keys[0]) is not None  # keys[0] pasa a ser la más reciente
+        cache.put(keys[2], _vec(2))
+
+        assert cache.get(keys[1]) is None
+        assert np.array_equal(cache.get(keys[0]), _vec(0))
+        assert np.array_equal(cache.get(keys[2]), _vec(2))
+
+    def test_disk_tier_survives_new_instance(self, tmp_path):
+        """Test: El nivel en disco debe servir vectores a otra instancia del mismo modelo"""
+        key = EmbeddingCache("modelo-a", max_entries=0, disk_dir=None).key(b"foto")
+        EmbeddingCache("modelo-a", max_entries=4, disk_dir=str(tmp_path)).put(key, _vec(7))
+
+        same_model = EmbeddingCache("modelo-a", max_entries=4, disk_dir=str(tmp_path))
+        other_model = EmbeddingCache("modelo-b", max_entries=4, disk_dir=str(tmp_path))
+
+        assert np.array_equal(same_model.get(key), _vec(7))
+        assert same_model.stats()["disk_hits"] == 1
+        assert other_model.get(key) is None
+
+    def test_disk_size_eviction(self, tmp_path):
+        """Test: El nivel en disco no debe superar el tamaño máximo configurado"""
+        vec_bytes = _vec(0).nbytes
+        cache = EmbeddingCache("modelo", max_entries=0, disk_dir=str(tmp_path), disk_max_bytes=vec_bytes * 3)
+        for i in range(10):
+            cache.put(cache.key(f"img-{i}".encode()), _vec(i))
+        cache.wait_for_maintenance()
+
+        files = list(cache.disk_dir.glob("*/*.f32"))
+        assert sum(f.stat().st_size for f in files) <= vec_bytes * 3
+        assert len(files) >= 1
+
+    def test_disk_overwrite_counts_once(self, tmp_path):
+        """Test: Reescribir la misma entrada no debe inflar el tamaño contado del disco"""
+        cache = EmbeddingCache("modelo", max_entries=0, disk_dir=str(tmp_path))
+        key = cache.key(b"foto")
+        cache.put(cache.key(b"otra"), _vec(1))
+        cache.wait_for_maintenance()  # escaneo inicial del directorio
+        for _ in range(5):
+            cache.put(key, _vec(2))
+
+        assert cache.stats()["disk_bytes"] == 2 * _vec(0).nbytes
+
+    async def test_async_api_moves_disk_io_off_the_loop(self, tmp_path):
+        """Test: aget/aput solo tocan el disco dentro de asyncio.to_thread; el LRU responde inline"""
+        import services.embedding_cache as embedding_cache
+
+        offloaded = []
+        real_to_thread = asyncio.to_thread
+
+        async def to_thread(fn, *args):
+            offloaded.append(fn.__name__)
+            return await real_to_thread(fn, *args)
+
+        writer = EmbeddingCache("modelo", max_entries=4, disk_dir=str(tmp_path))
+        reader = EmbeddingCache("modelo", max_entries=4, disk_dir=str(tmp_path))
+        key = writer.key(b"foto")
+        with patch.object(embedding_cache.asyncio, "to_thread", to_thread):
+            await writer.aput(key, _vec(5))
+            assert np.array_equal(await reader.aget(key), _vec(5))  # disco
+            assert np.array_equal(await reader.aget(key), _vec(5))  # memoria
+
+        assert offloaded == ["_disk_put", "_disk_lookup"]
+        assert reader.stats()["disk_hits"] == 1 and reader.stats()["hits"] == 1
+
+    async def test_cached_image_skips_inference(self):
+        """Test: Una imagen ya embebida no debe volver a pasar por el batcher"""
+        import services.embeddings as embeddings
+
+        cache = EmbeddingCache(embeddings.MODEL_NAME, max_entries=8, disk_dir=None)
+        batcher = AsyncMock()
+        batcher.submit.return_value = _vec(3)
+        with patch.object(embeddings, "_cache", cache), patch.object(embeddings, "_batcher", batcher):
+            first = await embeddings.image_bytes_to_vec_async(b"misma-foto")
+            second = await embeddings.image_bytes_to_vec_async(b"misma-foto")
+
+        assert batcher.submit.await_count == 1
+        assert np.array_equal(first, second)
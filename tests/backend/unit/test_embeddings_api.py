@@ -6,7 +6,7 @@ Principio X: Pruebas unitarias para cada funcionalidad
 
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, AsyncMock
 import sys
 from pathlib import Path
 
@@ -40,7 +40,7 @@ class TestEmbeddingsAPI:
     @pytest.fixture
     def mock_embedding_service(self):
         """Mock del servicio de embeddings"""
-        with patch('routers.embeddings_supabase.image_bytes_to_vec') as mock:
+        with patch('routers.embeddings_supabase.embed_image_for_request', new_callable=AsyncMock) as mock:
             import numpy as np
             mock.return_value = np.array([0.1] * 512)  # Embedding simulado
             yield mock
@@ -0,0 +1,217 @@
+"""
+Pruebas Unitarias: Supabase en memoria y prueba de carga
+Basado en: benchmarks/fake_supabase, benchmarks/load_test
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import sys
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from postgrest.exceptions import APIError
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from benchmarks.fake_supabase import FakeSupabase, installed
+from benchmarks.load_test import run_load
+from benchmarks.synthetic_data import generate_blocks, load_into_fake
+
+
+def _vec(*values):
+    return np.array(values, dtype=np.float32)
+
+
+@pytest.fixture
+def fake():
+    fake = FakeSupabase()
+    fake.seed("reports", [
+        {"id": "lost-1", "type": "lost", "species": "dog", "embedding": _vec(1, 0, 0), "created_at": "2024-01-02"},
+        {"id": "found-1", "type": "found", "species": "dog", "embedding": _vec(0.9, 0.1, 0), "created_at": "2024-01-03"},
+        {"id": "found-2", "type": "found", "species": "dog", "embedding": _vec(0, 1, 0), "created_at": "2024-01-01"},
+        {"id": "found-3", "type": "found", "species": "cat", "embedding": None, "created_at": "2024-01-04"},
+        {"id": "lost-2", "type": "lost", "species": "dog", "embedding": None, "status": "resolved"},
+    ])
+    return fake
+
+
+class TestFakeQueries:
+    """Pruebas para el subconjunto de PostgREST que usan los routers"""
+
+    def test_filters_order_and_exact_count(self, fake):
+        """Test: eq/not_.is_/in_/order y count="exact" con head se comportan como PostgREST"""
+        head = fake.table("reports").select("id", count="exact", head=True)\
+            .eq("status", "active").not_.is_("embedding", "null").eq("type", "found").execute()
+        rows = fake.table("reports").select("id, kind:type").in_("id", ["found-1", "found-2", "found-3"])\
+            .order("created_at", desc=True).limit(2).execute()
+
+        assert head.count == 2 and head.data == []
+        assert rows.data == [{"id": "found-3", "kind": "found"}, {"id": "found-1", "kind": "found"}]
+
+    def test_vectors_travel_as_text_and_b64(self, fake):
+        """Test: El embedding sale como texto de pgvector y embedding_b64 se decodifica igual"""
+        from utils.vector_codec import decode_vector
+
+        row = fake.table("reports").select("embedding, b64:embedding_b64").eq("id", "found-1").single().execute().data
+
+        assert row["embedding"].startswith("[0.899999976,")
+        assert np.allclose(decode_vector(row["b64"]), decode_vector(row["embedding"]))
+
+    def test_single_insert_update_and_or_delete(self, fake):
+        """Test: single() sin filas lanza PGRST116; insert completa defaults; or_ filtra el delete"""
+        with pytest.raises(APIError) as error:
+            fake.table("reports").select("*").eq("id", "nope").single().execute()
+        created = fake.table("matches").insert({"lost_report_id": "lost-1", "found_report_id": "found-2"}).execute()
+        fake.table("matches").update({"status": "accepted"}).eq("id", created.data[0]["id"]).execute()
+        fake.table("matches").insert({"lost_report_id": "x", "found_report_id": "found-1"}).execute()
+        deleted = fake.table("matches").delete().eq("status", "pending")\
+            .or_("lost_report_id.eq.lost-1,found_report_id.eq.found-1").execute()
+
+        assert error.value.code == "PGRST116"
+        assert created.data[0]["status"] == "pending" and created.data[0]["id"]
+        assert [m["lost_report_id"] for m in deleted.data] == ["x"]
+        assert [m["status"] for m in fake.rows("matches")] == ["accepted"]
+
+    def test_latency_is_injected_per_roundtrip(self):
+        """Test: Cada execute() espera la latencia configurada (más el extra de la RPC)"""
+        fake = FakeSupabase(latency_ms=20, rpc_latency_ms={"prune_match_lists": 30})
+
+        start = time.perf_counter()
+        fake.table("reports").select("id").execute()
+        fake.rpc("prune_match_lists", {"report_ids": ["a"], "keep": 1}).execute()
+        elapsed = time.perf_counter() - start
+
+        assert elapsed >= 0.07
+        assert fake.roundtrips == {"select:reports": 1, "rpc:prune_match_lists": 1}
+
+
+class TestFakeRpcs:
+    """Pruebas para las RPCs reimplementadas de las migraciones"""
+
+    def test_match_reports_for_report_and_errors(self, fake):
+        """Test: Top-k del tipo opuesto por coseno; errores como los RAISE de la migración"""
+        rows = fake.rpc("match_reports_for_report", {"p_report_id": "lost-1", "match_threshold": 0.5}).execute().data
+
+        assert [r["id"] for r in rows] == ["found-1"]
+        assert rows[0]["similarity_score"] == pytest.approx(0.9939, abs=1e-4)
+        for report_id, message in (("nope", "REPORT_NOT_FOUND"), ("found-3", "REPORT_WITHOUT_EMBEDDING")):
+            with pytest.raises(APIError, match=message):
+                fake.rpc("match_reports_for_report", {"p_report_id": report_id}).execute()
+        with pytest.raises(APIError) as unknown:
+            fake.rpc("no_existe", {}).execute()
+        assert unknown.value.code == "PGRST202"
+
+    def test_upsert_matches_only_improves(self, fake):
+        """Test: upsert_matches inserta pares nuevos, solo mejora la similitud y no reabre matches revisados"""
+        payload = [{"lost_report_id": "lost-1", "found_report_id": "found-1", "similarity_score": 0.5}]
+        first = fake.rpc("upsert_matches", {"payload": payload}).execute().data
+        fake.table("matches").update({"status": "rejected"}).eq("found_report_id", "found-1").execute()
+        worse = fake.rpc("upsert_matches", {"payload": [{**payload[0], "similarity_score": 0.4}]}).execute().data
+        better = fake.rpc("upsert_matches", {"payload": [{**payload[0], "similarity_score": 0.8}]}).execute().data
+
+        assert (first, worse, better) == (1, 0, 1)
+        assert fake.rows("matches")[0]["similarity_score"] == 0.8
+        assert fake.rows("matches")[0]["status"] == "rejected"
+
+
+class TestLoadHarness:
+    """Pruebas para la app real contra el fake y la carga en lazo abierto"""
+
+    def test_direct_matches_route_against_fake(self, fake):
+        """Test: /direct-matches/find usa el fake como cliente compartido y guarda el match"""
+        from routers import direct_matches
+        from fastapi import FastAPI
+
+        app = FastAPI()
+        app.include_router(direct_matches.router)
+        with installed(fake):
+            response = TestClient(app).post("/direct-matches/find/lost-1?match_threshold=0.5")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["total_candidates"] == 2
+        assert [m["report_id"] for m in body["matches"]] == ["found-1"]
+        assert [(m["lost_report_id"], m["found_report_id"]) for m in fake.rows("matches")] == [("lost-1", "found-1")]
+
+    async def test_short_asgi_run_reports_latencies(self):
+        """Test: Una corrida corta en modo asgi responde sin errores y cuenta round trips"""
+        fake = FakeSupabase(latency_ms=1)
+        ids = load_into_fake(fake, generate_blocks(40, seed=3, dim=16))
+
+        summary = await run_load(fake, ids, rps=40, duration=0.5, mix={"pending": 1, "direct": 1}, mode="asgi")
+
+        assert summary["total"]["requests"] == 20
+        assert summary["total"]["errors"] == 0
+        assert summary["total"]["p50_ms"] > 0
+        assert summary["roundtrips_per_request"] >= 2
+
+    def test_search_image_upserts_top1_against_fake(self, fake):
+        """Test: Repetir /embeddings/search_image con lost_id no duplica el match (upsert_matches)"""
+        from routers import embeddings_supabase
+        from fastapi import FastAPI
+
+        app = FastAPI()
+        app.include_router(embeddings_supabase.router)
+        with installed(fake), patch.object(embeddings_supabase, "embed_image_for_request",
+                                           new=AsyncMock(return_value=_vec(0.9, 0.1, 0))):
+            client = TestClient(app)
+            for _ in range(2):
+                response = client.post("/embeddings/search_image?lost_id=lost-1&top_k=3",
+                                       files={"file": ("a.jpg", b"img", "image/jpeg")})
+                assert response.status_code == 200
+
+        assert response.json()["results"][0]["report_id"] == "found-1"
+        assert [(m["lost_report_id"], m["found_report_id"]) for m in fake.rows("matches")] == [("lost-1", "found-1")]
+
+    def test_search_image_respects_radius(self):
+        """Test: Con lat/lng/max_km solo vuelven reportes dentro del radio, con su distancia"""
+        from routers import embeddings_supabase
+        from fastapi import FastAPI
+
+        fake = FakeSupabase()
+        point = lambda lon, lat: {"type": "Point", "coordinates": [lon, lat]}
+        fake.seed("reports", [
+            {"id": "far", "type": "found", "status": "active", "embedding": _vec(1, 0, 0),
+             "location": point(-58.0, -34.0)},
+            {"id": "near", "type": "found", "status": "active", "embedding": _vec(0.8, 0.2, 0),
+             "location": point(-58.38, -34.60)},
+        ])
+        app = FastAPI()
+        app.include_router(embeddings_supabase.router)
+        with installed(fake), patch.object(embeddings_supabase, "embed_image_for_request",
+                                           new=AsyncMock(return_value=_vec(1, 0, 0))):
+            response = TestClient(app).post("/embeddings/search_image?lat=-34.61&lng=-58.38&max_km=5",
+                                            files={"file": ("a.jpg", b"img", "image/jpeg")})
+
+        results = response.json()["results"]
+        assert [r["report_id"] for r in results] == ["near"]
+        assert results[0]["distance_km"] == pytest.approx(1.112, abs=0.01)
+
+    def test_search_image_radius_finds_match_beyond_global_top(self):
+        """Test: El único reporte dentro del radio aparece aunque cientos de lejanos sean más similares"""
+        from routers import embeddings_supabase
+        from fastapi import FastAPI
+
+        fake = FakeSupabase()
+        point = lambda lon, lat: {"type": "Point", "coordinates": [lon, lat]}
+        fake.seed("reports", [
+            {"id": f"far-{i:03d}", "type": "found", "status": "active", "embedding": _vec(1, 0.001 * i, 0),
+             "location": point(-58.0, -34.0)}
+            for i in range(300)
+        ] + [
+            {"id": "near", "type": "found", "status": "active", "embedding": _vec(0.2, 1, 0),
+             "location": point(-58.38, -34.60)},
+        ])
+        app = FastAPI()
+        app.include_router(embeddings_supabase.router)
+        with installed(fake), patch.object(embeddings_supabase, "embed_image_for_request",
+                                           new=AsyncMock(return_value=_vec(1, 0, 0))):
+            response = TestClient(app).post("/embeddings/search_image?lat=-34.61&lng=-58.38&max_km=5&top_k=5",
+                                            files={"file": ("a.jpg", b"img", "image/jpeg")})
+
+        assert [r["report_id"] for r in response.json()["results"]] == ["near"]
@@ -0,0 +1,123 @@
+"""
+Pruebas Unitarias: Índice espacial y búsqueda por radio de reportes
+Basado en: services/geo_index.GeoIndex, services/geo_search
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import math
+import struct
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.geo_index import GeoIndex, extract_coords
+from services import geo_search
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+class TestGeoIndex:
+    """Pruebas para la grilla espacial y sus actualizaciones incrementales"""
+
+    def test_query_matches_brute_force(self):
+        """Test: El radio con la grilla debe dar lo mismo que recorrer todos los puntos"""
+        rng = np.random.default_rng(0)
+        points = {
+            f"r{i}": (float(lat), float(lon))
+            for i, (lat, lon) in enumerate(zip(rng.uniform(-35.5, -33.5, 2000), rng.uniform(-59.5, -57.5, 2000)))
+        }
+        index = GeoIndex(cell_deg=0.1)
+        for report_id, (lat, lon) in points.items():
+            index.upsert(report_id, lat, lon, "lost", "dog")
+
+        for radius in (1.0, 10.0, 80.0, 500.0):
+            hits = index.query(-34.6037, -58.3816, radius)
+            expected = sorted(
+                (report_id for report_id, (lat, lon) in points.items()
+                 if _haversine(-34.6037, -58.3816, lat, lon) <= radius),
+                key=lambda report_id: _haversine(-34.6037, -58.3816, *points[report_id])
+            )
+            assert [report_id for report_id, _ in hits] == expected
+            distances = [d for _, d in hits]
+            assert distances == sorted(distances)
+
+    def test_filters_and_incremental_updates(self):
+        """Test: type/species filtran y los cambios de ubicación o estado se reflejan al instante"""
+        index = GeoIndex()
+        index.upsert("perro-perdido", -34.60, -58.38, "lost", "dog")
+        index.upsert("gato-encontrado", -34.61, -58.39, "found", "cat")
+        index.upsert("perro-encontrado", -34.62, -58.37, "found", "dog")
+
+        assert [r for r, _ in index.query(-34.60, -58.38, 5, report_type="found", species="dog")] == ["perro-encontrado"]
+        assert index.query(-34.60, -58.38, 5, species="bird") == []
+        assert "perro-perdido" not in [r for r, _ in index.query(-34.60, -58.38, 5, exclude_id="perro-perdido")]
+
+        index.upsert("perro-encontrado", -31.42, -64.18, "found", "dog")  # se mudó a Córdoba
+        assert index.query(-34.60, -58.38, 5, report_type="found", species="dog") == []
+        index.remove("gato-encontrado")
+        assert [r for r, _ in index.query(-34.60, -58.38, 5)] == ["perro-perdido"]
+        assert len(index) == 2
+
+    def test_query_across_antimeridian(self):
+        """Test: La búsqueda debe cruzar la línea de cambio de fecha"""
+        index = GeoIndex()
+        index.upsert("este", -17.0, 179.95)
+        index.upsert("oeste", -17.0, -179.95)
+
+        assert {r for r, _ in index.query(-17.0, 179.99, 20)} == {"este", "oeste"}
+
+    def test_extract_coords_formats(self):
+        """Test: Debe leer GeoJSON, EWKT y EWKB hexadecimal"""
+        ewkb = (struct.pack("<BII", 1, 0x20000001, 4326) + struct.pack("<dd", -58.3816, -34.6037)).hex().upper()
+
+        assert extract_coords({"type": "Point", "coordinates": [-58.3816, -34.6037]}) == (-34.6037, -58.3816)
+        assert extract_coords("SRID=4326;POINT(-58.3816 -34.6037)") == (-34.6037, -58.3816)
+        assert extract_coords(ewkb) == (-34.6037, -58.3816)
+        assert extract_coords("no es una ubicación") is None
+        assert extract_coords(None) is None
+
+
+class TestGeoSearch:
+    """Pruebas para la selección de backend de la búsqueda por radio"""
+
+    def test_postgis_backend_uses_rpc(self):
+        """Test: Con PostGIS se delega todo el filtrado a search_reports_within_radius"""
+        sb = MagicMock()
+        sb.rpc.return_value.execute.return_value.data = [
+            {"id": "a", "distance_km": 0.4},
+            {"id": "b", "distance_km": 2},
+        ]
+        with patch.object(geo_search, "GEO_SEARCH_BACKEND", "postgis"):
+            hits = geo_search.search_nearby(sb, -34.6, -58.4, 5, report_type="found", species="dog", limit=2)
+
+        name, params = sb.rpc.call_args[0]
+        assert name == "search_reports_within_radius"
+        assert params["p_lat"] == -34.6 and params["p_lng"] == -58.4
+        assert params["filter_type"] == "found" and params["filter_species"] == "dog"
+        assert params["filter_status"] == "active" and params["max_results"] == 2
+        assert hits == [("a", 0.4), ("b", 2.0)]
+        sb.table.assert_not_called()
+
+    def test_memory_backend_uses_index(self):
+        """Test: Con el backend memory se consulta el índice del proceso"""
+        index = GeoIndex()
+        index.upsert("cerca", -34.60, -58.38, "lost", "dog")
+        index.upsert("lejos", -31.42, -64.18, "lost", "dog")
+        index.loaded_at = float("inf")  # evitar la recarga desde Supabase
+
+        with patch.object(geo_search, "GEO_SEARCH_BACKEND", "memory"), \
+             patch.object(geo_search, "get_geo_index", return_value=index):
+            hits = geo_search.search_nearby(MagicMock(), -34.60, -58.38, 10)
+
+        assert [report_id for report_id, _ in hits] == ["cerca"]
@@ -0,0 +1,89 @@
+"""
+Pruebas Unitarias: Decodificación y preprocesamiento de imágenes
+Basado en: services/image_preprocess
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import io
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image, JpegImagePlugin
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+import services.image_preprocess as image_preprocess
+from services.image_preprocess import InvalidImageError, decode_image, preprocess_array
+
+
+def _jpeg(width, height, color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class TestImagePreprocess:
+    """Pruebas para el camino rápido de decodificación"""
+
+    def test_jpeg_uses_draft_mode(self):
+        """Test: Un JPEG grande se decodifica escalado en DCT antes de redimensionar"""
+        original_draft = JpegImagePlugin.JpegImageFile.draft
+        requested = []
+
+        def draft(self, mode, size):
+            result = original_draft(self, mode, size)
+            requested.append(self.size)
+            return result
+
+        with patch.object(JpegImagePlugin.JpegImageFile, "draft", draft):
+            img = decode_image(_jpeg(3200, 2400), size=384)
+
+        assert img.size == (384, 384) and img.mode == "RGB"
+        # 3200x2400 a 1/4 = 800x600: apenas mayor que 384 en ambos lados
+        assert requested == [(800, 600)]
+
+    def test_exif_orientation_is_applied(self):
+        """Test: Una foto con orientación EXIF 6 (rotada 90°) debe enderezarse"""
+        original = Image.new("RGB", (40, 20))
+        original.paste((255, 0, 0), (0, 0, 20, 20))  # izquierda roja, derecha negra
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        original.save(buffer, "JPEG", exif=exif.tobytes(), quality=95)
+
+        img = decode_image(buffer.getvalue(), size=20)
+        pixels = np.asarray(img)
+
+        # Tras rotar 90° en sentido horario la mitad roja queda arriba
+        assert pixels[2, 10, 0] > 200 and pixels[17, 10, 0] < 60
+
+    def test_rejects_oversized_and_corrupt_inputs(self):
+        """Test: Entradas corruptas, vacías o por encima de los límites deben rechazarse"""
+        with pytest.raises(InvalidImageError):
+            decode_image(b"no es una imagen")
+        with pytest.raises(InvalidImageError):
+            decode_image(b"")
+        with pytest.raises(InvalidImageError):
+            decode_image(_jpeg(64, 64)[:200])
+        with patch.object(image_preprocess, "IMAGE_MAX_BYTES", 10):
+            with pytest.raises(InvalidImageError):
+                decode_image(_jpeg(64, 64))
+        with patch.object(image_preprocess, "IMAGE_MAX_PIXELS", 100):
+            with pytest.raises(InvalidImageError):
+                decode_image(_jpeg(64, 64))
+
+    def test_array_matches_model_normalization(self):
+        """Test: La salida es (3, 384, 384) normalizada a [-1, 1] como ToTensor + Normalize(0.5)"""
+        img = Image.new("RGB", (500, 400), (255, 0, 128))
+        buffer = io.BytesIO()
+        img.save(buffer, "PNG")
+
+        arr = preprocess_array(buffer.getvalue())
+
+        assert arr.shape == (3, 384, 384) and arr.dtype == np.float32
+        assert np.allclose(arr[:, 0, 0], [1.0, -1.0, 128 / 255 * 2 - 1], atol=1e-6)
@@ -0,0 +1,67 @@
+"""
+Pruebas Unitarias: Matching incremental por escritura de embedding
+Basado en: services/incremental_matcher
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services import incremental_matcher
+from services.match_search import ReportNotFoundError
+
+
+def _client(report):
+    """Cliente falso: el SELECT del reporte devuelve `report`; las RPCs devuelven 3"""
+    sb = MagicMock()
+    sb.table.return_value.select.return_value.eq.return_value.execute.return_value.data = (
+        [report] if report else []
+    )
+    sb.rpc.return_value.execute.return_value.data = 3
+    return sb
+
+
+class TestIncrementalMatcher:
+    """Pruebas para la actualización de listas top-k tras escribir un embedding"""
+
+    def test_active_report_upserts_and_prunes_both_sides(self):
+        """Test: Se puntúa solo el reporte nuevo y se recortan su lista y las de sus candidatos"""
+        sb = _client({"id": "lost-1", "type": "lost", "status": "active"})
+        top = [("found-1", 0.9), ("found-2", 0.4)]
+
+        with patch.object(incremental_matcher, "search_similar_to_report", return_value=top) as search:
+            stats = incremental_matcher.update_matches_for_report(sb, "lost-1", top_k=5, fanout=20)
+
+        assert search.call_args.kwargs["k"] == 20
+        assert stats == {"candidates": 2, "saved": 3, "pruned": 3}
+        calls = [c.args for c in sb.rpc.call_args_list]
+        assert [name for name, _ in calls] == ["upsert_matches", "prune_match_lists"]
+        assert calls[0][1]["payload"][0]["lost_report_id"] == "lost-1"
+        assert calls[1][1] == {"report_ids": ["lost-1", "found-1", "found-2"], "keep": 5}
+
+    def test_closed_report_is_removed_from_lists(self):
+        """Test: Un reporte resuelto no busca candidatos y borra sus matches pendientes"""
+        sb = _client({"id": "lost-1", "type": "lost", "status": "resolved"})
+        sb.table.return_value.delete.return_value.eq.return_value.or_.return_value.execute.return_value.data = [{}, {}]
+
+        with patch.object(incremental_matcher, "search_similar_to_report") as search:
+            stats = incremental_matcher.update_matches_for_report(sb, "lost-1")
+
+        search.assert_not_called()
+        sb.rpc.assert_not_called()
+        assert stats["pruned"] == 2
+        sb.table.return_value.delete.return_value.eq.return_value.or_.assert_called_once_with(
+            "lost_report_id.eq.lost-1,found_report_id.eq.lost-1"
+        )
+
+    def test_missing_report_raises(self):
+        """Test: Un reporte inexistente debe lanzar ReportNotFoundError"""
+        with pytest.raises(ReportNotFoundError):
+            incremental_matcher.update_matches_for_report(_client(None), "nope")
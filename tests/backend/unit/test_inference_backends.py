@@ -0,0 +1,65 @@
+"""
+Pruebas Unitarias: Backends de inferencia y chequeo de paridad
+Basado en: services/inference_backends
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+import torch
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.inference_backends import build_backend, parity_report, pick_fastest
+
+
+def _tiny_model():
+    """Modelo chico con la misma forma de entrada/salida que MegaDescriptor"""
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 8, 3, stride=4),
+        torch.nn.Flatten(),
+        torch.nn.Linear(8 * 8 * 8, 64),
+        torch.nn.GELU(),
+        torch.nn.Linear(64, 32),
+    ).eval()
+
+
+class TestInferenceBackends:
+    """Pruebas para la selección de backend y la desviación contra fp32"""
+
+    def test_parity_report_measures_drift_against_fp32(self):
+        """Test: Cada backend reporta latencia y drift; fp32 contra sí mismo es ~0"""
+        tensors = [torch.randn(3, 32, 32) for _ in range(6)]
+
+        report = parity_report(_tiny_model(), tensors, 32, "cpu", backends=("fp32", "traced", "int8"), batch_size=4, repeats=1)
+
+        by_name = {entry["backend"]: entry for entry in report}
+        assert list(by_name) == ["fp32", "traced", "int8"]
+        assert all("error" not in entry and entry["ms_per_image"] > 0 for entry in report)
+        assert by_name["fp32"]["drift"]["max"] < 1e-6
+        assert by_name["traced"]["drift"]["max"] < 1e-5
+        # int8 se desvía algo, pero poco
+        assert 0 < by_name["int8"]["drift"]["max"] < 0.05
+
+    def test_pick_fastest_respects_drift_and_fallbacks(self):
+        """Test: Se elige el más rápido bajo el umbral, ignorando backends que cayeron a fp32"""
+        report = [
+            {"backend": "fp32", "effective_backend": "fp32", "ms_per_image": 10.0, "drift": {"mean": 0, "max": 0}},
+            {"backend": "int8", "effective_backend": "int8", "ms_per_image": 4.0, "drift": {"mean": 0.01, "max": 0.02}},
+            {"backend": "traced", "effective_backend": "traced", "ms_per_image": 8.0, "drift": {"mean": 0, "max": 1e-7}},
+            {"backend": "bf16", "effective_backend": "fp32", "ms_per_image": 3.0, "drift": {"mean": 0, "max": 0}},
+            {"backend": "compiled", "error": "sin compilador"},
+        ]
+
+        assert pick_fastest(report, max_drift=0.005) == "traced"
+        assert pick_fastest(report, max_drift=0.05) == "int8"
+
+    def test_unknown_backend_is_rejected(self):
+        """Test: Un EMBEDDING_BACKEND desconocido debe fallar al cargar"""
+        with pytest.raises(ValueError):
+            build_backend("fp8", _tiny_model(), 32, "cpu")
@@ -0,0 +1,107 @@
+"""
+Pruebas Unitarias: Servidor de inferencia compartido por los workers
+Basado en: services/inference_server, services/inference_client
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+import services.embeddings as embeddings
+from services.embedding_cache import EmbeddingCache
+from services.image_preprocess import InvalidImageError
+from services.inference_client import STATUS_INVALID_IMAGE, InferenceClient, InferenceServerError, read_response
+from services.inference_server import handle_connection
+
+
+async def _fake_local(image_bytes):
+    if image_bytes == b"rota":
+        raise InvalidImageError("Imagen inválida")
+    if image_bytes == b"falla":
+        raise RuntimeError("sin memoria")
+    return np.full(4, len(image_bytes), dtype=np.float32)
+
+
+class TestInferenceServer:
+    """Pruebas para el ida y vuelta worker -> servidor por socket Unix"""
+
+    async def test_roundtrip_and_errors(self, tmp_path):
+        """Test: El vector vuelve intacto y los errores se traducen a excepciones del cliente"""
+        path = str(tmp_path / "inference.sock")
+        with patch.object(embeddings, "image_bytes_to_vec_local_async", _fake_local):
+            server = await asyncio.start_unix_server(handle_connection, path=path)
+            async with server:
+                client = InferenceClient(path)
+                vecs = await asyncio.gather(*(client.embed(b"x" * n) for n in (1, 2, 3)))
+                with pytest.raises(InvalidImageError):
+                    await client.embed(b"rota")
+                with pytest.raises(InferenceServerError):
+                    await client.embed(b"falla")
+
+        assert [v.tolist() for v in vecs] == [[1.0] * 4, [2.0] * 4, [3.0] * 4]
+
+    async def test_client_waits_for_server_socket(self, tmp_path):
+        """Test: Si el servidor todavía carga el modelo, el cliente reintenta la conexión"""
+        path = str(tmp_path / "inference.sock")
+        client = InferenceClient(path)
+        with patch.object(embeddings, "image_bytes_to_vec_local_async", _fake_local), \
+             patch("services.inference_client.INFERENCE_SERVER_RETRY_SECONDS", 0.01):
+            pending = asyncio.ensure_future(client.embed(b"ab"))
+            await asyncio.sleep(0.05)
+            assert not pending.done()
+            server = await asyncio.start_unix_server(handle_connection, path=path)
+            async with server:
+                vec = await asyncio.wait_for(pending, 2)
+
+        assert vec.tolist() == [2.0] * 4
+
+    async def test_client_gives_up_when_server_never_starts(self, tmp_path):
+        """Test: Si el servidor no aparece dentro del timeout, el cliente falla en vez de colgarse"""
+        client = InferenceClient(str(tmp_path / "inference.sock"))
+        with patch("services.inference_client.INFERENCE_SERVER_RETRY_SECONDS", 0.01), \
+             patch("services.inference_client.INFERENCE_SERVER_CONNECT_TIMEOUT", 0.05):
+            with pytest.raises(InferenceServerError, match="no disponible"):
+                await asyncio.wait_for(client.embed(b"ab"), 2)
+
+    async def test_oversized_frame_is_rejected(self, tmp_path):
+        """Test: Un frame que supera el máximo se rechaza sin leer el cuerpo (servidor y cliente)"""
+        path = str(tmp_path / "inference.sock")
+        with patch.object(embeddings, "image_bytes_to_vec_local_async", _fake_local), \
+             patch("services.inference_client.MAX_REQUEST_BYTES", 4):
+            server = await asyncio.start_unix_server(handle_connection, path=path)
+            async with server:
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write((1 << 31).to_bytes(4, "big"))
+                await writer.drain()
+                status, payload = await read_response(reader)
+                closed = await reader.read()
+                writer.close()
+                with pytest.raises(InvalidImageError):
+                    await InferenceClient(path).embed(b"12345")
+
+        assert status == STATUS_INVALID_IMAGE
+        assert b"demasiado grande" in payload
+        assert closed == b""
+
+    async def test_async_api_uses_server_when_configured(self):
+        """Test: Con servidor configurado, el worker no usa su batcher local"""
+        client = AsyncMock()
+        client.embed.return_value = np.ones(4, dtype=np.float32)
+        batcher = AsyncMock()
+        with patch.object(embeddings, "get_inference_client", lambda: client), \
+             patch.object(embeddings, "_batcher", batcher), \
+             patch.object(embeddings, "_cache", EmbeddingCache("test", max_entries=0, disk_dir=None)):
+            vec = await embeddings.image_bytes_to_vec_async(b"foto")
+
+        assert vec.tolist() == [1.0] * 4
+        client.embed.assert_awaited_once_with(b"foto")
+        batcher.submit.assert_not_called()
@@ -0,0 +1,174 @@
+"""
+Pruebas Unitarias: Trabajos en segundo plano
+Basado en: services/jobs.JobManager
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.jobs import JobManager, COMPLETED, CANCELLED, FAILED, QUEUED, RUNNING
+
+
+class FakeRunner:
+    """Runner con la interfaz de BackfillPipeline que procesa `total` items"""
+
+    def __init__(self, total=5, fail=False):
+        self.total = total
+        self.fail = fail
+        self.processed = 0
+        self._cancel = asyncio.Event()
+
+    async def run(self):
+        for _ in range(self.total):
+            if self._cancel.is_set():
+                break
+            await asyncio.sleep(0.01)
+            self.processed += 1
+        if self.fail:
+            raise RuntimeError("fallo simulado")
+        return self.snapshot()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def snapshot(self):
+        return {"processed": self.processed}
+
+
+async def _wait(job):
+    await asyncio.wait_for(asyncio.shield(job.task), timeout=5)
+
+
+class TestJobManager:
+    """Pruebas para el gestor de trabajos"""
+
+    async def test_job_completes_with_result(self):
+        """Test: Un trabajo debe terminar con su resultado como progreso"""
+        manager = JobManager(max_concurrent=1)
+        job = manager.submit("test", lambda: FakeRunner(total=3))
+        await _wait(job)
+
+        data = job.as_dict()
+        assert data["status"] == COMPLETED
+        assert data["progress"] == {"processed": 3}
+
+    async def test_concurrency_limit_queues_jobs(self):
+        """Test: Con max_concurrent=1 el segundo trabajo espera en cola"""
+        manager = JobManager(max_concurrent=1)
+        first = manager.submit("test", lambda: FakeRunner(total=10))
+        second = manager.submit("test", lambda: FakeRunner(total=1))
+        await asyncio.sleep(0.03)
+
+        assert first.status == RUNNING
+        assert second.status == QUEUED
+        await _wait(first)
+        await _wait(second)
+        assert second.status == COMPLETED
+
+    async def test_cancel_running_and_queued(self):
+        """Test: Cancelar detiene el trabajo en curso y descarta el encolado"""
+        manager = JobManager(max_concurrent=1)
+        running = manager.submit("test", lambda: FakeRunner(total=100))
+        queued = manager.submit("test", lambda: FakeRunner(total=1))
+        await asyncio.sleep(0.03)
+
+        manager.cancel(queued.id)
+        manager.cancel(running.id)
+        await _wait(running)
+        await asyncio.gather(queued.task, return_exceptions=True)
+
+        assert running.status == CANCELLED
+        assert running.result["processed"] < 100
+        assert queued.status == CANCELLED
+        assert queued.started_at is None
+
+    async def test_failed_job_reports_error(self):
+        """Test: Un error del runner deja el trabajo en 'failed' con el mensaje"""
+        manager = JobManager(max_concurrent=2)
+        job = manager.submit("test", lambda: FakeRunner(total=2, fail=True))
+        await _wait(job)
+
+        assert job.status == FAILED
+        assert "fallo simulado" in job.error
+        assert manager.get(job.id) is job
+
+
+class TestSharedJobState:
+    """Pruebas para el estado compartido entre workers (dos gestores, un directorio)"""
+
+    async def test_other_worker_sees_and_cancels_job(self, tmp_path):
+        """Test: Otro worker consulta el progreso y cancela el trabajo con una marca"""
+        owner = JobManager(state_dir=str(tmp_path), sync_seconds=0.01)
+        other = JobManager(state_dir=str(tmp_path), sync_seconds=0.01)
+        job = owner.submit("test", lambda: FakeRunner(total=500))
+        await asyncio.sleep(0.1)
+
+        seen = other.status(job.id)
+        cancelled = other.request_cancel(job.id)
+        await _wait(job)
+
+        assert seen["status"] == RUNNING and seen["progress"]["processed"] > 0
+        assert cancelled["cancel_requested"] is True
+        assert job.status == CANCELLED
+        assert other.status(job.id)["status"] == CANCELLED
+        assert [data["job_id"] for data in other.list_status("test")] == [job.id]
+        assert other.status("../../etc/passwd") is None
+
+    async def test_concurrency_limit_is_global(self, tmp_path):
+        """Test: Con max_concurrent=1 un trabajo de otro worker espera el slot"""
+        first_worker = JobManager(max_concurrent=1, state_dir=str(tmp_path), sync_seconds=0.01)
+        second_worker = JobManager(max_concurrent=1, state_dir=str(tmp_path), sync_seconds=0.01)
+        first = first_worker.submit("test", lambda: FakeRunner(total=10))
+        await asyncio.sleep(0.03)
+        second = second_worker.submit("test", lambda: FakeRunner(total=1))
+        await asyncio.sleep(0.03)
+
+        assert first.status == RUNNING
+        assert second.status == QUEUED
+        await _wait(first)
+        await _wait(second)
+        assert second.status == COMPLETED
+
+    def test_job_of_dead_worker_reported_as_failed(self, tmp_path):
+        """Test: Un trabajo 'running' cuyo worker ya no existe se informa como fallido"""
+        job_id = "a" * 32
+        (tmp_path / f"{job_id}.json").write_text(json.dumps(
+            {"job_id": job_id, "kind": "test", "status": RUNNING, "worker_pid": 2 ** 22 + 1, "error": None}
+        ))
+
+        data = JobManager(state_dir=str(tmp_path)).status(job_id)
+
+        assert data["status"] == FAILED
+        assert "terminó" in data["error"]
+
+    def test_finished_job_files_are_pruned(self, tmp_path):
+        """Test: Al listar se borran los trabajos terminados viejos o fuera del historial, no los activos"""
+        import os
+        import time
+
+        now = time.time()
+
+        def write(job_id, status, ended):
+            (tmp_path / f"{job_id}.json").write_text(json.dumps({
+                "job_id": job_id, "kind": "test", "status": status, "worker_pid": os.getpid(),
+                "created_at": ended - 1, "finished_at": ended if status != RUNNING else None,
+            }))
+
+        write("a" * 32, COMPLETED, now - 10 * 3600)   # vencido
+        write("b" * 32, COMPLETED, now - 60)          # fuera del historial
+        write("c" * 32, FAILED, now - 30)
+        write("d" * 32, COMPLETED, now - 10)
+        write("e" * 32, RUNNING, now - 10 * 3600)     # activo: nunca se borra
+        manager = JobManager(history=2, state_dir=str(tmp_path), retention_seconds=3600)
+
+        listed = [data["job_id"] for data in manager.list_status()]
+
+        assert sorted(listed) == ["c" * 32, "d" * 32, "e" * 32]
+        assert sorted(p.stem for p in tmp_path.glob("*.json")) == sorted(listed)
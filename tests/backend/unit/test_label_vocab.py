@@ -0,0 +1,68 @@
+"""
+Pruebas Unitarias: Vocabulario de etiquetas y Jaccard vectorizado
+Basado en: services/label_vocab
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.label_vocab import LabelVocabulary, TermColumn, label_set, query_term_ids
+
+VOCAB = {"dog": 1, "golden": 2, "animal": 3, "cat": 4}
+
+
+def _vocab_client():
+    """Cliente falso cuya tabla label_vocabulary contiene VOCAB"""
+    sb = MagicMock()
+
+    def in_(column, terms):
+        query = MagicMock()
+        query.execute.return_value.data = [{"id": VOCAB[t], "term": t} for t in terms if t in VOCAB]
+        return query
+
+    sb.table.return_value.select.return_value.in_.side_effect = in_
+    return sb
+
+
+def _labels(*names):
+    return {"labels": [{"label": name} for name in names]}
+
+
+class TestLabelVocab:
+    """Pruebas para el internado de términos y la similitud por ids"""
+
+    def test_lookup_caches_known_terms(self):
+        """Test: Los términos conocidos se consultan una sola vez; los desconocidos no se inventan"""
+        sb = _vocab_client()
+        vocabulary = LabelVocabulary()
+
+        assert vocabulary.lookup(sb, {"dog", "zebra"}) == {"dog": 1}
+        assert vocabulary.lookup(sb, {"dog"}) == {"dog": 1}
+        assert sb.table.call_count == 1
+
+    def test_stored_ids_and_json_fallback_agree(self):
+        """Test: Reportes con label_ids y reportes sin ids deben puntuar igual que con sets"""
+        query_terms = {"dog", "golden", "husky"}  # husky no está en el vocabulario
+        query_ids = query_term_ids(_vocab_client(), query_terms, LabelVocabulary())
+        assert query_ids["dog"] == 1 and query_ids["husky"] < 0
+
+        rows = [
+            {"label_ids": [1, 3]},                         # dog, animal
+            {"labels": _labels("Dog", "Golden", "husky")},  # sin ids: se parsea el JSON
+            {"label_ids": [4]},                            # cat
+            {"label_ids": []},
+            {"labels": None},
+        ]
+        column = TermColumn.from_rows(rows, "label_ids", "labels", label_set, query_ids)
+
+        assert column.intersection_counts(query_ids.values()).tolist() == [1, 3, 0, 0, 0]
+        assert np.allclose(column.jaccard(query_ids), [100 / 4, 100.0, 0.0, 0.0, 0.0])
+        assert column.jaccard({}).tolist() == [0.0] * 5
@@ -0,0 +1,72 @@
+"""
+Pruebas Unitarias: Importación diferida del stack de ML
+Basado en: services/embeddings, main, scripts/import_report
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from scripts.import_report import backend_dir, parse_importtime, summarize
+
+
+IMPORTTIME_SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     numpy.core
+import time:       300 |        420 |   numpy
+import time:      2000 |       2000 |     fastapi.routing
+import time:       500 |       2500 |   fastapi
+import time:      1000 |       3900 | main
+"""
+
+
+class TestLazyImports:
+    """Pruebas para que importar la app no cargue torch/timm"""
+
+    def test_importing_main_does_not_load_torch(self):
+        """Test: Importar main (aun con generación local activa) no importa torch, timm ni torchvision"""
+        code = (
+            f"import sys; sys.path.insert(0, {str(backend_dir)!r}); import main; "
+            "print(','.join(m for m in ('torch', 'timm', 'torchvision') if m in sys.modules) or 'none')"
+        )
+        env = {**os.environ, "GENERATE_EMBEDDINGS_LOCALLY": "true", "PYTHONDONTWRITEBYTECODE": "1"}
+
+        completed = subprocess.run(
+            [sys.executable, "-c", code], cwd=backend_dir, env=env, capture_output=True, text=True, timeout=120
+        )
+
+        assert completed.returncode == 0, completed.stderr
+        assert completed.stdout.strip().splitlines()[-1] == "none"
+
+    def test_startup_skips_preload_when_disabled(self):
+        """Test: Con EMBEDDING_PRELOAD=false el startup no carga el modelo"""
+        from main import app
+        from services import embeddings
+
+        env = {"GENERATE_EMBEDDINGS_LOCALLY": "true", "EMBEDDING_PRELOAD": "false"}
+        with patch.dict(os.environ, env), patch.object(embeddings, "_load_model") as load_model:
+            with TestClient(app):
+                pass
+
+        load_model.assert_not_called()
+
+    def test_import_report_summarizes_importtime(self):
+        """Test: El reporte suma el tiempo por paquete y detecta si se cargó el stack de ML"""
+        entries = parse_importtime(IMPORTTIME_SAMPLE)
+        report = summarize(entries, "main", top=2)
+
+        assert [(e["module"], e["depth"]) for e in entries][-2:] == [("fastapi", 1), ("main", 0)]
+        assert report["total_ms"] == 3.9
+        assert report["heaviest_packages"] == [
+            {"package": "fastapi", "self_ms": 2.5}, {"package": "main", "self_ms": 1.0}
+        ]
+        assert report["ml_stack_loaded"] == []
+        assert summarize(parse_importtime(IMPORTTIME_SAMPLE + "import time: 9 | 9 |   torch\n"), "main")["ml_stack_loaded"] == ["torch"]
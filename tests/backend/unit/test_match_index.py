@@ -0,0 +1,140 @@
+"""
+Pruebas Unitarias: Índice vectorial de matches en memoria
+Basado en: services/match_index.MatchIndex
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import threading
+
+import numpy as np
+import pytest
+import sys
+from pathlib import Path
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.match_index import MatchIndex
+
+
+def _unit(vec):
+    vec = np.asarray(vec, dtype=np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+class TestMatchIndex:
+    """Pruebas para el índice de embeddings particionado por (type, species)"""
+
+    @pytest.fixture
+    def index(self):
+        rng = np.random.default_rng(42)
+        index = MatchIndex()
+        self.vectors = {}
+        for i in range(200):
+            vec = rng.normal(size=32)
+            report_type = "lost" if i % 2 else "found"
+            species = "dog" if i % 3 else "cat"
+            self.vectors[f"r{i}"] = (_unit(vec), report_type, species)
+            index.upsert(f"r{i}", vec, report_type, species)
+        return index
+
+    def test_search_matches_brute_force(self, index):
+        """Test: El top-k debe coincidir con el cálculo fuerza bruta"""
+        query = self.vectors["r3"][0]
+        results = index.search(query, report_type="found", species="dog", k=5)
+
+        expected = sorted(
+            ((rid, float(vec @ query)) for rid, (vec, t, s) in self.vectors.items()
+             if t == "found" and s == "dog"),
+            key=lambda item: item[1], reverse=True
+        )[:5]
+
+        assert [rid for rid, _ in results] == [rid for rid, _ in expected]
+        for (_, got), (_, want) in zip(results, expected):
+            assert got == pytest.approx(want, abs=1e-5)
+
+    def test_exclude_and_threshold(self, index):
+        """Test: Debe excluir el reporte base y respetar el umbral"""
+        query = self.vectors["r5"][0]
+        results, total = index.search_with_total(query, report_type="lost", k=3, threshold=0.0, exclude_id="r5")
+
+        assert "r5" not in [rid for rid, _ in results]
+        assert all(score >= 0.0 for _, score in results)
+        assert total >= len(results)
+
+    def test_search_restricted_to_ids(self, index):
+        """Test: Con ids solo se puntúan esos reportes, aunque haya otros más similares"""
+        query = self.vectors["r3"][0]
+        results, total = index.search_with_total(query, k=5, ids=["r10", "r11", "missing"])
+
+        assert sorted(rid for rid, _ in results) == ["r10", "r11"]
+        assert total == 2
+
+    def test_remove_and_move_partition(self, index):
+        """Test: Quitar y cambiar de partición debe reflejarse en las búsquedas"""
+        before = index.count(report_type="lost")
+        index.remove("r1")
+        assert "r1" not in index
+        assert index.count(report_type="lost") == before - 1
+
+        # r2 es found; pasarlo a lost
+        index.update_metadata("r2", "lost", "dog")
+        assert index.count(report_type="lost") == before
+        top = index.search(self.vectors["r2"][0], report_type="lost", k=1)
+        assert top[0][0] == "r2"
+
+    def test_rejects_wrong_dimension(self, index):
+        """Test: Vectores con otra dimensión no se indexan"""
+        assert index.upsert("bad", [1.0, 0.0, 0.0], "lost", "dog") is False
+        assert "bad" not in index
+
+
+class TestMatchIndexReload:
+    """Pruebas para la recarga periódica desde Supabase"""
+
+    def test_concurrent_callers_share_one_reload(self):
+        """Test: Con una recarga en curso los demás llamadores siguen con la instantánea vigente"""
+        index = MatchIndex()
+        index.rebuild([{"id": "old", "type": "lost", "species": "dog", "embedding": [1.0, 0.0]}])
+        index.loaded_at = 0.0  # vencido
+        started, release = threading.Event(), threading.Event()
+        loads = []
+
+        def fetch(sb, page_size):
+            loads.append(page_size)
+            started.set()
+            release.wait(5)
+            return [{"id": "new", "type": "lost", "species": "dog", "embedding": [0.0, 1.0]}]
+
+        index._fetch_active_rows = fetch
+        reloader = threading.Thread(target=index.ensure_fresh, args=(None,))
+        reloader.start()
+        assert started.wait(5)
+        # Mientras tanto se responde con el índice viejo sin disparar otra carga
+        assert index.ensure_fresh(None).search([1.0, 0.0], k=1)[0][0] == "old"
+        release.set()
+        reloader.join(5)
+
+        assert len(loads) == 1
+        assert "new" in index and "old" not in index
+
+    def test_updates_during_reload_survive_the_swap(self):
+        """Test: Los upserts y bajas recibidos durante la recarga se aplican sobre el índice nuevo"""
+        index = MatchIndex()
+
+        def fetch(sb, page_size):
+            # Llegan mientras se pagina la tabla: las filas leídas ya no los reflejan
+            index.upsert("written", [0.0, 1.0], "found", "cat")
+            index.remove("resolved")
+            return [
+                {"id": "resolved", "type": "lost", "species": "dog", "embedding": [1.0, 0.0]},
+                {"id": "kept", "type": "lost", "species": "dog", "embedding": [1.0, 1.0]},
+            ]
+
+        index._fetch_active_rows = fetch
+        index.load_from_supabase(None)
+
+        assert "written" in index and "kept" in index
+        assert "resolved" not in index
+        assert index._journal is None
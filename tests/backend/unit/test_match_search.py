@@ -0,0 +1,92 @@
+"""
+Pruebas Unitarias: Búsqueda de matches vía pgvector
+Basado en: services/match_search
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import pytest
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+import services.match_search as match_search
+from services.match_index import MatchIndex
+
+
+class TestPgvectorBackend:
+    """Pruebas para el backend por defecto (RPCs de pgvector)"""
+
+    def test_report_search_uses_rpc(self):
+        """Test: La búsqueda por reporte debe delegar el top-k a la RPC"""
+        sb = MagicMock()
+        sb.rpc.return_value.execute.return_value.data = [
+            {"id": "f1", "similarity_score": 0.91},
+            {"id": "f2", "similarity_score": 0.55},
+        ]
+
+        with patch.object(match_search, "MATCH_SEARCH_BACKEND", "pgvector"):
+            top, total = match_search.search_similar_to_report_with_total(
+                sb, "r1", species="dog", k=5, threshold=0.3
+            )
+
+        name, params = sb.rpc.call_args[0]
+        assert name == "match_reports_for_report"
+        assert params["p_report_id"] == "r1"
+        assert params["match_count"] == 5
+        assert params["filter_species"] == "dog"
+        assert top == [("f1", 0.91), ("f2", 0.55)]
+        assert total == 2
+        sb.table.assert_not_called()
+
+    def test_missing_embedding_error(self):
+        """Test: El error de la RPC debe traducirse a ReportWithoutEmbeddingError"""
+        sb = MagicMock()
+        sb.rpc.return_value.execute.side_effect = Exception("REPORT_WITHOUT_EMBEDDING: r1")
+
+        with patch.object(match_search, "MATCH_SEARCH_BACKEND", "pgvector"):
+            with pytest.raises(match_search.ReportWithoutEmbeddingError):
+                match_search.search_similar_to_report(sb, "r1")
+
+    def test_vector_search_sends_literal(self):
+        """Test: El vector de consulta debe enviarse como literal compacto de pgvector"""
+        sb = MagicMock()
+        sb.rpc.return_value.execute.return_value.data = []
+
+        with patch.object(match_search, "MATCH_SEARCH_BACKEND", "pgvector"):
+            match_search.search_similar_to_vector(sb, [3.0, 4.0], k=3)
+
+        name, params = sb.rpc.call_args[0]
+        assert name == "match_reports_by_embedding"
+        assert params["query_embedding"] == "[0.600000024,0.800000012]"
+        assert params["filter_status"] == "active"
+
+
+class TestMemoryBackend:
+    """Pruebas para MATCH_SEARCH_BACKEND=memory"""
+
+    def test_report_search_uses_index(self):
+        """Test: Con el backend en memoria se busca en el tipo opuesto del índice"""
+        index = MatchIndex()
+        index.upsert("l1", [1.0, 0.0], "lost", "dog")
+        index.upsert("f1", [0.9, 0.1], "found", "dog")
+        index.upsert("l2", [1.0, 0.0], "lost", "dog")
+        index.loaded_at = float("inf")
+
+        sb = MagicMock()
+        sb.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+            {"id": "l1", "type": "lost"}
+        ]
+
+        with patch.object(match_search, "MATCH_SEARCH_BACKEND", "memory"), \
+             patch.object(match_search, "get_match_index", return_value=index):
+            top = match_search.search_similar_to_report(sb, "l1", k=5)
+
+        assert [report_id for report_id, _ in top] == ["f1"]
+        assert np.isclose(top[0][1], 0.9 / np.hypot(0.9, 0.1))
+        sb.rpc.assert_not_called()
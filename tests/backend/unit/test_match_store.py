@@ -0,0 +1,43 @@
+"""
+Pruebas Unitarias: Guardado de matches en lote
+Basado en: services/match_store.upsert_matches
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.match_store import upsert_matches
+
+
+class TestMatchStore:
+    """Pruebas para el upsert de una corrida de matches"""
+
+    def test_single_rpc_with_lost_found_orientation(self):
+        """Test: Toda la corrida viaja en una sola llamada con los ids orientados según el tipo"""
+        sb = MagicMock()
+        sb.rpc.return_value.execute.return_value.data = 2
+
+        saved = upsert_matches(sb, "found-1", "found", [("lost-1", 0.912345678), ("lost-2", 0.5)])
+
+        assert saved == 2
+        sb.rpc.assert_called_once()
+        name, params = sb.rpc.call_args[0]
+        assert name == "upsert_matches"
+        assert params["payload"] == [
+            {"lost_report_id": "lost-1", "found_report_id": "found-1", "similarity_score": 0.9123, "matched_by": "ai_visual"},
+            {"lost_report_id": "lost-2", "found_report_id": "found-1", "similarity_score": 0.5, "matched_by": "ai_visual"},
+        ]
+        sb.table.assert_not_called()
+
+    def test_empty_run_skips_database(self):
+        """Test: Sin matches no debe haber llamadas a la base"""
+        sb = MagicMock()
+
+        assert upsert_matches(sb, "lost-1", "lost", []) == 0
+        sb.rpc.assert_not_called()
@@ -15,6 +15,7 @@ backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
 sys.path.insert(0, str(backend_path))
 
 from main import app
+from services.geo_index import GeoIndex
 
 client = TestClient(app)
 
@@ -78,9 +79,14 @@ class TestMatchesAPI:
             }
         ]
 
-        mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value.eq.return_value.execute.return_value.data = candidates
+        # Los candidatos se ubican con la búsqueda por radio y luego se traen por id
+        geo_index = GeoIndex()
+        geo_index.rebuild(candidates)
+        mock_supabase.table.return_value.select.return_value.in_.return_value.execute.return_value.data = candidates
 
-        response = client.get("/matches/auto-match?report_id=base-report-123&radius_km=10&top_k=5")
+        with patch('services.geo_search.GEO_SEARCH_BACKEND', 'memory'), \
+             patch('services.geo_search.get_geo_index', return_value=geo_index):
+            response = client.get("/matches/auto-match?report_id=base-report-123&radius_km=10&top_k=5")
         
         assert response.status_code == 200
         data = response.json()
@@ -161,4 +167,47 @@ class TestMatchesAPI:
         
         assert response.status_code == 200
 
+    def test_get_pending_matches_batches_report_lookups(self, mock_supabase):
+        """Test: El enriquecimiento debe traer los reportes en una sola consulta in_()"""
+        mock_matches = [
+            {"id": f"match-{i}", "lost_report_id": "report-1", "found_report_id": f"found-{i}",
+             "similarity_score": 0.9, "status": "pending"}
+            for i in range(20)
+        ]
+        reports = [{"id": "report-1", "type": "lost"}] + [
+            {"id": f"found-{i}", "type": "found"} for i in range(20)
+        ]
+        in_query = mock_supabase.table.return_value.select.return_value.in_
+        in_query.return_value.eq.return_value.execute.return_value.data = mock_matches
+        in_query.return_value.execute.return_value.data = reports
+
+        response = client.get("/matches/pending?report_id=report-1")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["matches"][0]["lost_report"]["id"] == "report-1"
+        assert data["matches"][5]["found_report"]["id"] == "found-5"
+        report_lookups = [c for c in in_query.call_args_list if c.args[0] == "id"]
+        assert len(report_lookups) == 1
+        assert len(report_lookups[0].args[1]) == 21
+        mock_supabase.table.return_value.select.return_value.eq.return_value.single.assert_not_called()
+
+    def test_get_pending_matches_chunks_many_user_reports(self, mock_supabase):
+        """Test: Con más de IN_CHUNK_SIZE reportes del usuario los matches se piden en tandas"""
+        from utils.supabase_client import IN_CHUNK_SIZE
+
+        report_ids = [f"report-{i}" for i in range(IN_CHUNK_SIZE * 2 + 10)]
+        select = mock_supabase.table.return_value.select.return_value
+        select.eq.return_value.execute.return_value.data = [{"id": rid} for rid in report_ids]
+        select.in_.return_value.eq.return_value.execute.return_value.data = []
+        select.in_.return_value.execute.return_value.data = []
+
+        response = client.get("/matches/pending?user_id=user-123")
 
+        assert response.status_code == 200
+        for column in ("lost_report_id", "found_report_id"):
+            chunks = [c.args[1] for c in select.in_.call_args_list if c.args[0] == column]
+            assert len(chunks) == 3
+            assert all(len(chunk) <= IN_CHUNK_SIZE for chunk in chunks)
+            assert sorted(rid for chunk in chunks for rid in chunk) == sorted(report_ids)
+        select.in_.return_value.eq.assert_any_call("status", "pending")
@@ -0,0 +1,131 @@
+"""
+Pruebas Unitarias: Métricas de latencia por ruta y por etapa
+Basado en: utils/metrics, endpoint /metrics
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+from unittest.mock import patch
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+import utils.metrics as metrics
+from utils.metrics import (
+    EMBEDDING_STAGE_SECONDS,
+    HTTP_REQUEST_SECONDS,
+    SUPABASE_ROUNDTRIPS_PER_REQUEST,
+    Histogram,
+    MetricsMiddleware,
+    count_supabase_roundtrip,
+)
+from services.image_preprocess import preprocess_array
+
+
+class TestMetrics:
+    """Pruebas para el registro de métricas y su exposición"""
+
+    def test_histogram_renders_cumulative_buckets(self):
+        """Test: Los buckets son acumulativos y +Inf coincide con la cantidad"""
+        hist = Histogram("demo_seconds", "Demo", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            hist.observe(value, stage="forward")
+
+        text = hist.render()
+
+        assert '# TYPE demo_seconds histogram' in text
+        assert 'demo_seconds_bucket{stage="forward",le="0.1"} 1' in text
+        assert 'demo_seconds_bucket{stage="forward",le="1"} 3' in text
+        assert 'demo_seconds_bucket{stage="forward",le="+Inf"} 4' in text
+        assert 'demo_seconds_count{stage="forward"} 4' in text
+        with pytest.raises(ValueError):
+            hist.observe(1.0, route="/x")
+
+    def test_middleware_labels_route_template_and_counts_roundtrips(self):
+        """Test: La latencia usa la plantilla de la ruta y los round trips incluyen los de threads"""
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: str):
+            count_supabase_roundtrip()
+            await asyncio.to_thread(count_supabase_roundtrip)
+            return {"id": item_id}
+
+        before, _ = HTTP_REQUEST_SECONDS.snapshot(method="GET", route="/items/{item_id}", status="200")
+        trips_before, trips_sum_before = SUPABASE_ROUNDTRIPS_PER_REQUEST.snapshot(route="/items/{item_id}")
+
+        client = TestClient(app)
+        assert client.get("/items/a").status_code == 200
+        assert client.get("/items/b").status_code == 200
+
+        after, _ = HTTP_REQUEST_SECONDS.snapshot(method="GET", route="/items/{item_id}", status="200")
+        trips_after, trips_sum_after = SUPABASE_ROUNDTRIPS_PER_REQUEST.snapshot(route="/items/{item_id}")
+        assert after - before == 2
+        assert trips_after - trips_before == 2
+        assert trips_sum_after - trips_sum_before == 4
+
+    def test_preprocess_records_decode_and_preprocess_stages(self):
+        """Test: Decodificar una foto registra las etapas decode y preprocess"""
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 48), (10, 20, 30)).save(buffer, format="JPEG")
+        decode_before, _ = EMBEDDING_STAGE_SECONDS.snapshot(stage="decode")
+        preprocess_before, _ = EMBEDDING_STAGE_SECONDS.snapshot(stage="preprocess")
+
+        preprocess_array(buffer.getvalue(), size=32)
+
+        assert EMBEDDING_STAGE_SECONDS.snapshot(stage="decode")[0] == decode_before + 1
+        assert EMBEDDING_STAGE_SECONDS.snapshot(stage="preprocess")[0] == preprocess_before + 1
+
+    def test_metrics_endpoint_next_to_health(self):
+        """Test: /metrics expone el formato de texto de Prometheus"""
+        from main import app
+
+        client = TestClient(app)
+        assert client.get("/health").status_code == 200
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'petalert_http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text
+        assert "# TYPE petalert_inference_queue_depth gauge" in response.text
+
+    def test_multiprocess_dir_aggregates_all_workers(self, tmp_path):
+        """Test: Con METRICS_MULTIPROC_DIR /metrics suma los registros de todos los procesos"""
+        other = Histogram("demo_seconds", "Demo", ("stage",), buckets=(0.1, 1.0))
+        other.observe(0.5, stage="forward")
+        other.observe(0.05, stage="forward")
+        own_before = EMBEDDING_STAGE_SECONDS.snapshot(stage="forward")[0]
+        # Registro publicado por otro worker (p.ej. el servidor de inferencia)
+        (tmp_path / "999999.json").write_text(json.dumps({"pid": 999999, "metrics": {
+            EMBEDDING_STAGE_SECONDS.name: [[["forward"], [1] + [0] * (len(EMBEDDING_STAGE_SECONDS.buckets) - 1), 0.004, 1]],
+            metrics.STARTUP_IMPORT_SECONDS.name: [[["app"], 99.0]],
+            metrics.INFERENCE_QUEUE_DEPTH.name: [[[], 3.0]],
+        }}))
+        (tmp_path / "1.json").write_text("{}")
+        os.utime(tmp_path / "1.json", (0, 0))  # proceso que dejó de publicar
+        metrics.STARTUP_IMPORT_SECONDS.set(1.5, component="app")
+        metrics.INFERENCE_QUEUE_DEPTH.set(2)
+
+        with patch.object(metrics, "METRICS_MULTIPROC_DIR", str(tmp_path)):
+            text = metrics.render_metrics()
+
+        count = own_before + 1
+        assert f'petalert_embedding_stage_duration_seconds_count{{stage="forward"}} {count}' in text
+        assert 'petalert_startup_import_seconds{component="app"} 99' in text   # max
+        assert "petalert_inference_queue_depth 5" in text                       # suma
+        metrics.INFERENCE_QUEUE_DEPTH.set(0)
+        assert not (tmp_path / "1.json").exists()
+        merged = other.merged([other.dump(), other.dump()])
+        assert merged.snapshot(stage="forward") == (4, pytest.approx(1.1))
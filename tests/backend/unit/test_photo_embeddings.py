@@ -0,0 +1,71 @@
+"""
+Pruebas Unitarias: Embeddings por foto y similitud máxima entre fotos
+Basado en: services/photo_embeddings
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from services.photo_embeddings import (
+    aggregate_embeddings,
+    photo_urls,
+    rerank_by_max_photo,
+    save_photo_embeddings,
+)
+
+
+class TestPhotoEmbeddings:
+    """Pruebas para el agregado por reporte y el rerank por foto"""
+
+    def test_photo_urls_skips_invalid_and_limits(self):
+        """Test: Solo se toman URLs válidas, conservando su índice original"""
+        photos = ["https://a.jpg", None, "", "https://b.jpg", "https://c.jpg"]
+
+        assert photo_urls(photos, limit=2) == [(0, "https://a.jpg"), (3, "https://b.jpg")]
+        assert photo_urls(None) == []
+
+    def test_aggregate_is_renormalized_mean(self):
+        """Test: El agregado es la media renormalizada; una sola foto queda igual"""
+        a = np.array([1, 0, 0], dtype=np.float32)
+        b = np.array([0, 1, 0], dtype=np.float32)
+
+        assert np.allclose(aggregate_embeddings([a, b]), [1 / np.sqrt(2), 1 / np.sqrt(2), 0])
+        assert np.allclose(aggregate_embeddings([a]), a)
+        assert aggregate_embeddings([]) is None
+
+    def test_save_sends_photos_and_aggregate_in_one_rpc(self):
+        """Test: Vectores por foto y agregado viajan en una sola llamada"""
+        sb = MagicMock()
+        sb.rpc.return_value.execute.return_value.data = 1
+        vec = np.array([0.6, 0.8], dtype=np.float32)
+
+        assert save_photo_embeddings(sb, [("r1", vec, [(0, "https://a.jpg", vec)])]) == 1
+        name, params = sb.rpc.call_args[0]
+        assert name == "save_report_photo_embeddings"
+        assert params["payload"][0]["id"] == "r1"
+        assert params["payload"][0]["photos"][0]["photo_index"] == 0
+        assert save_photo_embeddings(sb, []) == 0
+        assert sb.rpc.call_count == 1
+
+    def test_rerank_uses_max_photo_similarity(self):
+        """Test: Los candidatos se reordenan y filtran con la similitud máxima entre fotos"""
+        sb = MagicMock()
+        sb.rpc.return_value.execute.return_value.data = [
+            {"id": "b", "similarity_score": 0.95},
+            {"id": "a", "similarity_score": 0.5},
+        ]
+
+        results = rerank_by_max_photo(sb, [("a", 0.8), ("b", 0.7), ("c", 0.1)], k=2, threshold=0.3, report_id="q")
+
+        assert results == [("b", 0.95), ("a", 0.5)]
+        name, params = sb.rpc.call_args[0]
+        assert name == "max_photo_similarity"
+        assert params == {"candidate_ids": ["a", "b", "c"], "p_report_id": "q"}
@@ -0,0 +1,76 @@
+"""
+Pruebas Unitarias: Generador de datos sintéticos
+Basado en: benchmarks/synthetic_data
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.synthetic_data import CITIES, generate_blocks, load_into_fake, score_pairs
+from services.geo_index import extract_coords
+
+
+def _blocks(reports, seed=5):
+    return list(generate_blocks(reports, seed=seed, dim=32))
+
+
+class TestSyntheticData:
+    """Pruebas para el generador determinista de reportes, matches y pares de referencia"""
+
+    def test_same_seed_same_data_regardless_of_size(self):
+        """Test: La misma semilla genera los mismos reportes aunque se pidan más"""
+        small = _blocks(300)[0]
+        large = _blocks(2500)
+
+        assert sum(len(block["reports"]) for block in large) == 2500
+        for a, b in zip(small["reports"], large[0]["reports"]):
+            assert a["id"] == b["id"] and a["location"] == b["location"]
+            assert (a["embedding"] is None) == (b["embedding"] is None)
+            if a["embedding"] is not None:
+                assert np.array_equal(a["embedding"], b["embedding"])
+        assert _blocks(300, seed=6)[0]["reports"][0]["id"] != small["reports"][0]["id"]
+
+    def test_same_pet_pairs_are_closer_than_distractors(self):
+        """Test: Los pares de la misma mascota tienen más similitud que los matches distractores"""
+        block = _blocks(1000)[0]
+        truth = {(g["lost_report_id"], g["found_report_id"]) for g in block["ground_truth"]}
+        same = [m["similarity_score"] for m in block["matches"] if (m["lost_report_id"], m["found_report_id"]) in truth]
+        other = [m["similarity_score"] for m in block["matches"] if (m["lost_report_id"], m["found_report_id"]) not in truth]
+
+        assert truth and same and other
+        assert np.percentile(same, 10) > np.percentile(other, 90)
+        assert all(np.isclose(np.linalg.norm(r["embedding"]), 1.0, atol=1e-5)
+                   for r in block["reports"] if r["embedding"] is not None)
+
+    def test_rows_follow_app_formats(self):
+        """Test: Ubicación GeoJSON dentro de alguna ciudad, labels/colors con el formato de la app"""
+        reports = _blocks(200)[0]["reports"]
+        bboxes = [bbox for bbox, _ in CITIES.values()]
+
+        for row in reports:
+            lat, lon = extract_coords(row["location"])
+            assert any(b[0] <= lat <= b[1] and b[2] <= lon <= b[3] for b in bboxes)
+            assert row["labels"]["labels"] and all("label" in item for item in row["labels"]["labels"])
+            assert row["colors"] and all(color.startswith("#") for color in row["colors"])
+        assert {row["type"] for row in reports} == {"lost", "found"}
+
+    def test_load_into_fake_and_score_ground_truth(self):
+        """Test: Se carga en el fake y los matches guardados recuperan los pares de referencia"""
+        fake = FakeSupabase()
+
+        ids = load_into_fake(fake, generate_blocks(600, seed=2, dim=128))
+        predicted = [(m["lost_report_id"], m["found_report_id"]) for m in fake.rows("matches")
+                     if m["similarity_score"] >= 0.5]
+        scores = score_pairs(predicted, ids["ground_truth"])
+
+        assert len(fake.rows("reports")) == 600 and len(ids["reports"]) == 600
+        assert set(ids["embedded"]) <= set(ids["reports"])
+        assert scores["precision"] == 1.0 and scores["recall"] > 0.8
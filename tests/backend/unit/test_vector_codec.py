@@ -0,0 +1,75 @@
+"""
+Pruebas Unitarias: Formato de transporte de embeddings
+Basado en: utils/vector_codec
+Principio X: Pruebas unitarias para cada funcionalidad
+"""
+
+import base64
+import json
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Agregar el directorio backend al path
+backend_path = Path(__file__).resolve().parent.parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from utils.vector_codec import (
+    decode_vector,
+    decode_vector_b64,
+    encode_vector_binary,
+    register_vector,
+    to_pgvector_text,
+)
+
+
+class TestVectorCodec:
+    """Pruebas para la codificación de vectores entre Postgres y el backend"""
+
+    def test_binary_round_trip(self):
+        """Test: El formato binario de pgvector debe ir y volver sin pérdida"""
+        vec = np.random.default_rng(0).standard_normal(1536).astype(np.float32)
+        data = encode_vector_binary(vec)
+
+        assert len(data) == 4 + 4 * 1536
+        assert data[:4] == b"\x06\x00\x00\x00"
+        decoded = decode_vector_b64(base64.b64encode(data).decode())
+        assert decoded.dtype == np.float32
+        assert np.array_equal(decoded, vec)
+
+    def test_text_literal_is_exact_for_float32(self):
+        """Test: El literal de texto debe reproducir exactamente los float32"""
+        vec = np.random.default_rng(1).standard_normal(64).astype(np.float32)
+        text = to_pgvector_text(vec)
+
+        assert text.startswith("[") and text.endswith("]")
+        assert np.array_equal(decode_vector(text), vec)
+        assert len(text) < len(json.dumps(vec.tolist()))
+
+    def test_decode_accepts_legacy_formats(self):
+        """Test: decode_vector debe aceptar listas, JSON y valores vacíos"""
+        assert np.array_equal(decode_vector([1.0, 2.0]), np.array([1.0, 2.0], dtype=np.float32))
+        assert np.array_equal(decode_vector("[1, 2]"), np.array([1.0, 2.0], dtype=np.float32))
+        assert decode_vector(None) is None
+        assert decode_vector("") is None
+
+    def test_register_vector_fetches_type_once_per_database(self):
+        """Test: El OID de vector se consulta una vez por base, no en cada conexión"""
+        from psycopg.adapt import AdaptersMap
+
+        connections = []
+        for dsn in ("host=a dbname=x", "host=a dbname=x", "host=b dbname=x"):
+            conn = MagicMock()
+            conn.info.dsn = dsn
+            conn.adapters = AdaptersMap()
+            connections.append(conn)
+
+        with patch.dict("utils.vector_codec._VECTOR_OIDS", clear=True), \
+             patch("psycopg.types.TypeInfo.fetch", return_value=MagicMock(oid=16390)) as fetch:
+            for conn in connections:
+                register_vector(conn)
+
+        assert fetch.call_count == 2
+        assert connections[1].adapters.get_loader(16390, 1) is not None